@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmark_rate_card_grammar
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Measure what the rate card grammar costs a short-lived script: importing
+    the parser, building the grammar on first parse, and parsing each line
+    afterwards. Each run is a fresh interpreter so nothing is already
+    imported or built.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import json
+import optparse
+import os
+import subprocess
+import sys
+
+sys.path.append('')
+
+
+# Lines parsed when no file of lines is given
+SAMPLE_LINES = [
+    'Max $20',
+    '1st hour $5',
+    '1-2 hours = $7.50',
+    'each additional 30 min $2',
+    'monthly $150',
+    'evening (after 5pm) $8',
+    'flat rate after 6pm $7',
+    'weekends = $10',
+    'Mon-Fri (6am-6pm) $15',
+    'early bird $12',
+    'no overnight parking',
+    'Thursday $4'
+]
+
+# Code run in each fresh interpreter, printing its timings as JSON
+RUN_SCRIPT = '''
+import json
+import sys
+import time
+
+start = time.time()
+from parkme.ratecard import parser
+imported = time.time()
+lines = json.loads(sys.stdin.read())
+parser.parse_or_reject_line(lines[0])
+first_parsed = time.time()
+for _ in range({repeat}):
+    for each in lines:
+        parser.parse_or_reject_line(each)
+finished = time.time()
+print json.dumps({{
+    'import': imported - start,
+    'first_parse': first_parsed - imported,
+    'parse_per_line': (finished - first_parsed) / ({repeat} * len(lines))
+}})
+'''
+
+
+def run_once(lines, repeat):
+    """Time importing and parsing in a fresh interpreter.
+
+    :param lines: The rate lines to parse
+    :type lines: list of str
+    :param repeat: Times each line is parsed after the first parse
+    :type repeat: int
+    :rtype: dict of str to float
+    """
+    process = subprocess.Popen(
+        [sys.executable, '-c', RUN_SCRIPT.format(repeat=repeat)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output, _ = process.communicate(json.dumps(lines))
+    if process.returncode:
+        raise RuntimeError('Benchmark run failed')
+    return json.loads(output)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options] [LINES_FILE]',
+        description=(
+            'Time importing the rate card parser, building the grammar and '
+            'parsing the lines in LINES_FILE, one rate per line.'))
+    parser.add_option(
+        '-n', '--runs', type='int', dest='runs', default=10,
+        help='Number of fresh interpreters to time')
+    parser.add_option(
+        '--repeat', type='int', dest='repeat', default=10,
+        help='Times each line is parsed in every run')
+    options, args = parser.parse_args()
+
+    if args:
+        with open(args[0], 'r') as lines_file:
+            lines = filter(None, [each.strip() for each in lines_file])
+    else:
+        lines = SAMPLE_LINES
+
+    runs = [run_once(lines, options.repeat) for _ in range(options.runs)]
+    for name in ['import', 'first_parse', 'parse_per_line']:
+        timings = sorted(each[name] for each in runs)
+        print '{:<15} min {:.2f}ms median {:.2f}ms'.format(
+            name, timings[0] * 1000, timings[len(timings) // 2] * 1000)
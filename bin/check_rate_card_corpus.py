@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+    check_rate_card_corpus
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Check a rate card grammar change against the rate lines of Mechanical
+    Turk result files. Snapshot the parser output before the change with
+    --update, then run again after it to list the lines whose output changed
+    and fail on lines no longer parsed, lines parsed differently or slower
+    parsing.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import optparse
+import os
+import sys
+
+sys.path.append('')
+
+from parkme.ratecard import corpus
+
+
+def print_lines(title, lines, snapshot):
+    """Print lines of the corpus along with their snapshot output.
+
+    :param title: The heading printed before the lines
+    :type title: str
+    :param lines: The lines
+    :type lines: list of unicode
+    :param snapshot: The snapshot the output is taken from
+    :type snapshot: dict of unicode to parkme.ratecard.corpus.LineResult
+    """
+    if not lines:
+        return
+    print
+    print '{} ({})'.format(title, len(lines))
+    for each in lines:
+        print u'{} -> {}'.format(each, snapshot[each].output)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options] SNAPSHOT CSV_FILE...',
+        description=(
+            'Parse the distinct rate lines of the given Mechanical Turk '
+            'result files and compare the output and parse time with '
+            'SNAPSHOT, exiting with status 1 on any regression.'))
+    parser.add_option(
+        '-u', '--update', action='store_true', dest='update', default=False,
+        help='Write SNAPSHOT from the current grammar instead of comparing')
+    parser.add_option(
+        '--column', dest='column', default=corpus.RATES_COLUMN,
+        help='Column holding the rates')
+    parser.add_option(
+        '--repeat', type='int', dest='repeat', default=corpus.REPEAT,
+        help='Times each line is parsed, keeping the fastest')
+    parser.add_option(
+        '--max-slowdown', type='float', dest='max_slowdown',
+        default=corpus.MAX_SLOWDOWN,
+        help='Largest allowed increase in total parse time, as a fraction')
+    options, args = parser.parse_args()
+
+    if len(args) < 2:
+        parser.print_help()
+        exit(1)
+
+    snapshot_path, csv_paths = args[0], args[1:]
+    lines = corpus.load_corpus(csv_paths, options.column)
+    new_snapshot = corpus.take_snapshot(lines, options.repeat)
+    num_rejected = sum(
+        1 for each in new_snapshot.itervalues() if each.output is None)
+    print '{} distinct lines, {} rejected'.format(len(lines), num_rejected)
+
+    if options.update or not os.path.exists(snapshot_path):
+        corpus.save_snapshot(new_snapshot, snapshot_path)
+        print 'Wrote {}'.format(snapshot_path)
+        exit(0)
+
+    old_snapshot = corpus.load_snapshot(snapshot_path)
+    snapshot_diff = corpus.diff_snapshots(old_snapshot, new_snapshot)
+    print_lines('FIXED', snapshot_diff.fixed, new_snapshot)
+    print_lines('BROKEN', snapshot_diff.broken, old_snapshot)
+    print_lines('CHANGED', snapshot_diff.changed, new_snapshot)
+    print
+    print '{} new lines, parsing took {:.3f}s, was {:.3f}s'.format(
+        len(snapshot_diff.new),
+        snapshot_diff.new_seconds,
+        snapshot_diff.old_seconds)
+
+    regressions = corpus.get_regressions(
+        snapshot_diff, options.max_slowdown)
+    for each in regressions:
+        print 'REGRESSION: {}'.format(each)
+    exit(1 if regressions else 0)
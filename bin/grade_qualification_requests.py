@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+    grade_qualification_requests
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Grade pending requests for a qualification against its test, granting or
+    rejecting each, and optionally revoke the qualification from workers whose
+    answers disagree with consensus too often.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import optparse
+import sys
+
+sys.path.append('')
+
+from boto.mturk import connection
+
+from parkme import models
+from parkme import settings
+from parkme.turk import qualifications
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options] TEST_JSON [QUALIFICATION_TYPE_ID]',
+        description=(
+            'Grade qualification requests against the test in TEST_JSON, '
+            'which has overview, questions and expected_answers keys.'))
+    parser.add_option(
+        '--create', dest='create_name', default=None,
+        help='Create a qualification type with this name using the test')
+    parser.add_option(
+        '--description', dest='description', default='',
+        help='Description of the created qualification type')
+    parser.add_option(
+        '--retry-delay', type='int', dest='retry_delay', default=None,
+        help='Seconds before a worker may retake the created test')
+    parser.add_option(
+        '-p', '--passing-score', type='float', dest='passing_score',
+        default=qualifications.PASSING_SCORE,
+        help='Fraction of questions to answer correctly to qualify')
+    parser.add_option(
+        '-r', '--revoke', action='store_true', dest='revoke', default=False,
+        help='Revoke the qualification from inaccurate workers')
+    parser.add_option(
+        '--min-accuracy', type='float', dest='min_accuracy',
+        default=qualifications.MIN_ACCURACY,
+        help='Fraction of answers agreeing with consensus to stay qualified')
+    parser.add_option(
+        '--min-assignments', type='int', dest='min_assignments',
+        default=qualifications.MIN_ASSIGNMENTS_FOR_REVOCATION,
+        help='Assignments completed before accuracy is judged')
+    parser.add_option(
+        '-d', '--dry-run', action='store_true', dest='dry_run',
+        default=False)
+    options, args = parser.parse_args()
+
+    if len(args) != (1 if options.create_name else 2):
+        parser.print_help()
+        exit(1)
+
+    if options.dry_run:
+        print '[DRY RUN]'
+
+    mturk_connection = connection.MTurkConnection(
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
+    grader = qualifications.QualificationGrader(
+        mturk_connection,
+        args[1] if len(args) > 1 else None,
+        qualifications.QualificationAssignment.load(args[0]),
+        passing_score=options.passing_score)
+
+    if options.create_name:
+        if options.dry_run:
+            question_form = (
+                grader.qualification_assignment.get_question_form())
+            print question_form.get_as_xml()
+            exit(0)
+        print 'QualificationTypeId: {}'.format(
+            grader.create_qualification_type(
+                options.create_name,
+                options.description,
+                retry_delay=options.retry_delay))
+        exit(0)
+
+    grades = grader.grade_pending_requests(dry_run=options.dry_run)
+    for grade in grades:
+        print '{} {} {:.0%} {}'.format(
+            grade.qualification_request_id, grade.worker_id, grade.score,
+            'GRANTED' if grade.passed else 'REJECTED')
+    print '{} Granted, {} Rejected'.format(
+        len([each for each in grades if each.passed]),
+        len([each for each in grades if not each.passed]))
+
+    if options.revoke:
+        worker_stats_gateway = models.WorkerStatsDataGateway('db.sqlite3')
+        worker_stats_gateway.create_table()
+        revoked = grader.revoke_inaccurate_workers(
+            worker_stats_gateway,
+            min_accuracy=options.min_accuracy,
+            min_assignments=options.min_assignments,
+            dry_run=options.dry_run)
+        for worker_stats in revoked:
+            print 'REVOKED {} ({:.0%} of {} assignments agreed)'.format(
+                worker_stats.worker_id,
+                qualifications.get_accuracy(worker_stats),
+                worker_stats.num_assignments)
+        print '{} Revoked'.format(len(revoked))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+    import_gold_assets
+    ~~~~~~~~~~~~~~~~~~
+    Import lot photos with known categories as gold assets, to be mixed into
+    categorization batches and score worker accuracy.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import csv
+import optparse
+import sys
+
+sys.path.append('')
+
+from parkme import models
+from parkme.assignments.categorization import gold as categorization_gold
+
+
+def row_to_gold_asset(row):
+    """Convert the given CSV row to a gold asset. An empty categories column
+    means the photo does not match the lot.
+
+    :param row: A CSV row with asset_id, lot_id, image_url and categories
+        separated by '|'
+    :type row: dict
+    :rtype: parkme.models.GoldAsset
+    """
+    categories = [each.strip()
+                  for each in (row['categories'] or '').split('|')
+                  if each.strip()]
+    return models.GoldAsset(
+        asset_id=row['asset_id'],
+        params={
+            'asset_id': int(row['asset_id']),
+            'lot_id': int(row['lot_id']),
+            'image_url': row['image_url']
+        },
+        answer={
+            'categories': categories,
+            'does_not_match': not categories
+        })
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options] GOLD_ASSETS_CSV',
+        description=(
+            'Import gold categorization assets from a CSV file with '
+            'asset_id, lot_id, image_url and categories columns.'))
+    options, args = parser.parse_args()
+
+    if len(args) != 1:
+        parser.print_help()
+        exit(1)
+
+    with open(args[0], 'r') as csvfile:
+        gold_assets = [row_to_gold_asset(row)
+                       for row in csv.DictReader(csvfile)]
+
+    gold_gateway = models.GoldAssetDataGateway('db.sqlite3')
+    gold_gateway.create_table()
+    gold_gateway.save_all(categorization_gold.GOLD_TASK, gold_assets)
+    print '{} Gold assets imported'.format(len(gold_assets))
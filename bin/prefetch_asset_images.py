@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+    prefetch_asset_images
+    ~~~~~~~~~~~~~~~~~~~~~
+    Fill the local image cache with the comparable asset images of the given
+    lots so that later passes over them need no network I/O.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import optparse
+import sys
+
+sys.path.append('')
+
+import psycopg2
+
+from parkme.assignments.photochange import uploader
+from parkme.images import cache
+from upload_photo_change_assignments import get_lot_ids_from_csv_file
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options] LOT_IDS_CSV',
+        description='Prefetch asset images into the local image cache.')
+    parser.add_option(
+        '--image-cache', dest='image_cache_dir', default='image_cache',
+        help='Directory caching images')
+    parser.add_option(
+        '--image-source', dest='image_source', default=None,
+        help='Local directory or URL to fetch images from instead of S3')
+    parser.add_option(
+        '-n', '--workers', type='int', dest='workers',
+        default=cache.NUM_PREFETCH_WORKERS,
+        help='Number of images fetched concurrently')
+    options, args = parser.parse_args()
+
+    if len(args) != 1:
+        parser.print_help()
+        exit(1)
+
+    image_cache = cache.ImageCache(
+        options.image_cache_dir, cache.get_fetcher(options.image_source))
+    pgsql_connection = psycopg2.connect("dbname=pim user=pim")
+    try:
+        keys = [
+            (asset.str_bucket, asset.str_path)
+            for asset_group in uploader.get_comparable_assets_for_lots(
+                pgsql_connection, get_lot_ids_from_csv_file(args[0]))
+            for asset in asset_group]
+    finally:
+        pgsql_connection.close()
+
+    num_fetched, failed = image_cache.prefetch(keys, options.workers)
+    print 'Fetched {} images, {} already cached, {} failed'.format(
+        num_fetched, len(set(keys)) - num_fetched - len(failed), len(failed))
+    for str_bucket, str_path in failed:
+        print 'Failed {}/{}'.format(str_bucket, str_path)
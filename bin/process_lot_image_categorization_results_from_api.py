@@ -3,14 +3,26 @@ sys.path.append('')
 
 import collections
 import copy
+import optparse
+import time
 import uuid
 
 from boto.mturk import connection
 import psycopg2
 
 from parkme import db
+from parkme import models
 from parkme import settings
+from parkme.assignments.categorization import gold as categorization_gold
+from parkme.assignments.categorization import models as categorization_models
+from parkme.turk import adaptive
 from parkme.turk import assignments as turk_assignments
+from parkme.turk import gold
+from parkme.turk import metrics
+from parkme.turk import reputation
+from parkme.utils import eventlog
+from parkme.utils import profiling
+from parkme.utils import report
 
 
 # Constants taken from ParkMe app.
@@ -23,6 +35,26 @@ CATEGORY_TO_LOT_ASSET_TYPE = {
     'paymenttypes': 16
 }
 
+# Outcomes of processing the assignments for a single asset
+ACCEPTED = 'ACCEPTED'
+UNCATEGORIZABLE = 'UNCATEGORIZABLE'
+NO_CONSENSUS = 'NO CONSENSUS'
+NOT_ENOUGH = 'NOT ENOUGH'
+
+# Events logged for each answer on a gold asset, counted in the summary
+GOLD_CORRECT_EVENT = 'gold_answer_correct'
+GOLD_INCORRECT_EVENT = 'gold_answer_incorrect'
+
+# Columns of the report row written for each asset
+REPORT_COLUMNS = [
+    'hit_id',
+    'asset_id',
+    'lot_id',
+    'decision',
+    'num_assignments',
+    'num_duplicates'
+]
+
 
 def reject_empty_assignments(assignments, assignment_gateway):
     """Reject any assignments where the user did not choose an answer.
@@ -30,11 +62,13 @@ def reject_empty_assignments(assignments, assignment_gateway):
     :param assignments: A list of assignments
     :type assignments: list
     """
-    for each in assignments:
-        if each.categories is None and each.does_not_match is None:
-            print '--> {} REJECTED AS EMPTY <--'.format(each.assignment_id)
-            assignment_gateway.reject(
-                each, feedback='Did not select any options')
+    # Bundled assignments are rejected once, whichever of their items is empty
+    for each in turk_assignments.unique_by_assignment_id(
+            each for each in assignments
+            if each.categories is None and each.does_not_match is None):
+        eventlog.info(
+            'assignment_rejected_empty', assignment_id=each.assignment_id)
+        assignment_gateway.reject(each, feedback='Did not select any options')
 
 
 def majority_considered_uncategorizable(assignments):
@@ -79,6 +113,107 @@ def get_consensus_categories(assignments):
     return [category for category, count in results.iteritems() if count >= 2]
 
 
+def has_consensus_uncategorizable(assignments):
+    """Indicates whether or not at least two workers marked this assignment
+    as not matching any categories.
+
+    :param assignments: A list of assignments
+    :type assignments: list of ImageCategorizationAssignment
+    :rtype: bool
+    """
+    return len([each for each in assignments if each.does_not_match]) >= 2
+
+
+def is_decided(assignments):
+    """Indicates whether or not the given assignments can be decided without
+    requesting more assignments.
+
+    :param assignments: A list of assignments
+    :type assignments: list of ImageCategorizationAssignment
+    :rtype: bool
+    """
+    return (has_consensus_on_categories(assignments) or
+            has_consensus_uncategorizable(assignments))
+
+
+def get_weighted_consensus_categories(assignments, worker_weights):
+    """Return the categories agreed upon by enough trusted workers. Unlike
+    get_consensus_categories this can decide before all assignments are in.
+
+    :param assignments: a list of assignments
+    :type assignments: list
+    :param worker_weights: Weight of each worker
+    :type worker_weights: dict of worker id to float
+    :rtype: list
+    """
+    votes = reputation.get_weighted_votes(
+        assignments, worker_weights, lambda each: each.categories)
+    return reputation.get_weighted_consensus(
+        votes, len(assignments) >= 3)
+
+
+def agrees_with_categories(assignment, categories):
+    """Indicates whether or not the given assignment chose exactly the given
+    categories.
+
+    :param assignment: An assignment
+    :type assignment: ImageCategorizationAssignment
+    :param categories: A list of categories
+    :type categories: list
+    :rtype: bool
+    """
+    return set(assignment.categories or []) == set(categories)
+
+
+@profiling.timed()
+def process_gold_assignments(assignments,
+                             assignment_gateway,
+                             gold_gateway,
+                             accuracy_gateway):
+    """Score the given assignments that are for gold assets, recording each
+    worker's accuracy. Assignments with only gold assets are accepted if all
+    of their answers are correct and rejected otherwise, those bundled with
+    other assets are left to be reviewed with them.
+
+    :param assignments: A list of assignments
+    :type assignments: list of ImageCategorizationAssignment
+    :param assignment_gateway: An assignment gateway
+    :type assignment_gateway: parkme.turk.assignments.AssignmentGateway
+    :param gold_gateway: A gold asset data gateway
+    :type gold_gateway: parkme.models.GoldAssetDataGateway
+    :param accuracy_gateway: A worker gold accuracy data gateway
+    :type accuracy_gateway: parkme.models.WorkerAccuracyDataGateway
+    :return: The assignments for assets that aren't gold
+    :rtype: list of ImageCategorizationAssignment
+    """
+    gold_assets = gold_gateway.get_by_asset_ids(
+        categorization_gold.GOLD_TASK,
+        [each.asset_id for each in assignments])
+    if not gold_assets:
+        return assignments
+
+    gold_results, other_assignments = gold.score_assignments(
+        assignments, gold_assets, categorization_gold.matches_gold_answer)
+    grades = gold.grade_gold_only_assignments(gold_results, other_assignments)
+    for each in turk_assignments.unique_by_assignment_id(
+            each for each in assignments if each.assignment_id in grades):
+        if grades[each.assignment_id]:
+            assignment_gateway.accept(each)
+        else:
+            eventlog.info(
+                'assignment_rejected_gold', assignment_id=each.assignment_id)
+            assignment_gateway.reject(
+                each, feedback='Did not match the known categories')
+    accuracy_gateway.record_results(gold_results)
+    for each in gold_results:
+        eventlog.debug(
+            GOLD_CORRECT_EVENT if each.correct else GOLD_INCORRECT_EVENT,
+            assignment_id=each.assignment_id,
+            worker_id=each.worker_id,
+            asset_id=each.asset_id)
+    return other_assignments
+
+
 def set_categories_for_asset(asset_id, categories):
     """Update the ParkMe asset with the given ID to have the given
     categories.
@@ -141,6 +276,7 @@ def mark_approved(pk_asset):
             (pk_asset,))
 
 
+@profiling.timed()
 def adjust_show_quality_images_for_lot(lot_id):
     """For the given lot ensure that it has one show quality image for each
     category. If there's a tie simply choose the most recent image in the given
@@ -198,81 +334,325 @@ def adjust_show_quality_images_for_lot(lot_id):
                     unmark_show_quality(next_asset_id)
 
 
-def process_results(batch_id):
+@profiling.timed()
+def process_asset_assignments(asset_id,
+                              assignments,
+                              worker_weights=None,
+                              review=None,
+                              duplicate_asset_ids=()):
+    """Process the assignments for a single asset, saving any consensus
+    categories. The outcome is also applied to any duplicates of the asset
+    that were not uploaded. Assignments are accepted by
+    process_hit_assignments, once for all of the assets of their HIT.
+
+    :param asset_id: An asset id
+    :type asset_id: str or unicode
+    :param assignments: The assignments for the asset
+    :type assignments: list of ImageCategorizationAssignment
+    :param worker_weights: (Optional) Weight consensus by these worker weights
+    :type worker_weights: dict of worker id to float or None
+    :param review: (Optional) The outcome of reviewing the asset's HIT with
+        an adaptive scheduler, see review_hit
+    :type review: str or None
+    :param duplicate_asset_ids: (Optional) Duplicates of the asset
+    :type duplicate_asset_ids: list of str or unicode
+    :return: The outcome and the results to record for each worker
+    :rtype: tuple of (str, list of parkme.models.WorkerResult)
+    """
+    hit_id = assignments[0].hit_id
+    winning_categories = (
+        get_weighted_consensus_categories(assignments, worker_weights)
+        if worker_weights is not None
+        else [])
+    is_complete = len(assignments) >= 3
+    if review is not None and not winning_categories:
+        if review in (adaptive.WAITING, adaptive.EXTENDED):
+            eventlog.debug(
+                'asset_' + review.lower(), hit_id=hit_id, asset_id=asset_id)
+            return review, []
+        is_complete = True
+
+    if not winning_categories and not is_complete:
+        eventlog.debug('asset_not_enough', hit_id=hit_id, asset_id=asset_id)
+        return NOT_ENOUGH, []
+
+    if winning_categories or has_consensus_on_categories(assignments):
+        winning_categories = (
+            winning_categories or get_consensus_categories(assignments))
+        eventlog.debug(
+            'asset_accepted',
+            hit_id=hit_id,
+            asset_id=asset_id,
+            categories=winning_categories)
+        for each in [asset_id] + list(duplicate_asset_ids):
+            set_categories_for_asset(each, winning_categories)
+            mark_approved(each)
+        return ACCEPTED, reputation.get_worker_results(
+            assignments,
+            [agrees_with_categories(each, winning_categories)
+             for each in assignments])
+
+    if (majority_considered_uncategorizable(assignments) or
+            (review is not None and
+             has_consensus_uncategorizable(assignments))):
+        eventlog.debug(
+            'asset_uncategorizable', hit_id=hit_id, asset_id=asset_id)
+        # Mark the asset as approved
+        for each in [asset_id] + list(duplicate_asset_ids):
+            mark_approved(each)
+        return UNCATEGORIZABLE, reputation.get_worker_results(
+            assignments, [each.does_not_match for each in assignments])
+
+    # No consensus could be reached
+    eventlog.debug('asset_no_consensus', hit_id=hit_id, asset_id=asset_id)
+    return NO_CONSENSUS, []
+
+
+def review_hit(scheduler, hit, assignments_for_assets, worker_weights=None):
+    """Review a HIT with an adaptive scheduler, once for all of its assets.
+    The HIT is decided when every asset is.
+
+    :param scheduler: An adaptive scheduler
+    :type scheduler: parkme.turk.adaptive.AdaptiveScheduler
+    :param hit: A HIT
+    :type hit: boto.mturk.HIT
+    :param assignments_for_assets: The assignments for each asset of the HIT
+    :type assignments_for_assets: dict of asset id to list of
+        ImageCategorizationAssignment
+    :param worker_weights: (Optional) Weight consensus by these worker weights
+    :type worker_weights: dict of worker id to float or None
+    :return: One of the parkme.turk.adaptive outcomes
+    :rtype: str
+    """
+    def is_asset_decided(assignments):
+        return bool(
+            (worker_weights is not None and
+             get_weighted_consensus_categories(assignments, worker_weights))
+            or is_decided(assignments))
+
+    # The items split from a bundled assignment count as one assignment
+    return scheduler.review(
+        hit,
+        turk_assignments.unique_by_assignment_id(
+            item
+            for assignments in assignments_for_assets.itervalues()
+            for item in assignments),
+        lambda _: all(
+            is_asset_decided(assignments)
+            for assignments in assignments_for_assets.itervalues()))
+
+
+@profiling.timed()
+def process_hit_assignments(hit,
+                            assignments_for_assets,
+                            assignment_gateway,
+                            worker_weights=None,
+                            scheduler=None,
+                            asset_id_to_duplicates=None):
+    """Process the assignments for each asset of a single HIT. Once every
+    asset is finished the HIT's assignments are each accepted once, however
+    many assets they were split into.
+
+    :param hit: A HIT
+    :type hit: boto.mturk.HIT
+    :param assignments_for_assets: The assignments for each asset of the HIT
+    :type assignments_for_assets: dict of asset id to list of
+        ImageCategorizationAssignment
+    :param assignment_gateway: An assignment gateway
+    :type assignment_gateway: parkme.turk.assignments.AssignmentGateway
+    :param worker_weights: (Optional) Weight consensus by these worker weights
+    :type worker_weights: dict of worker id to float or None
+    :param scheduler: (Optional) Extend HITs that have not reached consensus
+    :type scheduler: parkme.turk.adaptive.AdaptiveScheduler or None
+    :param asset_id_to_duplicates: (Optional) Duplicates of each asset
+    :type asset_id_to_duplicates: dict of asset id to list of asset ids
+    :return: The outcome for each asset and the results to record for each
+        worker
+    :rtype: tuple of (dict of asset id to str,
+        list of parkme.models.WorkerResult)
+    """
+    asset_id_to_duplicates = asset_id_to_duplicates or {}
+    review = (
+        review_hit(scheduler, hit, assignments_for_assets, worker_weights)
+        if scheduler
+        else None)
+    outcomes = collections.OrderedDict()
+    worker_results = []
+    for asset_id, assignments in assignments_for_assets.iteritems():
+        outcomes[asset_id], asset_worker_results = process_asset_assignments(
+            asset_id,
+            assignments,
+            worker_weights=worker_weights,
+            review=review,
+            duplicate_asset_ids=asset_id_to_duplicates.get(asset_id, []))
+        worker_results.extend(asset_worker_results)
+    if not set(outcomes.itervalues()) & set(
+            [NOT_ENOUGH, adaptive.WAITING, adaptive.EXTENDED]):
+        assignment_gateway.accept_all(
+            item
+            for assignments in assignments_for_assets.itervalues()
+            for item in assignments)
+    return outcomes, worker_results
+
+
+@profiling.timed()
+def process_results(batch_id, weighted=False, adaptive_hits=False,
+                    call_metrics=None, report_path=None):
     """Process image categorization results from the batch with the given id.
+    Worker statistics are updated with the results of the batch.
 
     :param batch_id: A batch id
     :type batch_id: int
+    :param weighted: Weight consensus by worker reputation
+    :type weighted: bool
+    :param adaptive_hits: Extend HITs that have not reached consensus
+    :type adaptive_hits: bool
+    :param call_metrics: (Optional) Records the Mechanical Turk calls made
+    :type call_metrics: parkme.turk.metrics.CallMetrics or None
+    :param report_path: (Optional) Path to write a CSV report to, with a row
+        for each asset, and its summary next to it
+    :type report_path: str or unicode or None
     """
+    assignments_for_hits = collections.defaultdict(collections.OrderedDict)
     assignments_for_assets = collections.defaultdict(list)
     accepted_hits = set([])
     rejected_hits = set([])
     uncategorizable_hits = set([])
+    outcome_to_hits = {
+        ACCEPTED: accepted_hits,
+        NO_CONSENSUS: rejected_hits,
+        UNCATEGORIZABLE: uncategorizable_hits
+    }
     lot_ids = set([])
 
     mturk_connection = connection.MTurkConnection(
         aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
+    if call_metrics is not None:
+        mturk_connection = metrics.InstrumentedMTurkConnection(
+            mturk_connection, call_metrics)
     assignment_gateway = turk_assignments.AssignmentGateway.get(
         mturk_connection)
-    all_assignments = assignment_gateway.get_by_batch_id(
-        batch_id, turk_assignments.ImageCategorizationAssignment)
-
-    # Group all assignments by their referenced asset, accumulate lot ids
-    for each in all_assignments:
-        assignments_for_assets[each.asset_id].append(each)
-        lot_ids.add(each.lot_id)
-
-    # Check for any assignments where the answers do not match
-    for asset_id, assignments in assignments_for_assets.iteritems():
-        if len(assignments) >= 3:
-            if has_consensus_on_categories(assignments):
-                print '{} ACCEPTED {}'.format(assignments[0].hit_id, asset_id)
-                winning_categories = get_consensus_categories(assignments)
-                for each in assignments:
-                    assignment_gateway.accept(each)
-                accepted_hits.add(assignments[0].hit_id)
-                set_categories_for_asset(asset_id, winning_categories)
-                mark_approved(asset_id)
-            elif majority_considered_uncategorizable(assignments):
-                print "{} UNCATEGORIZABLE".format(assignments[0].hit_id)
-                # Accept all of the assignments (but don't keep categories)
-                for each in assignments:
-                    assignment_gateway.accept(each)
-                # Mark the asset as approved
-                mark_approved(asset_id)
-                uncategorizable_hits.add(assignments[0].hit_id)
-            else:
-                # No consensus could be reached
-                print "{} NO CONSENSUS".format(assignments[0].hit_id)
-                for each in assignments:
-                    assignment_gateway.accept(each)
-                rejected_hits.add(assignments[0].hit_id)
-        else:
-            print '{} NOT ENOUGH'.format(assignments[0].hit_id)
-        print [each.categories for each in assignments]
-
-    # Adjust show quality images based on classification results
-    print "Adjusting show quality images..."
-    for lot_id in lot_ids:
-        print lot_id
-        adjust_show_quality_images_for_lot(lot_id)
-
-    num_assignments_processed = (
-        len(accepted_hits) + len(uncategorizable_hits) + len(rejected_hits))
-
-    percent_accepted = (
-        float(len(accepted_hits) + len(uncategorizable_hits)) / len(assignments_for_assets.keys())
-        * 100.0)
-    print
-    print "RESULTS"
-    print "{} Accepted, {} No Consensus, {} Uncategorizable ({:0.02f}%)".format(
-        len(accepted_hits), len(rejected_hits),
-        len(uncategorizable_hits), percent_accepted)
-    print
-    print "NO CONSENSUS HIT IDS"
-    for hit_id in rejected_hits:
-        print hit_id
+    with profiling.span('fetch'):
+        hits_in_batch = list(
+            assignment_gateway.get_hits_by_batch_id(batch_id))
+        all_assignments = list(turk_assignments.map_hits_to_assignments(
+            hits_in_batch,
+            mturk_connection,
+            turk_assignments.ImageCategorizationAssignment))
+    hit_id_to_hit = {hit.HITId: hit for hit in hits_in_batch}
+    scheduler = (
+        adaptive.AdaptiveScheduler(
+            categorization_models.CategorizeLotPhotoTemplate(
+                mturk_connection))
+        if adaptive_hits
+        else None)
+    worker_stats_gateway = models.WorkerStatsDataGateway('db.sqlite3')
+    worker_stats_gateway.create_table()
+    gold_gateway = models.GoldAssetDataGateway('db.sqlite3')
+    gold_gateway.create_table()
+    accuracy_gateway = models.WorkerAccuracyDataGateway('db.sqlite3')
+    accuracy_gateway.create_table()
+    worker_results = []
+
+    # Assignments for bundled HITs are split into one per asset. Answers on
+    # gold assets are scored first so they count towards worker weights.
+    all_items = process_gold_assignments(
+        [item for each in all_assignments for item in each.split_items()],
+        assignment_gateway,
+        gold_gateway,
+        accuracy_gateway)
+    with profiling.span('worker_weights'):
+        worker_weights = (
+            reputation.get_worker_weights(
+                worker_stats_gateway, all_items, accuracy_gateway)
+            if weighted
+            else None)
+
+    # Group all assignments by their HIT and referenced asset, accumulate lot
+    # ids
+    for item in all_items:
+        assignments_for_hits[item.hit_id].setdefault(
+            item.asset_id, []).append(item)
+        assignments_for_assets[item.asset_id].append(item)
+        lot_ids.add(item.lot_id)
+
+    duplicate_gateway = models.AssetDuplicateDataGateway('db.sqlite3')
+    duplicate_gateway.create_table()
+    asset_id_to_duplicates = duplicate_gateway.get_by_original_asset_ids(
+        assignments_for_assets.keys())
+
+    with report.open_report(
+            report_path, batch_id, REPORT_COLUMNS) as batch_report:
+        # Check for any assignments where the answers do not match
+        for hit_id, hit_assignments in assignments_for_hits.iteritems():
+            outcomes, hit_worker_results = process_hit_assignments(
+                hit_id_to_hit[hit_id],
+                hit_assignments,
+                assignment_gateway,
+                worker_weights=worker_weights,
+                scheduler=scheduler,
+                asset_id_to_duplicates=asset_id_to_duplicates)
+            worker_results.extend(hit_worker_results)
+            for asset_id, outcome in outcomes.iteritems():
+                assignments = hit_assignments[asset_id]
+                if outcome in outcome_to_hits:
+                    outcome_to_hits[outcome].add((hit_id, asset_id))
+                if batch_report:
+                    batch_report.add_row(
+                        hit_id=hit_id,
+                        asset_id=asset_id,
+                        lot_id=assignments[0].lot_id,
+                        decision=outcome,
+                        num_assignments=len(assignments),
+                        num_duplicates=len(
+                            asset_id_to_duplicates.get(asset_id, [])))
+                eventlog.debug(
+                    'asset_answers',
+                    asset_id=asset_id,
+                    answers=[each.categories for each in assignments])
+
+        with profiling.span('record_worker_results'):
+            worker_stats_gateway.record_results(worker_results)
+
+        # Adjust show quality images based on classification results
+        print "Adjusting show quality images..."
+        for lot_id in lot_ids:
+            eventlog.debug('lot_show_quality_adjusted', lot_id=lot_id)
+            adjust_show_quality_images_for_lot(lot_id)
+
+        num_assignments_processed = (
+            len(accepted_hits) +
+            len(uncategorizable_hits) +
+            len(rejected_hits))
+
+        percent_accepted = (
+            float(len(accepted_hits) + len(uncategorizable_hits)) /
+            len(assignments_for_assets) * 100.0
+            if assignments_for_assets
+            else 0.0)
+        print
+        print "RESULTS"
+        print (
+            "{} Accepted, {} No Consensus, {} Uncategorizable "
+            "({:0.02f}%)".format(
+                len(accepted_hits), len(rejected_hits),
+                len(uncategorizable_hits), percent_accepted))
+        event_counts = eventlog.EVENT_LOG.get_counts()
+        print '{} Gold answers, {} correct'.format(
+            event_counts[GOLD_CORRECT_EVENT] +
+            event_counts[GOLD_INCORRECT_EVENT],
+            event_counts[GOLD_CORRECT_EVENT])
+        print
+        print "NO CONSENSUS HIT IDS"
+        for hit_id in set(hit_id for hit_id, _ in rejected_hits):
+            print hit_id
+
+        if batch_report:
+            batch_report.close(
+                num_hits=len(hits_in_batch),
+                num_lots=len(lot_ids),
+                percent_accepted=percent_accepted)
 
     if num_assignments_processed == len(assignments_for_assets.keys()):
         return True
@@ -280,14 +660,52 @@ def process_results(batch_id):
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print "Usage: process_categorization_results.py [BATCH_ID]"
-        print "Print out results of scanning validation results."
+    parser = optparse.OptionParser(
+        usage='%prog [options] BATCH_ID',
+        description='Print out results of scanning validation results.')
+    parser.add_option(
+        '-w', '--weighted', action='store_true', dest='weighted',
+        default=False, help='Weight consensus by worker reputation')
+    parser.add_option(
+        '-a', '--adaptive', action='store_true', dest='adaptive',
+        default=False, help='Extend HITs that have not reached consensus')
+    parser.add_option(
+        '-m', '--metrics', dest='metrics_file', default=None,
+        help='Write Mechanical Turk call metrics to this file, in the '
+        'Prometheus text format if it ends with .prom and JSON otherwise')
+    parser.add_option(
+        '--profile', dest='profile_file', default=None,
+        help='Profile the run, printing the slowest functions and a timing '
+        'table of each stage, and dump cProfile statistics to this file')
+    parser.add_option(
+        '-r', '--report', dest='report_file', default=None,
+        help='Write a CSV row for each asset decided to this file, and '
+        'aggregate statistics to this file with {} appended'.format(
+            report.SUMMARY_SUFFIX))
+    eventlog.add_options(parser)
+    options, args = parser.parse_args()
+
+    if len(args) != 1:
+        parser.print_help()
         exit(1)
 
     try:
-        batch_id = int(sys.argv[1])
+        batch_id = int(args[0])
     except ValueError:
-        batch_id = str(sys.argv[1])
-
-    process_results(batch_id)
+        batch_id = str(args[0])
+
+    eventlog.configure_from_options(options)
+    start = time.time()
+    call_metrics = metrics.CallMetrics() if options.metrics_file else None
+    with profiling.profile_run(
+            options.profile_file, enabled=bool(options.profile_file)):
+        process_results(
+            batch_id,
+            weighted=options.weighted,
+            adaptive_hits=options.adaptive,
+            call_metrics=call_metrics,
+            report_path=options.report_file)
+    eventlog.print_summary()
+    if call_metrics is not None:
+        metrics.report_call_metrics(
+            call_metrics, time.time() - start, options.metrics_file)
@@ -2,15 +2,39 @@ import sys
 sys.path.append('')
 
 import collections
-import itertools
+import optparse
 
 from boto.mturk import connection
 
-from parkme import db
+from parkme import models
 from parkme import settings
+from parkme.ratecard import consensus
+from parkme.ratecard import diagnostics
 from parkme.ratecard import models as ratecard_models
+from parkme.ratecard import reprocess
+from parkme.ratecard import writer
 from parkme.turk import assignments
 from parkme.turk import hits
+from parkme.turk import reputation
+from parkme.utils import eventlog
+from parkme.utils import profiling
+from parkme.utils import report
+
+
+# Outcomes of evaluating the assignments for a single HIT
+CONSENSUS = 'CONSENSUS'
+NOT_RATES = 'NOT RATES'
+NO_CONSENSUS = 'NO CONSENSUS'
+NOT_ENOUGH = 'NOT ENOUGH'
+
+# Columns of the report row written for each HIT
+REPORT_COLUMNS = [
+    'hit_id',
+    'lot_id',
+    'decision',
+    'num_assignments',
+    'num_rates'
+]
 
 
 def has_consensus_not_rate_card(assignments):
@@ -26,98 +50,257 @@ def has_consensus_not_rate_card(assignments):
     return num_without_rates >= 2
 
 
-def has_consensus_on_rates(assignments):
-    """Indicates whether or not the given assignments have a consensus on rates.
+def parse_assignment(assignment):
+    """Parse the rates of the given assignment.
+
+    :param assignment: An assignment
+    :type assignment: RateTranscriptionAssignment
+    :return: The result, or None if it has no rates or a line was rejected
+    :rtype: parkme.ratecard.models.ParseResult or None
+    """
+    if not assignment.rates:
+        return None
+    try:
+        return ratecard_models.ParseResult.get_for_assignment(assignment)
+    except ratecard_models.ParseFailedException:
+        return None
+
+
+def parse_assignments(assignments):
+    """Parse the rates of each of the given assignments once, so that
+    evaluating their HIT doesn't parse any of them again.
+
+    :param assignments: A list of assignments
+    :type assignments: list of RateTranscriptionAssignment
+    :rtype: dict of assignment id to parkme.ratecard.models.ParseResult or
+        None
+    """
+    return dict(
+        (each.assignment_id, parse_assignment(each)) for each in assignments)
+
+
+def get_parsed_rates(assignment, parse_result):
+    """Return the set of parsed rates for the given assignment if every line
+    could be parsed.
+
+    :param assignment: An assignment
+    :type assignment: RateTranscriptionAssignment
+    :param parse_result: The assignment's parse result, see parse_assignment
+    :type parse_result: parkme.ratecard.models.ParseResult or None
+    :rtype: frozenset of parkme.ratecard.records.RateRecord or None
+    """
+    if parse_result is None:
+        return None
+
+    # Has results and exactly one result per line
+    original_lines = assignment.rates.split('\r\n')
+    parsed_lines = filter(None, parse_result.parsed_rates)
+    if parsed_lines and len(parsed_lines) == len(original_lines):
+        return frozenset(parse_result.parsed_records)
+    return None
+
+
+def get_transcriptions(assignments, parse_results):
+    """Return the rate records of each of the given assignments, or None for
+    those with a line that couldn't be parsed.
 
     :param assignments: A list of assignments
     :type assignments: list
-    :rtype: bool
+    :param parse_results: The parse result of each assignment
+    :type parse_results: dict of assignment id to
+        parkme.ratecard.models.ParseResult or None
+    :rtype: list of list of parkme.ratecard.records.RateRecord or None
     """
-    parsed_assignments = []
-    for each in assignments:
-        if not each.rates:
-            continue
+    return [
+        parse_results[each.assignment_id].parsed_records
+        if get_parsed_rates(each, parse_results[each.assignment_id])
+        else None
+        for each in assignments]
 
-        try:
-            result = ratecard_models.ParseResult.get_for_assignment(each)
-            # Has results and exactly one result per line
-            original_lines = each.rates.split('\r\n')
-            parsed_lines = filter(None, result.parsed_rates)
-            if (parsed_lines and len(parsed_lines) == len(original_lines)):
-                parsed_assignments.append(result)
-        except ratecard_models.ParseFailedException:
-            continue
 
-    if len(parsed_assignments) < 2:
-        return False
+def get_consensus_rates(assignments, parse_results):
+    """Return the consensus results for the given assignments.
 
-    num_matches = 0
-    for (lhs, rhs) in itertools.combinations(parsed_assignments, 2):
-        if set(lhs.parsed_rates) == set(rhs.parsed_rates):
-            num_matches += 2
-    return num_matches >= 2
+    :param assignments: A list of assignments
+    :type assignments: list
+    :param parse_results: The parse result of each assignment
+    :type parse_results: dict of assignment id to
+        parkme.ratecard.models.ParseResult or None
+    :rtype: list of parkme.ratecard.records.RateRecord or None
+    """
+    return consensus.get_consensus_records(
+        get_transcriptions(assignments, parse_results))
 
 
-def get_consensus_rates(assignments):
-    """Parse and return the consensus results for the given assignments.
+def get_weighted_consensus_rates(assignments, worker_weights, parse_results):
+    """Return the rates agreed upon by enough trusted workers. Unlike
+    get_consensus_rates this can decide before all assignments are in.
 
     :param assignments: A list of assignments
     :type assignments: list
-    :rtype: parkme.ratecard.models.ParseResult
+    :param worker_weights: Weight of each worker
+    :type worker_weights: dict of worker id to float
+    :param parse_results: The parse result of each assignment
+    :type parse_results: dict of assignment id to
+        parkme.ratecard.models.ParseResult or None
+    :rtype: list of parkme.ratecard.records.RateRecord or None
     """
-    parsed_assignments = []
-    for each in assignments:
-        if not each.rates:
-            continue
+    return consensus.get_weighted_consensus_records(
+        get_transcriptions(assignments, parse_results),
+        [worker_weights.get(each.worker_id, reputation.DEFAULT_WEIGHT)
+         for each in assignments],
+        reputation.get_required_weight(len(assignments) >= 3))
 
-        try:
-            result = ratecard_models.ParseResult.get_for_assignment(each)
-            # Has results and exactly one result per line
-            if result and len(result.rates) == len(each.rates.split('\r\n')):
-                parsed_assignments.append(result)
-        except ratecard_models.ParseFailedException:
-            continue
 
-    if len(parsed_assignments) < 2:
-        return None
+@profiling.timed()
+def evaluate_hit_assignments(assignments, worker_weights=None):
+    """Evaluate the assignments for a single HIT. The rates of each
+    assignment are parsed once. With worker weights consensus needs enough
+    trusted workers agreeing, otherwise any two agreeing workers.
 
-    for (lhs, rhs) in itertools.combinations(parsed_assignments, 2):
-        if set(lhs.parsed_rates) == set(rhs.parsed_rates):
-            return lhs.parsed_rates
+    :param assignments: The assignments for the HIT
+    :type assignments: list of RateTranscriptionAssignment
+    :param worker_weights: (Optional) Weight consensus by these worker weights
+    :type worker_weights: dict of worker id to float or None
+    :return: The outcome, the consensus rates and the results to record for
+        each worker
+    :rtype: tuple of (str, list or None, list of parkme.models.WorkerResult)
+    """
+    parse_results = parse_assignments(assignments)
+    consensus_records = (
+        get_weighted_consensus_rates(
+            assignments, worker_weights, parse_results)
+        if worker_weights is not None
+        else None)
+    if not consensus_records and len(assignments) != 3:
+        return NOT_ENOUGH, None, []
 
-    return None
+    if len(assignments) == 3 and has_consensus_not_rate_card(assignments):
+        return NOT_RATES, None, reputation.get_worker_results(
+            assignments,
+            [each.does_not_contain_rates for each in assignments])
+
+    if worker_weights is None:
+        consensus_records = get_consensus_rates(assignments, parse_results)
+    if consensus_records:
+        winning_rates = frozenset(consensus_records)
+        return CONSENSUS, [each.text for each in consensus_records], (
+            reputation.get_worker_results(
+                assignments,
+                [consensus.is_similar(
+                    get_parsed_rates(
+                        each, parse_results[each.assignment_id]),
+                    winning_rates)
+                 for each in assignments]))
 
+    return NO_CONSENSUS, None, []
 
-def save_consensus_rates(lot_id, rates):
-    """Save the consensus rates for the given lot.
 
+def get_rate_writer():
+    """Return a rate writer auditing its changes. SQLite connections can't
+    be shared between threads so each writer opens its own.
+
+    :rtype: parkme.ratecard.writer.BulkRateWriter
+    """
+    audit_gateway = models.RateAuditDataGateway('db.sqlite3')
+    audit_gateway.create_table()
+    return writer.BulkRateWriter(audit_gateway)
+
+
+@profiling.timed()
+def store_transcriptions(assignments, outcomes):
+    """Store the given assignments and the outcome of their HITs so they
+    can be reprocessed after the grammar improves.
+
+    :param assignments: Rate transcription assignments
+    :type assignments: list of RateTranscriptionAssignment
+    :param outcomes: The outcome of each HIT of the assignments
+    :type outcomes: dict of HIT id to str
+    """
+    transcription_gateway = models.TranscriptionDataGateway('db.sqlite3')
+    transcription_gateway.create_table()
+    reprocess.store_transcriptions(
+        transcription_gateway, assignments, outcomes)
+
+
+@profiling.timed()
+def save_consensus_rates(rate_writer, lot_id, rates, hit_id=None):
+    """Save the consensus rates for the given lot unless it already has them.
+
+    :param rate_writer: A rate writer, see get_rate_writer
+    :type rate_writer: parkme.ratecard.writer.BulkRateWriter
     :param lot_id: A lot id
     :type lot_id: str or unicode
     :param rates: A list of rates
     :type rates: list
+    :param hit_id: (Optional) The HIT the rates came from
+    :type hit_id: str or unicode or None
+    :return: The change made, if any
+    :rtype: list of parkme.models.RateChange
     """
-    rates_formatted = '\r\n'.join(rates)
-    with db.cursor() as (cur, _):
-        cur.execute(
-            'UPDATE lot SET str_rates=%s WHERE pk_lot=%s;',
-            (rates_formatted, lot_id))
+    rate_writer.add(lot_id, rates, hit_id=hit_id)
+    return rate_writer.flush()
 
 
-if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print "Usage: process_api_results.py [BATCH_ID]"
-        print "Attempt to validate results from the given Mechanical Turk"
-        print "batch."
-        exit(1)
+@profiling.timed()
+def diagnose_parse_failures(assignments):
+    """Diagnose every rate line of the given assignments that fails to
+    parse.
+
+    :param assignments: The assignments
+    :type assignments: list of RateTranscriptionAssignment
+    :rtype: parkme.ratecard.diagnostics.FailureTable
+    """
+    failure_table = diagnostics.FailureTable()
+    for each in assignments:
+        if not each.rates:
+            continue
+        lines = filter(None, [
+            line.strip() for line in each.rates.split('\r\n')])
+        for failure in failure_table.add_lines(lines, each.assignment_id):
+            eventlog.debug(
+                'rate_line_rejected',
+                assignment_id=each.assignment_id,
+                line=failure.line,
+                column=failure.column,
+                expected=failure.expected,
+                closest_rate_type=failure.closest_rate_type)
+    return failure_table
+
 
-    batch_id = int(sys.argv[1])
+@profiling.timed()
+def process_results(batch_id, weighted=False, report_path=None,
+                    diagnose=False):
+    """Validate rate transcription results from the batch with the given id,
+    saving the rates of HITs with consensus. Worker statistics are updated
+    with the results of the batch.
 
+    :param batch_id: A batch id
+    :type batch_id: int
+    :param weighted: Weight consensus by worker reputation
+    :type weighted: bool
+    :param report_path: (Optional) Path to write a CSV report to, with a row
+        for each HIT, and its summary next to it
+    :type report_path: str or unicode or None
+    :param diagnose: Print a table of why rate lines failed to parse
+    :type diagnose: bool
+    """
     mturk_connection = connection.MTurkConnection(
         aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
     assignment_gateway = assignments.AssignmentGateway.get(mturk_connection)
-    all_assignments = assignment_gateway.get_by_batch_id(
-        batch_id, assignments.RateTranscriptionAssignment)
+    with profiling.span('fetch'):
+        all_assignments = list(assignment_gateway.get_by_batch_id(
+            batch_id, assignments.RateTranscriptionAssignment))
+    worker_stats_gateway = models.WorkerStatsDataGateway('db.sqlite3')
+    worker_stats_gateway.create_table()
+    with profiling.span('worker_weights'):
+        worker_weights = (
+            reputation.get_worker_weights(
+                worker_stats_gateway, all_assignments)
+            if weighted
+            else None)
+    worker_results = []
 
     hit_id_to_assignments = collections.defaultdict(list)
     for each in all_assignments:
@@ -127,38 +310,122 @@ if __name__ == '__main__':
     hit_ids_with_consensus = set([])
     hit_ids_without_consensus = set([])
     hit_ids_to_lot_id = {}
+    hit_ids_to_rates = {}
+    hit_ids_to_outcome = {}
+
+    outcome_to_hit_ids = {
+        NOT_RATES: hit_ids_without_rate_card,
+        CONSENSUS: hit_ids_with_consensus,
+        NO_CONSENSUS: hit_ids_without_consensus
+    }
+
+    with report.open_report(
+            report_path, batch_id, REPORT_COLUMNS) as batch_report:
+        for hit_id, hit_assignments in hit_id_to_assignments.iteritems():
+            outcome, rates, hit_worker_results = evaluate_hit_assignments(
+                hit_assignments, worker_weights)
+            if batch_report:
+                batch_report.add_row(
+                    hit_id=hit_id,
+                    lot_id=hit_assignments[0].lot_id,
+                    decision=outcome,
+                    num_assignments=len(hit_assignments),
+                    num_rates=len(rates or []))
+            if outcome in outcome_to_hit_ids:
+                outcome_to_hit_ids[outcome].add(hit_id)
+            hit_ids_to_outcome[hit_id] = outcome
+            if outcome == CONSENSUS:
+                hit_ids_to_lot_id[hit_id] = hit_assignments[0].lot_id
+                hit_ids_to_rates[hit_id] = rates
+            worker_results.extend(hit_worker_results)
+
+        store_transcriptions(all_assignments, hit_ids_to_outcome)
+
+        with profiling.span('record_worker_results'):
+            worker_stats_gateway.record_results(worker_results)
+
+        num_hits = (
+            len(hit_ids_without_rate_card) +
+            len(hit_ids_with_consensus) +
+            len(hit_ids_without_consensus))
+        num_hits_with_rates = (
+            len(hit_ids_with_consensus) + len(hit_ids_without_consensus))
+        print
+        print 'FINAL RESULTS'
+        print '{} HITs Total'.format(num_hits)
+        print '{} Consensus, {} Not Rates, {} No Consensus'.format(
+            len(hit_ids_with_consensus),
+            len(hit_ids_without_rate_card),
+            len(hit_ids_without_consensus))
+        print 'Effectiveness: {:0.02f}%'.format(
+            len(hit_ids_with_consensus) / float(num_hits_with_rates) * 100.0)
+
+        rate_writer = get_rate_writer()
+        for hit_id in hit_ids_with_consensus:
+            rate_writer.add(
+                hit_ids_to_lot_id[hit_id],
+                hit_ids_to_rates[hit_id],
+                hit_id=hit_id)
+        num_lots = len(rate_writer)
+        with profiling.span('save_consensus_rates'):
+            rate_changes = rate_writer.flush()
+        for each in rate_changes:
+            eventlog.debug(
+                'consensus_rates_saved',
+                hit_id=each.hit_id,
+                lot_id=each.lot_id,
+                rates=each.new_rates)
+        print '{} Lots updated, {} unchanged'.format(
+            len(rate_changes), num_lots - len(rate_changes))
+
+        if diagnose:
+            failure_table = diagnose_parse_failures(all_assignments)
+            print
+            print 'PARSE FAILURES'
+            for line in failure_table.format_table():
+                print line
+
+        if batch_report:
+            batch_report.close(
+                num_hits=num_hits,
+                num_hits_with_rates=num_hits_with_rates)
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options] BATCH_ID',
+        description=(
+            'Attempt to validate results from the given Mechanical Turk '
+            'batch.'))
+    parser.add_option(
+        '-w', '--weighted', action='store_true', dest='weighted',
+        default=False, help='Weight consensus by worker reputation')
+    parser.add_option(
+        '--profile', dest='profile_file', default=None,
+        help='Profile the run, printing the slowest functions and a timing '
+        'table of each stage, and dump cProfile statistics to this file')
+    parser.add_option(
+        '-r', '--report', dest='report_file', default=None,
+        help='Write a CSV row for each HIT decided to this file, and '
+        'aggregate statistics to this file with {} appended'.format(
+            report.SUMMARY_SUFFIX))
+    parser.add_option(
+        '--diagnose', action='store_true', dest='diagnose', default=False,
+        help='Print how often rate lines failed to parse and why, by the '
+        'number of assignments rejected')
+    eventlog.add_options(parser)
+    options, args = parser.parse_args()
+
+    if len(args) < 1:
+        parser.print_help()
+        exit(1)
 
-    for hit_id, assignments in hit_id_to_assignments.iteritems():
-        if len(assignments) == 3:
-            if has_consensus_not_rate_card(assignments):
-                hit_ids_without_rate_card.add(hit_id)
-            elif has_consensus_on_rates(assignments):
-                hit_ids_with_consensus.add(hit_id)
-                hit_ids_to_lot_id[hit_id] = assignments[0].lot_id
-            else:
-                hit_ids_without_consensus.add(hit_id)
-
-    num_hits = (
-        len(hit_ids_without_rate_card) +
-        len(hit_ids_with_consensus) +
-        len(hit_ids_without_consensus))
-    num_hits_with_rates = (
-        len(hit_ids_with_consensus) + len(hit_ids_without_consensus))
-    print
-    print 'FINAL RESULTS'
-    print '{} HITs Total'.format(num_hits)
-    print '{} Consensus, {} Not Rates, {} No Consensus'.format(
-        len(hit_ids_with_consensus),
-        len(hit_ids_without_rate_card),
-        len(hit_ids_without_consensus))
-    print 'Effectiveness: {:0.02f}%'.format(
-        len(hit_ids_with_consensus) / float(num_hits_with_rates) * 100.0)
-
-    print
-    print 'CONSENSUS HIT IDS'
-    for hit_id in hit_ids_with_consensus:
-        lot_id = hit_ids_to_lot_id[hit_id]
-        rates = get_consensus_rates(hit_id_to_assignments[hit_id])
-        print hit_id, '-', lot_id
-        print rates
-        save_consensus_rates(hit_ids_to_lot_id[hit_id], rates)
+    eventlog.configure_from_options(options)
+    with profiling.profile_run(
+            options.profile_file, enabled=bool(options.profile_file)):
+        process_results(
+            int(args[0]),
+            weighted=options.weighted,
+            report_path=options.report_file,
+            diagnose=options.diagnose)
+    eventlog.print_summary()
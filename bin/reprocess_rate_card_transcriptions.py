@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+    reprocess_rate_card_transcriptions
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Reconsider stored rate transcriptions after the grammar improves. Lines
+    that failed to parse with an older grammar version are parsed again, the
+    consensus of each HIT with a line that now parses is recomputed, and the
+    lots whose HITs newly reach consensus are reported. No Mechanical Turk
+    calls are made.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import optparse
+import sys
+
+sys.path.append('')
+
+from parkme import models
+from parkme.ratecard import grammar
+from parkme.ratecard import reprocess
+
+import process_rate_card_results_from_api as rate_card
+
+
+def get_newly_resolvable(hit_id_to_transcriptions, previous_outcomes):
+    """Evaluate the given HITs again, returning the outcome of each and
+    those that newly reach consensus.
+
+    :param hit_id_to_transcriptions: The stored transcriptions of each HIT
+    :type hit_id_to_transcriptions: dict of HIT id to list of
+        parkme.models.Transcription
+    :param previous_outcomes: The outcome last saved for each HIT
+    :type previous_outcomes: dict of HIT id to str
+    :return: The outcome of each HIT, and the HIT id, lot id and consensus
+        rates of each HIT that newly reached consensus
+    :rtype: tuple of (dict of HIT id to str, list of tuple)
+    """
+    outcomes = {}
+    newly_resolvable = []
+    for hit_id, transcriptions in sorted(
+            hit_id_to_transcriptions.iteritems()):
+        outcome, rates, _ = rate_card.evaluate_hit_assignments(
+            [reprocess.StoredAssignment(each) for each in transcriptions])
+        outcomes[hit_id] = outcome
+        if (outcome == rate_card.CONSENSUS and
+                previous_outcomes.get(hit_id) != rate_card.CONSENSUS):
+            newly_resolvable.append((hit_id, transcriptions[0].lot_id, rates))
+    return outcomes, newly_resolvable
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options]',
+        description=(
+            'Parse stored rate lines that failed with an older grammar '
+            'version again and report the lots whose HITs now reach '
+            'consensus.'))
+    parser.add_option(
+        '-s', '--save', action='store_true', dest='save', default=False,
+        help='Save the consensus rates of the newly resolvable lots')
+    options, args = parser.parse_args()
+
+    transcription_gateway = models.TranscriptionDataGateway('db.sqlite3')
+    transcription_gateway.create_table()
+
+    fixed_lines = reprocess.reparse_failed_lines(transcription_gateway)
+    hit_id_to_transcriptions = reprocess.get_affected_transcriptions(
+        transcription_gateway, fixed_lines)
+    outcomes, newly_resolvable = get_newly_resolvable(
+        hit_id_to_transcriptions,
+        transcription_gateway.get_outcomes(hit_id_to_transcriptions.keys()))
+    transcription_gateway.save_outcomes(grammar.GRAMMAR_VERSION, outcomes)
+
+    print 'Grammar version {}: {} lines now parse in {} HITs'.format(
+        grammar.GRAMMAR_VERSION, len(fixed_lines), len(outcomes))
+    print '{} HITs newly reach consensus'.format(len(newly_resolvable))
+    for hit_id, lot_id, rates in newly_resolvable:
+        print
+        print hit_id, lot_id
+        for each in rates:
+            print each
+
+    if options.save and newly_resolvable:
+        rate_writer = rate_card.get_rate_writer()
+        for hit_id, lot_id, rates in newly_resolvable:
+            rate_writer.add(lot_id, rates, hit_id=hit_id)
+        num_lots = len(rate_writer)
+        rate_changes = rate_writer.flush()
+        print
+        print '{} Lots updated, {} unchanged'.format(
+            len(rate_changes), num_lots - len(rate_changes))
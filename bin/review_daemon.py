@@ -0,0 +1,300 @@
+import sys
+sys.path.append('')
+
+import collections
+import functools
+import optparse
+import signal
+import threading
+
+from boto.mturk import connection
+
+from parkme import models
+from parkme import settings
+from parkme.assignments.categorization import models as categorization_models
+from parkme.assignments.photochange import evaluator
+from parkme.assignments.photochange import models as photochange_models
+from parkme.turk import adaptive
+from parkme.turk import assignments as turk_assignments
+from parkme.turk import daemon
+from parkme.turk import metrics
+from parkme.turk import reputation
+from parkme.utils import eventlog
+import process_lot_image_categorization_results_from_api as categorization
+import process_rate_card_results_from_api as rate_card
+
+
+def get_connection():
+    """Return a new Mechanical Turk connection.
+
+    :rtype: boto.mturk.connection.MTurkConnection
+    """
+    return connection.MTurkConnection(
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
+
+
+# State kept by each worker thread across the HITs it processes
+_thread_local = threading.local()
+
+
+def get_rate_writer():
+    """Return the rate writer of the current worker thread, creating it on
+    first use. SQLite connections can't be shared between threads so each
+    worker thread has its own, reused for every HIT it processes.
+
+    :rtype: parkme.ratecard.writer.BulkRateWriter
+    """
+    rate_writer = getattr(_thread_local, 'rate_writer', None)
+    if rate_writer is None:
+        rate_writer = rate_card.get_rate_writer()
+        _thread_local.rate_writer = rate_writer
+    return rate_writer
+
+
+def get_worker_stats_gateway():
+    """Return a worker stats gateway. SQLite connections can't be shared
+    between threads so each HIT opens its own.
+
+    :rtype: parkme.models.WorkerStatsDataGateway
+    """
+    worker_stats_gateway = models.WorkerStatsDataGateway('db.sqlite3')
+    worker_stats_gateway.create_table()
+    return worker_stats_gateway
+
+
+def get_worker_weights(worker_stats_gateway, assignments, weighted,
+                       accuracy_gateway=None):
+    """Return the worker weights for the given assignments if weighting.
+
+    :rtype: dict of worker id to float or None
+    """
+    if not weighted:
+        return None
+    return reputation.get_worker_weights(
+        worker_stats_gateway, assignments, accuracy_gateway)
+
+
+# Outcomes of HITs that need more assignments before they are finished
+UNFINISHED_OUTCOMES = (
+    categorization.NOT_ENOUGH, adaptive.WAITING, adaptive.EXTENDED)
+
+
+def handle_categorization_hit(mturk_connection, hit, raw_assignments,
+                              weighted=False, adaptive_hits=False):
+    """Process a reviewable image categorization HIT.
+
+    :param mturk_connection: A Mechanical Turk connection
+    :type mturk_connection: boto.mturk.connection.MTurkConnection
+    :param hit: A HIT
+    :type hit: boto.mturk.HIT
+    :param raw_assignments: The HIT's assignments
+    :type raw_assignments: list
+    :param weighted: Weight consensus by worker reputation
+    :type weighted: bool
+    :param adaptive_hits: Extend HITs that have not reached consensus
+    :type adaptive_hits: bool
+    :return: Whether the HIT is finished
+    :rtype: bool
+    """
+    assignment_gateway = turk_assignments.AssignmentGateway(mturk_connection)
+    gold_gateway = models.GoldAssetDataGateway('db.sqlite3')
+    gold_gateway.create_table()
+    accuracy_gateway = models.WorkerAccuracyDataGateway('db.sqlite3')
+    accuracy_gateway.create_table()
+    # Assignments for bundled HITs are split into one per asset and answers
+    # on gold assets are scored rather than decided by consensus
+    items = categorization.process_gold_assignments(
+        [item
+         for each in raw_assignments
+         for item in turk_assignments.ImageCategorizationAssignment(
+             each).split_items()],
+        assignment_gateway,
+        gold_gateway,
+        accuracy_gateway)
+    assignments_for_assets = collections.OrderedDict()
+    for item in items:
+        assignments_for_assets.setdefault(item.asset_id, []).append(item)
+    if not assignments_for_assets:
+        return True
+    scheduler = (
+        adaptive.AdaptiveScheduler(
+            categorization_models.CategorizeLotPhotoTemplate(
+                mturk_connection))
+        if adaptive_hits
+        else None)
+    worker_stats_gateway = get_worker_stats_gateway()
+    duplicate_gateway = models.AssetDuplicateDataGateway('db.sqlite3')
+    duplicate_gateway.create_table()
+    asset_id_to_duplicates = duplicate_gateway.get_by_original_asset_ids(
+        assignments_for_assets.keys())
+    outcomes, worker_results = categorization.process_hit_assignments(
+        hit,
+        assignments_for_assets,
+        assignment_gateway,
+        worker_weights=get_worker_weights(
+            worker_stats_gateway, items, weighted, accuracy_gateway),
+        scheduler=scheduler,
+        asset_id_to_duplicates=asset_id_to_duplicates)
+    worker_stats_gateway.record_results(worker_results)
+    lot_ids = set(
+        assignments_for_assets[asset_id][0].lot_id
+        for asset_id, outcome in outcomes.iteritems()
+        if outcome in (categorization.ACCEPTED,
+                       categorization.UNCATEGORIZABLE))
+    for lot_id in lot_ids:
+        categorization.adjust_show_quality_images_for_lot(lot_id)
+    return not set(outcomes.itervalues()) & set(UNFINISHED_OUTCOMES)
+
+
+def handle_rate_card_hit(mturk_connection, hit, raw_assignments,
+                         weighted=False):
+    """Process a reviewable rate card transcription HIT.
+
+    :param mturk_connection: A Mechanical Turk connection
+    :type mturk_connection: boto.mturk.connection.MTurkConnection
+    :param hit: A HIT
+    :type hit: boto.mturk.HIT
+    :param raw_assignments: The HIT's assignments
+    :type raw_assignments: list
+    :param weighted: Weight consensus by worker reputation
+    :type weighted: bool
+    :return: Whether the HIT is finished
+    :rtype: bool
+    """
+    assignments = [
+        turk_assignments.RateTranscriptionAssignment(each)
+        for each in raw_assignments]
+    if not assignments:
+        return True
+    worker_stats_gateway = get_worker_stats_gateway()
+    outcome, rates, worker_results = rate_card.evaluate_hit_assignments(
+        assignments,
+        get_worker_weights(worker_stats_gateway, assignments, weighted))
+    eventlog.debug(
+        'rate_card_hit_evaluated', hit_id=hit.HITId, outcome=outcome)
+    if outcome == rate_card.NOT_ENOUGH:
+        return False
+    worker_stats_gateway.record_results(worker_results)
+    rate_card.store_transcriptions(assignments, {hit.HITId: outcome})
+    if outcome == rate_card.CONSENSUS:
+        rate_card.save_consensus_rates(
+            get_rate_writer(), assignments[0].lot_id, rates, hit_id=hit.HITId)
+    return True
+
+
+def handle_photo_change_hit(mturk_connection, hit, raw_assignments,
+                            weighted=False):
+    """Process a reviewable photo change HIT.
+
+    :param mturk_connection: A Mechanical Turk connection
+    :type mturk_connection: boto.mturk.connection.MTurkConnection
+    :param hit: A HIT
+    :type hit: boto.mturk.HIT
+    :param raw_assignments: The HIT's assignments
+    :type raw_assignments: list
+    :param weighted: Weight consensus by worker reputation
+    :type weighted: bool
+    :return: Whether the HIT is finished
+    :rtype: bool
+    """
+    evaluator.evaluate_photo_change_assignments(
+        mturk_connection,
+        [photochange_models.PhotoChangeAssignment(each)
+         for each in raw_assignments],
+        get_worker_stats_gateway() if weighted else None)
+    return True
+
+
+if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options]',
+        description=(
+            'Continuously process reviewable HITs of the given types as soon '
+            'as they complete.'))
+    parser.add_option(
+        '--categorization-hit-type', action='append',
+        dest='categorization_hit_types', default=[],
+        help='HIT type id of image categorization HITs')
+    parser.add_option(
+        '--rate-card-hit-type', action='append',
+        dest='rate_card_hit_types', default=[],
+        help='HIT type id of rate card transcription HITs')
+    parser.add_option(
+        '--photo-change-hit-type', action='append',
+        dest='photo_change_hit_types', default=[],
+        help='HIT type id of photo change HITs')
+    parser.add_option(
+        '-i', '--interval', type='float', dest='interval',
+        default=daemon.POLL_INTERVAL_SECONDS,
+        help='Seconds between polls while HITs are reviewable')
+    parser.add_option(
+        '--max-backoff', type='float', dest='max_backoff',
+        default=daemon.MAX_BACKOFF_SECONDS,
+        help='Longest wait in seconds between polls while idle')
+    parser.add_option(
+        '-n', '--workers', type='int', dest='workers',
+        default=daemon.NUM_WORKERS,
+        help='Number of HITs processed concurrently')
+    parser.add_option(
+        '-w', '--weighted', action='store_true', dest='weighted',
+        default=False, help='Weight consensus by worker reputation')
+    parser.add_option(
+        '-a', '--adaptive', action='store_true', dest='adaptive',
+        default=False,
+        help='Extend categorization HITs uploaded with --adaptive that have '
+        'not reached consensus')
+    parser.add_option(
+        '--max-attempts', type='int', dest='max_attempts',
+        default=daemon.MAX_ATTEMPTS,
+        help='Times a HIT is processed without finishing before it is '
+        'ignored until restart')
+    parser.add_option(
+        '-m', '--metrics', dest='metrics_file', default=None,
+        help='Write Mechanical Turk call metrics to this file on exit, in '
+        'the Prometheus text format if it ends with .prom and JSON otherwise')
+    eventlog.add_options(parser)
+    options, _ = parser.parse_args()
+    eventlog.configure_from_options(options)
+
+    handlers = {}
+    for hit_type_ids, handler in (
+            (options.categorization_hit_types,
+             functools.partial(
+                 handle_categorization_hit, adaptive_hits=options.adaptive)),
+            (options.rate_card_hit_types, handle_rate_card_hit),
+            (options.photo_change_hit_types, handle_photo_change_hit)):
+        for hit_type_id in hit_type_ids:
+            handlers[hit_type_id] = functools.partial(
+                handler, weighted=options.weighted)
+
+    if not handlers:
+        parser.print_help()
+        exit(1)
+
+    connection_factory = get_connection
+    call_metrics = None
+    if options.metrics_file:
+        call_metrics = metrics.CallMetrics()
+        connection_factory = lambda: metrics.InstrumentedMTurkConnection(
+            get_connection(), call_metrics)
+
+    review_daemon = daemon.ReviewDaemon(
+        connection_factory,
+        handlers,
+        poll_interval=options.interval,
+        max_backoff=options.max_backoff,
+        num_workers=options.workers,
+        max_attempts=options.max_attempts)
+    signal.signal(signal.SIGTERM, lambda *_: review_daemon.stop())
+    signal.signal(signal.SIGINT, lambda *_: review_daemon.stop())
+    review_daemon.run()
+    print '{} HITs processed, {} left reviewable, {} failed'.format(
+        review_daemon.num_processed,
+        review_daemon.num_deferred,
+        review_daemon.num_failed)
+    eventlog.print_summary()
+    if call_metrics is not None:
+        for line in metrics.format_summary(call_metrics):
+            print line
+        metrics.write_metrics(call_metrics, options.metrics_file)
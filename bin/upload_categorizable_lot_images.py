@@ -11,6 +11,7 @@ sys.path.append('')
 
 import datetime
 import optparse
+import time
 import uuid
 
 from boto.mturk import connection
@@ -19,28 +20,23 @@ import pytz
 
 from parkme import models
 from parkme import settings
+from parkme.assignments.categorization import dedup
+from parkme.assignments.categorization import gold as categorization_gold
+from parkme.assignments.categorization import models as categorization_models
+from parkme.images import cache
+from parkme.turk import adaptive
+from parkme.turk import client
+from parkme.turk import gold
 from parkme.turk import hits
+from parkme.turk import metrics
+from parkme.turk import planning
+from parkme.turk import qualifications
+from parkme.turk import workqueue
+from parkme.utils import eventlog
 
 
-class CategorizeLotPhotoTemplate(hits.HITTemplate):
-    """MTurk assignment to categorize lot photo templates"""
-
-    # (TEST) The ID for [TEST] Categorize Parking Lot Photo
-    # HIT_LAYOUT_ID = '33LDDHGJVTUH37V05I853CFD5GV3Q6'
-    # (PRODUCTION) The ID for Categorize Parking Lot Photo
-    HIT_LAYOUT_ID = '3MCDHXBQ4Z7SJ2ZT2XZACNE142JWKX'
-
-    def __init__(self, mturk_connection):
-        """Initialize categorization HIT template."""
-        super(CategorizeLotPhotoTemplate, self).__init__(
-            mturk_connection=mturk_connection,
-            hit_layout_id=self.HIT_LAYOUT_ID,
-            reward_per_assignment=0.02,
-            assignments_per_hit=3,
-            hit_expires_in=datetime.timedelta(days=7),
-            time_per_assignment=datetime.timedelta(minutes=3),
-            auto_approval_delay=datetime.timedelta(hours=8))
-
+# Name of the work queue of photos waiting for categorization HITs
+QUEUE_NAME = 'categorization'
 
 def get_uncategorized_assets(dbconn, exclude_before_dt=None):
     """Returns the uncategorized assets found in the database.
@@ -115,20 +111,103 @@ def get_last_categorized_dt(data_gateway):
         year=datetime.MINYEAR, month=1, day=1, tzinfo=pytz.utc)
 
 
-def print_summary(num_photos, hit_template):
-    """Print a summary containing information about num photos uploaded and
-    estimated pricing.
+def get_photo_age_days(dt_photo):
+    """Return the age of a photo taken at the given time in days.
+
+    :param dt_photo: The photo timestamp
+    :type dt_photo: datetime.datetime
+    :rtype: float
+    """
+    now = (
+        datetime.datetime.now(pytz.utc)
+        if dt_photo.tzinfo
+        else datetime.datetime.utcnow())
+    return (now - dt_photo).total_seconds() / 86400.0
+
+
+def iter_work_items(rows, lot_traffic):
+    """Generator yielding a prioritized work queue item for each of the
+    given rows. The rows' lots have no rates, so they are all fully stale.
+
+    :param rows: Database rows from get_uncategorized_assets
+    :type rows: iterable of tuple
+    :param lot_traffic: The traffic of each lot
+    :type lot_traffic: dict of lot id to float
+    :rtype: iterable of tuple of (str, float, dict)
+    """
+    for row in rows:
+        priority = workqueue.get_priority(
+            traffic=lot_traffic.get(row[4], 0),
+            photo_age_days=get_photo_age_days(get_row_timestamp(row)))
+        yield row[0], priority, row_to_hit_data(row)
+
+
+def get_work_queue_gateway():
+    """Return the gateway to the work queue of photos waiting for HITs.
+
+    :rtype: parkme.models.WorkQueueDataGateway
+    """
+    work_queue_gateway = models.WorkQueueDataGateway('db.sqlite3')
+    work_queue_gateway.create_table()
+    return work_queue_gateway
+
+
+def bundle_hit_template(hit_template, hit_layout_id, bundle_size):
+    """Adjust the given single photo HIT template to categorize several
+    photos in each HIT, paying and allowing as much per photo as before.
+
+    :param hit_template: A HIT template
+    :type hit_template:
+        parkme.assignments.categorization.models.CategorizeLotPhotoTemplate
+    :param hit_layout_id: The HIT layout id with indexed parameters
+    :type hit_layout_id: str or unicode
+    :param bundle_size: The number of photos in each HIT
+    :type bundle_size: int
+    """
+    hit_template.hit_layout_id = hit_layout_id
+    hit_template.reward_per_assignment *= bundle_size
+    hit_template.time_per_assignment *= bundle_size
+
+
+def get_worker_stats():
+    """Return the historical statistics of each worker.
+
+    :rtype: list of parkme.models.WorkerStats
+    """
+    worker_stats_gateway = models.WorkerStatsDataGateway('db.sqlite3')
+    worker_stats_gateway.create_table()
+    return worker_stats_gateway.get_all()
+
+
+def upload_hit_data(hit_template, hit_data, batch_id, bundle_size,
+                    dry_run=False):
+    """Create a HIT for each bundle of the given photos.
 
-    :param num_photos: The number of photos
-    :type num_photos: int
     :param hit_template: A HIT template
-    :type hit_template: parkme.turk.hits.HITTemplate
+    :type hit_template:
+        parkme.assignments.categorization.models.CategorizeLotPhotoTemplate
+    :param hit_data: The hit data of each photo, see row_to_hit_data
+    :type hit_data: list of dict
+    :param batch_id: The ID to be associated with the HITs
+    :type batch_id: str or unicode
+    :param bundle_size: The number of photos in each HIT
+    :type bundle_size: int
+    :param dry_run: Whether to only log the photos without creating HITs
+    :type dry_run: bool
+    :return: The number of photos uploaded
+    :rtype: int
     """
-    num_assignments = num_photos * hit_template.assignments_per_hit
-    print
-    print '{} Photos, {} Assignments'.format(num_photos, num_assignments)
-    print 'Estimated Payout: ${:0.02f}'.format(
-        num_assignments * hit_template.reward_per_assignment)
+    for start in xrange(0, len(hit_data), bundle_size):
+        items = hit_data[start:start + bundle_size]
+        for data in items:
+            eventlog.debug('photo_uploaded', **data)
+        if dry_run:
+            continue
+        if bundle_size > 1:
+            hit_template.create_bundled_hit(items, batch_id=batch_id)
+        else:
+            hit_template.create_hit(items[0], batch_id=batch_id)
+    return len(hit_data)
 
 
 def save_categorization_batch(
@@ -155,24 +234,132 @@ def save_categorization_batch(
     return categorization_batch
 
 
+def deduplicate_rows(dbconn, rows, fingerprinter):
+    """Remove rows whose photos are duplicates of other photos in the same lot.
+
+    :param dbconn: A database connection
+    :type dbconn: psycopg2.Connection
+    :param rows: Uncategorized asset rows
+    :type rows: list of tuple
+    :param fingerprinter: Fingerprints asset images
+    :type fingerprinter: parkme.assignments.categorization.dedup.Fingerprinter
+    :rtype: parkme.assignments.categorization.dedup.DedupResult
+    """
+    lot_ids = set(row[4] for row in rows)
+    categorized_rows = list(
+        dedup.get_categorized_assets_for_lots(dbconn, lot_ids))
+    fingerprinter.prefetch(
+        [(row[1], row[2]) for row in rows] +
+        [(row[1], row[2]) for row in categorized_rows])
+    result = dedup.deduplicate(rows, categorized_rows, fingerprinter)
+    print '{} Duplicates of uploaded photos, {} Reused categories'.format(
+        len(result.duplicate_to_original), len(result.reused))
+    return result
+
+
 if __name__ == '__main__':
     parser = optparse.OptionParser()
     parser.add_option(
         '-d', '--dry-run', action='store_true', dest='dry_run', default=False)
+    parser.add_option(
+        '-a', '--adaptive', action='store_true', dest='adaptive',
+        default=False,
+        help='Start each HIT with {} assignments, extending on disagreement'
+        .format(adaptive.INITIAL_ASSIGNMENTS))
+    parser.add_option(
+        '--dedup', action='store_true', dest='dedup', default=False,
+        help='Only upload photos that are not duplicates within their lot')
+    parser.add_option(
+        '--image-cache', dest='image_cache_dir', default=None,
+        help='Directory caching images, to detect duplicates by content')
+    parser.add_option(
+        '--image-source', dest='image_source', default=None,
+        help='Local directory or URL to fetch images from instead of S3')
+    parser.add_option(
+        '--bundle-size', type='int', dest='bundle_size', default=1,
+        help='Number of photos to categorize in each HIT')
+    parser.add_option(
+        '--bundle-layout-id', dest='bundle_layout_id', default=None,
+        help='HIT layout id with indexed parameters for bundled HITs')
+    parser.add_option(
+        '--qualification-type', dest='qualification_type_id', default=None,
+        help='Only allow workers with this qualification, see '
+        'grade_qualification_requests.py')
+    parser.add_option(
+        '--min-qualification-score', type='int',
+        dest='min_qualification_score',
+        default=int(qualifications.PASSING_SCORE * 100),
+        help='Lowest qualification test score (percent) allowed')
+    parser.add_option(
+        '-g', '--gold-fraction', type='float', dest='gold_fraction',
+        default=0.0,
+        help='Fraction of uploaded photos that are gold photos of known '
+        'categories, see import_gold_assets.py (eg. {})'.format(
+            gold.GOLD_FRACTION))
+    parser.add_option(
+        '-q', '--queue', action='store_true', dest='queue', default=False,
+        help='Queue photos by priority and upload the most valuable first')
+    parser.add_option(
+        '--traffic', dest='traffic_csv', default=None,
+        help='CSV file with pk_lot and traffic columns to prioritize by')
+    parser.add_option(
+        '--max-hits', type='int', dest='max_hits', default=None,
+        help='Most HITs to create from the queue, leaving the rest queued')
+    parser.add_option(
+        '--rate', type='float', dest='rate',
+        default=client.MAX_REQUESTS_PER_SECOND,
+        help='Most HITs created per second from the queue')
+    parser.add_option(
+        '--num-workers', type='int', dest='num_workers',
+        default=hits.DEFAULT_NUM_WORKERS,
+        help='Number of workers assumed to work at once when planning')
+    parser.add_option(
+        '--deadline-hours', type='float', dest='deadline_hours',
+        default=None,
+        help='Plan sub-batches that each complete within this many hours')
+    parser.add_option(
+        '-m', '--metrics', dest='metrics_file', default=None,
+        help='Write Mechanical Turk call metrics to this file, in the '
+        'Prometheus text format if it ends with .prom and JSON otherwise')
+    eventlog.add_options(parser)
     options, _ = parser.parse_args()
 
+    if options.queue and options.gold_fraction:
+        parser.error('--gold-fraction cannot be used with --queue')
+    if options.bundle_size > 1:
+        if not options.bundle_layout_id:
+            parser.error('--bundle-size requires --bundle-layout-id')
+        if options.adaptive:
+            parser.error('--adaptive cannot be used with --bundle-size')
+
+    eventlog.configure_from_options(options)
     if options.dry_run:
         print '[DRY RUN]'
 
+    start = time.time()
     mturk_connection = connection.MTurkConnection(
         aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
         aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
+    call_metrics = None
+    if options.metrics_file:
+        call_metrics = metrics.CallMetrics()
+        mturk_connection = metrics.InstrumentedMTurkConnection(
+            mturk_connection, call_metrics)
     dbconn = psycopg2.connect("dbname=pim user=pim")
 
     data_gateway = models.CategorizationBatchDataGateway('db.sqlite3')
     data_gateway.create_table()
 
-    hit_template = CategorizeLotPhotoTemplate(mturk_connection)
+    hit_template = categorization_models.CategorizeLotPhotoTemplate(
+        mturk_connection)
+    if options.adaptive:
+        hit_template.assignments_per_hit = adaptive.INITIAL_ASSIGNMENTS
+    if options.qualification_type_id:
+        hit_template.qualifications = qualifications.get_qualifications(
+            options.qualification_type_id, options.min_qualification_score)
+    if options.bundle_size > 1:
+        bundle_hit_template(
+            hit_template, options.bundle_layout_id, options.bundle_size)
 
     batch_id = str(uuid.uuid4())
     num_photos = 0
@@ -180,19 +367,104 @@ if __name__ == '__main__':
 
     print 'BatchID:', batch_id
 
-    for row in get_uncategorized_assets(dbconn, last_categorized_dt):
+    rows = list(get_uncategorized_assets(dbconn, last_categorized_dt))
+    for row in rows:
         if get_row_timestamp(row) >= last_categorized_dt:
             last_categorized_dt = get_row_timestamp(row)
-        data = row_to_hit_data(row)
-        print data
-        if not options.dry_run:
-            hit_template.create_hit(data, batch_id=batch_id)
-        num_photos += 1
 
-    print_summary(num_photos, hit_template)
+    if options.dedup:
+        image_cache = (
+            cache.ImageCache(
+                options.image_cache_dir,
+                cache.get_fetcher(options.image_source))
+            if options.image_cache_dir
+            else None)
+        dedup_result = deduplicate_rows(
+            dbconn, rows, dedup.Fingerprinter(image_cache))
+        rows = dedup_result.novel_rows
+        if not options.dry_run:
+            dedup.copy_categories(dbconn, dedup_result.reused)
+            duplicate_gateway = models.AssetDuplicateDataGateway('db.sqlite3')
+            duplicate_gateway.create_table()
+            duplicate_gateway.save_all(
+                batch_id, dedup_result.duplicate_to_original)
+
+    if options.queue:
+        work_queue = workqueue.WorkQueue(
+            get_work_queue_gateway(), QUEUE_NAME)
+        lot_traffic = (
+            workqueue.get_lot_traffic_from_csv_file(options.traffic_csv)
+            if options.traffic_csv
+            else {})
+        if options.dry_run:
+            print '{} Photos to queue, {} waiting'.format(
+                len(rows), len(work_queue))
+            num_waiting = len(rows) + len(work_queue)
+        else:
+            num_queued = work_queue.push_all(
+                iter_work_items(rows, lot_traffic))
+            print '{} Photos queued, {} waiting'.format(
+                num_queued, len(work_queue))
+            num_waiting = len(work_queue)
+        num_hits = planning.get_num_hits(num_waiting, options.bundle_size)
+        if options.max_hits is not None:
+            num_hits = min(num_hits, options.max_hits)
+    else:
+        hit_data = [row_to_hit_data(row) for row in rows]
+        if options.gold_fraction:
+            gold_gateway = models.GoldAssetDataGateway('db.sqlite3')
+            gold_gateway.create_table()
+            hit_data = gold.mix_in_gold(
+                hit_data,
+                [each.params for each in gold_gateway.get_all(
+                    categorization_gold.GOLD_TASK)],
+                options.gold_fraction)
+            print '{} Gold photos mixed in'.format(len(hit_data) - len(rows))
+        num_hits = planning.get_num_hits(len(hit_data), options.bundle_size)
+
+    sub_batches = planning.print_plan(
+        hit_template,
+        num_hits,
+        get_worker_stats(),
+        options.num_workers,
+        deadline=(
+            datetime.timedelta(hours=options.deadline_hours)
+            if options.deadline_hours
+            else None))
+
+    if options.queue and not options.dry_run:
+        rate_limiter = client.RateLimiter(max_per_second=options.rate)
+        for sub_batch in planning.iter_sub_batches(sub_batches):
+            _, num_drained = work_queue.drain(
+                hit_template,
+                batch_id,
+                max_hits=sub_batch.num_hits,
+                rate_limiter=rate_limiter,
+                bundle_size=options.bundle_size)
+            num_photos += num_drained
+        print '{} Photos left waiting'.format(len(work_queue))
+    elif not options.queue:
+        for sub_batch in (
+                sub_batches
+                if options.dry_run
+                else planning.iter_sub_batches(sub_batches)):
+            num_items = sub_batch.num_hits * options.bundle_size
+            num_photos += upload_hit_data(
+                hit_template,
+                hit_data[:num_items],
+                batch_id,
+                options.bundle_size,
+                dry_run=options.dry_run)
+            hit_data = hit_data[num_items:]
+
+    print '{} Photos'.format(num_photos)
 
     if not options.dry_run:
         save_categorization_batch(
             data_gateway, batch_id, last_categorized_dt, num_photos)
 
     dbconn.close()
+    eventlog.print_summary()
+    if call_metrics is not None:
+        metrics.report_call_metrics(
+            call_metrics, time.time() - start, options.metrics_file)
@@ -8,6 +8,9 @@
 """
 import collections
 import csv
+import datetime
+import functools
+import optparse
 import sys
 import uuid
 
@@ -18,7 +21,14 @@ import psycopg2
 
 from parkme.assignments.photochange import uploader
 from parkme.assignments.photochange import models
+from parkme.images import cache
+from parkme.images import hashing
+from parkme.images import models as images_models
+from parkme import models as parkme_models
 from parkme import settings
+from parkme.turk import hits
+from parkme.turk import planning
+from parkme.utils import eventlog
 
 
 #INFO(etscrivner): Lot IDs provided by the data team for testing
@@ -29,15 +39,6 @@ LOT_IDS_FIXTURE = [
     17171, 112761, 16416, 17637, 13752
 ]
 
-def get_total_cost_estimate(num_assignments):
-    amazons_fee = 1.10
-    return (
-        num_assignments *
-        models.PhotoChangeTemplate.ASSIGNMENTS_PER_HIT *
-        models.PhotoChangeTemplate.PRICE_PER_ASSIGNMENT_DOLLARS *
-        amazons_fee)
-
-
 def get_lot_id(psql_connection, lot_id):
     """Return the string id of the lot with the given integer id.
 
@@ -69,40 +70,121 @@ def get_lot_ids_from_csv_file(csv_file_path):
     return lot_ids
 
 
+def print_progress(progress):
+    """Print the progress of an upload.
+
+    :param progress: The upload progress
+    :type progress: parkme.assignments.photochange.uploader.UploadProgress
+    """
+    print progress
+
+
+def get_image_hasher(image_cache_dir, image_source):
+    """Return an image hasher backed by the local hash index, reading images
+    through the local image cache.
+
+    :param image_cache_dir: The image cache directory
+    :type image_cache_dir: str or unicode
+    :param image_source: (Optional) A local directory or stand-in URL
+    :type image_source: str or unicode or None
+    :rtype: parkme.images.hashing.ImageHasher
+    """
+    data_gateway = images_models.ImageHashDataGateway('db.sqlite3')
+    data_gateway.create_table()
+    image_cache = cache.ImageCache(
+        image_cache_dir, cache.get_fetcher(image_source))
+    return hashing.ImageHasher(data_gateway, image_cache.get_or_fetch)
+
+
 if __name__ == '__main__':
+    parser = optparse.OptionParser(
+        usage='%prog [options] [LOT_IDS_CSV]',
+        description='Upload photo change assignments.')
+    parser.add_option(
+        '-p', '--prefilter', action='store_true', dest='prefilter',
+        default=False,
+        help='Resolve near-duplicate photos locally instead of creating HITs')
+    parser.add_option(
+        '--image-cache', dest='image_cache_dir', default='image_cache',
+        help='Directory caching images for the prefilter')
+    parser.add_option(
+        '--image-source', dest='image_source', default=None,
+        help='Local directory or URL to fetch images from instead of S3')
+    parser.add_option(
+        '--num-workers', type='int', dest='num_workers',
+        default=hits.DEFAULT_NUM_WORKERS,
+        help='Number of workers assumed to work at once when planning')
+    parser.add_option(
+        '--deadline-hours', type='float', dest='deadline_hours',
+        default=None,
+        help='Plan sub-batches that each complete within this many hours')
+    eventlog.add_options(parser)
+    options, args = parser.parse_args()
+    eventlog.configure_from_options(options)
+
     pgsql_connection = psycopg2.connect("dbname=pim user=pim")
     batch_id = str(uuid.uuid4())
     lot_ids = []
 
     try:
-        if len(sys.argv) == 2:
-            lot_ids = get_lot_ids_from_csv_file(sys.argv[1])
+        if len(args) == 1:
+            lot_ids = get_lot_ids_from_csv_file(args[0])
         else:
             lot_ids = [
                 get_lot_id(pgsql_connection, each) for each in LOT_IDS_FIXTURE]
 
         print 'HIT ID: {}'.format(batch_id)
-        mturk_connection = connection.MTurkConnection(
+        connection_factory = lambda: connection.MTurkConnection(
             aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
             aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
-        num_assignments = 0
-        for lot_id in lot_ids:
-            print lot_id
-            comparable_assets = list(uploader.get_comparable_assets_for_lot(
-                pgsql_connection, lot_id))
-
-            if not uploader.has_enough_assets_to_compare(comparable_assets):
-                print 'Not enough assets.'
-                print
-                continue
-            newest_asset = uploader.get_newest_asset(comparable_assets)
-            older_assets = uploader.get_remaining_assets(comparable_assets)
-            uploader.upload_assignments_to_turk(
-                mturk_connection, batch_id, newest_asset, older_assets)
-            num_assignments += len(older_assets)
-            print
-
-        print "Uploaded {} Assignments.".format(num_assignments)
-        print "Estimated Cost ${:0.02f}".format(get_total_cost_estimate(num_assignments))
+        asset_groups = list(uploader.get_comparable_assets_for_lots(
+            pgsql_connection, lot_ids))
+        worker_stats_gateway = parkme_models.WorkerStatsDataGateway(
+            'db.sqlite3')
+        worker_stats_gateway.create_table()
+        duplicate_gateway = parkme_models.AssetDuplicateDataGateway(
+            'db.sqlite3')
+        duplicate_gateway.create_table()
+        sub_batches = planning.print_plan(
+            models.PhotoChangeTemplate(connection_factory()),
+            uploader.get_num_pairs(asset_groups),
+            worker_stats_gateway.get_all(),
+            options.num_workers,
+            deadline=(
+                datetime.timedelta(hours=options.deadline_hours)
+                if options.deadline_hours
+                else None))
+
+        for index, sub_batch in enumerate(
+                planning.iter_sub_batches(sub_batches)):
+            if index == len(sub_batches) - 1:
+                sub_batch_groups, asset_groups = asset_groups, []
+            else:
+                sub_batch_groups, asset_groups = uploader.split_asset_groups(
+                    asset_groups, sub_batch.num_hits)
+            progress = uploader.upload_asset_groups_to_turk(
+                connection_factory,
+                batch_id,
+                sub_batch_groups,
+                report_progress=print_progress,
+                image_hasher_factory=(
+                    functools.partial(
+                        get_image_hasher,
+                        options.image_cache_dir,
+                        options.image_source)
+                    if options.prefilter
+                    else None))
+            print progress
+            for new_asset, old_asset in progress.auto_resolved_pairs:
+                eventlog.debug(
+                    'near_duplicate',
+                    new_asset_id=new_asset.asset_id,
+                    old_asset_id=old_asset.asset_id)
+            # The older asset of each pair is left out of the batch, so is
+            # recorded as a duplicate of the newer
+            duplicate_gateway.save_all(batch_id, {
+                old_asset.asset_id: new_asset.asset_id
+                for new_asset, old_asset in progress.auto_resolved_pairs})
+        eventlog.print_summary()
     finally:
         pgsql_connection.close()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.assignments.categorization.dedup
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Detect re-uploads of the same photo within a lot so that only novel images
+    are sent out for categorization.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import uuid
+
+import psycopg2
+
+
+# Result of deduplicating uncategorized asset rows. novel_rows need HITs,
+# duplicate_to_original maps each asset to the novel asset whose HIT will
+# categorize it, and reused holds (asset id, lot asset type ids) for assets
+# matching an already categorized asset.
+DedupResult = collections.namedtuple(
+    'DedupResult',
+    ['novel_rows',
+     'duplicate_to_original',
+     'reused'])
+
+
+class Fingerprinter(object):
+    """Fingerprints asset images by content digest from a local image cache,
+    falling back to their bucket and path when the image isn't cached."""
+
+    def __init__(self, image_cache=None):
+        """Initialize the fingerprinter.
+
+        :param image_cache: (Optional) A local image cache
+        :type image_cache: parkme.images.cache.ImageCache or None
+        """
+        self.image_cache = image_cache
+
+    def prefetch(self, keys):
+        """Cache the images with the given keys so that they can be
+        fingerprinted by content.
+
+        :param keys: An iterable of (str_bucket, str_path) pairs
+        :type keys: iterable of tuple
+        """
+        if self.image_cache:
+            self.image_cache.prefetch(keys)
+
+    def get_fingerprint(self, str_bucket, str_path):
+        """Return the fingerprint of the image with the given location.
+
+        :param str_bucket: The bucket containing the asset
+        :type str_bucket: str or unicode
+        :param str_path: The path of the asset
+        :type str_path: str or unicode
+        :rtype: str or unicode
+        """
+        digest = (
+            self.image_cache.get_digest(str_bucket, str_path)
+            if self.image_cache
+            else None)
+        if digest:
+            return u'sha1:{}'.format(digest)
+        return u'path:{}/{}'.format(str_bucket, str_path)
+
+
+def get_categorized_assets_for_lots(dbconn, lot_ids):
+    """Return the categorized assets in the given lots along with their
+    categories.
+
+    :param dbconn: A database connection
+    :type dbconn: psycopg2.Connection
+    :param lot_ids: A list of lot ids
+    :type lot_ids: list of str or unicode
+    :return: Rows of (pk_asset, str_bucket, str_path, pk_lot, list of
+        pk_lot_asset_type)
+    :rtype: psycopg2.Cursor
+    """
+    cur = dbconn.cursor()
+    cur.execute('''
+    SELECT pk_asset, str_bucket, str_path, pk_lot, array_agg(pk_lot_asset_type)
+    FROM asset JOIN asset_lot_asset_type_xref USING (pk_asset)
+    WHERE pk_lot = ANY(%s)
+    GROUP BY pk_asset, str_bucket, str_path, pk_lot
+    ''', (list(lot_ids),))
+    return cur
+
+
+def deduplicate(rows, categorized_rows, fingerprinter):
+    """Split uncategorized asset rows into those needing a HIT, duplicates of
+    another uncategorized asset in the same lot, and duplicates of an already
+    categorized asset in the same lot.
+
+    :param rows: Uncategorized asset rows of (pk_asset, str_bucket, str_path,
+        dt_photo, pk_lot)
+    :type rows: iterable of tuple
+    :param categorized_rows: Rows from get_categorized_assets_for_lots
+    :type categorized_rows: iterable of tuple
+    :param fingerprinter: Fingerprints asset images
+    :type fingerprinter: Fingerprinter
+    :rtype: DedupResult
+    """
+    existing_categories = {}
+    for _, str_bucket, str_path, lot_id, type_ids in categorized_rows:
+        key = (lot_id, fingerprinter.get_fingerprint(str_bucket, str_path))
+        existing_categories.setdefault(key, type_ids)
+
+    novel_rows = []
+    duplicate_to_original = {}
+    reused = []
+    key_to_original = {}
+    for row in rows:
+        asset_id, str_bucket, str_path, _, lot_id = row
+        key = (lot_id, fingerprinter.get_fingerprint(str_bucket, str_path))
+        if key in existing_categories:
+            reused.append((asset_id, existing_categories[key]))
+        elif key in key_to_original:
+            duplicate_to_original[asset_id] = key_to_original[key]
+        else:
+            key_to_original[key] = asset_id
+            novel_rows.append(row)
+    return DedupResult(novel_rows, duplicate_to_original, reused)
+
+
+def copy_categories(dbconn, reused):
+    """Give each of the given assets its categories and mark it as approved,
+    as if its categorization HIT had been accepted. The batch is committed
+    once, skipping any category an asset already has.
+
+    :param dbconn: A database connection
+    :type dbconn: psycopg2.Connection
+    :param reused: Pairs of (asset id, lot asset type ids), see DedupResult
+    :type reused: iterable of tuple
+    """
+    cur = dbconn.cursor()
+    for asset_id, lot_asset_type_ids in reused:
+        for lot_asset_type_id in lot_asset_type_ids:
+            # Undo only a failed insert rather than the whole transaction
+            cur.execute('SAVEPOINT copy_category')
+            try:
+                cur.execute('''
+                INSERT INTO asset_lot_asset_type_xref
+                (pk_asset_lot_asset_type_xref, pk_asset, pk_lot_asset_type,
+                str_create_who, dt_create_date, str_modified_who,
+                dt_modified_date)
+                VALUES (%s, %s, %s, 'mturk', now(), 'mturk', now())
+                ''', (str(uuid.uuid4()), asset_id, lot_asset_type_id))
+            except psycopg2.IntegrityError:
+                cur.execute('ROLLBACK TO SAVEPOINT copy_category')
+            else:
+                cur.execute('RELEASE SAVEPOINT copy_category')
+        cur.execute(
+            'UPDATE asset SET pk_asset_status=2 WHERE pk_asset=%s',
+            (asset_id,))
+    dbconn.commit()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.assignments.categorization.gold
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Gold assets of lot photo categorization, photos with known categories
+    mixed into categorization batches to score workers, see parkme.turk.gold.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+
+
+# Task that categorization gold assets are stored under
+GOLD_TASK = 'categorization'
+
+
+def matches_gold_answer(assignment, answer):
+    """Indicates whether or not the given assignment matches the known answer
+    of a gold asset.
+
+    :param assignment: An assignment
+    :type assignment: parkme.turk.assignments.ImageCategorizationAssignment
+    :param answer: The known answer with categories and does_not_match keys
+    :type answer: dict
+    :rtype: bool
+    """
+    if answer.get('does_not_match'):
+        return bool(assignment.does_not_match)
+    return (not assignment.does_not_match and
+            set(each.lower() for each in assignment.categories or []) ==
+            set(each.lower() for each in answer.get('categories') or []))
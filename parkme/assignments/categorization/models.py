@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.assignments.categorization.models
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Models for lot photo categorization assignments.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import datetime
+
+from parkme.turk import hits
+
+
+class CategorizeLotPhotoTemplate(hits.HITTemplate):
+    """MTurk assignment to categorize lot photo templates"""
+
+    # (TEST) The ID for [TEST] Categorize Parking Lot Photo
+    # HIT_LAYOUT_ID = '33LDDHGJVTUH37V05I853CFD5GV3Q6'
+    # (PRODUCTION) The ID for Categorize Parking Lot Photo
+    HIT_LAYOUT_ID = '3MCDHXBQ4Z7SJ2ZT2XZACNE142JWKX'
+
+    def __init__(self, mturk_connection):
+        """Initialize categorization HIT template."""
+        super(CategorizeLotPhotoTemplate, self).__init__(
+            mturk_connection=mturk_connection,
+            hit_layout_id=self.HIT_LAYOUT_ID,
+            reward_per_assignment=0.02,
+            assignments_per_hit=3,
+            hit_expires_in=datetime.timedelta(days=7),
+            time_per_assignment=datetime.timedelta(minutes=3),
+            auto_approval_delay=datetime.timedelta(hours=8))
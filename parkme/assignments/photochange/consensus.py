@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.assignments.photochange.consensus
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Columnar consensus engine for photo change assignments. All assignments in
+    a batch are loaded into NumPy arrays once so that rejection and per-pair
+    consensus can be computed with array operations instead of per-group
+    Python lists.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved
+"""
+import collections
+
+import numpy
+
+from parkme.turk import reputation
+
+
+# The minimum percentage of matches to consider the results a consensus
+CONSENSUS_THRESHOLD = 0.51
+
+# The minimum number of valid assignments for a pair to be evaluated
+MIN_VALID_ASSIGNMENTS = 3
+
+# Tri-state encoding of boolean answers
+ANSWER_TRUE = 1
+ANSWER_FALSE = 0
+ANSWER_BLANK = -1
+
+# Column indexes of each question in the answers array
+SAME_SIGN = 0
+NEW_PHOTO_HAS_EXTRA_RATES = 1
+OLD_PHOTO_HAS_EXTRA_RATES = 2
+SAME_PRICES = 3
+
+# Decisions for each (new, old) asset pair
+TOO_FEW_VALID_ASSIGNMENTS = 'TOO FEW VALID ASSIGNMENTS'
+DIFFERENT_SIGN = 'DIFFERENT SIGN'
+SAME_SIGN_DECISION = 'SAME SIGN'
+
+
+PairDecision = collections.namedtuple(
+    'PairDecision',
+    ['new_asset_id',
+     'old_asset_id',
+     'decision',
+     'consensus_result',
+     'assignment_indexes'])
+
+
+def encode_answer(answer):
+    """Encode the given boolean answer in tri-state form.
+
+    :param answer: An answer
+    :type answer: bool or None
+    :rtype: int
+    """
+    if answer is None:
+        return ANSWER_BLANK
+    return ANSWER_TRUE if answer else ANSWER_FALSE
+
+
+class AssignmentColumns(object):
+    """Columnar representation of a batch of photo change assignments."""
+
+    def __init__(self, assignments, worker_ids, new_asset_ids, old_asset_ids,
+                 new_index, old_index, answers):
+        """Initialize the columns.
+
+        :param assignments: The assignments in row order
+        :type assignments: list
+        :param worker_ids: The worker id of each row
+        :type worker_ids: list
+        :param new_asset_ids: Unique new asset ids
+        :type new_asset_ids: numpy.ndarray
+        :param old_asset_ids: Unique old asset ids
+        :type old_asset_ids: numpy.ndarray
+        :param new_index: Index into new_asset_ids for each row
+        :type new_index: numpy.ndarray
+        :param old_index: Index into old_asset_ids for each row
+        :type old_index: numpy.ndarray
+        :param answers: Tri-state answers, one column per question
+        :type answers: numpy.ndarray
+        """
+        self.assignments = assignments
+        self.worker_ids = worker_ids
+        self.new_asset_ids = new_asset_ids
+        self.old_asset_ids = old_asset_ids
+        self.new_index = new_index
+        self.old_index = old_index
+        self.answers = answers
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def get_weights(self, worker_weights):
+        """Return the weight of each row given the weight of each worker.
+
+        :param worker_weights: Weight of each worker
+        :type worker_weights: dict of worker id to float
+        :rtype: numpy.ndarray
+        """
+        return numpy.array(
+            [worker_weights.get(each, reputation.DEFAULT_WEIGHT)
+             for each in self.worker_ids],
+            dtype=numpy.float64)
+
+    @classmethod
+    def from_assignments(cls, assignments):
+        """Load the given assignments into columns. Each assignment's answers
+        are read exactly once.
+
+        :param assignments: An iterable of assignments
+        :type assignments: iterable of models.PhotoChangeAssignment
+        :rtype: AssignmentColumns
+        """
+        assignments = list(assignments)
+        worker_ids = []
+        raw_new_ids = []
+        raw_old_ids = []
+        answers = numpy.empty((len(assignments), 4), dtype=numpy.int8)
+
+        for row, each in enumerate(assignments):
+            worker_ids.append(each.worker_id)
+            raw_new_ids.append(each.new_asset_id)
+            raw_old_ids.append(each.old_asset_id)
+            answers[row] = (
+                encode_answer(each.same_sign),
+                encode_answer(each.new_photo_has_extra_rates),
+                encode_answer(each.old_photo_has_extra_rates),
+                encode_answer(each.same_prices))
+
+        new_asset_ids, new_index = numpy.unique(
+            numpy.array(raw_new_ids, dtype=object), return_inverse=True)
+        old_asset_ids, old_index = numpy.unique(
+            numpy.array(raw_old_ids, dtype=object), return_inverse=True)
+        return cls(assignments, worker_ids, new_asset_ids, old_asset_ids,
+                   new_index, old_index, answers)
+
+
+def should_reject(answers):
+    """Return a mask indicating which assignments should be rejected. Mirrors
+    evaluator.should_reject for each row of the answers array.
+
+    :param answers: Tri-state answers, one column per question
+    :type answers: numpy.ndarray
+    :rtype: numpy.ndarray of bool
+    """
+    blank = answers == ANSWER_BLANK
+    true = answers == ANSWER_TRUE
+
+    questions_2_through_4_blank = blank[:, 1:].all(axis=1)
+    all_blank = blank[:, SAME_SIGN] & questions_2_through_4_blank
+    same_sign = true[:, SAME_SIGN]
+    has_extra_rates = (
+        true[:, NEW_PHOTO_HAS_EXTRA_RATES] |
+        true[:, OLD_PHOTO_HAS_EXTRA_RATES])
+
+    return (
+        all_blank |
+        (~same_sign & ~questions_2_through_4_blank) |
+        (same_sign & has_extra_rates & ~blank[:, SAME_PRICES]) |
+        (same_sign & ~has_extra_rates & blank[:, SAME_PRICES]))
+
+
+class BatchEvaluation(object):
+    """Result of evaluating a batch of photo change assignments."""
+
+    def __init__(self, columns, weights=None):
+        """Evaluate the given columns. When weights are given each answer
+        counts towards consensus in proportion to its weight and pairs may be
+        decided early by trusted workers.
+
+        :param columns: The batch in columnar form
+        :type columns: AssignmentColumns
+        :param weights: (Optional) Weight of each row
+        :type weights: numpy.ndarray or None
+        """
+        self.columns = columns
+        self.is_weighted = weights is not None
+        if weights is None:
+            weights = numpy.ones(len(columns))
+        self.rejected = should_reject(columns.answers)
+
+        pair_keys = (
+            columns.new_index.astype(numpy.int64) *
+            len(columns.old_asset_ids) +
+            columns.old_index)
+        unique_keys, self.pair_index = numpy.unique(
+            pair_keys, return_inverse=True)
+        num_pairs = len(unique_keys)
+        self.pair_new_index = (
+            unique_keys // max(len(columns.old_asset_ids), 1))
+        self.pair_old_index = (
+            unique_keys % max(len(columns.old_asset_ids), 1))
+
+        valid = ~self.rejected
+        valid_weights = numpy.where(valid, weights, 0.0)
+        self.pair_num_valid = numpy.bincount(
+            self.pair_index, weights=valid, minlength=num_pairs)
+        pair_valid_weight = numpy.bincount(
+            self.pair_index, weights=valid_weights, minlength=num_pairs)
+
+        # Blank answers count against consensus, just as they do in
+        # evaluator.get_consensus_result_among_items
+        true_weights = numpy.zeros((num_pairs, 4))
+        answers_true = columns.answers == ANSWER_TRUE
+        for question in xrange(4):
+            true_weights[:, question] = numpy.bincount(
+                self.pair_index,
+                weights=answers_true[:, question] * valid_weights,
+                minlength=num_pairs)
+
+        # Pairs without valid weight have no true answers either, so the
+        # divisor is only replaced to avoid dividing zero by zero
+        ratios = true_weights / numpy.where(
+            pair_valid_weight > 0, pair_valid_weight, 1.0)[:, None]
+        self.pair_results = ratios >= CONSENSUS_THRESHOLD
+
+        # An assignment agrees when all of its answers match the consensus
+        self.agrees = valid & (
+            answers_true == self.pair_results[self.pair_index]).all(axis=1)
+        self.pair_has_enough_valid = (
+            self.pair_num_valid >= MIN_VALID_ASSIGNMENTS)
+        if self.is_weighted:
+            pair_agreeing_weight = numpy.bincount(
+                self.pair_index,
+                weights=self.agrees * weights,
+                minlength=num_pairs)
+            self.pair_has_enough_valid |= (
+                pair_agreeing_weight >= reputation.EARLY_CONSENSUS_WEIGHT)
+
+    def __len__(self):
+        return len(self.pair_num_valid)
+
+    def get_decision(self, pair):
+        """Return the decision for the pair with the given index.
+
+        :param pair: A pair index
+        :type pair: int
+        :rtype: str
+        """
+        if not self.pair_has_enough_valid[pair]:
+            return TOO_FEW_VALID_ASSIGNMENTS
+        if not self.pair_results[pair, SAME_SIGN]:
+            return DIFFERENT_SIGN
+        return SAME_SIGN_DECISION
+
+    def get_consensus_result(self, pair):
+        """Return the consensus result for the pair with the given index in the
+        same form as evaluator.get_consensus_result.
+
+        :param pair: A pair index
+        :type pair: int
+        :rtype: tuple or None
+        """
+        if not self.pair_num_valid[pair]:
+            return None
+        return tuple(bool(each) for each in self.pair_results[pair])
+
+    def iter_pair_decisions(self):
+        """Generator yielding the decision for each (new, old) asset pair,
+        ordered by new asset id then old asset id.
+
+        :rtype: iterable of PairDecision
+        """
+        order = numpy.argsort(self.pair_index, kind='mergesort')
+        boundaries = numpy.searchsorted(
+            self.pair_index[order], numpy.arange(len(self) + 1))
+        for pair in xrange(len(self)):
+            yield PairDecision(
+                new_asset_id=self.columns.new_asset_ids[
+                    self.pair_new_index[pair]],
+                old_asset_id=self.columns.old_asset_ids[
+                    self.pair_old_index[pair]],
+                decision=self.get_decision(pair),
+                consensus_result=self.get_consensus_result(pair),
+                assignment_indexes=order[
+                    boundaries[pair]:boundaries[pair + 1]])
+
+
+def evaluate(assignments, worker_weights=None):
+    """Evaluate all of the given photo change assignments in one pass.
+
+    :param assignments: An iterable of assignments
+    :type assignments: iterable of models.PhotoChangeAssignment
+    :param worker_weights: (Optional) Weight of each worker
+    :type worker_weights: dict of worker id to float or None
+    :rtype: BatchEvaluation
+    """
+    columns = AssignmentColumns.from_assignments(assignments)
+    weights = (
+        columns.get_weights(worker_weights)
+        if worker_weights is not None
+        else None)
+    return BatchEvaluation(columns, weights)
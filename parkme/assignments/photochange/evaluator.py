@@ -11,12 +11,16 @@ import csv
 
 from parkme import db
 from parkme.assignments import utils
+from parkme.assignments.photochange import consensus
 from parkme.assignments.photochange import models
 from parkme.turk import assignments
+from parkme.turk import reputation
+from parkme.utils import eventlog
+from parkme.utils import profiling
 
 
 # The minimum percentage of matches to consider the results a consensus
-CONSENSUS_THRESHOLD = 0.51
+CONSENSUS_THRESHOLD = consensus.CONSENSUS_THRESHOLD
 
 
 def get_asset_info(asset_id):
@@ -291,75 +295,91 @@ def dump_results(output_file, mturk_connection, batch_id):
             csvwriter.writerow(each)
 
 
-def evaluate_all_photo_change_assignments(mturk_connection, batch_id):
-    """Evaluate all of the photo change assignments in the given batch.
+def print_same_sign_results(results_with_same_sign):
+    """Print the consensus results of all pairs showing the same sign.
+
+    :param results_with_same_sign: A list of consensus results
+    :type results_with_same_sign: list
+    """
+    if results_with_same_sign:
+        print 'SAME SIGN RESULTS'
+        for each in results_with_same_sign:
+            print each
+
+
+@profiling.timed()
+def evaluate_all_photo_change_assignments(
+        mturk_connection, batch_id, worker_stats_gateway=None):
+    """Evaluate all of the photo change assignments in the given batch. When a
+    worker stats gateway is given consensus is weighted by worker reputation
+    and the worker statistics are updated with the results of the batch.
 
     :param mturk_connection: A mechanical turk connection
     :type mturk_connection: boto.mturk.connection.Connection
     :param batch_id: A batch id
     :type batch_id: str or unicode
+    :param worker_stats_gateway: (Optional) A worker stats data gateway
+    :type worker_stats_gateway: parkme.models.WorkerStatsDataGateway or None
     """
-    all_assignments = get_all_photo_change_assignments(
-        mturk_connection, batch_id)
-    new_asset_id_to_assignments = utils.group_by_attribute(
-        all_assignments, 'new_asset_id')
+    with profiling.span('fetch'):
+        all_assignments = list(
+            get_all_photo_change_assignments(mturk_connection, batch_id))
+    evaluate_photo_change_assignments(
+        mturk_connection, all_assignments, worker_stats_gateway)
 
-    for new_asset_id, new_assns in new_asset_id_to_assignments.iteritems():
-        old_asset_id_to_assignments = utils.group_by_attribute(
-            new_assns, 'old_asset_id')
 
-        print
-        print '<{}>'.format(new_asset_id)
-        print
+@profiling.timed()
+def evaluate_photo_change_assignments(
+        mturk_connection, all_assignments, worker_stats_gateway=None):
+    """Evaluate the given photo change assignments, whether a whole batch or
+    a single HIT.
 
-        results_with_same_sign = []
+    :param mturk_connection: A mechanical turk connection
+    :type mturk_connection: boto.mturk.connection.Connection
+    :param all_assignments: An iterable of assignments
+    :type all_assignments: iterable of models.PhotoChangeAssignment
+    :param worker_stats_gateway: (Optional) A worker stats data gateway
+    :type worker_stats_gateway: parkme.models.WorkerStatsDataGateway or None
+    """
+    all_assignments = list(all_assignments)
+    with profiling.span('worker_weights'):
+        worker_weights = (
+            reputation.get_worker_weights(
+                worker_stats_gateway, all_assignments)
+            if worker_stats_gateway
+            else None)
+    with profiling.span('consensus'):
+        evaluation = consensus.evaluate(all_assignments, worker_weights)
+    assignment_gateway = assignments.AssignmentGateway(mturk_connection)
 
-        for old_asset_id, old_assns in old_asset_id_to_assignments.iteritems():
-            print
-            print '[{}]'.format(old_asset_id)
-            print
-
-            # First, reject anything that is just unusable
-            unrejected_assignments = []
-            assignment_gateway = assignments.AssignmentGateway(
-                        mturk_connection)
-            for each in old_assns:
-                if should_reject(each):
-                    print 'Reject {}'.format(each.assignment_id)
-                    assignment_gateway.accept(
-                        each, feedback='Assignment accepted. Thank you!')
-                else:
-                    assignment_gateway.accept(
-                        each, feedback='Assignment accepted. Thank you!')
-                    unrejected_assignments.append(each)
-
-            if len(unrejected_assignments) < 3:
-                print
-                print 'TOO FEW VALID ASSIGNMENTS'
-                print
-                continue
-
-            if not has_consensus_for_assignments(unrejected_assignments):
-                print
-                print 'NO CONSENSUS'
-                print
-                continue
-
-            consensus_result = get_consensus_result(unrejected_assignments)
-
-            # Not a photo of the same sign
-            if not is_same_sign(consensus_result):
-                print
-                print 'DIFFERENT SIGN'
-                print
-                continue
-
-            print
-            print 'SAME SIGN'
-            print
-            results_with_same_sign.append(consensus_result)
-
-        if results_with_same_sign:
-            print 'SAME SIGN RESULTS'
-            for each in results_with_same_sign:
-                print each
+    results_with_same_sign = []
+    decided_indexes = []
+
+    for pair in evaluation.iter_pair_decisions():
+        for index in pair.assignment_indexes:
+            each = evaluation.columns.assignments[index]
+            if evaluation.rejected[index]:
+                eventlog.debug(
+                    'assignment_invalid', assignment_id=each.assignment_id)
+            assignment_gateway.accept(
+                each, feedback='Assignment accepted. Thank you!')
+
+        eventlog.debug(
+            'pair_decided',
+            new_asset_id=pair.new_asset_id,
+            old_asset_id=pair.old_asset_id,
+            decision=pair.decision)
+        if pair.decision == consensus.SAME_SIGN_DECISION:
+            results_with_same_sign.append(pair.consensus_result)
+        if pair.decision != consensus.TOO_FEW_VALID_ASSIGNMENTS:
+            decided_indexes.extend(pair.assignment_indexes)
+
+    print_same_sign_results(results_with_same_sign)
+
+    if worker_stats_gateway:
+        with profiling.span('record_worker_results'):
+            worker_stats_gateway.record_results(
+                reputation.get_worker_results(
+                    [evaluation.columns.assignments[index]
+                     for index in decided_indexes],
+                    evaluation.agrees[decided_indexes]))
@@ -7,14 +7,35 @@
 
     Copyright (C) 2015 ParkMe Inc. All Rights Reserved
 """
+import Queue
 import datetime
 import itertools
+import sys
+import threading
+import traceback
 
 import pytz
 
 from parkme import exceptions
 from parkme.assignments import utils
 from parkme.assignments.photochange import models
+from parkme.images import hashing
+from parkme.turk import client
+from parkme.utils import eventlog
+
+
+# Most HITs waiting between the database reader and the HIT creators. Once the
+# queue is full the reader blocks until HITs have been created.
+QUEUE_SIZE = 64
+
+# Number of threads creating HITs concurrently
+NUM_HIT_CREATORS = 8
+
+# Seconds between progress reports
+PROGRESS_INTERVAL_SECONDS = 5
+
+# Marks the end of the HIT queue
+_DONE = object()
 
 
 def has_enough_assets_to_compare(asset_group):
@@ -120,10 +141,45 @@ def get_comparable_assets(db_connection):
     :rtype: iterable
     """
     for (lot_id,) in get_all_lots(db_connection):
-        print lot_id
+        eventlog.debug('lot_assets_fetched', lot_id=lot_id)
         yield list(get_comparable_assets_for_lot(db_connection, lot_id))
 
 
+def get_num_pairs(asset_groups):
+    """Return the number of HITs comparing the newest asset of each of the
+    given groups with the older ones, before any near-duplicates are resolved.
+
+    :param asset_groups: Groups of comparable assets, newest first
+    :type asset_groups: list of list
+    :rtype: int
+    """
+    return sum(
+        len(get_remaining_assets(each)) for each in asset_groups
+        if has_enough_assets_to_compare(each))
+
+
+def split_asset_groups(asset_groups, num_hits):
+    """Split the given groups into the leading groups needing at most the
+    given number of HITs, and the rest. A lot's group is never split, so a
+    first group needing more HITs is taken on its own.
+
+    :param asset_groups: Groups of comparable assets, newest first
+    :type asset_groups: list of list
+    :param num_hits: Most HITs the leading groups may need
+    :type num_hits: int
+    :rtype: tuple of (list of list, list of list)
+    """
+    num_taken = 0
+    total_pairs = 0
+    for each in asset_groups:
+        num_pairs = get_num_pairs([each])
+        if total_pairs and total_pairs + num_pairs > num_hits:
+            break
+        num_taken += 1
+        total_pairs += num_pairs
+    return asset_groups[:num_taken], asset_groups[num_taken:]
+
+
 def upload_assignments_to_turk(
         mturk_connection, batch_id, new_asset, older_assets):
     """Given the newest asset and a list of older assets this task will create an
@@ -139,19 +195,260 @@ def upload_assignments_to_turk(
     :type older_assets: list
     """
     hit_template = models.PhotoChangeTemplate(mturk_connection)
-    for index, old_asset in enumerate(older_assets):
+    for old_asset in older_assets:
         assignment_data = get_assignment_data(new_asset, old_asset)
-        if not index:
-            print assignment_data['new_image_url']
-        print assignment_data['old_image_url']
+        eventlog.debug(
+            'photo_change_hit',
+            new_image_url=assignment_data['new_image_url'],
+            old_image_url=assignment_data['old_image_url'])
         hit_template.create_hit(assignment_data, batch_id)
 
 
-def upload_all_tasks_to_turk(mturk_connection, batch_id, db_connection):
+def get_comparable_assets_for_lots(db_connection, lot_ids):
+    """Yields groups of comparable assets for each of the given lots.
+
+    :param db_connection: A database connection
+    :type db_connection: psycopg2.Connection
+    :param lot_ids: An iterable of lot string ids
+    :type lot_ids: iterable of str or unicode
+    :rtype: iterable of list
+    """
+    for lot_id in lot_ids:
+        yield list(get_comparable_assets_for_lot(db_connection, lot_id))
+
+
+class UploadProgress(object):
+    """Thread safe counters tracking the progress of an upload."""
+
+    COUNTERS = (
+        'lots_read', 'lots_skipped', 'pairs_auto_resolved', 'hits_queued',
+        'hits_created', 'hits_failed')
+
+    def __init__(self):
+        """Initialize all counters to zero."""
+        self._lock = threading.Lock()
+        self.lots_read = 0
+        self.lots_skipped = 0
+        self.pairs_auto_resolved = 0
+        self.hits_queued = 0
+        self.hits_created = 0
+        self.hits_failed = 0
+        # (new asset, old asset) pairs resolved without creating a HIT
+        self.auto_resolved_pairs = []
+
+    def __str__(self):
+        return (
+            '{lots_read} lots read ({lots_skipped} skipped), '
+            '{pairs_auto_resolved} pairs auto-resolved, '
+            '{hits_created}/{hits_queued} HITs created, '
+            '{hits_failed} failed'.format(**self.get_counts()))
+
+    def increment(self, counter, amount=1):
+        """Increment the counter with the given name.
+
+        :param counter: One of COUNTERS
+        :type counter: str
+        :param amount: The amount to add
+        :type amount: int
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def add_auto_resolved_pairs(self, new_asset, old_assets):
+        """Record pairs resolved without creating a HIT.
+
+        :param new_asset: The newest asset
+        :type new_asset: models.ComparableAsset
+        :param old_assets: The older assets near-identical to the newest
+        :type old_assets: list of models.ComparableAsset
+        """
+        with self._lock:
+            self.pairs_auto_resolved += len(old_assets)
+            self.auto_resolved_pairs.extend(
+                (new_asset, old_asset) for old_asset in old_assets)
+
+    def get_counts(self):
+        """Return a consistent snapshot of all counters.
+
+        :rtype: dict of str to int
+        """
+        with self._lock:
+            return {
+                counter: getattr(self, counter) for counter in self.COUNTERS}
+
+
+def partition_near_duplicates(new_asset, older_assets, image_hasher,
+                              max_distance=hashing.NEAR_DUPLICATE_DISTANCE):
+    """Split the older assets into those that need comparing by workers and
+    those whose images are near-duplicates of the new asset's image. Assets
+    whose images couldn't be hashed always need comparing.
+
+    :param new_asset: The newest asset
+    :type new_asset: models.ComparableAsset
+    :param older_assets: The older assets
+    :type older_assets: list of models.ComparableAsset
+    :param image_hasher: Computes the hashes of asset images
+    :type image_hasher: parkme.images.hashing.ImageHasher
+    :param max_distance: The largest hash distance of near-duplicates
+    :type max_distance: int
+    :return: The assets to compare and the near-duplicate assets
+    :rtype: tuple of (list, list)
+    """
+    asset_hashes = image_hasher.get_hashes([new_asset] + older_assets)
+    new_hashes = asset_hashes.get((new_asset.str_bucket, new_asset.str_path))
+    to_compare = []
+    near_duplicates = []
+    for old_asset in older_assets:
+        old_hashes = asset_hashes.get(
+            (old_asset.str_bucket, old_asset.str_path))
+        if (new_hashes and old_hashes and hashing.is_near_duplicate(
+                new_hashes, old_hashes, max_distance)):
+            near_duplicates.append(old_asset)
+        else:
+            to_compare.append(old_asset)
+    return to_compare, near_duplicates
+
+
+def read_asset_groups(asset_groups, hit_queue, progress, image_hasher=None):
+    """Database reader stage of the upload pipeline. Queues the data for one
+    HIT per older asset in each group. Older assets whose images are
+    near-duplicates of the newest are resolved without a HIT when an image
+    hasher is given.
+
+    :param asset_groups: Groups of comparable assets, newest first
+    :type asset_groups: iterable of list
+    :param hit_queue: Bounded queue feeding the HIT creators
+    :type hit_queue: Queue.Queue
+    :param progress: The upload progress
+    :type progress: UploadProgress
+    :param image_hasher: (Optional) Computes the hashes of asset images
+    :type image_hasher: parkme.images.hashing.ImageHasher or None
+    """
+    for asset_group in asset_groups:
+        progress.increment('lots_read')
+        if not has_enough_assets_to_compare(asset_group):
+            progress.increment('lots_skipped')
+            continue
+
+        newest_asset = get_newest_asset(asset_group)
+        older_assets = get_remaining_assets(asset_group)
+        if image_hasher:
+            older_assets, near_duplicates = partition_near_duplicates(
+                newest_asset, older_assets, image_hasher)
+            progress.add_auto_resolved_pairs(newest_asset, near_duplicates)
+        for old_asset in older_assets:
+            hit_queue.put(get_assignment_data(newest_asset, old_asset))
+            progress.increment('hits_queued')
+
+
+def create_queued_hits(hit_template, batch_id, hit_queue, progress,
+                       rate_limiter):
+    """HIT creation stage of the upload pipeline. Creates a HIT for each item
+    in the queue until the end marker is reached.
+
+    :param hit_template: The template used to create HITs
+    :type hit_template: models.PhotoChangeTemplate
+    :param batch_id: The ID to be associated with this batch of tasks
+    :type batch_id: str or unicode
+    :param hit_queue: Bounded queue fed by the database reader
+    :type hit_queue: Queue.Queue
+    :param progress: The upload progress
+    :type progress: UploadProgress
+    :param rate_limiter: Rate limiter shared by all HIT creators
+    :type rate_limiter: parkme.turk.client.RateLimiter
+    """
+    while True:
+        assignment_data = hit_queue.get()
+        if assignment_data is _DONE:
+            return
+        try:
+            with rate_limiter:
+                hit_template.create_hit(assignment_data, batch_id)
+            progress.increment('hits_created')
+        # A creator that dies would leave the reader blocked on a full queue
+        except Exception:  # pylint: disable=W0703
+            traceback.print_exc()
+            progress.increment('hits_failed')
+
+
+def upload_asset_groups_to_turk(connection_factory,
+                                batch_id,
+                                asset_groups,
+                                queue_size=QUEUE_SIZE,
+                                num_hit_creators=NUM_HIT_CREATORS,
+                                rate_limiter=None,
+                                report_progress=None,
+                                image_hasher_factory=None):
+    """Upload a photo change HIT for each older asset in the given groups. The
+    groups are read on one thread while HITs are created concurrently on
+    others, with a bounded queue between them, so that database reads overlap
+    HIT creation.
+
+    :param connection_factory: Creates a new Mechanical Turk connection, one
+        per HIT creator
+    :type connection_factory: callable
+    :param batch_id: The ID to be associated with this batch of tasks
+    :type batch_id: str or unicode
+    :param asset_groups: Groups of comparable assets, newest first. Read
+        lazily by the reader thread.
+    :type asset_groups: iterable of list
+    :param queue_size: Most HITs waiting to be created
+    :type queue_size: int
+    :param num_hit_creators: Number of threads creating HITs
+    :type num_hit_creators: int
+    :param rate_limiter: (Optional) Rate limiter for HIT creation
+    :type rate_limiter: parkme.turk.client.RateLimiter or None
+    :param report_progress: (Optional) Called with the progress periodically
+    :type report_progress: callable or None
+    :param image_hasher_factory: (Optional) Creates the image hasher used to
+        resolve near-duplicate pairs without HITs. Called on the reader
+        thread since SQLite connections can't be shared between threads.
+    :type image_hasher_factory: callable or None
+    :rtype: UploadProgress
+    """
+    progress = UploadProgress()
+    rate_limiter = rate_limiter or client.RateLimiter()
+    hit_queue = Queue.Queue(maxsize=queue_size)
+    reader_errors = []
+
+    def run_reader():
+        try:
+            read_asset_groups(
+                asset_groups, hit_queue, progress,
+                image_hasher_factory() if image_hasher_factory else None)
+        except Exception:  # pylint: disable=W0703
+            reader_errors.append(sys.exc_info())
+        finally:
+            for _ in xrange(num_hit_creators):
+                hit_queue.put(_DONE)
+
+    threads = [threading.Thread(target=run_reader)]
+    for _ in xrange(num_hit_creators):
+        hit_template = models.PhotoChangeTemplate(connection_factory())
+        threads.append(threading.Thread(
+            target=create_queued_hits,
+            args=(hit_template, batch_id, hit_queue, progress, rate_limiter)))
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(PROGRESS_INTERVAL_SECONDS)
+            if report_progress and thread.is_alive():
+                report_progress(progress)
+
+    if reader_errors:
+        exc_type, exc_value, exc_traceback = reader_errors[0]
+        raise exc_type, exc_value, exc_traceback
+    return progress
+
+
+def upload_all_tasks_to_turk(connection_factory, batch_id, db_connection):
     """Upload all tasks to Mechanical Turk.
 
-    :param mturk_connection: A Mechanical Turk connection
-    :type mturk_connection: boto.mturk.Connection
+    :param connection_factory: Creates a new Mechanical Turk connection
+    :type connection_factory: callable
     :param batch_id: The ID to be associated wtih this batch of tasks
     :type batch_id: str or unicode
     :param db_connection: A database connection
@@ -159,14 +456,9 @@ def upload_all_tasks_to_turk(mturk_connection, batch_id, db_connection):
     :return: Number of items uploaded
     :rtype: int
     """
-    num_items_uploaded = 0
-    for asset_group in get_comparable_assets(db_connection):
-        if not has_enough_assets_to_compare(asset_group):
-            continue
-
-        newest_asset = get_newest_asset(asset_group)
-        remaining_assets = get_remaining_assets(asset_group)
-        upload_assignments_to_turk(
-            mturk_connection, batch_id, newest_asset, remaining_assets)
-        num_items_uploaded += len(remaining_assets)
-    return num_items_uploaded
+    lot_ids = (lot_id for (lot_id,) in get_all_lots(db_connection))
+    progress = upload_asset_groups_to_turk(
+        connection_factory,
+        batch_id,
+        get_comparable_assets_for_lots(db_connection, lot_ids))
+    return progress.hits_created
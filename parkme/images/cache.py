@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.images.cache
+    ~~~~~~~~~~~~~~~~~~~
+    Content-addressed local cache of asset images. Images are stored once per
+    distinct content under their SHA-1 digest, with a SQLite index mapping
+    each (str_bucket, str_path) to its digest, and the least recently used
+    images are evicted once the cache grows beyond its size limit.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import contextlib
+import datetime
+import hashlib
+import httplib
+import mmap
+import os
+import socket
+import tempfile
+import threading
+import urllib2
+from multiprocessing import pool
+
+from parkme.assignments import utils
+from parkme.images import models
+from parkme.utils import misc
+
+
+# Largest total size of cached images in bytes
+MAX_BYTES = 2 * 1024 ** 3
+
+# Number of images fetched concurrently by the prefetcher
+NUM_PREFETCH_WORKERS = 8
+
+# Least recently used images considered for eviction at a time
+EVICTION_BATCH_SIZE = 100
+
+# Seconds to wait when fetching an image over HTTP
+FETCH_TIMEOUT_SECONDS = 30
+
+# Errors fetching a single image. Besides IOError and OSError, responses cut
+# short raise httplib errors and dropped connections raise socket errors.
+FETCH_ERRORS = (IOError, OSError, httplib.HTTPException, socket.error)
+
+
+class HttpFetcher(object):
+    """Fetches asset images over HTTP, either from their real location or
+    from a stand-in server mirroring the bucket layout."""
+
+    def __init__(self, base_url=None, timeout=FETCH_TIMEOUT_SECONDS):
+        """Initialize the fetcher.
+
+        :param base_url: (Optional) URL of a stand-in server to fetch from
+            instead of each asset's bucket
+        :type base_url: str or unicode or None
+        :param timeout: Seconds to wait for each image
+        :type timeout: float
+        """
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.timeout = timeout
+
+    def __call__(self, str_bucket, str_path):
+        if self.base_url:
+            url = u'{}/{}/{}'.format(self.base_url, str_bucket, str_path)
+        else:
+            url = utils.asset_to_image_url(str_bucket, str_path)
+        response = urllib2.urlopen(url, timeout=self.timeout)
+        try:
+            return response.read()
+        finally:
+            response.close()
+
+
+class LocalDirectoryFetcher(object):
+    """Fetches asset images from a local directory mirroring the bucket
+    layout, ie. ROOT/str_bucket/str_path."""
+
+    def __init__(self, root):
+        """Initialize the fetcher.
+
+        :param root: The directory containing one directory per bucket
+        :type root: str or unicode
+        """
+        self.root = root
+
+    def __call__(self, str_bucket, str_path):
+        with open(os.path.join(self.root, str_bucket, str_path), 'rb') as f:
+            return f.read()
+
+
+def get_fetcher(image_source=None):
+    """Return a fetcher for the given image source.
+
+    :param image_source: (Optional) A local directory or the URL of a stand-in
+        HTTP server. Defaults to each asset's real location.
+    :type image_source: str or unicode or None
+    :rtype: HttpFetcher or LocalDirectoryFetcher
+    """
+    if image_source and not image_source.startswith(('http://', 'https://')):
+        return LocalDirectoryFetcher(image_source)
+    return HttpFetcher(image_source)
+
+
+def get_now_microtime():
+    """Return the current time as microtime.
+
+    :rtype: float
+    """
+    return misc.datetime_to_microtime(datetime.datetime.utcnow())
+
+
+class ImageCache(object):
+    """Content-addressed, size bounded disk cache of asset images. Safe to use
+    from several threads at once."""
+
+    def __init__(self, cache_dir, fetch_image=None, max_bytes=MAX_BYTES):
+        """Initialize the cache, creating its directory if necessary.
+
+        :param cache_dir: The directory holding the cache
+        :type cache_dir: str or unicode
+        :param fetch_image: (Optional) Returns the contents of the image with
+            the given bucket and path. Defaults to fetching over HTTP.
+        :type fetch_image: callable or None
+        :param max_bytes: Largest total size of cached images
+        :type max_bytes: int
+        """
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, 'blobs')
+        self.index_path = os.path.join(cache_dir, 'index.sqlite3')
+        self.fetch_image = fetch_image or HttpFetcher()
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._eviction_lock = threading.Lock()
+        if not os.path.isdir(self.blob_dir):
+            os.makedirs(self.blob_dir)
+        self.get_data_gateway().create_table()
+
+    def get_data_gateway(self):
+        """Return the index gateway for the current thread, as SQLite
+        connections can't be shared between threads.
+
+        :rtype: parkme.images.models.ImageCacheDataGateway
+        """
+        data_gateway = getattr(self._local, 'data_gateway', None)
+        if data_gateway is None:
+            data_gateway = models.ImageCacheDataGateway(self.index_path)
+            self._local.data_gateway = data_gateway
+        return data_gateway
+
+    def get_blob_path(self, digest):
+        """Return the path of the blob with the given digest.
+
+        :param digest: A SHA-1 hex digest
+        :type digest: str
+        :rtype: str
+        """
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def get_digest(self, str_bucket, str_path):
+        """Return the digest of the cached image with the given key.
+
+        :rtype: str or unicode or None
+        """
+        return self.get_data_gateway().get_digest(str_bucket, str_path)
+
+    def contains(self, str_bucket, str_path):
+        """Indicates whether or not the image with the given key is cached.
+
+        :rtype: bool
+        """
+        digest = self.get_digest(str_bucket, str_path)
+        return bool(digest) and os.path.exists(self.get_blob_path(digest))
+
+    @contextlib.contextmanager
+    def open(self, str_bucket, str_path):
+        """Context manager memory-mapping the cached image with the given key.
+        Yields None if the image isn't cached.
+
+        :param str_bucket: The bucket containing the asset
+        :type str_bucket: str or unicode
+        :param str_path: The path of the asset
+        :type str_path: str or unicode
+        :rtype: mmap.mmap or str or None
+        """
+        digest = self.get_digest(str_bucket, str_path)
+        if not digest:
+            yield None
+            return
+
+        try:
+            blob_file = open(self.get_blob_path(digest), 'rb')
+        except IOError:
+            # Evicted by another thread since looking up the digest
+            yield None
+            return
+
+        with blob_file:
+            self.get_data_gateway().touch(digest, get_now_microtime())
+            # Empty files can't be memory-mapped
+            if not os.fstat(blob_file.fileno()).st_size:
+                yield ''
+                return
+            mapped = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+
+    def get(self, str_bucket, str_path):
+        """Return the contents of the cached image with the given key.
+
+        :param str_bucket: The bucket containing the asset
+        :type str_bucket: str or unicode
+        :param str_path: The path of the asset
+        :type str_path: str or unicode
+        :rtype: str or None
+        """
+        digest = self.get_digest(str_bucket, str_path)
+        if not digest:
+            return None
+
+        try:
+            with open(self.get_blob_path(digest), 'rb') as blob_file:
+                image_data = blob_file.read()
+        except IOError:
+            # Evicted by another thread since looking up the digest
+            return None
+        self.get_data_gateway().touch(digest, get_now_microtime())
+        return image_data
+
+    def put(self, str_bucket, str_path, image_data):
+        """Cache the given image contents under the given key.
+
+        :param str_bucket: The bucket containing the asset
+        :type str_bucket: str or unicode
+        :param str_path: The path of the asset
+        :type str_path: str or unicode
+        :param image_data: The image contents
+        :type image_data: str
+        :return: The content digest
+        :rtype: str
+        """
+        digest = hashlib.sha1(image_data).hexdigest()
+        blob_path = self.get_blob_path(digest)
+        if not os.path.exists(blob_path):
+            blob_dir = os.path.dirname(blob_path)
+            if not os.path.isdir(blob_dir):
+                try:
+                    os.makedirs(blob_dir)
+                except OSError:
+                    # Created concurrently by another thread
+                    pass
+            # Write then rename so readers never see a partial blob
+            fd, temp_path = tempfile.mkstemp(dir=blob_dir)
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(image_data)
+            os.rename(temp_path, blob_path)
+
+        self.get_data_gateway().save(
+            str_bucket, str_path, digest, len(image_data),
+            get_now_microtime())
+        self.evict()
+        return digest
+
+    def get_or_fetch(self, str_bucket, str_path):
+        """Return the contents of the image with the given key, fetching and
+        caching it first if necessary.
+
+        :param str_bucket: The bucket containing the asset
+        :type str_bucket: str or unicode
+        :param str_path: The path of the asset
+        :type str_path: str or unicode
+        :rtype: str
+        """
+        image_data = self.get(str_bucket, str_path)
+        if image_data is None:
+            image_data = self.fetch_image(str_bucket, str_path)
+            self.put(str_bucket, str_path, image_data)
+        return image_data
+
+    def evict(self):
+        """Remove the least recently used images until the cache is within
+        its size limit.
+
+        :return: The number of blobs removed
+        :rtype: int
+        """
+        data_gateway = self.get_data_gateway()
+        num_evicted = 0
+        with self._eviction_lock:
+            excess_bytes = data_gateway.get_total_bytes() - self.max_bytes
+            while excess_bytes > 0:
+                to_evict = []
+                for digest, num_bytes in data_gateway.get_least_recently_used(
+                        EVICTION_BATCH_SIZE):
+                    to_evict.append(digest)
+                    excess_bytes -= num_bytes
+                    if excess_bytes <= 0:
+                        break
+                if not to_evict:
+                    break
+                data_gateway.delete_blobs(to_evict)
+                for digest in to_evict:
+                    try:
+                        os.remove(self.get_blob_path(digest))
+                    except OSError:
+                        pass
+                num_evicted += len(to_evict)
+        return num_evicted
+
+    def prefetch(self, keys, num_workers=NUM_PREFETCH_WORKERS):
+        """Fetch and cache all of the images with the given keys that aren't
+        already cached, several at a time.
+
+        :param keys: An iterable of (str_bucket, str_path) pairs
+        :type keys: iterable of tuple
+        :param num_workers: Number of images fetched concurrently
+        :type num_workers: int
+        :return: The number of images fetched and the keys that failed
+        :rtype: tuple of (int, list of tuple)
+        """
+        missing = [key for key in set(keys) if not self.contains(*key)]
+        if not missing:
+            return 0, []
+
+        def fetch(key):
+            try:
+                self.put(key[0], key[1], self.fetch_image(*key))
+                return True
+            except FETCH_ERRORS:
+                return False
+
+        worker_pool = pool.ThreadPool(min(num_workers, len(missing)))
+        try:
+            succeeded = worker_pool.map(fetch, missing)
+        finally:
+            worker_pool.close()
+            worker_pool.join()
+        failed = [key for key, ok in zip(missing, succeeded) if not ok]
+        return len(missing) - len(failed), failed
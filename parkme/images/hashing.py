@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.images.hashing
+    ~~~~~~~~~~~~~~~~~~~~~
+    Perceptual hashes for detecting identical and near-duplicate asset images
+    without asking Mechanical Turk workers to compare them.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import io
+import struct
+import urllib2
+
+import numpy
+from PIL import Image
+
+from parkme.assignments import utils
+from parkme.images import cache
+from parkme.images import models
+
+
+# Width and height in bits of each hash, giving 64 bit hashes
+HASH_SIZE = 8
+
+# Width and height images are reduced to before computing the pHash DCT
+PHASH_IMAGE_SIZE = 32
+
+# Pairs of images whose dHash and pHash both differ by at most this many bits
+# are considered near-duplicates
+NEAR_DUPLICATE_DISTANCE = 4
+
+# Seconds to wait when downloading an image
+DOWNLOAD_TIMEOUT_SECONDS = 30
+
+# Errors fetching or decoding a single image. Besides the fetch errors, PIL
+# raises SyntaxError, ValueError or struct.error on some malformed image
+# headers.
+IMAGE_ERRORS = cache.FETCH_ERRORS + (SyntaxError, ValueError, struct.error)
+
+
+ImageHashes = collections.namedtuple('ImageHashes', ['dhash', 'phash'])
+
+
+def download_image(str_bucket, str_path):
+    """Download the contents of the asset image with the given location.
+
+    :param str_bucket: The bucket containing the asset
+    :type str_bucket: str or unicode
+    :param str_path: The path of the asset
+    :type str_path: str or unicode
+    :rtype: str
+    """
+    url = utils.asset_to_image_url(str_bucket, str_path)
+    response = urllib2.urlopen(url, timeout=DOWNLOAD_TIMEOUT_SECONDS)
+    try:
+        return response.read()
+    finally:
+        response.close()
+
+
+def load_grayscale(image_data, size):
+    """Decode the given image and reduce it to grayscale pixels of the given
+    size.
+
+    :param image_data: Encoded image contents
+    :type image_data: str
+    :param size: The (width, height) to resize to
+    :type size: tuple of int
+    :rtype: numpy.ndarray
+    """
+    image = Image.open(io.BytesIO(image_data)).convert('L')
+    image = image.resize(size, Image.ANTIALIAS)
+    return numpy.asarray(image, dtype=numpy.float64)
+
+
+def bits_to_int(bits):
+    """Pack the given bits into an integer, most significant bit first.
+
+    :param bits: An array of booleans
+    :type bits: numpy.ndarray
+    :rtype: int or long
+    """
+    result = 0
+    for bit in bits.flat:
+        result = (result << 1) | int(bit)
+    return result
+
+
+def get_dhash(pixels):
+    """Return the difference hash of the given pixels. Each bit indicates
+    whether a pixel is brighter than its left neighbour.
+
+    :param pixels: Grayscale pixels, HASH_SIZE rows of HASH_SIZE + 1 columns
+    :type pixels: numpy.ndarray
+    :rtype: int or long
+    """
+    return bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+_DCT_MATRICES = {}
+
+
+def get_dct_matrix(size):
+    """Return the orthonormal DCT-II matrix of the given size.
+
+    :param size: The matrix size
+    :type size: int
+    :rtype: numpy.ndarray
+    """
+    if size not in _DCT_MATRICES:
+        k = numpy.arange(size)[:, None]
+        n = numpy.arange(size)[None, :]
+        matrix = numpy.sqrt(2.0 / size) * numpy.cos(
+            numpy.pi * (2 * n + 1) * k / (2.0 * size))
+        matrix[0] /= numpy.sqrt(2.0)
+        _DCT_MATRICES[size] = matrix
+    return _DCT_MATRICES[size]
+
+
+def get_phash(pixels):
+    """Return the perceptual hash of the given pixels. Each bit indicates
+    whether a low frequency DCT coefficient is above the median.
+
+    :param pixels: Square grayscale pixels
+    :type pixels: numpy.ndarray
+    :rtype: int or long
+    """
+    dct_matrix = get_dct_matrix(pixels.shape[0])
+    dct = dct_matrix.dot(pixels).dot(dct_matrix.T)
+    low_frequencies = dct[:HASH_SIZE, :HASH_SIZE]
+    # The DC term is the average brightness and would skew the median
+    median = numpy.median(low_frequencies.flat[1:])
+    return bits_to_int(low_frequencies > median)
+
+
+def hash_image(image_data):
+    """Compute the perceptual hashes of the given image.
+
+    :param image_data: Encoded image contents
+    :type image_data: str
+    :rtype: ImageHashes
+    """
+    dhash_pixels = load_grayscale(image_data, (HASH_SIZE + 1, HASH_SIZE))
+    phash_pixels = load_grayscale(
+        image_data, (PHASH_IMAGE_SIZE, PHASH_IMAGE_SIZE))
+    return ImageHashes(
+        dhash=get_dhash(dhash_pixels), phash=get_phash(phash_pixels))
+
+
+def hamming_distance(first, second):
+    """Return the number of bits that differ between the given hashes.
+
+    :param first: A hash
+    :type first: int or long
+    :param second: A hash
+    :type second: int or long
+    :rtype: int
+    """
+    return bin(first ^ second).count('1')
+
+
+def is_near_duplicate(first, second, max_distance=NEAR_DUPLICATE_DISTANCE):
+    """Indicates whether or not the images with the given hashes are
+    near-duplicates.
+
+    :param first: The hashes of an image
+    :type first: ImageHashes
+    :param second: The hashes of an image
+    :type second: ImageHashes
+    :param max_distance: The largest distance of each hash
+    :type max_distance: int
+    :rtype: bool
+    """
+    return (hamming_distance(first.dhash, second.dhash) <= max_distance and
+            hamming_distance(first.phash, second.phash) <= max_distance)
+
+
+class ImageHasher(object):
+    """Computes the hashes of asset images, keeping them in an on-disk hash
+    index so that each image is only fetched and hashed once."""
+
+    def __init__(self, data_gateway, fetch_image=download_image):
+        """Initialize the hasher.
+
+        :param data_gateway: The hash index
+        :type data_gateway: parkme.images.models.ImageHashDataGateway
+        :param fetch_image: Returns the contents of the image with the given
+            bucket and path
+        :type fetch_image: callable
+        """
+        self.data_gateway = data_gateway
+        self.fetch_image = fetch_image
+
+    def get_hashes(self, assets):
+        """Return the hashes of each of the given assets' images. Images that
+        could not be fetched or decoded are omitted.
+
+        :param assets: An iterable of assets
+        :type assets: iterable of ComparableAsset
+        :rtype: dict of (str_bucket, str_path) to ImageHashes
+        """
+        keys = set((each.str_bucket, each.str_path) for each in assets)
+        results = {
+            key: ImageHashes(image_hash.dhash, image_hash.phash)
+            for key, image_hash
+            in self.data_gateway.get_by_keys(keys).iteritems()}
+
+        new_image_hashes = []
+        for str_bucket, str_path in keys.difference(results):
+            try:
+                hashes = hash_image(self.fetch_image(str_bucket, str_path))
+            except IMAGE_ERRORS:
+                continue
+            results[(str_bucket, str_path)] = hashes
+            new_image_hashes.append(models.ImageHash(
+                str_bucket=str_bucket,
+                str_path=str_path,
+                dhash=hashes.dhash,
+                phash=hashes.phash))
+
+        self.data_gateway.save_all(new_image_hashes)
+        return results
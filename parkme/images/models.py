@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.images.models
+    ~~~~~~~~~~~~~~~~~~~~
+    SQLite models and data gateways indexing asset images.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+
+from parkme import models as parkme_models
+
+
+# Perceptual hashes of an asset image, see parkme.images.hashing
+ImageHash = collections.namedtuple(
+    'ImageHash',
+    ['str_bucket',
+     'str_path',
+     'dhash',
+     'phash'])
+
+
+class ImageHashDataGateway(parkme_models.BaseDataGateway):
+    """Gateway to the index of perceptual hashes of asset images"""
+
+    def create_table(self):
+        """Create the table if it does not already exist"""
+        cursor = self.dbconn.cursor()
+        # Hashes are stored as hex since SQLite integers are signed 64 bit
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_hash
+        (str_bucket TEXT,
+        str_path TEXT,
+        dhash TEXT,
+        phash TEXT,
+        PRIMARY KEY (str_bucket, str_path))
+        ''')
+
+    def save_all(self, image_hashes):
+        """Insert or replace the given image hashes in a single transaction.
+
+        :param image_hashes: An iterable of image hashes
+        :type image_hashes: iterable of ImageHash
+        """
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO image_hash VALUES (?, ?, ?, ?)
+            """,
+            [(each.str_bucket,
+              each.str_path,
+              '{:016x}'.format(each.dhash),
+              '{:016x}'.format(each.phash))
+             for each in image_hashes])
+        self.dbconn.commit()
+
+    def get_by_keys(self, keys):
+        """Return the hashes of each of the images with the given keys. Images
+        that have not been hashed are omitted.
+
+        :param keys: An iterable of (str_bucket, str_path) pairs
+        :type keys: iterable of tuple
+        :rtype: dict of (str_bucket, str_path) to ImageHash
+        """
+        results = {}
+        for result in self._select_in(
+                """
+                SELECT * FROM image_hash WHERE {}
+                """,
+                keys,
+                value_sql='(str_bucket=? AND str_path=?)',
+                separator=' OR '):
+            image_hash = self._raw_result_to_image_hash_obj(result)
+            results[(image_hash.str_bucket, image_hash.str_path)] = (
+                image_hash)
+        return results
+
+    def _raw_result_to_image_hash_obj(self, raw_result):
+        """Convert a raw result from the database into an image hash object.
+
+        :param raw_result: A raw result
+        :type raw_result: tuple
+        :rtype: ImageHash
+        """
+        return ImageHash(
+            str_bucket=raw_result[0],
+            str_path=raw_result[1],
+            dhash=int(raw_result[2], 16),
+            phash=int(raw_result[3], 16))
+
+
+class ImageCacheDataGateway(parkme_models.BaseDataGateway):
+    """Gateway to the index of a content-addressed image cache. Each
+    (str_bucket, str_path) key maps to the digest of a blob, and blobs
+    track their size and when they were last used for LRU eviction."""
+
+    def create_table(self):
+        """Create the tables if they do not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_cache_entry
+        (str_bucket TEXT,
+        str_path TEXT,
+        digest TEXT,
+        PRIMARY KEY (str_bucket, str_path))
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_cache_blob
+        (digest TEXT PRIMARY KEY,
+        num_bytes INTEGER,
+        last_used_at NUMERIC)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS image_cache_blob_last_used_at
+        ON image_cache_blob (last_used_at)
+        ''')
+        self.dbconn.commit()
+
+    def get_digest(self, str_bucket, str_path):
+        """Return the digest of the blob cached for the given key.
+
+        :param str_bucket: The bucket containing the asset
+        :type str_bucket: str or unicode
+        :param str_path: The path of the asset
+        :type str_path: str or unicode
+        :rtype: str or unicode or None
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            SELECT digest FROM image_cache_entry
+            WHERE str_bucket=? AND str_path=?
+            """,
+            (str_bucket, str_path))
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    def save(self, str_bucket, str_path, digest, num_bytes, used_at):
+        """Map the given key to the blob with the given digest.
+
+        :param str_bucket: The bucket containing the asset
+        :type str_bucket: str or unicode
+        :param str_path: The path of the asset
+        :type str_path: str or unicode
+        :param digest: The blob's digest
+        :type digest: str or unicode
+        :param num_bytes: The blob's size
+        :type num_bytes: int
+        :param used_at: The current time as microtime
+        :type used_at: float
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO image_cache_blob VALUES (?, ?, ?)
+            """,
+            (digest, num_bytes, used_at))
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO image_cache_entry VALUES (?, ?, ?)
+            """,
+            (str_bucket, str_path, digest))
+        self.dbconn.commit()
+
+    def touch(self, digest, used_at):
+        """Mark the blob with the given digest as used.
+
+        :param digest: The blob's digest
+        :type digest: str or unicode
+        :param used_at: The current time as microtime
+        :type used_at: float
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            'UPDATE image_cache_blob SET last_used_at=? WHERE digest=?',
+            (used_at, digest))
+        self.dbconn.commit()
+
+    def get_total_bytes(self):
+        """Return the total size of all cached blobs.
+
+        :rtype: int
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute('SELECT SUM(num_bytes) FROM image_cache_blob')
+        return cursor.fetchone()[0] or 0
+
+    def get_least_recently_used(self, limit):
+        """Return the least recently used blobs, oldest first.
+
+        :param limit: The most blobs to return
+        :type limit: int
+        :rtype: list of (digest, num_bytes)
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            SELECT digest, num_bytes FROM image_cache_blob
+            ORDER BY last_used_at ASC LIMIT ?
+            """,
+            (limit,))
+        return list(cursor)
+
+    def delete_blobs(self, digests):
+        """Remove the given blobs and every key mapped to them.
+
+        :param digests: A list of digests
+        :type digests: list of str or unicode
+        """
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            'DELETE FROM image_cache_entry WHERE digest=?',
+            [(digest,) for digest in digests])
+        cursor.executemany(
+            'DELETE FROM image_cache_blob WHERE digest=?',
+            [(digest,) for digest in digests])
@@ -7,6 +7,8 @@
     Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
 """
 import collections
+import datetime
+import json
 import sqlite3
 
 import pytz
@@ -23,10 +25,95 @@ CategorizationBatch = collections.namedtuple(
      'num_photos',
      'is_finished'])
 
+WorkerStats = collections.namedtuple(
+    'WorkerStats',
+    ['worker_id',
+     'num_assignments',
+     'num_agreed',
+     'total_work_seconds',
+     'updated_at'])
+
+# The outcome of a single evaluated assignment for a worker
+WorkerResult = collections.namedtuple(
+    'WorkerResult',
+    ['assignment_id',
+     'worker_id',
+     'asset_id',
+     'agreed',
+     'work_seconds'])
+
+# A unit of work waiting in a prioritized upload queue, see
+# parkme.turk.workqueue
+WorkItem = collections.namedtuple(
+    'WorkItem',
+    ['work_item_id',
+     'queue_name',
+     'priority',
+     'params',
+     'enqueued_at'])
+
+# An asset with a known answer that is mixed into batches to measure worker
+# accuracy, see parkme.turk.gold
+GoldAsset = collections.namedtuple(
+    'GoldAsset',
+    ['asset_id',
+     'params',
+     'answer'])
+
+# Whether a worker answered a gold asset correctly in an assignment
+GoldResult = collections.namedtuple(
+    'GoldResult',
+    ['assignment_id',
+     'worker_id',
+     'asset_id',
+     'correct'])
+
+# Running accuracy of a worker on gold assets
+WorkerAccuracy = collections.namedtuple(
+    'WorkerAccuracy',
+    ['worker_id',
+     'num_gold',
+     'num_correct',
+     'updated_at'])
+
+# A change to a lot's rates made from the consensus of a HIT
+RateChange = collections.namedtuple(
+    'RateChange',
+    ['lot_id',
+     'hit_id',
+     'old_rates',
+     'new_rates'])
+
+# The raw answers of a rate transcription assignment, kept so they can be
+# parsed again when the grammar improves
+Transcription = collections.namedtuple(
+    'Transcription',
+    ['assignment_id',
+     'hit_id',
+     'worker_id',
+     'lot_id',
+     'rates',
+     'does_not_contain_rates',
+     'work_seconds'])
+
+
+def get_rate_lines(rates):
+    """Return the non-empty lines of transcribed rates.
+
+    :param rates: Rates separated by CRLF, as answered by workers
+    :type rates: str or unicode or None
+    :rtype: list of str or unicode
+    """
+    return filter(None, [
+        each.strip() for each in (rates or '').split('\r\n')])
+
 
 class BaseDataGateway(object):
     """Represents the base class for data gateways"""
 
+    # SQLite limits the number of host parameters in a single statement
+    _MAX_PARAMS_PER_QUERY = 500
+
     def __init__(self, dbfile):
         """Create a new rates table instance with the given dbfile.
 
@@ -39,6 +126,39 @@ class BaseDataGateway(object):
         """Cleanup resources"""
         self.dbconn.close()
 
+    def _select_in(self, query, values, params=(), value_sql='?',
+                   separator=', '):
+        """Generator running the given query for chunks of the given values,
+        yielding every result row.
+
+        :param query: A query with a {} placeholder for the values
+        :type query: str
+        :param values: An iterable of values, or of tuples of values if
+            value_sql has several parameters
+        :type values: iterable
+        :param params: (Optional) Parameters preceding the values
+        :type params: tuple
+        :param value_sql: The SQL matching a single value
+        :type value_sql: str
+        :param separator: The SQL joining the value_sql of each value
+        :type separator: str
+        :rtype: iterable of tuple
+        """
+        values = list(set(values))
+        num_value_params = value_sql.count('?')
+        chunk_size = self._MAX_PARAMS_PER_QUERY // num_value_params
+        cursor = self.dbconn.cursor()
+        for start in xrange(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            if num_value_params > 1:
+                chunk = [each for value in chunk for each in value]
+            cursor.execute(
+                query.format(separator.join(
+                    [value_sql] * (len(chunk) // num_value_params))),
+                list(params) + chunk)
+            for result in cursor:
+                yield result
+
 
 class CategorizationBatchDataGateway(BaseDataGateway):
     """Gateway to table containing data categorization batches"""
@@ -125,3 +245,735 @@ class CategorizationBatchDataGateway(BaseDataGateway):
             created_at=localized_created_at,
             num_photos=raw_result[3],
             is_finished=bool(raw_result[4]))
+
+
+class WorkerStatsDataGateway(BaseDataGateway):
+    """Gateway to table containing running statistics for each worker"""
+
+    def create_table(self):
+        """Create the tables if they do not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS worker_stats
+        (worker_id TEXT PRIMARY KEY,
+        num_assignments INTEGER,
+        num_agreed INTEGER,
+        total_work_seconds NUMERIC,
+        updated_at NUMERIC)
+        ''')
+        # Assignments recorded before results were keyed by asset, whose
+        # results are all ignored
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS worker_stats_assignment
+        (assignment_id TEXT PRIMARY KEY,
+        worker_id TEXT)
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS worker_stats_answer
+        (assignment_id TEXT,
+        asset_id TEXT,
+        worker_id TEXT,
+        PRIMARY KEY (assignment_id, asset_id))
+        ''')
+
+    def record_results(self, worker_results):
+        """Incrementally update worker statistics with the given results in a
+        single transaction. Results that have already been recorded are
+        ignored, so re-processing a batch is safe. The items split from a
+        bundled assignment are each recorded, told apart by their asset.
+
+        :param worker_results: An iterable of worker results
+        :type worker_results: iterable of parkme.models.WorkerResult
+        :return: The number of newly recorded results
+        :rtype: int
+        """
+        cursor = self.dbconn.cursor()
+        deltas = collections.defaultdict(lambda: [0, 0, 0.0])
+        for result in worker_results:
+            # An empty asset id rather than NULL, which never conflicts
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO worker_stats_answer
+                SELECT ?, ?, ? WHERE NOT EXISTS (
+                    SELECT 1 FROM worker_stats_assignment
+                    WHERE assignment_id = ?)
+                """,
+                (result.assignment_id, result.asset_id or '',
+                 result.worker_id, result.assignment_id))
+            if cursor.rowcount != 1:
+                continue
+            delta = deltas[result.worker_id]
+            delta[0] += 1
+            delta[1] += 1 if result.agreed else 0
+            delta[2] += result.work_seconds or 0.0
+
+        now = misc.datetime_to_microtime(datetime.datetime.utcnow())
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO worker_stats VALUES (?, 0, 0, 0, ?)
+            """,
+            [(worker_id, now) for worker_id in deltas])
+        cursor.executemany(
+            """
+            UPDATE worker_stats SET
+            num_assignments=num_assignments + ?,
+            num_agreed=num_agreed + ?,
+            total_work_seconds=total_work_seconds + ?,
+            updated_at=?
+            WHERE worker_id=?
+            """,
+            [(num_assignments, num_agreed, work_seconds, now, worker_id)
+             for worker_id, (num_assignments, num_agreed, work_seconds)
+             in deltas.iteritems()])
+        self.dbconn.commit()
+        return sum(delta[0] for delta in deltas.itervalues())
+
+    def get_by_worker_ids(self, worker_ids):
+        """Return the statistics for each of the given workers. Workers
+        without any recorded results are omitted.
+
+        :param worker_ids: An iterable of worker ids
+        :type worker_ids: iterable of str or unicode
+        :rtype: dict of worker id to parkme.models.WorkerStats
+        """
+        results = {}
+        for result in self._select_in(
+                """
+                SELECT * FROM worker_stats WHERE worker_id IN ({})
+                """,
+                worker_ids):
+            worker_stats = self._raw_result_to_worker_stats_obj(result)
+            results[worker_stats.worker_id] = worker_stats
+        return results
+
+    def get_all(self):
+        """Return the statistics for all workers.
+
+        :rtype: list of parkme.models.WorkerStats
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute('SELECT * FROM worker_stats ORDER BY worker_id')
+        return [self._raw_result_to_worker_stats_obj(result)
+                for result in cursor]
+
+    def _raw_result_to_worker_stats_obj(self, raw_result):
+        """Convert a raw result from the database into a worker stats object.
+
+        :param raw_result: A raw result
+        :type raw_result: tuple
+        :rtype: parkme.models.WorkerStats
+        """
+        return WorkerStats(
+            worker_id=raw_result[0],
+            num_assignments=raw_result[1],
+            num_agreed=raw_result[2],
+            total_work_seconds=raw_result[3],
+            updated_at=pytz.utc.localize(
+                misc.microtime_to_datetime(raw_result[4])))
+
+
+class AssetDuplicateDataGateway(BaseDataGateway):
+    """Gateway to table mapping assets that were not uploaded, for
+    categorization or to be compared for photo changes, to the duplicate
+    asset whose HIT covers them"""
+
+    def create_table(self):
+        """Create the table if it does not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS asset_duplicate
+        (duplicate_asset_id TEXT PRIMARY KEY,
+        original_asset_id TEXT,
+        batch_id TEXT)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS asset_duplicate_original_asset_id
+        ON asset_duplicate (original_asset_id)
+        ''')
+
+    def save_all(self, batch_id, duplicate_to_original):
+        """Record the original of each duplicate asset in the given batch.
+
+        :param batch_id: A batch id
+        :type batch_id: str or unicode
+        :param duplicate_to_original: Original asset id of each duplicate
+        :type duplicate_to_original: dict of str to str
+        """
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO asset_duplicate VALUES (?, ?, ?)
+            """,
+            [(duplicate_asset_id, original_asset_id, batch_id)
+             for duplicate_asset_id, original_asset_id
+             in duplicate_to_original.iteritems()])
+        self.dbconn.commit()
+
+    def get_by_original_asset_ids(self, original_asset_ids):
+        """Return the duplicates of each of the given assets. Assets without
+        duplicates are omitted.
+
+        :param original_asset_ids: An iterable of asset ids
+        :type original_asset_ids: iterable of str or unicode
+        :rtype: dict of asset id to list of asset ids
+        """
+        results = collections.defaultdict(list)
+        for original_asset_id, duplicate_asset_id in self._select_in(
+                """
+                SELECT original_asset_id, duplicate_asset_id
+                FROM asset_duplicate WHERE original_asset_id IN ({})
+                """,
+                original_asset_ids):
+            results[original_asset_id].append(duplicate_asset_id)
+        return dict(results)
+
+
+class WorkQueueDataGateway(BaseDataGateway):
+    """Gateway to table containing prioritized work items waiting to be
+    uploaded as HITs"""
+
+    def create_table(self):
+        """Create the table if it does not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_item
+        (work_item_id TEXT,
+        queue_name TEXT,
+        priority REAL,
+        params TEXT,
+        enqueued_at NUMERIC,
+        hit_id TEXT,
+        uploaded_at NUMERIC,
+        PRIMARY KEY (queue_name, work_item_id))
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS work_item_pending
+        ON work_item (queue_name, uploaded_at, priority)
+        ''')
+
+    def push_all(self, queue_name, items):
+        """Add the given items to the queue with the given name in a single
+        transaction. Items already waiting in the queue have their priority
+        updated and items that were already uploaded are ignored.
+
+        :param queue_name: The queue name
+        :type queue_name: str or unicode
+        :param items: An iterable of (work item id, priority, params)
+        :type items: iterable of tuple
+        :return: The number of newly added items
+        :rtype: int
+        """
+        cursor = self.dbconn.cursor()
+        now = misc.datetime_to_microtime(datetime.datetime.utcnow())
+        num_added = 0
+        for work_item_id, priority, params in items:
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO work_item
+                VALUES (?, ?, ?, ?, ?, NULL, NULL)
+                """,
+                (work_item_id, queue_name, priority, json.dumps(params), now))
+            if cursor.rowcount == 1:
+                num_added += 1
+                continue
+            cursor.execute(
+                """
+                UPDATE work_item SET priority=?
+                WHERE queue_name=? AND work_item_id=? AND uploaded_at IS NULL
+                """,
+                (priority, queue_name, work_item_id))
+        self.dbconn.commit()
+        return num_added
+
+    def get_next(self, queue_name, limit):
+        """Return the highest priority items waiting in the queue with the
+        given name, oldest first among equal priorities.
+
+        :param queue_name: The queue name
+        :type queue_name: str or unicode
+        :param limit: Most items to return
+        :type limit: int
+        :rtype: list of parkme.models.WorkItem
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            SELECT work_item_id, queue_name, priority, params, enqueued_at
+            FROM work_item WHERE queue_name=? AND uploaded_at IS NULL
+            ORDER BY priority DESC, enqueued_at LIMIT ?
+            """,
+            (queue_name, limit))
+        return [self._raw_result_to_work_item_obj(result)
+                for result in cursor]
+
+    def mark_uploaded(self, queue_name, work_item_ids, hit_id):
+        """Record that the given items were uploaded as the HIT with the
+        given ID, removing them from the queue.
+
+        :param queue_name: The queue name
+        :type queue_name: str or unicode
+        :param work_item_ids: The work item ids
+        :type work_item_ids: list of str or unicode
+        :param hit_id: The HIT ID
+        :type hit_id: str or unicode
+        """
+        now = misc.datetime_to_microtime(datetime.datetime.utcnow())
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            UPDATE work_item SET hit_id=?, uploaded_at=?
+            WHERE queue_name=? AND work_item_id=?
+            """,
+            [(hit_id, now, queue_name, work_item_id)
+             for work_item_id in work_item_ids])
+        self.dbconn.commit()
+
+    def count_pending(self, queue_name):
+        """Return the number of items waiting in the queue with the given
+        name.
+
+        :param queue_name: The queue name
+        :type queue_name: str or unicode
+        :rtype: int
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            SELECT COUNT(*) FROM work_item
+            WHERE queue_name=? AND uploaded_at IS NULL
+            """,
+            (queue_name,))
+        return cursor.fetchone()[0]
+
+    def _raw_result_to_work_item_obj(self, raw_result):
+        """Convert a raw result from the database into a work item.
+
+        :param raw_result: A raw result
+        :type raw_result: tuple
+        :rtype: parkme.models.WorkItem
+        """
+        return WorkItem(
+            work_item_id=raw_result[0],
+            queue_name=raw_result[1],
+            priority=raw_result[2],
+            params=json.loads(raw_result[3]),
+            enqueued_at=pytz.utc.localize(
+                misc.microtime_to_datetime(raw_result[4])))
+
+
+class GoldAssetDataGateway(BaseDataGateway):
+    """Gateway to table containing gold assets with known answers for each
+    kind of task"""
+
+    def create_table(self):
+        """Create the table if it does not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS gold_asset
+        (task TEXT,
+        asset_id TEXT,
+        params TEXT,
+        answer TEXT,
+        PRIMARY KEY (task, asset_id))
+        ''')
+
+    def save_all(self, task, gold_assets):
+        """Save the given gold assets for the given task, replacing any with
+        the same asset ids.
+
+        :param task: The task, eg. categorization
+        :type task: str or unicode
+        :param gold_assets: An iterable of gold assets
+        :type gold_assets: iterable of parkme.models.GoldAsset
+        """
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO gold_asset VALUES (?, ?, ?, ?)
+            """,
+            [(task, each.asset_id, json.dumps(each.params),
+              json.dumps(each.answer))
+             for each in gold_assets])
+        self.dbconn.commit()
+
+    def get_all(self, task):
+        """Return all of the gold assets for the given task.
+
+        :param task: The task, eg. categorization
+        :type task: str or unicode
+        :rtype: list of parkme.models.GoldAsset
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            SELECT asset_id, params, answer FROM gold_asset
+            WHERE task=? ORDER BY asset_id
+            """,
+            (task,))
+        return [self._raw_result_to_gold_asset_obj(result)
+                for result in cursor]
+
+    def get_by_asset_ids(self, task, asset_ids):
+        """Return the gold assets among the given assets for the given task.
+
+        :param task: The task, eg. categorization
+        :type task: str or unicode
+        :param asset_ids: An iterable of asset ids
+        :type asset_ids: iterable of str or unicode
+        :rtype: dict of asset id to parkme.models.GoldAsset
+        """
+        results = {}
+        for result in self._select_in(
+                """
+                SELECT asset_id, params, answer FROM gold_asset
+                WHERE task=? AND asset_id IN ({})
+                """,
+                asset_ids,
+                params=(task,)):
+            gold_asset = self._raw_result_to_gold_asset_obj(result)
+            results[gold_asset.asset_id] = gold_asset
+        return results
+
+    def _raw_result_to_gold_asset_obj(self, raw_result):
+        """Convert a raw result from the database into a gold asset.
+
+        :param raw_result: A raw result
+        :type raw_result: tuple
+        :rtype: parkme.models.GoldAsset
+        """
+        return GoldAsset(
+            asset_id=raw_result[0],
+            params=json.loads(raw_result[1]),
+            answer=json.loads(raw_result[2]))
+
+
+class WorkerAccuracyDataGateway(BaseDataGateway):
+    """Gateway to table containing each worker's running accuracy on gold
+    assets"""
+
+    def create_table(self):
+        """Create the tables if they do not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS worker_accuracy
+        (worker_id TEXT PRIMARY KEY,
+        num_gold INTEGER,
+        num_correct INTEGER,
+        updated_at NUMERIC)
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS worker_accuracy_answer
+        (assignment_id TEXT,
+        asset_id TEXT,
+        worker_id TEXT,
+        PRIMARY KEY (assignment_id, asset_id))
+        ''')
+
+    def record_results(self, gold_results):
+        """Incrementally update worker accuracy with the given results in a
+        single transaction. Results that have already been recorded are
+        ignored, so re-processing a batch is safe.
+
+        :param gold_results: An iterable of gold results
+        :type gold_results: iterable of parkme.models.GoldResult
+        :return: The number of newly recorded results
+        :rtype: int
+        """
+        cursor = self.dbconn.cursor()
+        deltas = collections.defaultdict(lambda: [0, 0])
+        for result in gold_results:
+            cursor.execute(
+                """
+                INSERT OR IGNORE INTO worker_accuracy_answer
+                VALUES (?, ?, ?)
+                """,
+                (result.assignment_id, result.asset_id, result.worker_id))
+            if cursor.rowcount != 1:
+                continue
+            delta = deltas[result.worker_id]
+            delta[0] += 1
+            delta[1] += 1 if result.correct else 0
+
+        now = misc.datetime_to_microtime(datetime.datetime.utcnow())
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO worker_accuracy VALUES (?, 0, 0, ?)
+            """,
+            [(worker_id, now) for worker_id in deltas])
+        cursor.executemany(
+            """
+            UPDATE worker_accuracy SET
+            num_gold=num_gold + ?,
+            num_correct=num_correct + ?,
+            updated_at=?
+            WHERE worker_id=?
+            """,
+            [(num_gold, num_correct, now, worker_id)
+             for worker_id, (num_gold, num_correct) in deltas.iteritems()])
+        self.dbconn.commit()
+        return sum(delta[0] for delta in deltas.itervalues())
+
+    def get_by_worker_ids(self, worker_ids):
+        """Return the gold accuracy of each of the given workers. Workers
+        without any gold results are omitted.
+
+        :param worker_ids: An iterable of worker ids
+        :type worker_ids: iterable of str or unicode
+        :rtype: dict of worker id to parkme.models.WorkerAccuracy
+        """
+        results = {}
+        for result in self._select_in(
+                """
+                SELECT * FROM worker_accuracy WHERE worker_id IN ({})
+                """,
+                worker_ids):
+            worker_accuracy = WorkerAccuracy(
+                worker_id=result[0],
+                num_gold=result[1],
+                num_correct=result[2],
+                updated_at=pytz.utc.localize(
+                    misc.microtime_to_datetime(result[3])))
+            results[worker_accuracy.worker_id] = worker_accuracy
+        return results
+
+
+class RateAuditDataGateway(BaseDataGateway):
+    """Gateway to table auditing the changes made to lot rates"""
+
+    def create_table(self):
+        """Create the table if it does not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_audit
+        (lot_id TEXT,
+        hit_id TEXT,
+        old_rates TEXT,
+        new_rates TEXT,
+        changed_at NUMERIC)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS rate_audit_lot_id ON rate_audit (lot_id)
+        ''')
+
+    def record_changes(self, rate_changes):
+        """Record the given rate changes.
+
+        :param rate_changes: An iterable of rate changes
+        :type rate_changes: iterable of parkme.models.RateChange
+        """
+        now = misc.datetime_to_microtime(datetime.datetime.utcnow())
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            INSERT INTO rate_audit VALUES (?, ?, ?, ?, ?)
+            """,
+            [(each.lot_id, each.hit_id, each.old_rates, each.new_rates, now)
+             for each in rate_changes])
+        self.dbconn.commit()
+
+    def get_by_lot_id(self, lot_id):
+        """Return the changes made to the rates of the given lot, oldest
+        first.
+
+        :param lot_id: A lot id
+        :type lot_id: str or unicode or int
+        :rtype: list of parkme.models.RateChange
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            SELECT lot_id, hit_id, old_rates, new_rates FROM rate_audit
+            WHERE lot_id=? ORDER BY changed_at, rowid
+            """,
+            (lot_id,))
+        return [RateChange(*result) for result in cursor]
+
+
+class TranscriptionDataGateway(BaseDataGateway):
+    """Gateway to tables storing rate transcriptions, whether each of their
+    lines parsed with the grammar version it was last parsed with and the
+    outcome of each HIT"""
+
+    def create_table(self):
+        """Create the tables if they do not already exist"""
+        cursor = self.dbconn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_transcription
+        (assignment_id TEXT PRIMARY KEY,
+        hit_id TEXT,
+        worker_id TEXT,
+        lot_id TEXT,
+        rates TEXT,
+        does_not_contain_rates NUMERIC,
+        work_seconds NUMERIC)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS rate_transcription_hit_id
+        ON rate_transcription (hit_id)
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_transcription_line
+        (line TEXT,
+        hit_id TEXT,
+        PRIMARY KEY (line, hit_id))
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_line_result
+        (line TEXT PRIMARY KEY,
+        grammar_version INTEGER,
+        parsed NUMERIC)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS rate_line_result_failed
+        ON rate_line_result (parsed, grammar_version)
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rate_hit_outcome
+        (hit_id TEXT PRIMARY KEY,
+        outcome TEXT,
+        grammar_version INTEGER)
+        ''')
+
+    def save_all(self, transcriptions):
+        """Save the given transcriptions, replacing any with the same
+        assignment ids, and index the HITs by the lines transcribed.
+
+        :param transcriptions: An iterable of transcriptions
+        :type transcriptions: iterable of parkme.models.Transcription
+        """
+        transcriptions = list(transcriptions)
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO rate_transcription
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(each.assignment_id, each.hit_id, each.worker_id, each.lot_id,
+              each.rates, 1 if each.does_not_contain_rates else 0,
+              each.work_seconds)
+             for each in transcriptions])
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO rate_transcription_line VALUES (?, ?)
+            """,
+            [(line, each.hit_id)
+             for each in transcriptions
+             for line in get_rate_lines(each.rates)])
+        self.dbconn.commit()
+
+    def get_by_hit_ids(self, hit_ids):
+        """Return the transcriptions of each of the given HITs.
+
+        :param hit_ids: An iterable of HIT ids
+        :type hit_ids: iterable of str or unicode
+        :rtype: dict of HIT id to list of parkme.models.Transcription
+        """
+        results = collections.defaultdict(list)
+        for result in self._select_in(
+                """
+                SELECT * FROM rate_transcription WHERE hit_id IN ({})
+                ORDER BY hit_id, assignment_id
+                """,
+                hit_ids):
+            transcription = Transcription(
+                assignment_id=result[0],
+                hit_id=result[1],
+                worker_id=result[2],
+                lot_id=result[3],
+                rates=result[4],
+                does_not_contain_rates=bool(result[5]),
+                work_seconds=result[6])
+            results[transcription.hit_id].append(transcription)
+        return dict(results)
+
+    def get_hit_ids_by_lines(self, lines):
+        """Return the HITs with any of the given lines transcribed.
+
+        :param lines: An iterable of rate lines
+        :type lines: iterable of str or unicode
+        :rtype: set of str or unicode
+        """
+        return set(
+            result[0]
+            for result in self._select_in(
+                """
+                SELECT DISTINCT hit_id FROM rate_transcription_line
+                WHERE line IN ({})
+                """,
+                lines))
+
+    def record_line_results(self, grammar_version, line_results,
+                            overwrite=False):
+        """Record whether each line parsed with the given grammar version.
+        Lines already recorded are kept unless overwriting, so that a line
+        that failed with an older grammar is still found by get_failed_lines
+        after it is transcribed again.
+
+        :param grammar_version: The grammar version the lines were parsed
+            with, see parkme.ratecard.grammar.GRAMMAR_VERSION
+        :type grammar_version: int
+        :param line_results: Whether each line parsed
+        :type line_results: dict of str or unicode to bool
+        :param overwrite: Whether to replace lines already recorded
+        :type overwrite: bool
+        """
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            INSERT OR {} INTO rate_line_result VALUES (?, ?, ?)
+            """.format('REPLACE' if overwrite else 'IGNORE'),
+            [(line, grammar_version, 1 if parsed else 0)
+             for line, parsed in line_results.iteritems()])
+        self.dbconn.commit()
+
+    def get_failed_lines(self, before_grammar_version):
+        """Return the lines that failed to parse when last parsed with a
+        grammar older than the given version.
+
+        :param before_grammar_version: The current grammar version
+        :type before_grammar_version: int
+        :rtype: list of str or unicode
+        """
+        cursor = self.dbconn.cursor()
+        cursor.execute(
+            """
+            SELECT line FROM rate_line_result
+            WHERE parsed=0 AND grammar_version<? ORDER BY line
+            """,
+            (before_grammar_version,))
+        return [result[0] for result in cursor]
+
+    def save_outcomes(self, grammar_version, outcomes):
+        """Save the outcome of evaluating each HIT with the given grammar
+        version.
+
+        :param grammar_version: The grammar version used
+        :type grammar_version: int
+        :param outcomes: The outcome of each HIT
+        :type outcomes: dict of HIT id to str
+        """
+        cursor = self.dbconn.cursor()
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO rate_hit_outcome VALUES (?, ?, ?)
+            """,
+            [(hit_id, outcome, grammar_version)
+             for hit_id, outcome in outcomes.iteritems()])
+        self.dbconn.commit()
+
+    def get_outcomes(self, hit_ids):
+        """Return the last outcome saved for each of the given HITs. HITs
+        without an outcome are omitted.
+
+        :param hit_ids: An iterable of HIT ids
+        :type hit_ids: iterable of str or unicode
+        :rtype: dict of HIT id to str
+        """
+        return dict(
+            (result[0], result[1])
+            for result in self._select_in(
+                """
+                SELECT hit_id, outcome FROM rate_hit_outcome
+                WHERE hit_id IN ({})
+                """,
+                hit_ids))
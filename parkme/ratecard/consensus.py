@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.ratecard.consensus
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+    Fuzzy consensus between rate card transcriptions. Each transcription is
+    reduced to the set of distinct rate records it describes, so line order,
+    price formatting and repeated lines don't matter, and two transcriptions
+    agree when the sets are similar enough. The consensus rates are those
+    transcribed by at least two of the agreeing workers. When only two agree,
+    a rate one of them missed is kept as long as the other didn't transcribe
+    a different price for it.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import itertools
+
+
+# Lowest similarity at which two transcriptions agree. Allows one rate of
+# five to be missed. A rate transcribed differently is missing from both, so
+# one is only allowed from nine rates, eg. 4 shared of 6 distinct is 0.67.
+SIMILARITY_THRESHOLD = 0.8
+
+# Number of agreeing transcriptions a rate must be in to be kept
+MIN_AGREEING = 2
+
+
+def canonicalize(records):
+    """Return the canonical form of a transcription, the set of distinct
+    rates it describes.
+
+    :param records: The rate records of a transcription
+    :type records: iterable of parkme.ratecard.records.RateRecord
+    :rtype: frozenset of parkme.ratecard.records.RateRecord
+    """
+    return frozenset(records)
+
+
+def get_similarity(lhs, rhs):
+    """Return the Jaccard similarity of two canonical transcriptions.
+
+    :param lhs: A canonical transcription
+    :type lhs: frozenset
+    :param rhs: Another canonical transcription
+    :type rhs: frozenset
+    :rtype: float
+    """
+    if lhs == rhs:
+        return 1.0
+    num_shared = len(lhs & rhs)
+    return float(num_shared) / (len(lhs) + len(rhs) - num_shared)
+
+
+def is_similar(lhs, rhs, threshold=SIMILARITY_THRESHOLD):
+    """Indicate whether two transcriptions agree.
+
+    :param lhs: A transcription, or None if it couldn't be parsed
+    :type lhs: iterable of parkme.ratecard.records.RateRecord or None
+    :param rhs: Another transcription, or None if it couldn't be parsed
+    :type rhs: iterable of parkme.ratecard.records.RateRecord or None
+    :param threshold: Lowest similarity at which they agree
+    :type threshold: float
+    :rtype: bool
+    """
+    if not lhs or not rhs:
+        return False
+    return get_similarity(canonicalize(lhs), canonicalize(rhs)) >= threshold
+
+
+def get_agreeing_pairs(transcriptions, threshold=SIMILARITY_THRESHOLD):
+    """Return the index of each pair of transcriptions that agree. Each
+    transcription is canonicalized once, and identical ones are compared
+    once, so all pairs are scored cheaply.
+
+    :param transcriptions: The rate records of each transcription
+    :type transcriptions: list of list of parkme.ratecard.records.RateRecord
+    :param threshold: Lowest similarity at which two agree
+    :type threshold: float
+    :rtype: list of tuple of (int, int)
+    """
+    indexes_by_form = collections.OrderedDict()
+    for index, each in enumerate(transcriptions):
+        if each:
+            indexes_by_form.setdefault(canonicalize(each), []).append(index)
+
+    pairs = []
+    for indexes in indexes_by_form.itervalues():
+        pairs.extend(itertools.combinations(indexes, 2))
+    for (lhs, lhs_indexes), (rhs, rhs_indexes) in itertools.combinations(
+            indexes_by_form.iteritems(), 2):
+        if get_similarity(lhs, rhs) >= threshold:
+            pairs.extend(itertools.product(lhs_indexes, rhs_indexes))
+    return sorted(tuple(sorted(each)) for each in pairs)
+
+
+def get_consensus_records(transcriptions,
+                          threshold=SIMILARITY_THRESHOLD,
+                          min_agreeing=MIN_AGREEING):
+    """Return the rates transcribed by enough of the transcriptions that
+    agree with another, in the order they were first transcribed. When no
+    more than min_agreeing transcriptions agree, requiring min_agreeing would
+    drop any rate one of them missed, so a rate in fewer is kept unless
+    another of them has a rate with the same slot and a different price.
+
+    :param transcriptions: The rate records of each transcription
+    :type transcriptions: list of list of parkme.ratecard.records.RateRecord
+    :param threshold: Lowest similarity at which two agree
+    :type threshold: float
+    :param min_agreeing: Number of agreeing transcriptions a rate must be in
+    :type min_agreeing: int
+    :return: The consensus rates, or None without agreement
+    :rtype: list of parkme.ratecard.records.RateRecord or None
+    """
+    agreeing = sorted(set(itertools.chain.from_iterable(
+        get_agreeing_pairs(transcriptions, threshold))))
+    if not agreeing:
+        return None
+
+    counts = collections.Counter()
+    for index in agreeing:
+        counts.update(canonicalize(transcriptions[index]))
+    slots = {
+        index: set(each.slot for each in transcriptions[index])
+        for index in agreeing}
+    consensus = []
+    for index in agreeing:
+        for record in transcriptions[index]:
+            if record in consensus:
+                continue
+            is_uncontested = len(agreeing) <= min_agreeing and not any(
+                record.slot in slots[other]
+                for other in agreeing if other != index)
+            if counts[record] >= min_agreeing or is_uncontested:
+                consensus.append(record)
+    return consensus or None
+
+
+def get_weighted_consensus_records(transcriptions,
+                                   weights,
+                                   required_weight,
+                                   threshold=SIMILARITY_THRESHOLD):
+    """Return the consensus rates of the transcription with the most support,
+    the summed weight of its worker and the workers agreeing with it, if that
+    is enough. Agreement is the same as for get_consensus_records.
+
+    :param transcriptions: The rate records of each transcription
+    :type transcriptions: list of list of parkme.ratecard.records.RateRecord
+    :param weights: The weight of each transcription's worker
+    :type weights: list of float
+    :param required_weight: Summed weight required for consensus
+    :type required_weight: float
+    :param threshold: Lowest similarity at which two agree
+    :type threshold: float
+    :return: The consensus rates, or None without enough support
+    :rtype: list of parkme.ratecard.records.RateRecord or None
+    """
+    supporters = collections.OrderedDict(
+        (index, [index]) for index, each in enumerate(transcriptions) if each)
+    for lhs, rhs in get_agreeing_pairs(transcriptions, threshold):
+        supporters[lhs].append(rhs)
+        supporters[rhs].append(lhs)
+    if not supporters:
+        return None
+
+    def get_support(index):
+        return sum(weights[each] for each in supporters[index])
+
+    # max keeps the first transcribed of equally supported transcriptions
+    best = max(supporters, key=get_support)
+    if len(supporters[best]) < 2 or get_support(best) < required_weight:
+        return None
+    return get_consensus_records(
+        [transcriptions[index] for index in sorted(supporters[best])],
+        threshold)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.ratecard.corpus
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Regression checks for the rate card grammar against a corpus of rate
+    lines transcribed by workers. The lines of any number of Mechanical Turk
+    result CSV files are deduplicated into a corpus, the output and parse
+    time of each line is snapshotted, and a snapshot taken after a grammar
+    change is compared with one taken before it.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import csv
+import json
+import time
+
+from parkme.ratecard import parser
+
+
+# Column of the rates in Mechanical Turk result CSV files
+RATES_COLUMN = 'Answer.Rates'
+
+# Times each line is parsed when snapshotting, keeping the fastest
+REPEAT = 5
+
+# Largest allowed increase in total parse time, as a fraction of the old
+MAX_SLOWDOWN = 0.25
+
+# Increases in total parse time smaller than this are timing noise
+MIN_SLOWDOWN_SECONDS = 0.01
+
+# The output of a single line. output is the ParkMe format text, empty for
+# lines that only hold notes, or None if the line was rejected. seconds is
+# the fastest of the parses timed.
+LineResult = collections.namedtuple(
+    'LineResult',
+    ['output',
+     'notes',
+     'seconds'])
+
+# The differences between two snapshots, as lists of lines
+SnapshotDiff = collections.namedtuple(
+    'SnapshotDiff',
+    ['fixed',
+     'broken',
+     'changed',
+     'new',
+     'old_seconds',
+     'new_seconds'])
+
+
+def load_corpus(csv_paths, column=RATES_COLUMN):
+    """Return the distinct rate lines of the given result files, in the
+    order they first appear.
+
+    :param csv_paths: Paths to Mechanical Turk result CSV files
+    :type csv_paths: list of str or unicode
+    :param column: The column holding the rates
+    :type column: str
+    :rtype: list of unicode
+    """
+    lines = collections.OrderedDict()
+    for csv_path in csv_paths:
+        with open(csv_path, 'rb') as csv_file:
+            for row in csv.DictReader(csv_file):
+                rates = (row.get(column) or '').decode('utf-8')
+                for each in rates.splitlines():
+                    each = each.strip()
+                    if each:
+                        lines[each] = None
+    return lines.keys()
+
+
+def parse_line(line, repeat=REPEAT, clock=time.time):
+    """Parse a line, timing the fastest of several parses.
+
+    :param line: A single text line
+    :type line: str or unicode
+    :param repeat: Number of times the line is parsed
+    :type repeat: int
+    :param clock: Returns the current time in seconds
+    :type clock: callable
+    :rtype: LineResult
+    """
+    fastest = None
+    for _ in range(repeat):
+        parser.clear_user_visible_notes()
+        start = clock()
+        output = parser.parse_or_reject_line(line)
+        seconds = clock() - start
+        fastest = seconds if fastest is None else min(fastest, seconds)
+    return LineResult(
+        output=None if output is False else output,
+        notes=list(parser.get_user_visible_notes()),
+        seconds=fastest)
+
+
+def take_snapshot(lines, repeat=REPEAT, clock=time.time):
+    """Parse every line of a corpus.
+
+    :param lines: The corpus
+    :type lines: list of str
+    :param repeat: Number of times each line is parsed
+    :type repeat: int
+    :param clock: Returns the current time in seconds
+    :type clock: callable
+    :rtype: dict of str to LineResult
+    """
+    return collections.OrderedDict(
+        (each, parse_line(each, repeat, clock)) for each in lines)
+
+
+def save_snapshot(snapshot, file_path):
+    """Write a snapshot to a JSON file.
+
+    :param snapshot: The snapshot
+    :type snapshot: dict of str to LineResult
+    :param file_path: The path to the file
+    :type file_path: str or unicode
+    """
+    with open(file_path, 'w') as snapshot_file:
+        json.dump(
+            [[line] + list(result) for line, result in snapshot.iteritems()],
+            snapshot_file,
+            indent=1)
+
+
+def load_snapshot(file_path):
+    """Read a snapshot written by save_snapshot.
+
+    :param file_path: The path to the file
+    :type file_path: str or unicode
+    :rtype: dict of str to LineResult
+    """
+    with open(file_path, 'r') as snapshot_file:
+        return collections.OrderedDict(
+            (each[0], LineResult(*each[1:]))
+            for each in json.load(snapshot_file))
+
+
+def diff_snapshots(old, new):
+    """Compare the outputs and parse times of two snapshots. Only lines in
+    both are timed, so growing the corpus doesn't count as a slowdown.
+
+    :param old: The snapshot taken before a change
+    :type old: dict of str to LineResult
+    :param new: The snapshot taken after it
+    :type new: dict of str to LineResult
+    :rtype: SnapshotDiff
+    """
+    fixed, broken, changed, new_lines = [], [], [], []
+    old_seconds = new_seconds = 0.0
+    for line, result in new.iteritems():
+        if line not in old:
+            new_lines.append(line)
+            continue
+        old_result = old[line]
+        old_seconds += old_result.seconds
+        new_seconds += result.seconds
+        if old_result.output is None and result.output is not None:
+            fixed.append(line)
+        elif old_result.output is not None and result.output is None:
+            broken.append(line)
+        elif (old_result.output, old_result.notes) != (
+                result.output, result.notes):
+            changed.append(line)
+    return SnapshotDiff(
+        fixed=fixed,
+        broken=broken,
+        changed=changed,
+        new=new_lines,
+        old_seconds=old_seconds,
+        new_seconds=new_seconds)
+
+
+def get_regressions(snapshot_diff, max_slowdown=MAX_SLOWDOWN):
+    """Return a description of each regression in a snapshot diff: lines
+    no longer parsed, lines parsed differently and slower parsing. Tiny
+    increases in parse time are ignored, see MIN_SLOWDOWN_SECONDS.
+
+    :param snapshot_diff: The differences between two snapshots
+    :type snapshot_diff: SnapshotDiff
+    :param max_slowdown: Largest allowed increase in total parse time
+    :type max_slowdown: float
+    :rtype: list of str
+    """
+    regressions = []
+    if snapshot_diff.broken:
+        regressions.append(
+            '{} lines no longer parse'.format(len(snapshot_diff.broken)))
+    if snapshot_diff.changed:
+        regressions.append(
+            '{} lines parse differently'.format(len(snapshot_diff.changed)))
+    slowdown = snapshot_diff.new_seconds - snapshot_diff.old_seconds
+    if (slowdown > snapshot_diff.old_seconds * max_slowdown and
+            slowdown > MIN_SLOWDOWN_SECONDS):
+        regressions.append('Parsing took {:.3f}s, was {:.3f}s'.format(
+            snapshot_diff.new_seconds, snapshot_diff.old_seconds))
+    return regressions
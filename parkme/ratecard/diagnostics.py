@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.ratecard.diagnostics
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Diagnoses rate card lines the grammar rejects. Each failure records where
+    parsing stopped, what was expected there and the rate type that parsed
+    furthest into the line, and failures are counted across a batch so the
+    grammar can be improved where it rejects the most assignments.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+
+import pyparsing
+
+from parkme.ratecard import grammar
+
+
+# Why a single line failed to parse. column is 1-based, expected is the
+# pyparsing message, eg. 'Expected W:($)', and closest_rate_type the name of
+# the rate type parsing furthest into the line, see grammar.RATE_TYPE_NAMES.
+ParseFailure = collections.namedtuple(
+    'ParseFailure',
+    ['line',
+     'column',
+     'expected',
+     'closest_rate_type'])
+
+# A row of the failure table, the failures with the same closest rate type
+# and expectation
+FailureCount = collections.namedtuple(
+    'FailureCount',
+    ['closest_rate_type',
+     'expected',
+     'num_lines',
+     'num_assignments',
+     'example'])
+
+
+def rank_rate_types(line):
+    """Return each rate type with how far into the line it parsed, furthest
+    first. A rate type parsing the whole line is ranked at its length.
+
+    :param line: A single text line
+    :type line: str or unicode
+    :rtype: list of tuple of (str, int)
+    """
+    ranking = []
+    for name, rate_form in grammar.get_grammar().rate_forms.iteritems():
+        try:
+            rate_form.parseString(line)
+            location = len(line)
+        except pyparsing.ParseException as parse_err:
+            location = parse_err.loc
+        ranking.append((name, location))
+    # sorted is stable, so ties keep the order the grammar tries them in
+    return sorted(ranking, key=lambda (name, location): -location)
+
+
+def diagnose_line(line):
+    """Diagnose why the given line fails to parse.
+
+    :param line: A single text line
+    :type line: str or unicode
+    :return: The failure, or None if the line parses
+    :rtype: ParseFailure or None
+    """
+    try:
+        grammar.get_rate_card().parseString(line)
+        return None
+    except pyparsing.ParseException as parse_err:
+        return ParseFailure(
+            line=line,
+            column=parse_err.col,
+            expected=parse_err.msg,
+            closest_rate_type=rank_rate_types(line)[0][0])
+
+
+class FailureTable(object):
+    """Counts parse failures by closest rate type and expectation, along
+    with the number of distinct assignments they caused to be rejected."""
+
+    def __init__(self):
+        self._num_lines = collections.Counter()
+        self._assignment_ids = collections.defaultdict(set)
+        self._examples = {}
+
+    def __len__(self):
+        return sum(self._num_lines.itervalues())
+
+    def add(self, failure, assignment_id=None):
+        """Count a failure.
+
+        :param failure: The failure
+        :type failure: ParseFailure
+        :param assignment_id: (Optional) The assignment with the line
+        :type assignment_id: str or unicode or None
+        """
+        key = (failure.closest_rate_type, failure.expected)
+        self._num_lines[key] += 1
+        if assignment_id is not None:
+            self._assignment_ids[key].add(assignment_id)
+        self._examples.setdefault(key, failure.line)
+
+    def add_lines(self, lines, assignment_id=None):
+        """Diagnose and count the failures among the given lines.
+
+        :param lines: Rate card lines
+        :type lines: iterable of str or unicode
+        :param assignment_id: (Optional) The assignment with the lines
+        :type assignment_id: str or unicode or None
+        :return: The failures
+        :rtype: list of ParseFailure
+        """
+        failures = filter(None, [diagnose_line(each) for each in lines])
+        for each in failures:
+            self.add(each, assignment_id)
+        return failures
+
+    def get_rows(self):
+        """Return the failure counts, those rejecting the most assignments
+        first, then those with the most lines.
+
+        :rtype: list of FailureCount
+        """
+        rows = [
+            FailureCount(
+                closest_rate_type=closest_rate_type,
+                expected=expected,
+                num_lines=num_lines,
+                num_assignments=len(
+                    self._assignment_ids[(closest_rate_type, expected)]),
+                example=self._examples[(closest_rate_type, expected)])
+            for (closest_rate_type, expected), num_lines
+            in self._num_lines.iteritems()]
+        return sorted(
+            rows,
+            key=lambda each: (
+                -each.num_assignments, -each.num_lines,
+                each.closest_rate_type, each.expected))
+
+    def format_table(self):
+        """Return the lines of a table of the failure counts.
+
+        :rtype: list of str
+        """
+        lines = ['{:>11} {:>6} {:<14} {:<30} {}'.format(
+            'ASSIGNMENTS', 'LINES', 'RATE TYPE', 'EXPECTED', 'EXAMPLE')]
+        for each in self.get_rows():
+            lines.append(u'{:>11} {:>6} {:<14} {:<30} {}'.format(
+                each.num_assignments,
+                each.num_lines,
+                each.closest_rate_type,
+                each.expected,
+                each.example))
+        return lines
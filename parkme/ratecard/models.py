@@ -21,7 +21,7 @@ class ParseFailedException(exceptions.Error):
 class ParseResult(object):
     """Container class for parsed results."""
 
-    def __init__(self, assignment, rates, notes):
+    def __init__(self, assignment, rates, notes, records=None):
         """Contains a set of parse results for a given assignment.
 
         :param assignment: An assignment
@@ -30,10 +30,13 @@ class ParseResult(object):
         :type rates: list of str or bool
         :param notes: The notes parsed along with the rates
         :type notes: list of str
+        :param records: (Optional) The structured rates, one per rate line
+        :type records: list of parkme.ratecard.records.RateRecord or None
         """
         self.assignment = assignment
         self.rates = rates
         self.notes = notes
+        self.records = records or []
 
     @classmethod
     def get_for_assignment(cls, assignment):
@@ -51,9 +54,17 @@ class ParseResult(object):
         rate_lines = filter(None, [each.strip() for each in rate_lines])
 
         parser.clear_user_visible_notes()
-        rates = [
-            (each, parser.parse_or_reject_line(each))
-            for each in rate_lines]
+        rates = []
+        records = []
+        for each in rate_lines:
+            try:
+                record = parser.parse_rate_record(each)
+            except parser.RateCardParsingException:
+                rates.append((each, False))
+                continue
+            rates.append((each, record.text if record else ''))
+            if record:
+                records.append(record)
         notes = parser.get_user_visible_notes()
 
         has_rejected_lines = any([line is False for (_, line) in rates])
@@ -61,7 +72,7 @@ class ParseResult(object):
         if has_rejected_lines:
             raise ParseFailedException(rates)
 
-        return cls(assignment, rates, notes)
+        return cls(assignment, rates, notes, records)
 
     @property
     def parsed_rates(self):
@@ -71,6 +82,15 @@ class ParseResult(object):
         """
         return [each[1] for each in self.rates if each[1].strip()]
 
+    @property
+    def parsed_records(self):
+        """Return the structured rates, which compare equal when they
+        describe the same rate.
+
+        :rtype: list of parkme.ratecard.records.RateRecord
+        """
+        return self.records
+
     @property
     def rates_str(self):
         """Return the internal rates in a single newline-separated string.
@@ -18,16 +18,16 @@ class RateCardParsingException(exceptions.Error):
 
 
 def clear_user_visible_notes():
-    """Clear the user visible notes"""
-    grammar.user_visible_notes = []
+    """Clear the user visible notes of the current thread"""
+    grammar.clear_user_visible_notes()
 
 
 def get_user_visible_notes():
-    """Return the user visible notes.
+    """Return the user visible notes parsed by the current thread.
 
     :rtype: list
     """
-    return grammar.user_visible_notes
+    return grammar.get_user_visible_notes()
 
 
 def parse_rate_card_line(line):
@@ -41,11 +41,25 @@ def parse_rate_card_line(line):
     :rtype: list
     """
     try:
-        return grammar.rate_card.parseString(line)
+        return grammar.get_rate_card().parseString(line)
     except pyparsing.ParseException as parse_err:
         raise RateCardParsingException(parse_err)
 
 
+def parse_rate_record(line):
+    """Parse a single rate card line into a structured record.
+
+    Raises RateCardParsingException on error.
+
+    :param line: A single text line
+    :type line: str or unicode
+    :return: The rate, or None if the line only held notes
+    :rtype: parkme.ratecard.records.RateRecord or None
+    """
+    tokens = parse_rate_card_line(line)
+    return tokens[0] if tokens else None
+
+
 def convert_to_parkme_format(line):
     """Convert the given line to the ParkMe internal format.
 
@@ -53,7 +67,8 @@ def convert_to_parkme_format(line):
     :type line: str or unicode
     :rtype: str
     """
-    return ' '.join(parse_rate_card_line(line))
+    record = parse_rate_record(line)
+    return record.text if record else ''
 
 
 def parse_or_reject_line(line):
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.ratecard.records
+    ~~~~~~~~~~~~~~~~~~~~~~~
+    Structured rate records. The grammar emits a RateRecord per rate line with
+    the rate type, the days and time of day it applies to, the duration it
+    covers and its price in cents, so consumers can compare and price rates
+    without parsing the ParkMe format text again. The text is kept for saving
+    and display.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import re
+
+
+# Rate types
+OTHER = 0
+HOURLY = 1
+INCREMENT = 2
+DAILY_MAX = 3
+MONTHLY = 4
+EVENING = 5
+EARLY_BIRD = 6
+FLAT = 7
+DAYS = 8
+
+RATE_TYPE_NAMES = {
+    OTHER: 'OTHER',
+    HOURLY: 'HOURLY',
+    INCREMENT: 'INCREMENT',
+    DAILY_MAX: 'DAILY_MAX',
+    MONTHLY: 'MONTHLY',
+    EVENING: 'EVENING',
+    EARLY_BIRD: 'EARLY_BIRD',
+    FLAT: 'FLAT',
+    DAYS: 'DAYS'
+}
+
+# Rate types whose label is fixed, by label
+_LABEL_RATE_TYPES = {
+    'daily max': DAILY_MAX,
+    'monthly': MONTHLY,
+    'evening': EVENING,
+    'early bird': EARLY_BIRD,
+    'flat rate': FLAT
+}
+
+# Day mask bits, in the order the grammar names the days
+DAY_NAMES = ['Mon', 'Tues', 'Wed', 'Thurs', 'Fri', 'Sat', 'Sun']
+DAY_BITS = dict((name, 1 << index) for index, name in enumerate(DAY_NAMES))
+ALL_DAYS = (1 << len(DAY_NAMES)) - 1
+
+MINUTES_PER_UNIT = {
+    'Min': 1,
+    'Hour': 60,
+    'Hours': 60
+}
+
+_DURATION_RE = re.compile(r'^(\d+)(?:-(\d+))? (Min|Hours?)$')
+_INCREMENT_RE = re.compile(r"^Each Add'l (\d+) (Min|Hours?)")
+_DAYS_RE = re.compile(r'^(\w+)(?:-(\w+))?$')
+_TIMESTAMP_RE = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*([AaPp])[Mm]')
+
+
+def get_minute_of_day(hour, minute, meridiem):
+    """Return the minute of the day of a 12 hour clock time.
+
+    :param hour: The hour, 1 to 12
+    :type hour: int
+    :param minute: The minute
+    :type minute: int
+    :param meridiem: 'A' or 'P'
+    :type meridiem: str
+    :rtype: int
+    """
+    hour %= 12
+    if meridiem.upper() == 'P':
+        hour += 12
+    return hour * 60 + minute
+
+
+def get_day_mask(first_day, last_day=None):
+    """Return the day mask of a day or a range of days, which may wrap past
+    Sunday.
+
+    :param first_day: A day name as emitted by the grammar, eg. Mon
+    :type first_day: str
+    :param last_day: (Optional) The last day of the range
+    :type last_day: str or None
+    :rtype: int
+    """
+    first = DAY_NAMES.index(first_day)
+    last = DAY_NAMES.index(last_day or first_day)
+    num_days = (last - first) % len(DAY_NAMES) + 1
+    return sum(
+        DAY_BITS[DAY_NAMES[(first + offset) % len(DAY_NAMES)]]
+        for offset in range(num_days))
+
+
+def parse_time_window(window):
+    """Return the start and end minute of the day of a parenthetical time
+    window such as '(In After 6PM)' or '(6AM-6PM)'.
+
+    :param window: The parenthetical, may be empty
+    :type window: str or unicode
+    :return: Start and end minute, either None when unbounded
+    :rtype: tuple of (int or None, int or None)
+    """
+    minutes = [
+        get_minute_of_day(int(hour), int(minute or 0), meridiem)
+        for hour, minute, meridiem in _TIMESTAMP_RE.findall(window)]
+    if not minutes:
+        return None, None
+    if 'Before' in window:
+        return None, minutes[0]
+    if len(minutes) > 1:
+        return minutes[0], minutes[1]
+    return minutes[0], None
+
+
+class RateRecord(object):
+    """A single parsed rate. Records are equal when they describe the same
+    rate, even if the text they were parsed from differs."""
+
+    __slots__ = (
+        'rate_type',
+        'day_mask',
+        'start_minute',
+        'end_minute',
+        'min_duration',
+        'max_duration',
+        'price_cents',
+        'text')
+
+    def __init__(self, rate_type, day_mask, start_minute, end_minute,
+                 min_duration, max_duration, price_cents, text):
+        """Initialize the record.
+
+        :param rate_type: One of the rate types, eg. HOURLY
+        :type rate_type: int
+        :param day_mask: The days the rate applies on, see DAY_BITS
+        :type day_mask: int
+        :param start_minute: Minute of the day the rate starts or None
+        :type start_minute: int or None
+        :param end_minute: Minute of the day the rate ends or None
+        :type end_minute: int or None
+        :param min_duration: Shortest stay in minutes covered or None
+        :type min_duration: int or None
+        :param max_duration: Longest stay in minutes covered or None
+        :type max_duration: int or None
+        :param price_cents: The price in cents
+        :type price_cents: int
+        :param text: The rate in the ParkMe format, eg. 'Daily Max: $20.00'
+        :type text: str or unicode
+        """
+        self.rate_type = rate_type
+        self.day_mask = day_mask
+        self.start_minute = start_minute
+        self.end_minute = end_minute
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.price_cents = price_cents
+        self.text = text
+
+    @classmethod
+    def from_tokens(cls, label, price):
+        """Build a record from the label and price emitted by the grammar.
+
+        :param label: The rate label, eg. 'Mon-Fri (In After 6PM):'
+        :type label: str or unicode
+        :param price: The price, eg. '$20.00'
+        :type price: str or unicode
+        :rtype: RateRecord
+        """
+        name, _, window = label.rstrip(':').partition(' (')
+        start_minute, end_minute = parse_time_window(window)
+        rate_type = _LABEL_RATE_TYPES.get(
+            ' '.join(name.lower().split()), OTHER)
+        day_mask = ALL_DAYS
+        min_duration = max_duration = None
+
+        duration_match = _DURATION_RE.match(name)
+        increment_match = _INCREMENT_RE.match(name)
+        days_match = _DAYS_RE.match(name)
+        if duration_match:
+            first, last, unit = duration_match.groups()
+            rate_type = HOURLY
+            min_duration = int(first) * MINUTES_PER_UNIT[unit] if last else 0
+            max_duration = int(last or first) * MINUTES_PER_UNIT[unit]
+        elif increment_match:
+            amount, unit = increment_match.groups()
+            rate_type = INCREMENT
+            min_duration = max_duration = int(amount) * MINUTES_PER_UNIT[unit]
+        elif days_match and days_match.group(1) in DAY_BITS:
+            rate_type = DAYS
+            day_mask = get_day_mask(*days_match.groups())
+
+        return cls(
+            rate_type=rate_type,
+            day_mask=day_mask,
+            start_minute=start_minute,
+            end_minute=end_minute,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            price_cents=int(round(float(price.lstrip('$')) * 100)),
+            text=' '.join([label, price]))
+
+    @property
+    def key(self):
+        """Return the fields that identify the rate.
+
+        :rtype: tuple
+        """
+        return (self.rate_type, self.day_mask, self.start_minute,
+                self.end_minute, self.min_duration, self.max_duration,
+                self.price_cents)
+
+    @property
+    def slot(self):
+        """Return the fields identifying what the rate applies to, its key
+        without the price. Rates of the OTHER type are told apart by their
+        label.
+
+        :rtype: tuple
+        """
+        label = None
+        if self.rate_type == OTHER:
+            label = self.text.rsplit(' ', 1)[0]
+        return self.key[:-1] + (label,)
+
+    def __eq__(self, other):
+        return isinstance(other, RateRecord) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __str__(self):
+        return str(self.text)
+
+    def __unicode__(self):
+        return unicode(self.text)
+
+    def __repr__(self):
+        return 'RateRecord({}, {!r})'.format(
+            RATE_TYPE_NAMES[self.rate_type], self.text)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.ratecard.reprocess
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+    Keeps rate transcriptions so they can be reconsidered when the grammar
+    improves. The raw rates of every processed assignment are stored along
+    with whether each distinct line parsed and the grammar version it was
+    parsed with. After GRAMMAR_VERSION is bumped only the lines that failed
+    are parsed again, and the HITs with lines that now parse are found
+    without any Mechanical Turk calls.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+
+from parkme import models
+from parkme.ratecard import grammar
+from parkme.ratecard import parser
+
+
+def to_transcription(assignment):
+    """Return the stored form of a rate transcription assignment.
+
+    :param assignment: An assignment
+    :type assignment: parkme.turk.assignments.RateTranscriptionAssignment
+    :rtype: parkme.models.Transcription
+    """
+    return models.Transcription(
+        assignment_id=assignment.assignment_id,
+        hit_id=assignment.hit_id,
+        worker_id=assignment.worker_id,
+        lot_id=assignment.lot_id,
+        rates=assignment.rates,
+        does_not_contain_rates=bool(assignment.does_not_contain_rates),
+        work_seconds=assignment.work_seconds)
+
+
+class StoredAssignment(object):
+    """Adapts a stored transcription to the interface of a rate
+    transcription assignment, so the stored transcriptions of a HIT can be
+    evaluated again like the assignments fetched from Mechanical Turk."""
+
+    def __init__(self, transcription):
+        """Initialize the adapter.
+
+        :param transcription: A stored transcription
+        :type transcription: parkme.models.Transcription
+        """
+        self.transcription = transcription
+
+    @property
+    def assignment_id(self):
+        """The assignment id"""
+        return self.transcription.assignment_id
+
+    @property
+    def hit_id(self):
+        """The HIT id"""
+        return self.transcription.hit_id
+
+    @property
+    def worker_id(self):
+        """The id of the worker who transcribed the rates"""
+        return self.transcription.worker_id
+
+    @property
+    def lot_id(self):
+        """The id of the lot whose rates were transcribed"""
+        return self.transcription.lot_id
+
+    @property
+    def asset_id(self):
+        """The rate card image isn't stored with the transcription"""
+        return None
+
+    @property
+    def rates(self):
+        """The raw transcribed rates, one per line"""
+        return self.transcription.rates
+
+    @property
+    def does_not_contain_rates(self):
+        """Whether the worker said the image has no rates"""
+        return self.transcription.does_not_contain_rates
+
+    @property
+    def work_seconds(self):
+        """How long the worker took"""
+        return self.transcription.work_seconds
+
+
+def parse_lines(lines):
+    """Return whether each of the given lines parses.
+
+    :param lines: Rate lines
+    :type lines: iterable of str or unicode
+    :rtype: dict of str or unicode to bool
+    """
+    line_results = collections.OrderedDict(
+        (each, parser.parse_or_reject_line(each) is not False)
+        for each in lines)
+    parser.clear_user_visible_notes()
+    return line_results
+
+
+def store_transcriptions(data_gateway,
+                         assignments,
+                         outcomes,
+                         grammar_version=grammar.GRAMMAR_VERSION):
+    """Store the given assignments, whether each of their lines parses and
+    the outcome of their HITs.
+
+    :param data_gateway: The transcription store
+    :type data_gateway: parkme.models.TranscriptionDataGateway
+    :param assignments: Rate transcription assignments
+    :type assignments: list of RateTranscriptionAssignment
+    :param outcomes: The outcome of each HIT of the assignments
+    :type outcomes: dict of HIT id to str
+    :param grammar_version: The grammar version the lines are parsed with
+    :type grammar_version: int
+    """
+    transcriptions = [to_transcription(each) for each in assignments]
+    data_gateway.save_all(transcriptions)
+    lines = set(
+        line
+        for each in transcriptions
+        for line in models.get_rate_lines(each.rates))
+    data_gateway.record_line_results(grammar_version, parse_lines(lines))
+    data_gateway.save_outcomes(grammar_version, outcomes)
+
+
+def reparse_failed_lines(data_gateway,
+                         grammar_version=grammar.GRAMMAR_VERSION):
+    """Parse the stored lines that failed with an older grammar version
+    again, recording the results.
+
+    :param data_gateway: The transcription store
+    :type data_gateway: parkme.models.TranscriptionDataGateway
+    :param grammar_version: The current grammar version
+    :type grammar_version: int
+    :return: The lines that parse now
+    :rtype: list of str or unicode
+    """
+    line_results = parse_lines(data_gateway.get_failed_lines(grammar_version))
+    data_gateway.record_line_results(
+        grammar_version, line_results, overwrite=True)
+    return [line for line, parsed in line_results.iteritems() if parsed]
+
+
+def get_affected_transcriptions(data_gateway, lines):
+    """Return the stored transcriptions of every HIT with any of the given
+    lines transcribed.
+
+    :param data_gateway: The transcription store
+    :type data_gateway: parkme.models.TranscriptionDataGateway
+    :param lines: Rate lines
+    :type lines: iterable of str or unicode
+    :rtype: dict of HIT id to list of parkme.models.Transcription
+    """
+    return data_gateway.get_by_hit_ids(
+        data_gateway.get_hit_ids_by_lines(lines))
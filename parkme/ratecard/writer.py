@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.ratecard.writer
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Saves consensus rates to lots in bulk. The current rates of every lot are
+    fetched in one query, lots whose rates would not change are skipped, and
+    the rest are updated in a single statement and transaction.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+
+from psycopg2 import extras
+
+from parkme import db
+from parkme import models
+
+
+# Separates the rates of a lot in lot.str_rates
+RATES_SEPARATOR = '\r\n'
+
+# Lots updated per statement
+PAGE_SIZE = 500
+
+
+def format_rates(rates):
+    """Return the given rates as stored in lot.str_rates.
+
+    :param rates: A list of rates
+    :type rates: list of str or unicode
+    :rtype: str or unicode
+    """
+    return RATES_SEPARATOR.join(rates)
+
+
+def get_current_rates(cursor, lot_ids):
+    """Return the current rates of the given lots.
+
+    :param cursor: A database cursor
+    :type cursor: psycopg2.extensions.cursor
+    :param lot_ids: The lot ids, pk_lot values
+    :type lot_ids: list of str or unicode
+    :rtype: dict of lot id to str or None
+    """
+    cursor.execute(
+        'SELECT pk_lot, str_rates FROM lot WHERE pk_lot = ANY(%s);',
+        (list(lot_ids),))
+    return dict(cursor.fetchall())
+
+
+def get_rate_changes(current_rates, new_rates):
+    """Return the changes needed to give each lot its new rates, skipping
+    lots that already have them or don't exist.
+
+    :param current_rates: The current rates of each lot
+    :type current_rates: dict of lot id to str or None
+    :param new_rates: The hit id and formatted new rates of each lot
+    :type new_rates: dict of lot id to tuple of (str, str)
+    :rtype: list of parkme.models.RateChange
+    """
+    return [
+        models.RateChange(
+            lot_id=lot_id,
+            hit_id=hit_id,
+            old_rates=current_rates[lot_id],
+            new_rates=rates)
+        for lot_id, (hit_id, rates) in new_rates.iteritems()
+        if lot_id in current_rates and current_rates[lot_id] != rates]
+
+
+class BulkRateWriter(object):
+    """Collects the consensus rates of lots and saves them all at once."""
+
+    def __init__(self,
+                 audit_gateway=None,
+                 connection_params=None,
+                 page_size=PAGE_SIZE):
+        """Initialize the writer.
+
+        :param audit_gateway: (Optional) Records each change made
+        :type audit_gateway: parkme.models.RateAuditDataGateway or None
+        :param connection_params: (Optional) psycopg2 connection params
+        :type connection_params: str or unicode or None
+        :param page_size: Lots updated per statement
+        :type page_size: int
+        """
+        self.audit_gateway = audit_gateway
+        self.connection_params = connection_params
+        self.page_size = page_size
+        self._new_rates = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._new_rates)
+
+    def add(self, lot_id, rates, hit_id=None):
+        """Set the rates to save for a lot, replacing any set before.
+
+        :param lot_id: A lot id, the lot's pk_lot
+        :type lot_id: str or unicode
+        :param rates: A list of rates
+        :type rates: list of str or unicode
+        :param hit_id: (Optional) The HIT the rates came from
+        :type hit_id: str or unicode or None
+        """
+        self._new_rates[lot_id] = (hit_id, format_rates(rates))
+
+    def flush(self):
+        """Save the rates added since the last flush in a single transaction.
+
+        :return: The changes made, excluding lots whose rates were unchanged
+        :rtype: list of parkme.models.RateChange
+        """
+        if not self._new_rates:
+            return []
+        new_rates, self._new_rates = (
+            self._new_rates, collections.OrderedDict())
+        with db.cursor(self.connection_params) as (cursor, _):
+            rate_changes = get_rate_changes(
+                get_current_rates(cursor, new_rates.keys()), new_rates)
+            extras.execute_values(
+                cursor,
+                'UPDATE lot SET str_rates = v.str_rates '
+                'FROM (VALUES %s) AS v (pk_lot, str_rates) '
+                'WHERE lot.pk_lot = v.pk_lot;',
+                [(each.lot_id, each.new_rates) for each in rate_changes],
+                page_size=self.page_size)
+        if self.audit_gateway is not None:
+            self.audit_gateway.record_changes(rate_changes)
+        return rate_changes
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.adaptive
+    ~~~~~~~~~~~~~~~~~~~~
+    Adaptive assignment scheduling. HITs start with few assignments and are
+    only extended when the workers disagree.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+from parkme.turk import hits
+
+
+# Assignments requested when an adaptive HIT is created
+INITIAL_ASSIGNMENTS = 2
+
+# Most assignments an adaptive HIT will ever be extended to
+MAX_ASSIGNMENTS = 5
+
+# Assignments added each time a HIT without consensus is extended
+ASSIGNMENTS_INCREMENT = 1
+
+# Outcomes of reviewing a HIT
+WAITING = 'WAITING'
+DECIDED = 'DECIDED'
+EXTENDED = 'EXTENDED'
+NO_CONSENSUS = 'NO CONSENSUS'
+
+
+class AdaptiveScheduler(object):
+    """Reviews HITs created with a small number of assignments and extends
+    them only when the submitted assignments do not reach consensus."""
+
+    def __init__(self,
+                 hit_template,
+                 initial_assignments=INITIAL_ASSIGNMENTS,
+                 max_assignments=MAX_ASSIGNMENTS,
+                 assignments_increment=ASSIGNMENTS_INCREMENT):
+        """Initialize the scheduler.
+
+        :param hit_template: The template used to create and extend HITs
+        :type hit_template: parkme.turk.hits.HITTemplate
+        :param initial_assignments: Assignments for each new HIT
+        :type initial_assignments: int
+        :param max_assignments: Most assignments for any HIT
+        :type max_assignments: int
+        :param assignments_increment: Assignments added on each extension
+        :type assignments_increment: int
+        """
+        self.hit_template = hit_template
+        self.initial_assignments = initial_assignments
+        self.max_assignments = max_assignments
+        self.assignments_increment = assignments_increment
+
+    def review(self, hit, assignments, has_consensus):
+        """Review the assignments submitted so far for the given HIT, extending
+        it if all requested assignments are in without consensus.
+
+        :param hit: A HIT
+        :type hit: boto.mturk.HIT
+        :param assignments: The assignments submitted for the HIT
+        :type assignments: list
+        :param has_consensus: Predicate on a list of assignments
+        :type has_consensus: callable
+        :return: One of WAITING, DECIDED, EXTENDED or NO_CONSENSUS
+        :rtype: str
+        """
+        if assignments and has_consensus(assignments):
+            return DECIDED
+
+        num_requested = (
+            hits.get_max_assignments(hit) or self.initial_assignments)
+        if len(assignments) < num_requested:
+            return WAITING
+
+        if num_requested >= self.max_assignments:
+            return NO_CONSENSUS
+
+        self.hit_template.extend_hit(
+            hit.HITId,
+            min(self.assignments_increment,
+                self.max_assignments - num_requested))
+        return EXTENDED
@@ -7,6 +7,7 @@
 
     Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
 """
+import datetime
 import itertools
 
 from boto.mturk import connection
@@ -14,6 +15,10 @@ from boto.mturk import connection
 from parkme.turk import hits
 
 
+# Format of timestamps returned by the Mechanical Turk API
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
 def map_hits_to_assignments(iter_hits, mturk_connection, assignment_cls):
     """Generator that converts the given HITs into Assignments.
 
@@ -32,6 +37,24 @@ def map_hits_to_assignments(iter_hits, mturk_connection, assignment_cls):
         assignment_cls, itertools.chain(*assignments_for_hits))
 
 
+def unique_by_assignment_id(assignments):
+    """Return the given assignments without repeats of the same assignment
+    id, keeping the first of each. The items split from a bundled assignment
+    all share its id, see ImageCategorizationAssignment.split_items.
+
+    :param assignments: An iterable of assignments
+    :type assignments: iterable of BaseAssignment
+    :rtype: list of BaseAssignment
+    """
+    assignment_ids = set()
+    unique = []
+    for each in assignments:
+        if each.assignment_id not in assignment_ids:
+            assignment_ids.add(each.assignment_id)
+            unique.append(each)
+    return unique
+
+
 def get_answer_to_question(assignment, question_id):
     """Get the answer to the question with the given ID.
 
@@ -84,6 +107,25 @@ class BaseAssignment(object):
         """Worker ID for this assignment"""
         return self.assignment.WorkerId
 
+    @property
+    def asset_id(self):
+        """Asset this assignment answers about, None unless a subclass
+        reads it from the answers"""
+        return None
+
+    @property
+    def work_seconds(self):
+        """Number of seconds between accepting and submitting this assignment
+        or None if not available."""
+        try:
+            accept_time = datetime.datetime.strptime(
+                self.assignment.AcceptTime, TIMESTAMP_FORMAT)
+            submit_time = datetime.datetime.strptime(
+                self.assignment.SubmitTime, TIMESTAMP_FORMAT)
+        except (AttributeError, TypeError, ValueError):
+            return None
+        return (submit_time - accept_time).total_seconds()
+
     def get_answer_to_question(self, question_name):
         """Return the answer for the question with the given name.
 
@@ -119,25 +161,58 @@ class BaseAssignment(object):
 
 
 class ImageCategorizationAssignment(BaseAssignment):
-    """Represents an image categorization assignment"""
+    """Represents an image categorization assignment. Assignments for bundled
+    HITs answer the questions once per item, see split_items."""
 
     _CATEGORIES_QUESTION_NAME = 'Answer'
     _ASSET_ID_QUESTION_NAME = 'AssetId'
     _LOT_ID_QUESTION_NAME = 'LotId'
     _DOES_NOT_MATCH_QUESTION_NAME = 'DoesNotMatch'
 
-    def __init__(self, assignment):
+    def __init__(self, assignment, item_index=None):
         """Initialize assignment entity.
 
         :param assignment: An assignment
         :type assignment: boto.mturk.Assignment
+        :param item_index: (Optional) The 1-based index of the item to read
+            answers for in a bundled HIT
+        :type item_index: int or None
         """
         super(ImageCategorizationAssignment, self).__init__(assignment)
+        self.item_index = item_index
         self._categories = self._EMPTY
         self._asset_id = self._EMPTY
         self._lot_id = self._EMPTY
         self._does_not_match = self._EMPTY
 
+    def get_question_name(self, question_name):
+        """Return the name of the given question for this assignment's item.
+
+        :param question_name: The question name
+        :type question_name: str or unicode
+        :rtype: str or unicode
+        """
+        if self.item_index is None:
+            return question_name
+        return hits.get_item_name(question_name, self.item_index)
+
+    def split_items(self):
+        """Return an assignment for each item answered in this assignment.
+        Assignments for HITs that aren't bundled are returned as is.
+
+        :rtype: list of ImageCategorizationAssignment
+        """
+        if self.item_index is not None:
+            return [self]
+
+        items = []
+        for item_index in itertools.count(1):
+            item = ImageCategorizationAssignment(self.assignment, item_index)
+            if not item.asset_id:
+                break
+            items.append(item)
+        return items or [self]
+
     @property
     def categories(self):
         """Return all the categories on this assignment.
@@ -146,7 +221,7 @@ class ImageCategorizationAssignment(BaseAssignment):
         """
         if self._categories is self._EMPTY:
             self._categories = self.get_multichoice_answers_to_question(
-                self._CATEGORIES_QUESTION_NAME)
+                self.get_question_name(self._CATEGORIES_QUESTION_NAME))
         return self._categories
 
     @property
@@ -157,7 +232,7 @@ class ImageCategorizationAssignment(BaseAssignment):
         """
         if self._asset_id is self._EMPTY:
             self._asset_id = self.get_answer_to_question(
-                self._ASSET_ID_QUESTION_NAME)
+                self.get_question_name(self._ASSET_ID_QUESTION_NAME))
         return self._asset_id
 
     @property
@@ -168,7 +243,7 @@ class ImageCategorizationAssignment(BaseAssignment):
         """
         if self._lot_id is self._EMPTY:
             self._lot_id = self.get_answer_to_question(
-                self._LOT_ID_QUESTION_NAME)
+                self.get_question_name(self._LOT_ID_QUESTION_NAME))
         return self._lot_id
 
     @property
@@ -180,7 +255,7 @@ class ImageCategorizationAssignment(BaseAssignment):
         """
         if self._does_not_match is self._EMPTY:
             self._does_not_match = bool(self.get_answer_to_question(
-                self._DOES_NOT_MATCH_QUESTION_NAME))
+                self.get_question_name(self._DOES_NOT_MATCH_QUESTION_NAME)))
         return self._does_not_match
 
 
@@ -284,10 +359,20 @@ class AssignmentGateway(object):
         :type assignment_cls: BaseAssignment
         :rtype: iterable of boto.mturk.Assignment
         """
-        all_hits = self.mturk_connection.get_all_hits()
-        hits_in_batch = hits.filter_by_batch_id(all_hits, batch_id)
         return map_hits_to_assignments(
-            hits_in_batch, self.mturk_connection, assignment_cls)
+            self.get_hits_by_batch_id(batch_id),
+            self.mturk_connection,
+            assignment_cls)
+
+    def get_hits_by_batch_id(self, batch_id):
+        """Return all the HITs in the given batch.
+
+        :param batch_id: A batch id
+        :type batch_id: int or str or unicode
+        :rtype: iterable of boto.mturk.HIT
+        """
+        all_hits = self.mturk_connection.get_all_hits()
+        return hits.filter_by_batch_id(all_hits, batch_id)
 
     def accept(self, assignment, feedback=_DEFAULT):
         """Accept the given assignment. Ignores exception thrown when
@@ -308,6 +393,17 @@ class AssignmentGateway(object):
             if mtre.status != 200:
                 raise mtre
 
+    def accept_all(self, assignments, feedback=_DEFAULT):
+        """Accept each distinct assignment among the given ones once.
+
+        :param assignments: An iterable of assignments
+        :type assignments: iterable of Assignment
+        :param feedback: Feedback message (Defaults to generic message)
+        :type feedback: str or unicode or _DEFAULT
+        """
+        for each in unique_by_assignment_id(assignments):
+            self.accept(each, feedback)
+
     def accept_rejected(self, assignment, feedback=_DEFAULT):
         """Approve an assignment that was previously rejected.
 
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.client
+    ~~~~~~~~~~~~~~~~~~
+    Concurrent Mechanical Turk client. Requests are issued from a pool of
+    worker threads, each reusing its own connection, and return immediately
+    with an asynchronous result so that many requests can be in flight from a
+    single process.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import threading
+import time
+from multiprocessing import pool
+
+
+# Number of worker threads issuing requests
+NUM_WORKERS = 16
+
+# Most requests in flight at once across all clients sharing a rate limiter
+MAX_CONCURRENT_REQUESTS = 16
+
+# Most requests started per second across all clients sharing a rate limiter
+MAX_REQUESTS_PER_SECOND = 10.0
+
+
+class RateLimiter(object):
+    """Context manager limiting both the number of requests in flight and the
+    rate at which requests are started. A single rate limiter may be shared
+    between several clients to stay within the Mechanical Turk API limits."""
+
+    def __init__(self,
+                 max_concurrent=MAX_CONCURRENT_REQUESTS,
+                 max_per_second=MAX_REQUESTS_PER_SECOND,
+                 clock=time.time,
+                 sleep=time.sleep):
+        """Initialize the rate limiter.
+
+        :param max_concurrent: Most requests in flight at once
+        :type max_concurrent: int
+        :param max_per_second: Most requests started per second, None for no
+            limit
+        :type max_per_second: float or None
+        :param clock: Returns the current time in seconds
+        :type clock: callable
+        :param sleep: Sleeps for the given number of seconds
+        :type sleep: callable
+        """
+        self.min_interval = 1.0 / max_per_second if max_per_second else 0.0
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self._clock = clock
+        self._sleep = sleep
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        with self._lock:
+            now = self._clock()
+            start = max(now, self._next_start)
+            self._next_start = start + self.min_interval
+        if start > now:
+            self._sleep(start - now)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._semaphore.release()
+
+
+class ConcurrentMTurkClient(object):
+    """Issues Mechanical Turk requests concurrently. Each request method takes
+    the same arguments as its boto.mturk.connection.MTurkConnection
+    counterpart and returns a multiprocessing.pool.AsyncResult whose get
+    method returns the response or raises the request's exception.
+
+    Since create_hit has the same signature as the blocking call the client
+    may be given to a parkme.turk.hits.HITTemplate in place of a connection.
+    """
+
+    def __init__(self,
+                 connection_factory,
+                 num_workers=NUM_WORKERS,
+                 rate_limiter=None):
+        """Initialize the client.
+
+        :param connection_factory: Creates a new Mechanical Turk connection.
+            Each worker thread creates one connection and reuses it.
+        :type connection_factory: callable
+        :param num_workers: Number of worker threads issuing requests
+        :type num_workers: int
+        :param rate_limiter: (Optional) A rate limiter, possibly shared with
+            other clients
+        :type rate_limiter: RateLimiter or None
+        """
+        self.connection_factory = connection_factory
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self._local = threading.local()
+        self._pool = pool.ThreadPool(num_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Wait for all requests in flight, then stop the worker threads."""
+        self._pool.close()
+        self._pool.join()
+
+    def get_connection(self):
+        """Return the Mechanical Turk connection for the current thread.
+
+        :rtype: boto.mturk.connection.MTurkConnection
+        """
+        mturk_connection = getattr(self._local, 'mturk_connection', None)
+        if mturk_connection is None:
+            mturk_connection = self.connection_factory()
+            self._local.mturk_connection = mturk_connection
+        return mturk_connection
+
+    def _call(self, method_name, args, kwargs):
+        with self.rate_limiter:
+            method = getattr(self.get_connection(), method_name)
+            return method(*args, **kwargs)
+
+    def submit(self, method_name, *args, **kwargs):
+        """Issue a request for the connection method with the given name.
+
+        :param method_name: Name of a MTurkConnection method
+        :type method_name: str
+        :rtype: multiprocessing.pool.AsyncResult
+        """
+        return self._pool.apply_async(
+            self._call, (method_name, args, kwargs))
+
+    def create_hit(self, **kwargs):
+        """Create a HIT.
+
+        :rtype: multiprocessing.pool.AsyncResult
+        """
+        return self.submit('create_hit', **kwargs)
+
+    def get_assignments(self, hit_id, **kwargs):
+        """Get the assignments for a HIT.
+
+        :param hit_id: A HIT ID
+        :type hit_id: str or unicode
+        :rtype: multiprocessing.pool.AsyncResult
+        """
+        return self.submit('get_assignments', hit_id, **kwargs)
+
+    def approve_assignment(self, assignment_id, feedback=None):
+        """Approve an assignment.
+
+        :param assignment_id: An assignment ID
+        :type assignment_id: str or unicode
+        :param feedback: (Optional) Feedback for the worker
+        :type feedback: str or unicode or None
+        :rtype: multiprocessing.pool.AsyncResult
+        """
+        return self.submit(
+            'approve_assignment', assignment_id, feedback=feedback)
+
+    def get_reviewable_hits(self, **kwargs):
+        """Get a page of reviewable HITs.
+
+        :rtype: multiprocessing.pool.AsyncResult
+        """
+        return self.submit('get_reviewable_hits', **kwargs)
+
+    def map(self, method_name, all_args):
+        """Issue one request per argument tuple and return the responses in
+        order once all have completed.
+
+        :param method_name: Name of a MTurkConnection method
+        :type method_name: str
+        :param all_args: Positional arguments for each request
+        :type all_args: iterable of tuple
+        :rtype: list
+        """
+        async_results = [
+            self.submit(method_name, *args) for args in all_args]
+        return [each.get() for each in async_results]
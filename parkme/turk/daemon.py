@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.daemon
+    ~~~~~~~~~~~~~~~~~~
+    Long-running poller that processes reviewable HITs as soon as they
+    complete.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import random
+import threading
+import traceback
+from multiprocessing import pool
+
+from boto.mturk import connection
+
+from parkme.utils import eventlog
+
+
+# Seconds between polls while HITs keep becoming reviewable
+POLL_INTERVAL_SECONDS = 60
+
+# Longest wait between polls while idle or failing
+MAX_BACKOFF_SECONDS = 15 * 60
+
+# Number of HITs processed concurrently
+NUM_WORKERS = 4
+
+# Most HITs returned by a single GetReviewableHITs call
+PAGE_SIZE = 100
+
+# Most times a HIT is processed without finishing, because its handler
+# failed or left it reviewable, before it is ignored until restart
+MAX_ATTEMPTS = 5
+
+
+def get_backoff_seconds(num_idle_polls, poll_interval, max_backoff,
+                        rng=random):
+    """Return the delay before the next poll. The delay doubles with each
+    consecutive idle or failed poll and is jittered so that several daemons
+    don't poll in lockstep.
+
+    :param num_idle_polls: Number of consecutive idle or failed polls
+    :type num_idle_polls: int
+    :param poll_interval: The base poll interval in seconds
+    :type poll_interval: float
+    :param max_backoff: The longest delay in seconds
+    :type max_backoff: float
+    :param rng: (Optional) Source of randomness
+    :type rng: random.Random
+    :rtype: float
+    """
+    delay = min(max_backoff, poll_interval * (2 ** num_idle_polls))
+    return rng.uniform(delay / 2.0, delay)
+
+
+def iter_reviewable_hit_ids(mturk_connection, page_size=PAGE_SIZE):
+    """Generator yielding the IDs of all reviewable HITs, one page at a time.
+
+    :param mturk_connection: A Mechanical Turk connection
+    :type mturk_connection: boto.mturk.connection.MTurkConnection
+    :param page_size: The number of HITs requested per page
+    :type page_size: int
+    :rtype: iterable of str or unicode
+    """
+    page_number = 1
+    while True:
+        result_set = mturk_connection.get_reviewable_hits(
+            page_size=page_size, page_number=page_number)
+        for hit in result_set:
+            yield hit.HITId
+        total_num_results = int(getattr(result_set, 'TotalNumResults', 0))
+        if page_number * page_size >= total_num_results:
+            return
+        page_number += 1
+
+
+class ReviewDaemon(object):
+    """Polls Mechanical Turk for reviewable HITs and dispatches each one to the
+    handler registered for its HIT type on a bounded pool of worker threads.
+    Finished HITs are moved to the Reviewing status so they aren't polled
+    again. HITs that aren't finished, such as those still waiting for
+    assignments, are left reviewable and retried on later polls, up to a
+    limit."""
+
+    def __init__(self,
+                 connection_factory,
+                 handlers,
+                 poll_interval=POLL_INTERVAL_SECONDS,
+                 max_backoff=MAX_BACKOFF_SECONDS,
+                 num_workers=NUM_WORKERS,
+                 max_attempts=MAX_ATTEMPTS):
+        """Initialize the daemon.
+
+        :param connection_factory: Creates a new Mechanical Turk connection.
+            Each worker thread gets its own connection which it reuses.
+        :type connection_factory: callable
+        :param handlers: Handler for each HIT type id, called with the
+            connection, the HIT and its raw assignments. Returns whether the
+            HIT is finished.
+        :type handlers: dict of str to callable
+        :param poll_interval: Seconds between polls while busy
+        :type poll_interval: float
+        :param max_backoff: Longest wait between polls while idle
+        :type max_backoff: float
+        :param num_workers: Number of HITs processed concurrently
+        :type num_workers: int
+        :param max_attempts: Most times a HIT is processed without finishing
+            before it is ignored
+        :type max_attempts: int
+        """
+        self.connection_factory = connection_factory
+        self.handlers = handlers
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts
+        # Bound on HITs dispatched but not yet processed
+        self.max_in_flight = num_workers * 2
+        self.num_processed = 0
+        self.num_deferred = 0
+        self.num_failed = 0
+        self._pool = None
+        self._in_flight = set()
+        self._ignored = set()
+        self._num_attempts = collections.Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stop_event = threading.Event()
+
+    def get_connection(self):
+        """Return the Mechanical Turk connection for the current thread.
+
+        :rtype: boto.mturk.connection.MTurkConnection
+        """
+        mturk_connection = getattr(self._local, 'mturk_connection', None)
+        if mturk_connection is None:
+            mturk_connection = self.connection_factory()
+            self._local.mturk_connection = mturk_connection
+        return mturk_connection
+
+    def stop(self):
+        """Ask the daemon to stop. HITs already dispatched are finished before
+        run returns."""
+        self._stop_event.set()
+
+    def is_stopped(self):
+        """Indicates whether or not the daemon has been asked to stop.
+
+        :rtype: bool
+        """
+        return self._stop_event.is_set()
+
+    def process_hit(self, hit_id):
+        """Process the reviewable HIT with the given ID.
+
+        :param hit_id: A HIT ID
+        :type hit_id: str or unicode
+        """
+        try:
+            mturk_connection = self.get_connection()
+            hit = mturk_connection.get_hit(hit_id)[0]
+            handler = self.handlers.get(hit.HITTypeId)
+            if not handler:
+                with self._lock:
+                    self._ignored.add(hit_id)
+                return
+            assignments = list(
+                mturk_connection.get_assignments(hit_id, page_size=100))
+            if not handler(mturk_connection, hit, assignments):
+                with self._lock:
+                    self.num_deferred += 1
+                    self._add_attempt(hit_id)
+                return
+            mturk_connection.set_reviewing(hit_id)
+            with self._lock:
+                self.num_processed += 1
+                self._num_attempts.pop(hit_id, None)
+        # A failing HIT must not take down its worker thread, it will be
+        # retried on the next poll
+        except Exception:  # pylint: disable=W0703
+            traceback.print_exc()
+            with self._lock:
+                self.num_failed += 1
+                self._add_attempt(hit_id)
+        finally:
+            with self._lock:
+                self._in_flight.discard(hit_id)
+
+    def _add_attempt(self, hit_id):
+        """Count a time the given HIT was processed without finishing,
+        ignoring it once it reaches the limit. The lock must be held.
+
+        :param hit_id: A HIT ID
+        :type hit_id: str or unicode
+        """
+        self._num_attempts[hit_id] += 1
+        if self._num_attempts[hit_id] >= self.max_attempts:
+            eventlog.warning(
+                'hit_ignored',
+                hit_id=hit_id,
+                num_attempts=self._num_attempts.pop(hit_id))
+            self._ignored.add(hit_id)
+
+    def poll(self):
+        """Dispatch all newly reviewable HITs to the worker pool, up to the
+        in-flight limit. All pages are read before any HIT is dispatched,
+        since HITs leaving the Reviewable status while paging would shift
+        later HITs onto pages already read.
+
+        :return: The number of HITs dispatched
+        :rtype: int
+        """
+        num_dispatched = 0
+        for hit_id in list(iter_reviewable_hit_ids(self.get_connection())):
+            if self.is_stopped():
+                break
+            with self._lock:
+                if hit_id in self._in_flight or hit_id in self._ignored:
+                    continue
+                if len(self._in_flight) >= self.max_in_flight:
+                    break
+                self._in_flight.add(hit_id)
+            self._pool.apply_async(self.process_hit, (hit_id,))
+            num_dispatched += 1
+        return num_dispatched
+
+    def run(self):
+        """Poll until stopped, then wait for dispatched HITs to finish."""
+        self._pool = pool.ThreadPool(self.num_workers)
+        num_idle_polls = 0
+        try:
+            while not self.is_stopped():
+                try:
+                    num_dispatched = self.poll()
+                except (connection.MTurkRequestError, IOError):
+                    traceback.print_exc()
+                    num_dispatched = 0
+
+                if num_dispatched:
+                    num_idle_polls = 0
+                    delay = self.poll_interval
+                else:
+                    num_idle_polls += 1
+                    delay = get_backoff_seconds(
+                        num_idle_polls, self.poll_interval, self.max_backoff)
+                self._stop_event.wait(delay)
+        finally:
+            self._pool.close()
+            self._pool.join()
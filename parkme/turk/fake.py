@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.fake
+    ~~~~~~~~~~~~~~~~
+    In-memory stand-in for a Mechanical Turk connection, for tests and dry
+    runs. Responses are built from the same boto result classes the real
+    connection returns.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import datetime
+import itertools
+import threading
+import time
+
+from boto import resultset
+from boto.mturk import connection
+
+from parkme.turk import assignments
+
+
+# Statuses of HITs and assignments
+ASSIGNABLE = 'Assignable'
+REVIEWABLE = 'Reviewable'
+REVIEWING = 'Reviewing'
+SUBMITTED = 'Submitted'
+APPROVED = 'Approved'
+
+
+def make_result_set(items, total_num_results=None):
+    """Return a result set containing the given items.
+
+    :param items: The items
+    :type items: list
+    :param total_num_results: (Optional) Total number of results across pages
+    :type total_num_results: int or None
+    :rtype: boto.resultset.ResultSet
+    """
+    result_set = resultset.ResultSet()
+    result_set.extend(items)
+    result_set.NumResults = str(len(items))
+    result_set.TotalNumResults = str(
+        len(items) if total_num_results is None else total_num_results)
+    return result_set
+
+
+def make_answers(answers):
+    """Convert the given answers to the form of boto assignment answers.
+
+    :param answers: The answer fields to each question
+    :type answers: dict of question id to list of str
+    :rtype: list of boto.resultset.ResultSet
+    """
+    question_form_answers = []
+    for qid, fields in answers.iteritems():
+        answer = connection.QuestionFormAnswer(None)
+        answer.qid = qid
+        answer.fields = list(fields)
+        question_form_answers.append(answer)
+    return [make_result_set(question_form_answers)]
+
+
+def get_page(items, page_size, page_number):
+    """Return the given page of items as a result set.
+
+    :rtype: boto.resultset.ResultSet
+    """
+    start = (page_number - 1) * page_size
+    return make_result_set(items[start:start + page_size], len(items))
+
+
+class FakeMTurkConnection(object):
+    """Thread safe in-memory Mechanical Turk connection supporting the calls
+    made by parkme.turk. HITs become reviewable once all of their assignments
+    have been submitted with submit_assignment."""
+
+    def __init__(self, latency=0.0):
+        """Initialize the connection.
+
+        :param latency: Seconds each call blocks for, to simulate the network
+        :type latency: float
+        """
+        self.latency = latency
+        self.hits = {}
+        self.assignments = {}
+        self.num_calls = 0
+        self._hit_ids = []
+        self._assignment_ids = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _simulate_latency(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _get_hit(self, hit_id):
+        try:
+            return self.hits[hit_id]
+        except KeyError:
+            raise connection.MTurkRequestError(
+                400, 'Bad Request', 'HIT {} does not exist'.format(hit_id))
+
+    def create_hit(self, hit_type=None, hit_layout=None, max_assignments=1,
+                   annotation=None, **kwargs):
+        """Create a HIT. The HIT type defaults to the layout id."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            hit = connection.HIT(None)
+            hit.HITId = 'HIT{}'.format(next(self._ids))
+            hit.HITTypeId = hit_type or hit_layout
+            hit.HITStatus = ASSIGNABLE
+            hit.MaxAssignments = str(max_assignments)
+            hit.RequesterAnnotation = annotation
+            hit.layout_params = kwargs.get('layout_params')
+            self.hits[hit.HITId] = hit
+            self._hit_ids.append(hit.HITId)
+            return make_result_set([hit])
+
+    def submit_assignment(self, hit_id, worker_id, answers, work_seconds=60):
+        """Submit an assignment for the given HIT on behalf of a worker.
+
+        :param hit_id: A HIT ID
+        :type hit_id: str or unicode
+        :param worker_id: A worker ID
+        :type worker_id: str or unicode
+        :param answers: The answer fields to each question
+        :type answers: dict of question id to list of str
+        :param work_seconds: Seconds the worker spent on the assignment
+        :type work_seconds: int
+        :rtype: boto.mturk.connection.Assignment
+        """
+        with self._lock:
+            hit = self._get_hit(hit_id)
+            submit_time = datetime.datetime.utcnow()
+            accept_time = submit_time - datetime.timedelta(
+                seconds=work_seconds)
+            assignment = connection.Assignment(None)
+            assignment.AssignmentId = 'ASSIGNMENT{}'.format(next(self._ids))
+            assignment.HITId = hit_id
+            assignment.WorkerId = worker_id
+            assignment.AssignmentStatus = SUBMITTED
+            assignment.AcceptTime = accept_time.strftime(
+                assignments.TIMESTAMP_FORMAT)
+            assignment.SubmitTime = submit_time.strftime(
+                assignments.TIMESTAMP_FORMAT)
+            assignment.answers = make_answers(answers)
+            self.assignments[assignment.AssignmentId] = assignment
+            self._assignment_ids.append(assignment.AssignmentId)
+            num_submitted = len([
+                each for each in self.assignments.itervalues()
+                if each.HITId == hit_id])
+            if num_submitted >= int(hit.MaxAssignments):
+                hit.HITStatus = REVIEWABLE
+            return assignment
+
+    def get_hit(self, hit_id, response_groups=None):
+        """Return the HIT with the given ID."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            return make_result_set([self._get_hit(hit_id)])
+
+    def get_all_hits(self):
+        """Return all HITs in creation order."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            return [self.hits[hit_id] for hit_id in self._hit_ids]
+
+    def get_reviewable_hits(self, hit_type=None, status=REVIEWABLE,
+                            page_size=10, page_number=1, **kwargs):
+        """Return a page of HITs with the given status."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            matching = [
+                self.hits[hit_id] for hit_id in self._hit_ids
+                if self.hits[hit_id].HITStatus == status and
+                hit_type in (None, self.hits[hit_id].HITTypeId)]
+            return get_page(matching, page_size, page_number)
+
+    def set_reviewing(self, hit_id, revert=None):
+        """Move a reviewable HIT to reviewing, or back if reverting."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            hit = self._get_hit(hit_id)
+            expected, new = (
+                (REVIEWING, REVIEWABLE) if revert else (REVIEWABLE, REVIEWING))
+            if hit.HITStatus != expected:
+                raise connection.MTurkRequestError(
+                    400, 'Bad Request',
+                    'HIT {} is {}'.format(hit_id, hit.HITStatus))
+            hit.HITStatus = new
+
+    def extend_hit(self, hit_id, assignments_increment=None,
+                   expiration_increment=None):
+        """Request additional assignments for a HIT."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            hit = self._get_hit(hit_id)
+            hit.MaxAssignments = str(
+                int(hit.MaxAssignments) + (assignments_increment or 0))
+            if assignments_increment:
+                hit.HITStatus = ASSIGNABLE
+
+    def get_assignments(self, hit_id, status=None, page_size=10,
+                        page_number=1, **kwargs):
+        """Return a page of the assignments submitted for a HIT."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            self._get_hit(hit_id)
+            all_assignments = [
+                self.assignments[assignment_id]
+                for assignment_id in self._assignment_ids]
+            matching = [
+                each for each in all_assignments
+                if each.HITId == hit_id and
+                status in (None, each.AssignmentStatus)]
+            return get_page(matching, page_size, page_number)
+
+    def approve_assignment(self, assignment_id, feedback=None):
+        """Approve a submitted assignment."""
+        self._simulate_latency()
+        with self._lock:
+            self.num_calls += 1
+            try:
+                assignment = self.assignments[assignment_id]
+            except KeyError:
+                raise connection.MTurkRequestError(
+                    400, 'Bad Request',
+                    'Assignment {} does not exist'.format(assignment_id))
+            if assignment.AssignmentStatus != SUBMITTED:
+                raise connection.MTurkRequestError(
+                    200, 'OK',
+                    'Assignment {} is {}'.format(
+                        assignment_id, assignment.AssignmentStatus))
+            assignment.AssignmentStatus = APPROVED
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.gold
+    ~~~~~~~~~~~~~~~~
+    Gold assets are assets with known answers that are mixed into batches of
+    HITs. Workers' answers on them measure their accuracy directly rather than
+    through agreement with other workers.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import math
+import random
+
+from parkme import models
+
+
+# Fraction of the items in a batch that are gold assets
+GOLD_FRACTION = 0.05
+
+
+def mix_in_gold(items, gold_items, fraction=GOLD_FRACTION, rng=random):
+    """Return the given items with gold items inserted at random positions,
+    making up about the given fraction of the result. Each gold item is
+    used at most once.
+
+    :param items: The items of the batch
+    :type items: list
+    :param gold_items: The gold items to choose from
+    :type gold_items: list
+    :param fraction: Fraction of the result that should be gold
+    :type fraction: float
+    :param rng: (Optional) Source of randomness
+    :type rng: random.Random
+    :rtype: list
+    """
+    if not items or not gold_items or fraction <= 0:
+        return list(items)
+    num_gold = int(math.ceil(len(items) * fraction / (1.0 - fraction)))
+    mixed = list(items)
+    for gold_item in rng.sample(gold_items, min(num_gold, len(gold_items))):
+        mixed.insert(rng.randint(0, len(mixed)), gold_item)
+    return mixed
+
+
+def score_assignments(assignments, gold_assets, is_correct):
+    """Split the given assignments into those for gold assets, scored against
+    their known answers, and the rest, in a single pass.
+
+    :param assignments: Assignments with an asset_id
+    :type assignments: iterable of parkme.turk.assignments.BaseAssignment
+    :param gold_assets: The gold assets by asset id
+    :type gold_assets: dict of asset id to parkme.models.GoldAsset
+    :param is_correct: Indicates whether an assignment matches a known answer
+    :type is_correct: callable
+    :return: The gold results and the assignments for other assets
+    :rtype: tuple of (list of parkme.models.GoldResult, list)
+    """
+    gold_results = []
+    other_assignments = []
+    for each in assignments:
+        gold_asset = gold_assets.get(each.asset_id)
+        if gold_asset is None:
+            other_assignments.append(each)
+            continue
+        gold_results.append(models.GoldResult(
+            assignment_id=each.assignment_id,
+            worker_id=each.worker_id,
+            asset_id=each.asset_id,
+            correct=bool(is_correct(each, gold_asset.answer))))
+    return gold_results, other_assignments
+
+
+def grade_gold_only_assignments(gold_results, other_assignments):
+    """Grade the assignments that only answered gold assets. Such an
+    assignment is correct when every one of its gold answers is; those
+    that also answered other assets are left to be reviewed with them.
+
+    :param gold_results: The scored gold answers, see score_assignments
+    :type gold_results: list of parkme.models.GoldResult
+    :param other_assignments: The assignments for other assets
+    :type other_assignments: list of parkme.turk.assignments.BaseAssignment
+    :return: Whether each gold-only assignment is correct
+    :rtype: dict of assignment id to bool
+    """
+    reviewed_assignment_ids = set(
+        each.assignment_id for each in other_assignments)
+    grades = {}
+    for each in gold_results:
+        if each.assignment_id not in reviewed_assignment_ids:
+            grades[each.assignment_id] = (
+                grades.get(each.assignment_id, True) and each.correct)
+    return grades
@@ -5,14 +5,45 @@
 
     Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
 """
+import collections
 import datetime
 import functools
 import itertools
+import math
 
 from boto.mturk import layoutparam
 from boto.mturk import price
 
 
+# Commission Amazon charges on each assignment's reward
+MTURK_FEE_RATE = 0.20
+
+# Commission charged instead on HITs with at least
+# LARGE_HIT_MIN_ASSIGNMENTS assignments
+MTURK_LARGE_HIT_FEE_RATE = 0.40
+LARGE_HIT_MIN_ASSIGNMENTS = 10
+
+# Smallest commission charged on each assignment in dollars
+MTURK_MIN_FEE_PER_ASSIGNMENT = 0.01
+
+# Seconds a worker takes to complete an assignment when there are no
+# historical statistics to go on
+DEFAULT_SECONDS_PER_ASSIGNMENT = 60.0
+
+# Number of workers assumed to be working on a batch at once
+DEFAULT_NUM_WORKERS = 10
+
+# Predicted spend and completion time of uploading a batch of HITs
+BatchPlan = collections.namedtuple(
+    'BatchPlan',
+    ['num_hits',
+     'num_assignments',
+     'reward_cost',
+     'fee_cost',
+     'total_cost',
+     'duration'])
+
+
 def in_batch(hit, batch_id):
     """Indicates whether or not the given HIT is in the batch with the given
     ID.
@@ -57,6 +88,40 @@ def filter_by_batch_id(hits, batch_id):
     return itertools.ifilter(in_batch_with_id, hits)
 
 
+def get_max_assignments(hit):
+    """Return the number of assignments requested for the given HIT.
+
+    :param hit: A HIT
+    :type hit: mturk.connection.HIT
+    :rtype: int or None
+    """
+    try:
+        return int(hit.MaxAssignments)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def get_seconds_per_assignment(
+        worker_stats, default=DEFAULT_SECONDS_PER_ASSIGNMENT):
+    """Return the mean time workers have historically taken to complete an
+    assignment.
+
+    :param worker_stats: An iterable of worker statistics
+    :type worker_stats: iterable of parkme.models.WorkerStats
+    :param default: Seconds to return if no assignments were recorded
+    :type default: float
+    :rtype: float
+    """
+    num_assignments = 0
+    total_work_seconds = 0.0
+    for each in worker_stats:
+        num_assignments += each.num_assignments or 0
+        total_work_seconds += float(each.total_work_seconds or 0)
+    if not num_assignments or not total_work_seconds:
+        return default
+    return total_work_seconds / num_assignments
+
+
 def dict_to_layout_parameters(dict_to_convert):
     """Convert a dictionary into Mechanical Turk layout parameters. Mechanical
     turk layout parameters are really just an overly formalized dictionary.
@@ -74,6 +139,35 @@ def dict_to_layout_parameters(dict_to_convert):
     return layoutparam.LayoutParameters(params)
 
 
+def get_item_name(name, item_index):
+    """Return the name of the given layout parameter or question for the item
+    with the given index in a bundled HIT.
+
+    :param name: A layout parameter or question name
+    :type name: str or unicode
+    :param item_index: The 1-based index of the item in the HIT
+    :type item_index: int
+    :rtype: str or unicode
+    """
+    return '{}_{}'.format(name, item_index)
+
+
+def bundle_params(items):
+    """Pack the template params of several items into the params of a single
+    HIT. Each item's params are suffixed with the item's 1-based index (eg.
+    asset_id_2) and num_items holds the number of items.
+
+    :param items: The template params of each item
+    :type items: list of dict
+    :rtype: dict
+    """
+    params = {'num_items': len(items)}
+    for item_index, item in enumerate(items, 1):
+        for key, value in item.iteritems():
+            params[get_item_name(key, item_index)] = value
+    return params
+
+
 class HITTemplate(object):
     """Represents a Mechanical Turk HIT template that can be used to create
     HITs."""
@@ -88,7 +182,8 @@ class HITTemplate(object):
                  auto_approval_delay=datetime.timedelta(hours=8),
                  title=None,
                  description=None,
-                 keywords=None):
+                 keywords=None,
+                 qualifications=None):
         """Initialize the HIT template with some basic information.
 
         :param mturk_connection: The mechanical turk connection to use
@@ -112,6 +207,8 @@ class HITTemplate(object):
         :type description: str or unicode or None
         :param keywords: List of keywords
         :type keywords: list
+        :param qualifications: (Optional) Qualifications workers must have
+        :type qualifications: boto.mturk.qualification.Qualifications or None
         """
         self.mturk_connection = mturk_connection
         self.hit_layout_id = hit_layout_id
@@ -123,14 +220,17 @@ class HITTemplate(object):
         self.title = title
         self.description = description
         self.keywords = ','.join(keywords) if keywords else None
+        self.qualifications = qualifications
 
-    def create_hit(self, params, batch_id=None):
+    def create_hit(self, params, batch_id=None, max_assignments=None):
         """Create a new HIT using this template with the given params.
 
         :param params: A dictionary of template params
         :type params: dict
         :param batch_id: (Optional) Batch ID to be associated with HIT
         :type batch_id: str or unicode or None
+        :param max_assignments: (Optional) Override assignments_per_hit
+        :type max_assignments: int or None
         :rtype: boto.mturk.HIT
         """
         boto_params = dict_to_layout_parameters(params)
@@ -139,7 +239,7 @@ class HITTemplate(object):
         return self.mturk_connection.create_hit(
             hit_layout=self.hit_layout_id,
             reward=reward_price,
-            max_assignments=self.assignments_per_hit,
+            max_assignments=max_assignments or self.assignments_per_hit,
             lifetime=self.hit_expires_in,
             duration=self.time_per_assignment,
             approval_delay=self.auto_approval_delay,
@@ -147,4 +247,113 @@ class HITTemplate(object):
             layout_params=boto_params,
             title=self.title,
             description=self.description,
-            keywords=self.keywords)
+            keywords=self.keywords,
+            qualifications=self.qualifications)
+
+    def create_bundled_hit(self, items, batch_id=None, max_assignments=None):
+        """Create a new HIT using this template covering several items at
+        once, see bundle_params.
+
+        :param items: The template params of each item
+        :type items: list of dict
+        :param batch_id: (Optional) Batch ID to be associated with HIT
+        :type batch_id: str or unicode or None
+        :param max_assignments: (Optional) Override assignments_per_hit
+        :type max_assignments: int or None
+        :rtype: boto.mturk.HIT
+        """
+        return self.create_hit(
+            bundle_params(items),
+            batch_id=batch_id,
+            max_assignments=max_assignments)
+
+    def extend_hit(self, hit_id, assignments_increment=1):
+        """Request additional assignments for an existing HIT.
+
+        :param hit_id: The HIT ID
+        :type hit_id: str or unicode
+        :param assignments_increment: The number of assignments to add
+        :type assignments_increment: int
+        """
+        return self.mturk_connection.extend_hit(
+            hit_id, assignments_increment=assignments_increment)
+
+    def get_fee_per_assignment(self):
+        """Return the commission Amazon charges on each assignment.
+
+        :rtype: float
+        """
+        if self.assignments_per_hit >= LARGE_HIT_MIN_ASSIGNMENTS:
+            fee_rate = MTURK_LARGE_HIT_FEE_RATE
+        else:
+            fee_rate = MTURK_FEE_RATE
+        return max(
+            MTURK_MIN_FEE_PER_ASSIGNMENT,
+            self.reward_per_assignment * fee_rate)
+
+    def plan(self,
+             num_hits,
+             seconds_per_assignment=DEFAULT_SECONDS_PER_ASSIGNMENT,
+             num_workers=DEFAULT_NUM_WORKERS):
+        """Predict the spend and wall-clock completion time of creating the
+        given number of HITs from this template.
+
+        :param num_hits: The number of HITs
+        :type num_hits: int
+        :param seconds_per_assignment: Mean time a worker takes to complete
+            an assignment, see get_seconds_per_assignment
+        :type seconds_per_assignment: float
+        :param num_workers: Number of workers working on the HITs at once
+        :type num_workers: int
+        :rtype: BatchPlan
+        """
+        num_assignments = num_hits * self.assignments_per_hit
+        reward_cost = num_assignments * self.reward_per_assignment
+        fee_cost = (
+            num_assignments * self.get_fee_per_assignment()
+            if num_assignments
+            else 0.0)
+        num_rounds = math.ceil(float(num_assignments) / num_workers)
+        return BatchPlan(
+            num_hits=num_hits,
+            num_assignments=num_assignments,
+            reward_cost=reward_cost,
+            fee_cost=fee_cost,
+            total_cost=reward_cost + fee_cost,
+            duration=datetime.timedelta(
+                seconds=num_rounds * seconds_per_assignment))
+
+    def plan_sub_batches(self,
+                         num_hits,
+                         deadline,
+                         seconds_per_assignment=DEFAULT_SECONDS_PER_ASSIGNMENT,
+                         num_workers=DEFAULT_NUM_WORKERS):
+        """Split the given number of HITs into consecutive sub-batches that
+        are each predicted to complete within the given deadline.
+
+        :param num_hits: The number of HITs
+        :type num_hits: int
+        :param deadline: Longest time each sub-batch may take to complete
+        :type deadline: datetime.timedelta
+        :param seconds_per_assignment: Mean time a worker takes to complete
+            an assignment, see get_seconds_per_assignment
+        :type seconds_per_assignment: float
+        :param num_workers: Number of workers working on the HITs at once
+        :type num_workers: int
+        :rtype: list of BatchPlan
+        :raises ValueError: If not even one HIT can complete within the
+            deadline
+        """
+        num_rounds = int(
+            deadline.total_seconds() // seconds_per_assignment)
+        max_hits = num_rounds * num_workers // self.assignments_per_hit
+        if not max_hits:
+            raise ValueError(
+                'Assignments take {:.0f}s, longer than the deadline'.format(
+                    seconds_per_assignment))
+        return [
+            self.plan(
+                min(max_hits, num_hits - start),
+                seconds_per_assignment,
+                num_workers)
+            for start in xrange(0, num_hits, max_hits)]
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.metrics
+    ~~~~~~~~~~~~~~~~~~~
+    Call counts, error counts and latency histograms for each Mechanical Turk
+    operation. Wrapping a connection in an InstrumentedMTurkConnection records
+    every call made through it, so a slow run can be attributed to the API or
+    to everything else.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import bisect
+import collections
+import json
+import threading
+import time
+
+
+# Upper bounds in seconds of the latency histogram buckets. Calls slower
+# than the last bound are only counted in the implicit +Inf bucket.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Prefix of the exported Prometheus metric names
+PROMETHEUS_PREFIX = 'mturk'
+
+# A snapshot of the metrics of one operation. bucket_counts holds the number
+# of calls in each bucket, not cumulative, with the +Inf bucket last.
+OperationMetrics = collections.namedtuple(
+    'OperationMetrics',
+    ['operation',
+     'num_calls',
+     'num_errors',
+     'total_seconds',
+     'bucket_counts'])
+
+
+class CallMetrics(object):
+    """Thread-safe registry of the calls made for each operation."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """Initialize the registry.
+
+        :param buckets: Ascending upper bounds of the latency buckets
+        :type buckets: sequence of float
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def record(self, operation, seconds, error=False):
+        """Record a single call.
+
+        :param operation: The operation name, eg. create_hit
+        :type operation: str
+        :param seconds: How long the call took
+        :type seconds: float
+        :param error: Whether the call raised an exception
+        :type error: bool
+        """
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self._operations.get(operation)
+            if counts is None:
+                counts = self._operations[operation] = [
+                    0, 0, 0.0, [0] * (len(self.buckets) + 1)]
+            counts[0] += 1
+            counts[1] += 1 if error else 0
+            counts[2] += seconds
+            counts[3][bucket] += 1
+
+    def get_all(self):
+        """Return a snapshot of the metrics of each operation, in order of
+        operation name.
+
+        :rtype: list of OperationMetrics
+        """
+        with self._lock:
+            return [
+                OperationMetrics(
+                    operation=operation,
+                    num_calls=counts[0],
+                    num_errors=counts[1],
+                    total_seconds=counts[2],
+                    bucket_counts=tuple(counts[3]))
+                for operation, counts in sorted(self._operations.items())]
+
+    def get_total_seconds(self):
+        """Return the total time spent in calls across all operations.
+
+        :rtype: float
+        """
+        return sum(each.total_seconds for each in self.get_all())
+
+    def to_json(self):
+        """Export the metrics as JSON, with cumulative bucket counts keyed by
+        their upper bound as Prometheus does.
+
+        :rtype: str
+        """
+        return json.dumps(
+            {each.operation: {
+                'calls': each.num_calls,
+                'errors': each.num_errors,
+                'total_seconds': each.total_seconds,
+                'buckets': collections.OrderedDict(
+                    self._iter_cumulative_buckets(each))}
+             for each in self.get_all()},
+            indent=2,
+            sort_keys=True)
+
+    def to_prometheus(self):
+        """Export the metrics in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        calls_name = '{}_calls_total'.format(PROMETHEUS_PREFIX)
+        errors_name = '{}_errors_total'.format(PROMETHEUS_PREFIX)
+        duration_name = '{}_call_duration_seconds'.format(PROMETHEUS_PREFIX)
+        all_metrics = self.get_all()
+        lines = [
+            '# HELP {} Mechanical Turk calls made.'.format(calls_name),
+            '# TYPE {} counter'.format(calls_name)]
+        lines.extend(
+            '{}{{operation="{}"}} {}'.format(
+                calls_name, each.operation, each.num_calls)
+            for each in all_metrics)
+        lines.extend([
+            '# HELP {} Mechanical Turk calls that failed.'.format(
+                errors_name),
+            '# TYPE {} counter'.format(errors_name)])
+        lines.extend(
+            '{}{{operation="{}"}} {}'.format(
+                errors_name, each.operation, each.num_errors)
+            for each in all_metrics)
+        lines.extend([
+            '# HELP {} Mechanical Turk call latency.'.format(duration_name),
+            '# TYPE {} histogram'.format(duration_name)])
+        for each in all_metrics:
+            for upper_bound, count in self._iter_cumulative_buckets(each):
+                lines.append('{}_bucket{{operation="{}",le="{}"}} {}'.format(
+                    duration_name, each.operation, upper_bound, count))
+            lines.append('{}_sum{{operation="{}"}} {!r}'.format(
+                duration_name, each.operation, each.total_seconds))
+            lines.append('{}_count{{operation="{}"}} {}'.format(
+                duration_name, each.operation, each.num_calls))
+        return '\n'.join(lines) + '\n'
+
+    def _iter_cumulative_buckets(self, operation_metrics):
+        """Generator yielding the upper bound label of each bucket and the
+        number of calls at most that long.
+
+        :rtype: iterable of tuple of (str, int)
+        """
+        cumulative = 0
+        upper_bounds = [repr(each) for each in self.buckets] + ['+Inf']
+        for upper_bound, count in zip(
+                upper_bounds, operation_metrics.bucket_counts):
+            cumulative += count
+            yield upper_bound, cumulative
+
+
+def write_metrics(call_metrics, file_path):
+    """Write the given metrics to a file, in the Prometheus text format if
+    its name ends with .prom and as JSON otherwise.
+
+    :param call_metrics: The metrics
+    :type call_metrics: CallMetrics
+    :param file_path: The path to the file
+    :type file_path: str or unicode
+    """
+    content = (
+        call_metrics.to_prometheus()
+        if file_path.endswith('.prom')
+        else call_metrics.to_json())
+    with open(file_path, 'w') as metrics_file:
+        metrics_file.write(content)
+
+
+def format_summary(call_metrics):
+    """Return a line for each operation with its calls, errors and mean and
+    total latency.
+
+    :param call_metrics: The metrics
+    :type call_metrics: CallMetrics
+    :rtype: list of str
+    """
+    return [
+        '{} {} calls, {} errors, {:.3f}s mean, {:.1f}s total'.format(
+            each.operation,
+            each.num_calls,
+            each.num_errors,
+            each.total_seconds / each.num_calls,
+            each.total_seconds)
+        for each in call_metrics.get_all()]
+
+
+def report_call_metrics(call_metrics, wall_seconds, metrics_file_path):
+    """Print a summary of the Mechanical Turk calls made and how much of the
+    run they took, and write their metrics to the given file.
+
+    :param call_metrics: The metrics
+    :type call_metrics: CallMetrics
+    :param wall_seconds: How long the run took
+    :type wall_seconds: float
+    :param metrics_file_path: The path to the metrics file
+    :type metrics_file_path: str or unicode
+    """
+    print
+    print 'MECHANICAL TURK CALLS'
+    for line in format_summary(call_metrics):
+        print line
+    api_seconds = call_metrics.get_total_seconds()
+    print '{:.1f}s of {:.1f}s in Mechanical Turk calls ({:.0%})'.format(
+        api_seconds,
+        wall_seconds,
+        api_seconds / wall_seconds if wall_seconds else 0.0)
+    write_metrics(call_metrics, metrics_file_path)
+
+
+class InstrumentedMTurkConnection(object):
+    """Wraps a Mechanical Turk connection, recording every method call made
+    through it. Attributes that aren't methods are passed through.
+
+    Some boto methods, such as get_all_hits, return an iterator that requests
+    further pages as it is consumed. Time spent consuming such an iterator is
+    added to the call, which is recorded once the iterator is exhausted, or
+    when it is closed or garbage collected if it is abandoned before then.
+    """
+
+    def __init__(self, mturk_connection, call_metrics, clock=time.time):
+        """Initialize the wrapper.
+
+        :param mturk_connection: A Mechanical Turk connection
+        :type mturk_connection: boto.mturk.connection.MTurkConnection
+        :param call_metrics: Where calls are recorded
+        :type call_metrics: CallMetrics
+        :param clock: Returns the current time in seconds
+        :type clock: callable
+        """
+        self.mturk_connection = mturk_connection
+        self.call_metrics = call_metrics
+        self._clock = clock
+
+    def __getattr__(self, name):
+        attribute = getattr(self.mturk_connection, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            start = self._clock()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception:
+                self.call_metrics.record(name, self._clock() - start, True)
+                raise
+            seconds = self._clock() - start
+            if _is_iterator(result):
+                return _InstrumentedIterator(
+                    result, name, seconds, self.call_metrics, self._clock)
+            self.call_metrics.record(name, seconds)
+            return result
+        return call
+
+
+def _is_iterator(result):
+    """Return whether the given call result is a lazy iterator. Result sets
+    and lists can be iterated repeatedly and are not.
+
+    :rtype: bool
+    """
+    return isinstance(result, collections.Iterator)
+
+
+class _InstrumentedIterator(object):
+    """Iterator adding the time spent consuming it to a call. The call is
+    recorded exactly once."""
+
+    def __init__(self, iterator, operation, seconds, call_metrics, clock):
+        self.iterator = iterator
+        self.operation = operation
+        self.seconds = seconds
+        self.call_metrics = call_metrics
+        self._clock = clock
+        self._is_recorded = False
+
+    def __iter__(self):
+        return self
+
+    def __del__(self):
+        self._record()
+
+    def next(self):
+        start = self._clock()
+        try:
+            item = next(self.iterator)
+        except StopIteration:
+            self.seconds += self._clock() - start
+            self._record()
+            raise
+        except Exception:
+            self.seconds += self._clock() - start
+            self._record(error=True)
+            raise
+        self.seconds += self._clock() - start
+        return item
+
+    def close(self):
+        """Stop consuming the iterator, recording the call."""
+        close = getattr(self.iterator, 'close', None)
+        if close is not None:
+            close()
+        self._record()
+
+    def _record(self, error=False):
+        """Record the call unless it already was.
+
+        :param error: Whether consuming the iterator raised an exception
+        :type error: bool
+        """
+        if self._is_recorded:
+            return
+        self._is_recorded = True
+        self.call_metrics.record(self.operation, self.seconds, error)
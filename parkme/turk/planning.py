@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.planning
+    ~~~~~~~~~~~~~~~~~~~~
+    Prints the predicted spend and completion time of uploading a batch of
+    HITs before it is uploaded, see parkme.turk.hits.HITTemplate.plan. A
+    batch that wouldn't complete within a deadline is uploaded as consecutive
+    sub-batches that each would.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import math
+import time
+
+from parkme.turk import hits
+
+
+def get_num_hits(num_items, bundle_size=1):
+    """Return the number of HITs needed for the given number of items.
+
+    :param num_items: The number of items
+    :type num_items: int
+    :param bundle_size: Number of items in each HIT
+    :type bundle_size: int
+    :rtype: int
+    """
+    return int(math.ceil(float(num_items) / bundle_size))
+
+
+def print_plan(hit_template, num_hits, worker_stats, num_workers,
+               deadline=None):
+    """Print the predicted spend and completion time of the given number of
+    HITs, based on how long workers have historically taken.
+
+    :param hit_template: A HIT template
+    :type hit_template: parkme.turk.hits.HITTemplate
+    :param num_hits: The number of HITs
+    :type num_hits: int
+    :param worker_stats: The historical statistics of each worker
+    :type worker_stats: iterable of parkme.models.WorkerStats
+    :param num_workers: Number of workers assumed to work at once
+    :type num_workers: int
+    :param deadline: (Optional) Split the HITs into sub-batches that each
+        complete within this time
+    :type deadline: datetime.timedelta or None
+    :return: The sub-batches to upload, the whole batch if there is no
+        deadline or it can't be met
+    :rtype: list of parkme.turk.hits.BatchPlan
+    """
+    seconds_per_assignment = hits.get_seconds_per_assignment(worker_stats)
+    plan = hit_template.plan(num_hits, seconds_per_assignment, num_workers)
+    print
+    print '{} HITs, {} Assignments'.format(plan.num_hits, plan.num_assignments)
+    print 'Est. Cost: ${:0.02f} (${:0.02f} payout, ${:0.02f} fees)'.format(
+        plan.total_cost, plan.reward_cost, plan.fee_cost)
+    print 'Est. Duration: {} ({:.0f}s per assignment)'.format(
+        plan.duration, seconds_per_assignment)
+    if deadline is None or not num_hits:
+        return [plan]
+    try:
+        sub_batches = hit_template.plan_sub_batches(
+            num_hits, deadline, seconds_per_assignment, num_workers)
+    except ValueError as e:
+        print 'Cannot meet deadline: {}'.format(e)
+        return [plan]
+    print '{} Sub-batches to complete each within {}:'.format(
+        len(sub_batches), deadline)
+    for sub_batch in sub_batches:
+        print '  {} HITs, ${:0.02f}, {}'.format(
+            sub_batch.num_hits, sub_batch.total_cost, sub_batch.duration)
+    return sub_batches
+
+
+def iter_sub_batches(sub_batches, sleep=time.sleep):
+    """Generator yielding each sub-batch once the previous one is predicted
+    to have completed, so they are uploaded one after another.
+
+    :param sub_batches: The sub-batches, see print_plan
+    :type sub_batches: list of parkme.turk.hits.BatchPlan
+    :param sleep: Waits the given number of seconds
+    :type sleep: callable
+    :rtype: iterable of parkme.turk.hits.BatchPlan
+    """
+    for index, sub_batch in enumerate(sub_batches):
+        if index:
+            previous = sub_batches[index - 1]
+            print 'Waiting {} for sub-batch {} of {} to complete'.format(
+                previous.duration, index, len(sub_batches))
+            sleep(previous.duration.total_seconds())
+        yield sub_batch
@@ -1,6 +1,46 @@
 # -*- coding: utf-8 -*-
+"""
+    parkme.turk.qualifications
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+    Qualification tests that workers must pass before working on HITs. Tests
+    are rendered as Mechanical Turk question forms, incoming qualification
+    requests are graded against the expected answers, and the qualification is
+    revoked from workers whose work later disagrees with consensus too often.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import functools
+import json
+import os
+
+from boto.mturk import qualification
 from boto.mturk import question
 
+from parkme.turk import assignments
+
+
+# Fraction of test questions a worker must answer correctly to qualify
+PASSING_SCORE = 0.8
+
+# Fraction of assignments agreeing with consensus below which a qualified
+# worker has the qualification revoked
+MIN_ACCURACY = 0.6
+
+# Assignments a worker must have completed before their accuracy is judged
+MIN_ASSIGNMENTS_FOR_REVOCATION = 20
+
+# The number of requests or qualifications requested per page
+PAGE_SIZE = 100
+
+# The outcome of grading a single qualification request
+QualificationGrade = collections.namedtuple(
+    'QualificationGrade',
+    ['qualification_request_id',
+     'worker_id',
+     'score',
+     'passed'])
+
 
 class QualificationAssignment(object):
     """Helper object to simplify creating qualification assignments"""
@@ -8,12 +48,328 @@ class QualificationAssignment(object):
     def __init__(self, overview, questions, expected_answers):
         """Takes a list of questions and the expected answers for the assignment.
 
-        :param overview: The questions overview
+        :param overview: The questions overview with title and text keys
         :type overview: dict
-        :param questions: A dict containing questions
+        :param questions: A dict of question id to a dict with the question
+            text, its choices as (text, answer) pairs, and optionally an
+            image_url and whether multiple choices may be selected
         :type questions: dict
-        :param expected_answers: Dict of question id to expected answer
+        :param expected_answers: Dict of question id to expected answer, or
+            list of answers for questions allowing multiple choices
         :type expected_answers: dict
         """
+        self.overview = overview
         self.questions = questions
         self.expected_answers = expected_answers
+
+    @classmethod
+    def load(cls, json_file_path):
+        """Load a qualification assignment from the given JSON file with
+        overview, questions and expected_answers keys.
+
+        :param json_file_path: The path to the file
+        :type json_file_path: str or unicode
+        :rtype: QualificationAssignment
+        """
+        with open(json_file_path, 'r') as json_file:
+            test = json.load(json_file)
+        return cls(
+            test['overview'], test['questions'], test['expected_answers'])
+
+    def get_question_form(self):
+        """Return the test as a question form, with questions in order of
+        their ids.
+
+        :rtype: boto.mturk.question.QuestionForm
+        """
+        question_form = question.QuestionForm()
+        overview = question.Overview()
+        overview.append_field('Title', self.overview['title'])
+        overview.append_field('Text', self.overview['text'])
+        question_form.append(overview)
+
+        for question_id in sorted(self.questions):
+            spec = self.questions[question_id]
+            content = question.QuestionContent()
+            content.append_field('Text', spec['text'])
+            if spec.get('image_url'):
+                content.append(get_image_content(spec['image_url']))
+            multiple = spec.get('multiple', False)
+            choices = [tuple(choice) for choice in spec['choices']]
+            selection = question.SelectionAnswer(
+                min=1,
+                max=len(choices) if multiple else 1,
+                style='checkbox' if multiple else 'radiobutton',
+                selections=choices)
+            question_form.append(question.Question(
+                identifier=question_id,
+                content=content,
+                answer_spec=question.AnswerSpecification(selection),
+                is_required=True))
+        return question_form
+
+    def grade(self, answers):
+        """Return the fraction of questions answered as expected.
+
+        :param answers: The selected answers to each question
+        :type answers: dict of question id to list of str or unicode
+        :rtype: float
+        """
+        if not self.expected_answers:
+            return 0.0
+        num_correct = 0
+        for question_id, expected in self.expected_answers.iteritems():
+            if isinstance(expected, basestring):
+                expected = [expected]
+            if set(answers.get(question_id) or []) == set(expected):
+                num_correct += 1
+        return float(num_correct) / len(self.expected_answers)
+
+
+def get_image_content(image_url):
+    """Return question content displaying the image at the given URL.
+
+    :param image_url: The image URL
+    :type image_url: str or unicode
+    :rtype: boto.mturk.question.Binary
+    """
+    subtype = os.path.splitext(image_url)[1].lstrip('.').lower() or 'jpeg'
+    return question.Binary(
+        'image', 'jpeg' if subtype == 'jpg' else subtype, image_url, 'Photo')
+
+
+def get_request_answers(qualification_request, question_ids):
+    """Return the answers to the given questions in a qualification request.
+
+    :param qualification_request: A qualification request
+    :type qualification_request: boto.mturk.connection.QualificationRequest
+    :param question_ids: The question ids
+    :type question_ids: iterable of str or unicode
+    :rtype: dict of question id to list of str or unicode
+    """
+    answers = {}
+    for question_id in question_ids:
+        answer = assignments.get_answer_to_question(
+            qualification_request, question_id)
+        answers[question_id] = list(answer.fields) if answer else []
+    return answers
+
+
+def iter_pages(get_page, page_size=PAGE_SIZE):
+    """Generator yielding every result of a paged Mechanical Turk request.
+
+    :param get_page: Returns the page with the given size and number
+    :type get_page: callable
+    :param page_size: The number of results requested per page
+    :type page_size: int
+    :rtype: iterable
+    """
+    page_number = 1
+    while True:
+        result_set = get_page(page_size=page_size, page_number=page_number)
+        for each in result_set:
+            yield each
+        total_num_results = int(getattr(result_set, 'TotalNumResults', 0))
+        if page_number * page_size >= total_num_results:
+            return
+        page_number += 1
+
+
+def get_qualifications(qualification_type_id, min_score):
+    """Return HIT qualifications requiring workers to have scored at least
+    the given percentage on the given qualification test.
+
+    :param qualification_type_id: The qualification type id
+    :type qualification_type_id: str or unicode
+    :param min_score: The lowest score allowed, as a percentage
+    :type min_score: int
+    :rtype: boto.mturk.qualification.Qualifications
+    """
+    return qualification.Qualifications([
+        qualification.Requirement(
+            qualification_type_id, 'GreaterThanOrEqualTo', min_score)])
+
+
+def get_accuracy(worker_stats):
+    """Return the fraction of a worker's assignments that agreed with the
+    consensus.
+
+    :param worker_stats: The worker's statistics
+    :type worker_stats: parkme.models.WorkerStats
+    :rtype: float
+    """
+    if not worker_stats.num_assignments:
+        return 0.0
+    return float(worker_stats.num_agreed) / worker_stats.num_assignments
+
+
+class QualificationGrader(object):
+    """Grades pending requests for a qualification type against its test and
+    grants or rejects them, and revokes the qualification from workers who
+    turn out to be inaccurate."""
+
+    def __init__(self,
+                 mturk_connection,
+                 qualification_type_id,
+                 qualification_assignment,
+                 passing_score=PASSING_SCORE):
+        """Initialize the grader.
+
+        :param mturk_connection: A Mechanical Turk connection
+        :type mturk_connection: boto.mturk.connection.MTurkConnection
+        :param qualification_type_id: The qualification type id
+        :type qualification_type_id: str or unicode
+        :param qualification_assignment: The qualification test
+        :type qualification_assignment: QualificationAssignment
+        :param passing_score: Fraction of questions a worker must answer
+            correctly to be granted the qualification
+        :type passing_score: float
+        """
+        self.mturk_connection = mturk_connection
+        self.qualification_type_id = qualification_type_id
+        self.qualification_assignment = qualification_assignment
+        self.passing_score = passing_score
+
+    def create_qualification_type(self, name, description, keywords=None,
+                                  retry_delay=None, test_duration=3600):
+        """Create a new qualification type using this grader's test, and
+        start grading requests for it.
+
+        :param name: The qualification type name
+        :type name: str or unicode
+        :param description: The qualification type description
+        :type description: str or unicode
+        :param keywords: (Optional) List of keywords
+        :type keywords: list or None
+        :param retry_delay: (Optional) Seconds before a worker may retake
+            the test, None to never allow retakes
+        :type retry_delay: int or None
+        :param test_duration: Seconds a worker has to complete the test
+        :type test_duration: int
+        :return: The new qualification type id
+        :rtype: str or unicode
+        """
+        result = self.mturk_connection.create_qualification_type(
+            name,
+            description,
+            'Active',
+            keywords=','.join(keywords) if keywords else None,
+            retry_delay=retry_delay,
+            test=self.qualification_assignment.get_question_form(),
+            test_duration=test_duration)
+        self.qualification_type_id = result[0].QualificationTypeId
+        return self.qualification_type_id
+
+    def grade_request(self, qualification_request):
+        """Grade the given qualification request.
+
+        :param qualification_request: A qualification request
+        :type qualification_request: boto.mturk.connection.QualificationRequest
+        :rtype: QualificationGrade
+        """
+        answers = get_request_answers(
+            qualification_request,
+            self.qualification_assignment.expected_answers.keys())
+        score = self.qualification_assignment.grade(answers)
+        return QualificationGrade(
+            qualification_request_id=(
+                qualification_request.QualificationRequestId),
+            worker_id=qualification_request.SubjectId,
+            score=score,
+            passed=score >= self.passing_score)
+
+    def grade_pending_requests(self, dry_run=False):
+        """Grade all pending qualification requests, granting the
+        qualification to workers that passed and rejecting the rest. Workers
+        are granted their score as a percentage.
+
+        :param dry_run: Grade requests without granting or rejecting them
+        :type dry_run: bool
+        :rtype: list of QualificationGrade
+        """
+        # Read every page before answering since answered requests leave
+        # the list and would shift later pages
+        qualification_requests = list(iter_pages(functools.partial(
+            self.mturk_connection.get_qualification_requests,
+            self.qualification_type_id)))
+        grades = [self.grade_request(each) for each in qualification_requests]
+        if dry_run:
+            return grades
+
+        for grade in grades:
+            if grade.passed:
+                self.mturk_connection.grant_qualification(
+                    grade.qualification_request_id,
+                    integer_value=int(round(grade.score * 100)))
+            else:
+                reject_qualification_request(
+                    self.mturk_connection,
+                    grade.qualification_request_id,
+                    reason='Scored {:.0%}, {:.0%} required to qualify'.format(
+                        grade.score, self.passing_score))
+        return grades
+
+    def revoke_inaccurate_workers(
+            self,
+            worker_stats_gateway,
+            min_accuracy=MIN_ACCURACY,
+            min_assignments=MIN_ASSIGNMENTS_FOR_REVOCATION,
+            dry_run=False):
+        """Revoke the qualification from qualified workers whose completed
+        assignments agree with consensus too rarely.
+
+        :param worker_stats_gateway: A worker stats data gateway
+        :type worker_stats_gateway: parkme.models.WorkerStatsDataGateway
+        :param min_accuracy: Fraction of assignments that must agree with
+            consensus to keep the qualification
+        :type min_accuracy: float
+        :param min_assignments: Assignments a worker must have completed
+            before their accuracy is judged
+        :type min_assignments: int
+        :param dry_run: Find inaccurate workers without revoking anything
+        :type dry_run: bool
+        :return: The stats of each worker whose qualification was revoked
+        :rtype: list of parkme.models.WorkerStats
+        """
+        get_qualifications = (
+            self.mturk_connection.get_qualifications_for_qualification_type)
+        qualified_worker_ids = [
+            each.SubjectId
+            for each in iter_pages(functools.partial(
+                get_qualifications, self.qualification_type_id))]
+        worker_stats = worker_stats_gateway.get_by_worker_ids(
+            qualified_worker_ids)
+        inaccurate = [
+            each for each in worker_stats.itervalues()
+            if each.num_assignments >= min_assignments and
+            get_accuracy(each) < min_accuracy]
+        if dry_run:
+            return inaccurate
+
+        for each in inaccurate:
+            self.mturk_connection.revoke_qualification(
+                each.worker_id,
+                self.qualification_type_id,
+                reason='Only {:.0%} of your answers agreed with other '
+                'workers'.format(get_accuracy(each)))
+        return inaccurate
+
+
+def reject_qualification_request(mturk_connection, qualification_request_id,
+                                 reason=None):
+    """Reject the qualification request with the given ID, which boto's
+    connection does not provide.
+
+    :param mturk_connection: A Mechanical Turk connection
+    :type mturk_connection: boto.mturk.connection.MTurkConnection
+    :param qualification_request_id: The qualification request id
+    :type qualification_request_id: str or unicode
+    :param reason: (Optional) The reason shown to the worker
+    :type reason: str or unicode or None
+    """
+    params = {'QualificationRequestId': qualification_request_id}
+    if reason:
+        params['Reason'] = reason
+    # pylint: disable=W0212
+    return mturk_connection._process_request(
+        'RejectQualificationRequest', params)
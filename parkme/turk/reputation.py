@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.reputation
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Worker reputation weights and weighted consensus over Mechanical Turk
+    assignments.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import itertools
+
+from parkme import models
+
+
+# Weight given to a worker without any recorded results
+DEFAULT_WEIGHT = 0.5
+
+# Summed weight of agreeing workers required for consensus once all of a
+# HIT's assignments are in. Two unknown workers reach it, which matches the
+# fixed two-vote rule used without weighting.
+CONSENSUS_WEIGHT = 1.0
+
+# Summed weight of agreeing workers required to decide a HIT early, before
+# all of its assignments are in. Requires two workers with at least 80%
+# agreement rates.
+EARLY_CONSENSUS_WEIGHT = 1.6
+
+# Number of consensus agreements a correct answer on a gold asset counts as,
+# since it is checked against a known answer rather than other workers
+GOLD_WEIGHT = 3.0
+
+
+def get_worker_weight(worker_stats, worker_accuracy=None):
+    """Return the weight of a worker's answers given their statistics. This is
+    the worker's agreement rate smoothed towards DEFAULT_WEIGHT so that a few
+    lucky assignments don't make a worker fully trusted. Answers on gold
+    assets count GOLD_WEIGHT times as much as agreement with other workers.
+
+    :param worker_stats: Statistics for a worker
+    :type worker_stats: parkme.models.WorkerStats or None
+    :param worker_accuracy: (Optional) The worker's accuracy on gold assets
+    :type worker_accuracy: parkme.models.WorkerAccuracy or None
+    :rtype: float
+    """
+    if not worker_stats and not worker_accuracy:
+        return DEFAULT_WEIGHT
+    num_agreed = 1.0
+    num_assignments = 2.0
+    if worker_stats:
+        num_agreed += worker_stats.num_agreed
+        num_assignments += worker_stats.num_assignments
+    if worker_accuracy:
+        num_agreed += GOLD_WEIGHT * worker_accuracy.num_correct
+        num_assignments += GOLD_WEIGHT * worker_accuracy.num_gold
+    return num_agreed / num_assignments
+
+
+def get_worker_weights(data_gateway, assignments, accuracy_gateway=None):
+    """Return the weight of each worker in the given assignments.
+
+    :param data_gateway: A worker stats data gateway
+    :type data_gateway: parkme.models.WorkerStatsDataGateway
+    :param assignments: A list of assignments
+    :type assignments: list of parkme.turk.assignments.BaseAssignment
+    :param accuracy_gateway: (Optional) A worker gold accuracy gateway
+    :type accuracy_gateway: parkme.models.WorkerAccuracyDataGateway or None
+    :rtype: dict of worker id to float
+    """
+    worker_ids = set(each.worker_id for each in assignments)
+    all_worker_stats = data_gateway.get_by_worker_ids(worker_ids)
+    all_worker_accuracy = (
+        accuracy_gateway.get_by_worker_ids(worker_ids)
+        if accuracy_gateway
+        else {})
+    return {
+        worker_id: get_worker_weight(
+            all_worker_stats.get(worker_id),
+            all_worker_accuracy.get(worker_id))
+        for worker_id in worker_ids}
+
+
+def get_required_weight(is_complete):
+    """Return the summed weight required for consensus.
+
+    :param is_complete: Whether or not all assignments for the HIT are in
+    :type is_complete: bool
+    :rtype: float
+    """
+    return CONSENSUS_WEIGHT if is_complete else EARLY_CONSENSUS_WEIGHT
+
+
+def has_weighted_consensus(agreeing_weight, is_complete):
+    """Indicates whether or not the summed weight of agreeing workers is
+    enough for consensus.
+
+    :param agreeing_weight: The summed weight of agreeing workers
+    :type agreeing_weight: float
+    :param is_complete: Whether or not all assignments for the HIT are in
+    :type is_complete: bool
+    :rtype: bool
+    """
+    return agreeing_weight >= get_required_weight(is_complete)
+
+
+def get_weighted_votes(assignments, weights, get_answers):
+    """Sum the weights of the workers voting for each answer.
+
+    :param assignments: A list of assignments
+    :type assignments: list of parkme.turk.assignments.BaseAssignment
+    :param weights: Weight of each worker
+    :type weights: dict of worker id to float
+    :param get_answers: Returns the hashable answers of an assignment
+    :type get_answers: callable
+    :rtype: collections.Counter
+    """
+    votes = collections.Counter()
+    for each in assignments:
+        answers = get_answers(each)
+        if not answers:
+            continue
+        weight = weights.get(each.worker_id, DEFAULT_WEIGHT)
+        for answer in set(answers):
+            votes[answer] += weight
+    return votes
+
+
+def get_weighted_consensus(votes, is_complete):
+    """Return all answers whose votes are enough for consensus.
+
+    :param votes: Summed weight of each answer
+    :type votes: collections.Counter
+    :param is_complete: Whether or not all assignments for the HIT are in
+    :type is_complete: bool
+    :rtype: list
+    """
+    return [answer for answer, weight in votes.iteritems()
+            if has_weighted_consensus(weight, is_complete)]
+
+
+def get_worker_results(assignments, agreements):
+    """Return the result of each assignment for recording in the worker
+    statistics.
+
+    :param assignments: A list of assignments
+    :type assignments: list of parkme.turk.assignments.BaseAssignment
+    :param agreements: Whether each assignment agreed with the consensus
+    :type agreements: iterable of bool
+    :rtype: list of parkme.models.WorkerResult
+    """
+    return [
+        models.WorkerResult(
+            assignment_id=each.assignment_id,
+            worker_id=each.worker_id,
+            asset_id=each.asset_id,
+            agreed=bool(agreed),
+            work_seconds=each.work_seconds)
+        for each, agreed in itertools.izip(assignments, agreements)]
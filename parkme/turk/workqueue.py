@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.turk.workqueue
+    ~~~~~~~~~~~~~~~~~~~~~
+    Persistent priority queue of work waiting to be uploaded as HITs. Work is
+    drained highest priority first and a little at a time, so a large backlog
+    can be trickled out over several runs while newly queued urgent work still
+    goes out first.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import csv
+import math
+
+from parkme.turk import client
+
+
+# Weight of the (log) lot traffic in an item's priority
+TRAFFIC_WEIGHT = 1.0
+
+# Weight of how stale a lot's rates are in an item's priority
+RATES_STALENESS_WEIGHT = 2.0
+
+# Rates older than this many days, or missing, are considered fully stale
+MAX_RATES_AGE_DAYS = 365
+
+# Weight of how recent a photo is in an item's priority
+PHOTO_RECENCY_WEIGHT = 1.0
+
+# Age in days at which a photo's recency counts half as much
+PHOTO_AGE_HALF_LIFE_DAYS = 90
+
+# Items read from the queue at a time while draining, so that items queued
+# while draining are considered promptly
+DRAIN_CHUNK_SIZE = 20
+
+
+def get_priority(traffic=0, photo_age_days=0, rates_age_days=None):
+    """Return the priority of work on a lot photo. Busy lots with missing or
+    stale rates and recent photos come first.
+
+    :param traffic: The lot's traffic
+    :type traffic: float
+    :param photo_age_days: Age of the photo in days
+    :type photo_age_days: float
+    :param rates_age_days: Age of the lot's rates in days, None if missing
+    :type rates_age_days: float or None
+    :rtype: float
+    """
+    if rates_age_days is None:
+        rates_age_days = MAX_RATES_AGE_DAYS
+    staleness = min(rates_age_days, MAX_RATES_AGE_DAYS) / float(
+        MAX_RATES_AGE_DAYS)
+    recency = 0.5 ** (max(photo_age_days, 0) / float(
+        PHOTO_AGE_HALF_LIFE_DAYS))
+    return (TRAFFIC_WEIGHT * math.log1p(max(traffic, 0)) +
+            RATES_STALENESS_WEIGHT * staleness +
+            PHOTO_RECENCY_WEIGHT * recency)
+
+
+def get_lot_traffic_from_csv_file(csv_file_path):
+    """Get the traffic of each lot from the given CSV file with pk_lot and
+    traffic columns.
+
+    :param csv_file_path: The path to the file
+    :type csv_file_path: str or unicode
+    :rtype: dict of lot id to float
+    """
+    lot_traffic = {}
+    with open(csv_file_path, 'r') as csvfile:
+        for row in csv.DictReader(csvfile):
+            lot_traffic[row['pk_lot']] = float(row['traffic'] or 0)
+    return lot_traffic
+
+
+def get_hit_id(create_hit_result):
+    """Return the ID of the HIT created by HITTemplate.create_hit.
+
+    :param create_hit_result: The result of creating the HIT
+    :type create_hit_result: boto.resultset.ResultSet
+    :rtype: str or unicode or None
+    """
+    try:
+        return create_hit_result[0].HITId
+    except (AttributeError, IndexError, TypeError):
+        return None
+
+
+class WorkQueue(object):
+    """A named priority queue of HIT template params."""
+
+    def __init__(self, data_gateway, queue_name):
+        """Initialize the queue.
+
+        :param data_gateway: The work queue data gateway
+        :type data_gateway: parkme.models.WorkQueueDataGateway
+        :param queue_name: The queue name, eg. the HIT type
+        :type queue_name: str or unicode
+        """
+        self.data_gateway = data_gateway
+        self.queue_name = queue_name
+
+    def __len__(self):
+        return self.data_gateway.count_pending(self.queue_name)
+
+    def push_all(self, items):
+        """Add the given items to the queue, updating the priority of those
+        already waiting.
+
+        :param items: An iterable of (work item id, priority, params)
+        :type items: iterable of tuple
+        :return: The number of newly added items
+        :rtype: int
+        """
+        return self.data_gateway.push_all(self.queue_name, items)
+
+    def drain(self,
+              hit_template,
+              batch_id,
+              max_hits=None,
+              rate_limiter=None,
+              bundle_size=1,
+              chunk_size=DRAIN_CHUNK_SIZE):
+        """Create HITs for the highest priority items in the queue. Each item
+        is removed from the queue once its HIT is created, so a failed drain
+        can simply be retried.
+
+        :param hit_template: The template used to create HITs
+        :type hit_template: parkme.turk.hits.HITTemplate
+        :param batch_id: The ID to be associated with the HITs
+        :type batch_id: str or unicode
+        :param max_hits: (Optional) Most HITs to create, leaving the rest of
+            the queue for later
+        :type max_hits: int or None
+        :param rate_limiter: (Optional) Rate limiter for HIT creation
+        :type rate_limiter: parkme.turk.client.RateLimiter or None
+        :param bundle_size: Number of items in each HIT, see
+            parkme.turk.hits.HITTemplate.create_bundled_hit
+        :type bundle_size: int
+        :param chunk_size: Most HITs to create per read from the queue
+        :type chunk_size: int
+        :return: The number of HITs created and of items in them
+        :rtype: tuple of (int, int)
+        """
+        rate_limiter = rate_limiter or client.RateLimiter()
+        num_hits = 0
+        num_items = 0
+        while max_hits is None or num_hits < max_hits:
+            num_to_read = chunk_size
+            if max_hits is not None:
+                num_to_read = min(num_to_read, max_hits - num_hits)
+            items = self.data_gateway.get_next(
+                self.queue_name, num_to_read * bundle_size)
+            if not items:
+                break
+            for start in xrange(0, len(items), bundle_size):
+                bundle = items[start:start + bundle_size]
+                with rate_limiter:
+                    result = self.create_hit(
+                        hit_template, batch_id, bundle, bundle_size)
+                self.data_gateway.mark_uploaded(
+                    self.queue_name,
+                    [item.work_item_id for item in bundle],
+                    get_hit_id(result))
+                num_hits += 1
+                num_items += len(bundle)
+        return num_hits, num_items
+
+    def create_hit(self, hit_template, batch_id, items, bundle_size):
+        """Create a HIT for the given items.
+
+        :rtype: boto.resultset.ResultSet
+        """
+        if bundle_size > 1:
+            return hit_template.create_bundled_hit(
+                [item.params for item in items], batch_id=batch_id)
+        return hit_template.create_hit(items[0].params, batch_id=batch_id)
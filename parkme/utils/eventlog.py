@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.utils.eventlog
+    ~~~~~~~~~~~~~~~~~~~~~
+    Structured event log written as JSON lines. Events below the log level
+    are only counted, and written events are buffered and written in large
+    chunks, so logging every item of a large batch costs little unless asked
+    for. A summary of the events counted is printed at the end of a run.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import atexit
+import collections
+import json
+import sys
+import threading
+import time
+
+
+# Event levels, as in the logging module
+DEBUG = 10
+INFO = 20
+WARNING = 30
+
+LEVEL_NAMES = {
+    DEBUG: 'DEBUG',
+    INFO: 'INFO',
+    WARNING: 'WARNING'
+}
+
+# Number of events buffered before they are written out
+BUFFER_SIZE = 1000
+
+
+class EventLog(object):
+    """Thread-safe buffered log of structured events."""
+
+    def __init__(self,
+                 stream=None,
+                 level=INFO,
+                 buffer_size=BUFFER_SIZE,
+                 clock=time.time):
+        """Initialize the log.
+
+        :param stream: (Optional) File the events are written to, defaults
+            to stdout
+        :type stream: file or None
+        :param level: Lowest level of the events written
+        :type level: int
+        :param buffer_size: Number of events buffered before writing
+        :type buffer_size: int
+        :param clock: Returns the current time in seconds
+        :type clock: callable
+        """
+        self.stream = stream
+        self.level = level
+        self.buffer_size = buffer_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._counts = collections.Counter()
+        self._flushed_on_exit = False
+
+    def configure(self, stream=None, level=INFO):
+        """Change where events are written and the level written, flushing
+        the events buffered so far. The log is flushed again on exit.
+
+        :param stream: (Optional) File the events are written to, defaults
+            to stdout
+        :type stream: file or None
+        :param level: Lowest level of the events written
+        :type level: int
+        """
+        self.flush()
+        self.stream = stream
+        self.level = level
+        if not self._flushed_on_exit:
+            atexit.register(self.flush)
+            self._flushed_on_exit = True
+
+    def log(self, level, event, **fields):
+        """Count an event and write it with the given fields if it is at
+        least the log level.
+
+        :param level: The event level
+        :type level: int
+        :param event: The event name, eg. asset_accepted
+        :type event: str
+        """
+        with self._lock:
+            self._counts[event] += 1
+            if level < self.level:
+                return
+            record = {
+                'time': self._clock(),
+                'level': LEVEL_NAMES.get(level, level),
+                'event': event
+            }
+            record.update(fields)
+            self._buffer.append(json.dumps(record, default=unicode))
+            if len(self._buffer) < self.buffer_size:
+                return
+            lines = self._take_buffer()
+        self._write(lines)
+
+    def debug(self, event, **fields):
+        """Log a per-item event, written only when debugging."""
+        self.log(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        """Log an event of interest for every run."""
+        self.log(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        """Log an event that may need attention."""
+        self.log(WARNING, event, **fields)
+
+    def flush(self):
+        """Write out all buffered events."""
+        with self._lock:
+            lines = self._take_buffer()
+        self._write(lines)
+
+    def get_counts(self):
+        """Return the number of each event logged, whatever its level.
+
+        :rtype: collections.Counter
+        """
+        with self._lock:
+            return collections.Counter(self._counts)
+
+    def format_summary(self):
+        """Return a line with the count of each event logged, most frequent
+        first.
+
+        :rtype: list of str
+        """
+        return ['{} {}'.format(count, event)
+                for event, count in sorted(
+                    self.get_counts().iteritems(),
+                    key=lambda (event, count): (-count, event))]
+
+    def _take_buffer(self):
+        """Empty the buffer, returning the lines it held. Must be called
+        while holding the lock.
+
+        :rtype: list of str
+        """
+        lines, self._buffer = self._buffer, []
+        return lines
+
+    def _write(self, lines):
+        """Write the given lines to the stream in a single write.
+
+        :param lines: JSON encoded events
+        :type lines: list of str
+        """
+        if not lines:
+            return
+        stream = self.stream or sys.stdout
+        stream.write('\n'.join(lines) + '\n')
+        stream.flush()
+
+
+# The event log used by the module level functions
+EVENT_LOG = EventLog()
+
+debug = EVENT_LOG.debug
+info = EVENT_LOG.info
+warning = EVENT_LOG.warning
+
+
+def add_options(parser):
+    """Add options controlling the event log to a script's option parser.
+
+    :param parser: The option parser
+    :type parser: optparse.OptionParser
+    """
+    parser.add_option(
+        '-v', '--verbose', action='store_true', dest='verbose',
+        default=False, help='Log an event for every item processed')
+    parser.add_option(
+        '--event-log', dest='event_log_file', default=None,
+        help='Append JSON lines events to this file instead of stdout')
+
+
+def configure_from_options(options):
+    """Configure the module event log from a script's parsed options, see
+    add_options.
+
+    :param options: The parsed options
+    :type options: optparse.Values
+    """
+    EVENT_LOG.configure(
+        stream=(
+            open(options.event_log_file, 'a')
+            if options.event_log_file
+            else None),
+        level=DEBUG if options.verbose else INFO)
+
+
+def print_summary(event_log=EVENT_LOG):
+    """Flush the event log and print the count of each event logged.
+
+    :param event_log: The event log
+    :type event_log: EventLog
+    """
+    event_log.flush()
+    print
+    print 'EVENTS'
+    for line in event_log.format_summary():
+        print line
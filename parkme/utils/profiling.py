@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.utils.profiling
+    ~~~~~~~~~~~~~~~~~~~~~~
+    Lightweight timing of the stages of a run. Stages are timed with the span
+    context manager or the timed decorator, and spans opened inside another
+    span are named after it, eg. process_results/fetch.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import contextlib
+import cProfile
+import functools
+import pstats
+import threading
+import time
+
+
+# Separates the names of nested spans
+SPAN_SEPARATOR = '/'
+
+# Number of functions shown when printing cProfile statistics
+NUM_PROFILE_STATS = 30
+
+# The accumulated timing of one stage
+StageTiming = collections.namedtuple(
+    'StageTiming',
+    ['name',
+     'count',
+     'total_seconds'])
+
+
+class Profiler(object):
+    """Thread-safe registry of the time spent in each stage."""
+
+    def __init__(self, clock=time.time):
+        """Initialize the profiler.
+
+        :param clock: Returns the current time in seconds
+        :type clock: callable
+        """
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._timings = collections.OrderedDict()
+
+    def reset(self):
+        """Forget all recorded timings."""
+        with self._lock:
+            self._timings.clear()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Context manager timing the enclosed block as the stage with the
+        given name, nested under any span already open in this thread.
+
+        :param name: The stage name
+        :type name: str
+        """
+        stack = self._get_stack()
+        stack.append(name)
+        full_name = SPAN_SEPARATOR.join(stack)
+        start = self._clock()
+        try:
+            yield
+        finally:
+            seconds = self._clock() - start
+            stack.pop()
+            self.record(full_name, seconds)
+
+    def timed(self, name=None):
+        """Decorator timing each call of a function as a stage, named after
+        the function unless a name is given.
+
+        :param name: (Optional) The stage name
+        :type name: str or None
+        :rtype: callable
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds):
+        """Add a single timing of the stage with the given name.
+
+        :param name: The full stage name
+        :type name: str
+        :param seconds: The time spent in the stage
+        :type seconds: float
+        """
+        with self._lock:
+            count, total_seconds = self._timings.get(name, (0, 0.0))
+            self._timings[name] = (count + 1, total_seconds + seconds)
+
+    def get_timings(self):
+        """Return the timing of each stage in the order they were first
+        completed.
+
+        :rtype: list of StageTiming
+        """
+        with self._lock:
+            return [StageTiming(name, count, total_seconds)
+                    for name, (count, total_seconds)
+                    in self._timings.iteritems()]
+
+    def format_table(self):
+        """Return the lines of a table of the stage timings, in order of
+        stage name so nested stages follow their parent.
+
+        :rtype: list of str
+        """
+        timings = sorted(self.get_timings(), key=lambda each: each.name)
+        width = max([len(each.name) for each in timings] + [len('STAGE')])
+        lines = ['{:<{width}} {:>8} {:>10} {:>10}'.format(
+            'STAGE', 'COUNT', 'TOTAL (s)', 'MEAN (s)', width=width)]
+        for each in timings:
+            lines.append('{:<{width}} {:>8} {:>10.3f} {:>10.4f}'.format(
+                each.name,
+                each.count,
+                each.total_seconds,
+                each.total_seconds / each.count,
+                width=width))
+        return lines
+
+    def _get_stack(self):
+        """Return the names of the spans open in the current thread.
+
+        :rtype: list of str
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+
+# The profiler used by the module level span and timed functions
+PROFILER = Profiler()
+
+span = PROFILER.span
+timed = PROFILER.timed
+
+
+@contextlib.contextmanager
+def profile_run(stats_file_path=None,
+                enabled=True,
+                profiler=PROFILER,
+                num_stats=NUM_PROFILE_STATS):
+    """Context manager running the enclosed block under cProfile, then
+    printing the most expensive functions and the stage timing table.
+
+    :param stats_file_path: (Optional) File to dump the cProfile statistics
+        to, for later inspection with pstats or a viewer
+    :type stats_file_path: str or unicode or None
+    :param enabled: Whether to profile, so callers can profile optionally
+    :type enabled: bool
+    :param profiler: The profiler whose stages are printed
+    :type profiler: Profiler
+    :param num_stats: Number of functions printed
+    :type num_stats: int
+    """
+    if not enabled:
+        yield None
+        return
+    c_profile = cProfile.Profile()
+    c_profile.enable()
+    try:
+        yield c_profile
+    finally:
+        c_profile.disable()
+        if stats_file_path:
+            c_profile.dump_stats(stats_file_path)
+        print
+        print 'PROFILE'
+        stats = pstats.Stats(c_profile)
+        stats.sort_stats('cumulative').print_stats(num_stats)
+        print 'STAGES'
+        for line in profiler.format_table():
+            print line
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+    parkme.utils.report
+    ~~~~~~~~~~~~~~~~~~~
+    Machine-readable batch reports. Each decision of a run is appended to a
+    CSV file with fixed columns as it is made, and aggregate statistics are
+    written to a JSON file next to it when the run ends, so batches can be
+    compared without fetching their results again.
+
+    Copyright (C) 2015 ParkMe Inc. All Rights Reserved.
+"""
+import collections
+import contextlib
+import csv
+import datetime
+import json
+
+import pytz
+
+
+# Rows written between flushes of the report file
+FLUSH_EVERY = 100
+
+# Suffix added to the report path for the aggregate statistics file
+SUMMARY_SUFFIX = '.summary.json'
+
+
+def get_summary_path(report_path):
+    """Return the path of the aggregate statistics of the given report.
+
+    :param report_path: The path to the report CSV file
+    :type report_path: str or unicode
+    :rtype: str or unicode
+    """
+    return report_path + SUMMARY_SUFFIX
+
+
+class BatchReport(object):
+    """Writes one row per decision to a CSV file and counts the decisions.
+    The report is a context manager that writes the aggregate statistics on
+    exit, even if the run failed part way."""
+
+    def __init__(self, report_path, batch_id, columns,
+                 flush_every=FLUSH_EVERY):
+        """Initialize the report, writing the header row.
+
+        :param report_path: The path to the report CSV file
+        :type report_path: str or unicode
+        :param batch_id: The batch the report is for
+        :type batch_id: str or unicode or int
+        :param columns: Names of the columns of each row. Every row also
+            has the batch_id column first and must have a decision column.
+        :type columns: list of str
+        :param flush_every: Rows written between flushes
+        :type flush_every: int
+        """
+        self.report_path = report_path
+        self.batch_id = batch_id
+        self.columns = ['batch_id'] + list(columns)
+        self.flush_every = flush_every
+        self.decision_counts = collections.Counter()
+        self.num_rows = 0
+        self.started_at = datetime.datetime.now(pytz.utc)
+        self._file = open(report_path, 'wb')
+        self._writer = csv.DictWriter(self._file, self.columns)
+        self._writer.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+    def add_row(self, **row):
+        """Append a decision to the report.
+
+        :param row: A value for each column besides batch_id, lists are
+            joined with '|'
+        :type row: dict
+        """
+        row['batch_id'] = self.batch_id
+        for key, value in row.items():
+            if isinstance(value, (list, tuple)):
+                value = '|'.join(unicode(each) for each in value)
+            if isinstance(value, unicode):
+                value = value.encode('utf-8')
+            row[key] = value
+        self._writer.writerow(row)
+        self.decision_counts[row['decision']] += 1
+        self.num_rows += 1
+        if not self.num_rows % self.flush_every:
+            self._file.flush()
+
+    def get_summary(self, **stats):
+        """Return the aggregate statistics of the report.
+
+        :param stats: Extra statistics to include
+        :type stats: dict
+        :rtype: dict
+        """
+        summary = {
+            'batch_id': self.batch_id,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.datetime.now(pytz.utc).isoformat(),
+            'num_rows': self.num_rows,
+            'decisions': dict(self.decision_counts),
+            'decision_fractions': {
+                decision: float(count) / self.num_rows
+                for decision, count in self.decision_counts.iteritems()}
+        }
+        summary.update(stats)
+        return summary
+
+    def close(self, complete=True, **stats):
+        """Close the report file and write the aggregate statistics.
+
+        :param complete: Whether the run finished, rather than failing
+        :type complete: bool
+        :param stats: Extra statistics to include in the summary
+        :type stats: dict
+        """
+        if self._file.closed:
+            return
+        self._file.close()
+        with open(get_summary_path(self.report_path), 'w') as summary_file:
+            json.dump(
+                self.get_summary(complete=complete, **stats),
+                summary_file,
+                indent=2,
+                sort_keys=True)
+
+
+@contextlib.contextmanager
+def open_report(report_path, batch_id, columns):
+    """Open a batch report if a path is given, closing it on exit even if
+    the run fails.
+
+    :param report_path: (Optional) The path to the report CSV file
+    :type report_path: str or unicode or None
+    :param batch_id: The batch the report is for
+    :type batch_id: str or unicode or int
+    :param columns: Names of the columns of each row, see BatchReport
+    :type columns: list of str
+    :return: The report, or None without a path
+    :rtype: BatchReport or None
+    """
+    if not report_path:
+        yield None
+        return
+    with BatchReport(report_path, batch_id, columns) as batch_report:
+        yield batch_report
+
+
+def load_summary(report_path):
+    """Load the aggregate statistics of the given report.
+
+    :param report_path: The path to the report CSV file
+    :type report_path: str or unicode
+    :rtype: dict
+    """
+    with open(get_summary_path(report_path), 'r') as summary_file:
+        return json.load(summary_file)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+
+import mock
+import psycopg2
+
+from parkme.assignments.categorization import dedup
+
+
+DT_PHOTO = datetime.datetime(2015, 1, 1)
+
+
+class FingerprinterTest(unittest.TestCase):
+
+    def test_should_fall_back_to_path_without_cache(self):
+        """Should fingerprint by bucket and path if there is no image
+        cache"""
+        self.assertEqual(
+            u'path:bucket/lot/a.jpg',
+            dedup.Fingerprinter().get_fingerprint('bucket', 'lot/a.jpg'))
+
+    def test_should_use_content_digest_if_cached(self):
+        """Should fingerprint by content digest if the image is cached"""
+        mock_image_cache = mock.Mock()
+        mock_image_cache.get_digest.return_value = 'abc'
+        self.assertEqual(
+            u'sha1:abc',
+            dedup.Fingerprinter(mock_image_cache).get_fingerprint(
+                'bucket', 'lot/a.jpg'))
+
+
+class DeduplicateTest(unittest.TestCase):
+
+    def test_should_only_keep_first_of_duplicates_within_lot(self):
+        """Should map later duplicates within a lot to the first"""
+        rows = [('a1', 'bucket', 'x.jpg', DT_PHOTO, 'lot-a'),
+                ('a2', 'bucket', 'x.jpg', DT_PHOTO, 'lot-a'),
+                ('b1', 'bucket', 'x.jpg', DT_PHOTO, 'lot-b')]
+        result = dedup.deduplicate(rows, [], dedup.Fingerprinter())
+        self.assertEqual([rows[0], rows[2]], result.novel_rows)
+        self.assertEqual({'a2': 'a1'}, result.duplicate_to_original)
+        self.assertEqual([], result.reused)
+
+    def test_should_reuse_categories_of_categorized_duplicate(self):
+        """Should reuse categories of a categorized duplicate in the lot"""
+        rows = [('a1', 'bucket', 'x.jpg', DT_PHOTO, 'lot-a')]
+        categorized_rows = [('old', 'bucket', 'x.jpg', 'lot-a', [4, 5])]
+        result = dedup.deduplicate(
+            rows, categorized_rows, dedup.Fingerprinter())
+        self.assertEqual([], result.novel_rows)
+        self.assertEqual([('a1', [4, 5])], result.reused)
+
+
+class CopyCategoriesTest(unittest.TestCase):
+
+    def test_should_commit_batch_once_skipping_existing_categories(self):
+        """Should commit the batch once, undoing only failed inserts"""
+        mock_dbconn = mock.Mock()
+        mock_cursor = mock_dbconn.cursor.return_value
+
+        def execute(sql, params=None):
+            if params and params[1:] == ('a1', 5):
+                raise psycopg2.IntegrityError
+        mock_cursor.execute.side_effect = execute
+
+        dedup.copy_categories(mock_dbconn, [('a1', [4, 5]), ('a2', [4])])
+        statements = [
+            call[0][0] for call in mock_cursor.execute.call_args_list]
+        self.assertEqual(1, statements.count(
+            'ROLLBACK TO SAVEPOINT copy_category'))
+        self.assertEqual(2, statements.count(
+            'RELEASE SAVEPOINT copy_category'))
+        mock_dbconn.commit.assert_called_once_with()
+        self.assertFalse(mock_dbconn.rollback.called)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from parkme.assignments.categorization import gold
+
+
+class MatchesGoldAnswerTest(unittest.TestCase):
+
+    def test_should_match_categories_ignoring_case(self):
+        """Should match the known categories regardless of case and order"""
+        assignment = mock.Mock(
+            does_not_match=False, categories=['Rates', 'entrance'])
+        self.assertTrue(gold.matches_gold_answer(
+            assignment, {'categories': ['entrance', 'rates']}))
+
+    def test_should_not_match_other_categories(self):
+        """Should not match an assignment missing a known category"""
+        assignment = mock.Mock(does_not_match=False, categories=['rates'])
+        self.assertFalse(gold.matches_gold_answer(
+            assignment, {'categories': ['entrance', 'rates']}))
+
+    def test_should_match_photos_not_matching_the_lot(self):
+        """Should match only does not match answers for such photos"""
+        self.assertTrue(gold.matches_gold_answer(
+            mock.Mock(does_not_match=True, categories=[]),
+            {'categories': [], 'does_not_match': True}))
+        self.assertFalse(gold.matches_gold_answer(
+            mock.Mock(does_not_match=False, categories=['rates']),
+            {'categories': [], 'does_not_match': True}))
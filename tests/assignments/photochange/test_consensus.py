@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import itertools
+import random
+import unittest
+
+import mock
+import numpy
+
+from parkme.assignments import utils
+from parkme.assignments.photochange import consensus
+from parkme.assignments.photochange import evaluator
+
+
+TRI_STATE = [True, False, None]
+
+
+def make_assignment(new_asset_id, old_asset_id, answers):
+    """Return a mock photo change assignment with the given answers"""
+    assignment = mock.Mock()
+    assignment.new_asset_id = new_asset_id
+    assignment.old_asset_id = old_asset_id
+    (assignment.same_sign,
+     assignment.new_photo_has_extra_rates,
+     assignment.old_photo_has_extra_rates,
+     assignment.same_prices) = answers
+    return assignment
+
+
+def get_legacy_decisions(all_assignments):
+    """Decide each pair the way evaluate_all_photo_change_assignments used
+    to, one group of Python lists at a time."""
+    decisions = {}
+    new_asset_id_to_assignments = utils.group_by_attribute(
+        all_assignments, 'new_asset_id')
+    for new_asset_id, new_assns in new_asset_id_to_assignments.iteritems():
+        old_asset_id_to_assignments = utils.group_by_attribute(
+            new_assns, 'old_asset_id')
+        for old_asset_id, old_assns in old_asset_id_to_assignments.iteritems():
+            unrejected = [
+                each for each in old_assns if not evaluator.should_reject(each)]
+            result = evaluator.get_consensus_result(unrejected)
+            if len(unrejected) < 3:
+                decision = consensus.TOO_FEW_VALID_ASSIGNMENTS
+            elif not evaluator.is_same_sign(result):
+                decision = consensus.DIFFERENT_SIGN
+            else:
+                decision = consensus.SAME_SIGN_DECISION
+            decisions[(new_asset_id, old_asset_id)] = (decision, result)
+    return decisions
+
+
+class ShouldRejectTest(unittest.TestCase):
+
+    def test_should_match_evaluator_for_every_combination_of_answers(self):
+        """Should match evaluator.should_reject for every possible answer"""
+        all_answers = list(itertools.product(TRI_STATE, repeat=4))
+        assignments = [
+            make_assignment('new', 'old', answers) for answers in all_answers]
+        columns = consensus.AssignmentColumns.from_assignments(assignments)
+        expected = [evaluator.should_reject(each) for each in assignments]
+        self.assertEqual(
+            expected, list(consensus.should_reject(columns.answers)))
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def test_should_return_no_pairs_for_empty_batch(self):
+        """Should return no pairs if there are no assignments"""
+        evaluation = consensus.evaluate([])
+        self.assertEqual([], list(evaluation.iter_pair_decisions()))
+
+    def test_should_return_too_few_valid_if_assignments_rejected(self):
+        """Should return too few valid assignments if any were rejected"""
+        assignments = [
+            make_assignment('new', 'old', (True, False, False, True)),
+            make_assignment('new', 'old', (True, False, False, True)),
+            make_assignment('new', 'old', (None, None, None, None))]
+        pair = next(consensus.evaluate(assignments).iter_pair_decisions())
+        self.assertEqual(consensus.TOO_FEW_VALID_ASSIGNMENTS, pair.decision)
+
+    def test_should_group_assignment_indexes_by_pair(self):
+        """Should return the indexes of the assignments in each pair"""
+        assignments = [
+            make_assignment('a', 'x', (False, None, None, None)),
+            make_assignment('b', 'x', (False, None, None, None)),
+            make_assignment('a', 'x', (False, None, None, None))]
+        pairs = list(consensus.evaluate(assignments).iter_pair_decisions())
+        self.assertEqual([[0, 2], [1]],
+                         [list(each.assignment_indexes) for each in pairs])
+
+    def test_should_make_same_decisions_as_evaluator(self):
+        """Should make the same decision as the evaluator for every pair"""
+        rng = random.Random(1234)
+        all_answers = list(itertools.product(TRI_STATE, repeat=4))
+        # Bias towards valid answers so that every decision is exercised
+        valid_answers = [
+            answers for answers in all_answers
+            if not evaluator.should_reject(make_assignment(0, 0, answers))]
+        assignments = []
+        for new_asset_id in xrange(40):
+            for old_asset_id in xrange(rng.randint(1, 4)):
+                for _ in xrange(rng.randint(1, 5)):
+                    answers = rng.choice(
+                        valid_answers if rng.random() < 0.8 else all_answers)
+                    assignments.append(make_assignment(
+                        'new-{}'.format(new_asset_id),
+                        'old-{}'.format(old_asset_id),
+                        answers))
+        rng.shuffle(assignments)
+
+        expected = get_legacy_decisions(assignments)
+        evaluation = consensus.evaluate(assignments)
+        found = {
+            (each.new_asset_id, each.old_asset_id):
+            (each.decision, each.consensus_result)
+            for each in evaluation.iter_pair_decisions()}
+
+        self.assertEqual(expected, found)
+        self.assertEqual(
+            set([consensus.TOO_FEW_VALID_ASSIGNMENTS,
+                 consensus.DIFFERENT_SIGN,
+                 consensus.SAME_SIGN_DECISION]),
+            set(decision for decision, _ in found.itervalues()))
+        numpy.testing.assert_array_equal(
+            [evaluator.should_reject(each) for each in assignments],
+            evaluation.rejected)
+
+    def test_should_make_same_decisions_with_equal_weights(self):
+        """Should make the same decisions if all workers are weighted equally"""
+        assignments = [
+            make_assignment('new', 'old', (True, False, False, True)),
+            make_assignment('new', 'old', (True, False, False, False)),
+            make_assignment('new', 'old', (False, None, None, None))]
+        unweighted = next(consensus.evaluate(assignments).iter_pair_decisions())
+        weighted = next(
+            consensus.evaluate(assignments, {}).iter_pair_decisions())
+        self.assertEqual(
+            (unweighted.decision, unweighted.consensus_result),
+            (weighted.decision, weighted.consensus_result))
+
+    def test_should_decide_early_if_trusted_workers_agree(self):
+        """Should decide with two assignments if trusted workers agree"""
+        assignments = [
+            make_assignment('new', 'old', (False, None, None, None)),
+            make_assignment('new', 'old', (False, None, None, None))]
+        assignments[0].worker_id = 'a'
+        assignments[1].worker_id = 'b'
+        pair = next(consensus.evaluate(
+            assignments, {'a': 0.9, 'b': 0.8}).iter_pair_decisions())
+        self.assertEqual(consensus.DIFFERENT_SIGN, pair.decision)
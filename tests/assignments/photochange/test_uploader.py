@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+
+import mock
+
+from parkme.assignments.photochange import models
+from parkme.assignments.photochange import uploader
+from parkme.images import hashing
+from parkme.turk import client
+from parkme.turk import fake
+
+
+def make_asset_group(lot_id, num_assets):
+    """Return a group of comparable assets for the given lot, newest first"""
+    return [
+        models.ComparableAsset(
+            asset_id='{}-{}'.format(lot_id, index),
+            lot_id=lot_id,
+            str_bucket='bucket',
+            str_path='{}/{}.jpg'.format(lot_id, index),
+            dt_photo=datetime.datetime(2015, 1, 1) - datetime.timedelta(
+                days=index))
+        for index in xrange(num_assets)]
+
+
+class SplitAssetGroupsTest(unittest.TestCase):
+
+    def test_should_count_a_pair_per_older_asset(self):
+        """Should need a HIT for each older asset of groups to compare"""
+        self.assertEqual(3, uploader.get_num_pairs(
+            [make_asset_group(1, 3), make_asset_group(2, 1),
+             make_asset_group(3, 2)]))
+
+    def test_should_take_leading_groups_within_hits(self):
+        """Should take whole leading groups needing at most the HITs"""
+        asset_groups = [
+            make_asset_group(1, 3), make_asset_group(2, 1),
+            make_asset_group(3, 2), make_asset_group(4, 2)]
+        self.assertEqual(
+            (asset_groups[:3], asset_groups[3:]),
+            uploader.split_asset_groups(asset_groups, 3))
+
+    def test_should_take_first_group_needing_more_hits(self):
+        """Should take a first group needing more HITs on its own"""
+        asset_groups = [make_asset_group(1, 5), make_asset_group(2, 2)]
+        self.assertEqual(
+            (asset_groups[:1], asset_groups[1:]),
+            uploader.split_asset_groups(asset_groups, 2))
+
+
+class UploadAssetGroupsToTurkTest(unittest.TestCase):
+
+    def setUp(self):
+        super(UploadAssetGroupsToTurkTest, self).setUp()
+        self.mturk_connection = fake.FakeMTurkConnection(latency=0.001)
+        self.rate_limiter = client.RateLimiter(max_per_second=None)
+
+    def upload(self, asset_groups, queue_size=uploader.QUEUE_SIZE):
+        """Upload the given asset groups to the fake connection"""
+        return uploader.upload_asset_groups_to_turk(
+            lambda: self.mturk_connection,
+            'batch',
+            asset_groups,
+            queue_size=queue_size,
+            num_hit_creators=4,
+            rate_limiter=self.rate_limiter)
+
+    def test_should_create_hit_for_each_older_asset(self):
+        """Should create one HIT comparing the newest asset to each older"""
+        asset_groups = [make_asset_group('lot-{}'.format(index), 5)
+                        for index in xrange(10)]
+        progress = self.upload(asset_groups, queue_size=2)
+        self.assertEqual(40, progress.hits_created)
+        self.assertEqual(40, len(self.mturk_connection.hits))
+        self.assertEqual(
+            set(['batch']),
+            set(each.RequesterAnnotation
+                for each in self.mturk_connection.hits.itervalues()))
+
+    def test_should_skip_lots_without_enough_assets(self):
+        """Should skip lots with fewer than two assets"""
+        progress = self.upload(
+            [make_asset_group('a', 1), make_asset_group('b', 0),
+             make_asset_group('c', 2)])
+        self.assertEqual(
+            {'lots_read': 3, 'lots_skipped': 2, 'pairs_auto_resolved': 0,
+             'hits_queued': 1, 'hits_created': 1, 'hits_failed': 0},
+            progress.get_counts())
+
+    def test_should_raise_reader_errors(self):
+        """Should raise errors reading asset groups after creators finish"""
+        def failing_asset_groups():
+            yield make_asset_group('a', 3)
+            raise ValueError('Database went away')
+
+        self.assertRaises(ValueError, self.upload, failing_asset_groups())
+        self.assertEqual(2, len(self.mturk_connection.hits))
+
+    def test_should_resolve_near_duplicates_without_hits(self):
+        """Should not create HITs for near-duplicate pairs"""
+        asset_group = make_asset_group('lot', 3)
+        mock_image_hasher = mock.Mock()
+        mock_image_hasher.get_hashes.return_value = {
+            ('bucket', 'lot/0.jpg'): hashing.ImageHashes(0b1111, 0b1111),
+            ('bucket', 'lot/1.jpg'): hashing.ImageHashes(0b1110, 0b1111),
+            ('bucket', 'lot/2.jpg'): hashing.ImageHashes(2 ** 40, 2 ** 40)}
+        progress = uploader.upload_asset_groups_to_turk(
+            lambda: self.mturk_connection,
+            'batch',
+            [asset_group],
+            num_hit_creators=2,
+            rate_limiter=self.rate_limiter,
+            image_hasher_factory=lambda: mock_image_hasher)
+        self.assertEqual(1, progress.hits_created)
+        self.assertEqual(
+            [(asset_group[0], asset_group[1])], progress.auto_resolved_pairs)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import httplib
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from parkme.images import cache
+
+
+class ImageCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ImageCacheTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.mock_fetch_image = mock.Mock(return_value='image')
+        self.image_cache = cache.ImageCache(
+            os.path.join(self.temp_dir, 'cache'),
+            self.mock_fetch_image,
+            max_bytes=10)
+
+    def tearDown(self):
+        super(ImageCacheTest, self).tearDown()
+        shutil.rmtree(self.temp_dir)
+
+    def test_should_store_identical_images_once(self):
+        """Should store images with identical contents in a single blob"""
+        first = self.image_cache.put('bucket', 'a.jpg', 'abc')
+        second = self.image_cache.put('bucket', 'b.jpg', 'abc')
+        self.assertEqual(first, second)
+        self.assertEqual('abc', self.image_cache.get('bucket', 'b.jpg'))
+        self.assertEqual(
+            1, len(os.listdir(os.path.dirname(
+                self.image_cache.get_blob_path(first)))))
+
+    def test_should_only_fetch_missing_images(self):
+        """Should fetch an image only if it isn't cached"""
+        self.assertEqual(
+            'image', self.image_cache.get_or_fetch('bucket', 'a.jpg'))
+        self.assertEqual(
+            'image', self.image_cache.get_or_fetch('bucket', 'a.jpg'))
+        self.mock_fetch_image.assert_called_once_with('bucket', 'a.jpg')
+
+    def test_should_evict_least_recently_used_images(self):
+        """Should evict the least recently used images once over the limit"""
+        with mock.patch.object(cache, 'get_now_microtime') as mock_now:
+            mock_now.return_value = 1
+            self.image_cache.put('bucket', 'a.jpg', 'aaaa')
+            mock_now.return_value = 2
+            self.image_cache.put('bucket', 'b.jpg', 'bbbb')
+            mock_now.return_value = 3
+            self.image_cache.get('bucket', 'a.jpg')
+            mock_now.return_value = 4
+            self.image_cache.put('bucket', 'c.jpg', 'cccc')
+
+        self.assertTrue(self.image_cache.contains('bucket', 'a.jpg'))
+        self.assertFalse(self.image_cache.contains('bucket', 'b.jpg'))
+        self.assertTrue(self.image_cache.contains('bucket', 'c.jpg'))
+
+    def test_should_prefetch_from_local_directory(self):
+        """Should prefetch all available images from a local directory"""
+        source_dir = os.path.join(self.temp_dir, 'source', 'bucket')
+        os.makedirs(source_dir)
+        for name in ('a.jpg', 'b.jpg'):
+            with open(os.path.join(source_dir, name), 'wb') as f:
+                f.write(name)
+        self.image_cache.fetch_image = cache.get_fetcher(
+            os.path.join(self.temp_dir, 'source'))
+
+        num_fetched, failed = self.image_cache.prefetch(
+            [('bucket', 'a.jpg'), ('bucket', 'b.jpg'),
+             ('bucket', 'missing.jpg')])
+
+        self.assertEqual(2, num_fetched)
+        self.assertEqual([('bucket', 'missing.jpg')], failed)
+        self.assertEqual('b.jpg', self.image_cache.get('bucket', 'b.jpg'))
+
+    def test_should_record_truncated_responses_as_failed(self):
+        """Should record an image whose response was cut short as failed"""
+        def fetch_image(str_bucket, str_path):
+            if str_path == 'truncated.jpg':
+                raise httplib.IncompleteRead('partial')
+            return str_path
+        self.image_cache.fetch_image = fetch_image
+
+        num_fetched, failed = self.image_cache.prefetch(
+            [('bucket', 'a.jpg'), ('bucket', 'truncated.jpg')])
+
+        self.assertEqual(1, num_fetched)
+        self.assertEqual([('bucket', 'truncated.jpg')], failed)
+        self.assertFalse(self.image_cache.contains('bucket', 'truncated.jpg'))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import httplib
+import io
+import unittest
+
+import mock
+import numpy
+from PIL import Image
+
+from parkme.images import hashing
+from parkme.images import models
+
+
+def make_image_data(seed, image_format='PNG', quality=95):
+    """Return an encoded random image with some large scale structure"""
+    rng = numpy.random.RandomState(seed)
+    coarse = rng.randint(0, 256, size=(8, 8)).astype(numpy.uint8)
+    image = Image.fromarray(coarse).resize((128, 96), Image.BILINEAR)
+    output = io.BytesIO()
+    image.convert('RGB').save(output, image_format, quality=quality)
+    return output.getvalue()
+
+
+class HashImageTest(unittest.TestCase):
+
+    def test_should_return_64_bit_hashes(self):
+        """Should return hashes that fit in 64 bits"""
+        hashes = hashing.hash_image(make_image_data(1))
+        self.assertTrue(0 <= hashes.dhash < 2 ** 64)
+        self.assertTrue(0 <= hashes.phash < 2 ** 64)
+
+    def test_should_consider_recompressed_image_near_duplicate(self):
+        """Should consider a recompressed copy a near-duplicate"""
+        original = hashing.hash_image(make_image_data(1))
+        recompressed = hashing.hash_image(
+            make_image_data(1, image_format='JPEG', quality=40))
+        self.assertTrue(hashing.is_near_duplicate(original, recompressed))
+
+    def test_should_not_consider_different_images_near_duplicates(self):
+        """Should not consider different images near-duplicates"""
+        self.assertFalse(hashing.is_near_duplicate(
+            hashing.hash_image(make_image_data(1)),
+            hashing.hash_image(make_image_data(2))))
+
+
+class ImageHasherTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ImageHasherTest, self).setUp()
+        self.data_gateway = models.ImageHashDataGateway(':memory:')
+        self.data_gateway.create_table()
+        self.mock_fetch_image = mock.Mock(
+            side_effect=lambda bucket, path: make_image_data(len(path)))
+        self.image_hasher = hashing.ImageHasher(
+            self.data_gateway, self.mock_fetch_image)
+        self.assets = [mock.Mock(str_bucket='bucket', str_path='a.jpg'),
+                       mock.Mock(str_bucket='bucket', str_path='bb.jpg')]
+
+    def test_should_only_fetch_each_image_once(self):
+        """Should read hashes from the index after the first time"""
+        first = self.image_hasher.get_hashes(self.assets)
+        second = self.image_hasher.get_hashes(self.assets)
+        self.assertEqual(first, second)
+        self.assertEqual(2, self.mock_fetch_image.call_count)
+
+    def test_should_omit_images_that_cannot_be_fetched(self):
+        """Should omit images that could not be fetched"""
+        self.mock_fetch_image.side_effect = IOError
+        self.assertEqual({}, self.image_hasher.get_hashes(self.assets))
+
+    def test_should_skip_images_that_cannot_be_read_or_decoded(self):
+        """Should skip images cut short or PIL can't decode, hashing the
+        rest"""
+        for error in [httplib.IncompleteRead(''), SyntaxError('broken PNG')]:
+            data_gateway = models.ImageHashDataGateway(':memory:')
+            data_gateway.create_table()
+            image_hasher = hashing.ImageHasher(
+                data_gateway, mock.Mock(side_effect=[
+                    error, make_image_data(1)]))
+            self.assertEqual(1, len(image_hasher.get_hashes(self.assets)))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from parkme.images import models
+
+
+class ImageHashDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ImageHashDataGatewayTest, self).setUp()
+        self.data_gateway = models.ImageHashDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_round_trip_full_64_bit_hashes(self):
+        """Should return saved hashes including those above 2 ** 63"""
+        image_hash = models.ImageHash(
+            'bucket', 'path.jpg', 2 ** 64 - 1, 2 ** 63 + 5)
+        self.data_gateway.save_all([image_hash])
+        self.assertEqual(
+            {('bucket', 'path.jpg'): image_hash},
+            self.data_gateway.get_by_keys(
+                [('bucket', 'path.jpg'), ('bucket', 'missing.jpg')]))
+
+    def test_should_query_keys_in_chunks(self):
+        """Should return the hashes of more keys than fit in one query"""
+        self.data_gateway._MAX_PARAMS_PER_QUERY = 4
+        image_hashes = [
+            models.ImageHash('bucket', '{}.jpg'.format(i), i, i)
+            for i in xrange(5)]
+        self.data_gateway.save_all(image_hashes)
+        self.assertEqual(
+            {(each.str_bucket, each.str_path): each for each in image_hashes},
+            self.data_gateway.get_by_keys(
+                (each.str_bucket, each.str_path) for each in image_hashes))
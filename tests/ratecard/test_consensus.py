@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from parkme.ratecard import consensus
+from parkme.ratecard import parser
+
+
+def parse(*lines):
+    """Return the rate records of the given lines"""
+    return [parser.parse_rate_record(each) for each in lines]
+
+
+class GetSimilarityTest(unittest.TestCase):
+
+    def test_should_ignore_order_formatting_and_repeats(self):
+        """Should be identical regardless of line order, price format and
+        repeated lines"""
+        lhs = consensus.canonicalize(parse('1st hour $5', 'Max $20'))
+        rhs = consensus.canonicalize(
+            parse('Max $20.00', '1st hour $5', 'Max $20'))
+        self.assertEqual(1.0, consensus.get_similarity(lhs, rhs))
+
+    def test_should_score_shared_rates(self):
+        """Should score the shared fraction of all distinct rates"""
+        lhs = consensus.canonicalize(parse('1st hour $5', 'Max $20'))
+        rhs = consensus.canonicalize(parse('1st hour $5', 'Max $25'))
+        self.assertAlmostEqual(1.0 / 3, consensus.get_similarity(lhs, rhs))
+
+    def test_should_not_agree_on_one_substitution_in_five(self):
+        """Should not agree when one rate of five is transcribed
+        differently"""
+        full = parse('1st hour $5', '2 hours $8', '3 hours $10',
+                     'Max $20', 'monthly $150')
+        self.assertFalse(consensus.is_similar(
+            full, full[:4] + parse('monthly $160')))
+
+
+class GetAgreeingPairsTest(unittest.TestCase):
+
+    def test_should_pair_similar_transcriptions(self):
+        """Should pair identical and near-identical transcriptions only"""
+        full = parse('1st hour $5', '2 hours $8', '3 hours $10',
+                     'Max $20', 'monthly $150')
+        self.assertEqual(
+            [(0, 1), (0, 2), (1, 2)],
+            consensus.get_agreeing_pairs(
+                [full, list(reversed(full)), full[:4], parse('Max $9'),
+                 None]))
+
+
+class GetConsensusRecordsTest(unittest.TestCase):
+
+    def test_should_keep_rates_of_at_least_two_transcriptions(self):
+        """Should keep the rates transcribed by two of three agreeing
+        workers"""
+        full = parse('1st hour $5', '2 hours $8', '3 hours $10',
+                     'Max $20', 'monthly $150')
+        self.assertEqual(
+            full[:4],
+            consensus.get_consensus_records(
+                [full[:4], parse('Max $9'), full, list(full[:4])]))
+
+    def test_should_keep_rates_missed_by_one_of_two_agreeing(self):
+        """Should keep a rate only one of two agreeing workers missed"""
+        full = parse('1st hour $5', '2 hours $8', '3 hours $10',
+                     'Max $20', 'monthly $150')
+        self.assertEqual(
+            full,
+            consensus.get_consensus_records(
+                [full[:4], parse('Max $9'), full]))
+
+    def test_should_drop_rates_two_agreeing_workers_priced_differently(self):
+        """Should keep neither price of a rate two agreeing workers
+        transcribed differently"""
+        shared = parse('1st hour $5', '2 hours $8', '3 hours $10',
+                       '4 hours $12', 'Max $20', 'monthly $150',
+                       'early bird $12', 'evening $8', 'Saturday $6')
+        self.assertEqual(
+            shared,
+            consensus.get_consensus_records(
+                [shared + parse('each additional 15 min $2'),
+                 shared + parse('each additional 15 min $3')]))
+
+    def test_should_return_none_without_agreement(self):
+        """Should return None when no transcriptions agree"""
+        self.assertIsNone(consensus.get_consensus_records(
+            [parse('Max $20'), parse('Max $25')]))
+
+
+class GetWeightedConsensusRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        super(GetWeightedConsensusRecordsTest, self).setUp()
+        self.full = parse('1st hour $5', '2 hours $8', '3 hours $10',
+                          'Max $20', 'monthly $150')
+
+    def test_should_group_near_identical_transcriptions(self):
+        """Should sum the weights of workers whose transcriptions agree
+        without being identical"""
+        self.assertEqual(
+            self.full,
+            consensus.get_weighted_consensus_records(
+                [self.full[:4], parse('Max $9'), self.full],
+                [0.9, 0.9, 0.9],
+                1.6))
+
+    def test_should_require_enough_weight(self):
+        """Should return None when the agreeing workers aren't trusted
+        enough"""
+        self.assertIsNone(consensus.get_weighted_consensus_records(
+            [self.full[:4], parse('Max $9'), self.full],
+            [0.5, 0.9, 0.5],
+            1.6))
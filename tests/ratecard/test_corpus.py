@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from parkme.ratecard import corpus
+
+
+class LoadCorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        super(LoadCorpusTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def write_csv(self, name, rates):
+        """Write a result file with the given rates and return its path"""
+        csv_path = os.path.join(self.temp_dir, name)
+        with open(csv_path, 'wb') as csv_file:
+            csv_file.write('"HITId","Answer.Rates"\r\n')
+            for each in rates:
+                csv_file.write('"h","{}"\r\n'.format(each))
+        return csv_path
+
+    def test_should_deduplicate_lines_of_all_files(self):
+        """Should return each distinct line once in order of appearance"""
+        self.assertEqual(
+            [u'Max $20', u'1st hour $5', u'monthly $150'],
+            corpus.load_corpus([
+                self.write_csv('a.csv', ['Max $20\r\n1st hour $5', '']),
+                self.write_csv('b.csv', [' 1st hour $5\r\nmonthly $150'])]))
+
+
+class ParseLineTest(unittest.TestCase):
+
+    def test_should_keep_fastest_parse(self):
+        """Should record the output, notes and fastest parse time"""
+        clock = mock.Mock(side_effect=[0.0, 3.0, 10.0, 11.0])
+        self.assertEqual(
+            corpus.LineResult('Daily Max: $20.00', [], 1.0),
+            corpus.parse_line('Max $20', repeat=2, clock=clock))
+        self.assertIsNone(
+            corpus.parse_line('Thursday $4', repeat=1).output)
+
+
+class DiffSnapshotsTest(unittest.TestCase):
+
+    def setUp(self):
+        super(DiffSnapshotsTest, self).setUp()
+        self.old = {
+            'a': corpus.LineResult(None, [], 0.5),
+            'b': corpus.LineResult('B', [], 0.5),
+            'c': corpus.LineResult('C', [], 0.5),
+            'd': corpus.LineResult('D', [], 0.5)
+        }
+
+    def test_should_categorize_lines(self):
+        """Should list fixed, broken, changed and new lines and time only
+        lines in both snapshots"""
+        new = {
+            'a': corpus.LineResult('A', [], 0.5),
+            'b': corpus.LineResult(None, [], 0.5),
+            'c': corpus.LineResult('C2', [], 0.5),
+            'd': corpus.LineResult('D', [], 0.5),
+            'e': corpus.LineResult('E', [], 5.0)
+        }
+        self.assertEqual(
+            corpus.SnapshotDiff(['a'], ['b'], ['c'], ['e'], 2.0, 2.0),
+            corpus.diff_snapshots(self.old, new))
+
+    def test_should_report_regressions(self):
+        """Should report broken and changed lines and slower parsing"""
+        self.assertEqual(
+            ['1 lines no longer parse',
+             '1 lines parse differently',
+             'Parsing took 3.000s, was 2.000s'],
+            corpus.get_regressions(
+                corpus.SnapshotDiff([], ['b'], ['c'], [], 2.0, 3.0)))
+        self.assertEqual(
+            [],
+            corpus.get_regressions(
+                corpus.SnapshotDiff(['a'], [], [], ['e'], 2.0, 2.4)))
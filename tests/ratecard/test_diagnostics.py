@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from parkme.ratecard import diagnostics
+
+
+class DiagnoseLineTest(unittest.TestCase):
+
+    def test_should_return_none_for_parsed_lines(self):
+        """Should not diagnose lines that parse"""
+        self.assertIsNone(diagnostics.diagnose_line('Max $20'))
+
+    def test_should_locate_failure(self):
+        """Should record where parsing stopped, what was expected and the
+        rate type parsing furthest"""
+        failure = diagnostics.diagnose_line('Thursday $4')
+        self.assertEqual(6, failure.column)
+        self.assertEqual('Expected W:($)', failure.expected)
+        self.assertEqual('day_range', failure.closest_rate_type)
+
+
+class FailureTableTest(unittest.TestCase):
+
+    def test_should_rank_by_rejected_assignments(self):
+        """Should count lines and distinct assignments for each failure,
+        ranking those rejecting the most assignments first"""
+        failure_table = diagnostics.FailureTable()
+        failure_table.add_lines(['Thursday $4', 'Thursday $5'], 'a1')
+        failure_table.add_lines(['3 days $5'], 'a2')
+        failure_table.add_lines(['3 days $6', 'Max $20'], 'a3')
+        rows = failure_table.get_rows()
+        self.assertEqual(4, len(failure_table))
+        self.assertEqual(
+            [('hourly', 2, 2, '3 days $5'),
+             ('day_range', 2, 1, 'Thursday $4')],
+            [(each.closest_rate_type,
+              each.num_lines,
+              each.num_assignments,
+              each.example) for each in rows])
+        self.assertEqual(3, len(failure_table.format_table()))
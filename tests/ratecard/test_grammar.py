@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+
+import mock
+
+from parkme.ratecard import grammar
+
+
+class GetRateCardTest(unittest.TestCase):
+
+    @mock.patch('parkme.ratecard.grammar._grammar', None)
+    @mock.patch('parkme.ratecard.grammar.build_grammar')
+    def test_should_build_once(self, build_grammar):
+        """Should build the grammar on first use and reuse it after"""
+        rate_card = build_grammar.return_value.rate_card
+        self.assertEqual(rate_card, grammar.get_rate_card())
+        self.assertEqual(rate_card, grammar.get_rate_card())
+        build_grammar.assert_called_once_with()
+
+
+class UserVisibleNotesTest(unittest.TestCase):
+
+    def test_should_keep_notes_for_each_thread(self):
+        """Should not share notes parsed on another thread"""
+        grammar.clear_user_visible_notes()
+        grammar.push_user_visible_note('free parking', 0, [])
+        thread = threading.Thread(
+            target=grammar.push_user_visible_note,
+            args=('lost ticket pays $20', 0, []))
+        thread.start()
+        thread.join()
+        self.assertEqual(
+            ['free parking'], grammar.get_user_visible_notes())
+        grammar.clear_user_visible_notes()
+        self.assertEqual([], grammar.get_user_visible_notes())
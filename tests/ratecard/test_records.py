@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from parkme.ratecard import models
+from parkme.ratecard import parser
+from parkme.ratecard import records
+
+
+class RateRecordTest(unittest.TestCase):
+
+    def test_should_keep_parkme_format_text(self):
+        """Should convert to the same text the grammar always emitted"""
+        record = parser.parse_rate_record('Max $20')
+        self.assertEqual('Daily Max: $20.00', str(record))
+        self.assertEqual(
+            'Daily Max: $20.00', parser.convert_to_parkme_format('Max $20'))
+
+    def test_should_parse_structure(self):
+        """Should parse the rate type, days, time window and price"""
+        record = parser.parse_rate_record('Mon-Fri (6am-6pm) $15')
+        self.assertEqual(records.DAYS, record.rate_type)
+        self.assertEqual(
+            sum(records.DAY_BITS[each]
+                for each in ['Mon', 'Tues', 'Wed', 'Thurs', 'Fri']),
+            record.day_mask)
+        self.assertEqual((360, 1080), (record.start_minute, record.end_minute))
+        self.assertEqual(1500, record.price_cents)
+
+    def test_should_parse_durations(self):
+        """Should parse the stay covered by hourly and increment rates"""
+        hourly = parser.parse_rate_record('1st hour $5')
+        increment = parser.parse_rate_record('each additional 30 min $2')
+        self.assertEqual(
+            (records.HOURLY, 0, 60),
+            (hourly.rate_type, hourly.min_duration, hourly.max_duration))
+        self.assertEqual(
+            (records.INCREMENT, 30, 30),
+            (increment.rate_type,
+             increment.min_duration,
+             increment.max_duration))
+
+    def test_should_compare_by_structure(self):
+        """Should be equal when describing the same rate in other words"""
+        lhs = parser.parse_rate_record('2 hours $6')
+        rhs = parser.parse_rate_record('0-2 hrs $6.00')
+        self.assertNotEqual(str(lhs), str(rhs))
+        self.assertEqual(lhs, rhs)
+        self.assertEqual(frozenset([lhs]), frozenset([rhs]))
+        self.assertNotEqual(lhs, parser.parse_rate_record('2 hours $7'))
+
+    def test_should_share_slot_regardless_of_price(self):
+        """Should give rates for the same stay the same slot whatever their
+        price"""
+        self.assertEqual(
+            parser.parse_rate_record('2 hours $6').slot,
+            parser.parse_rate_record('2 hours $7').slot)
+        self.assertNotEqual(
+            parser.parse_rate_record('2 hours $6').slot,
+            parser.parse_rate_record('3 hours $6').slot)
+
+    def test_should_wrap_day_ranges(self):
+        """Should include the days of a range past Sunday"""
+        self.assertEqual(
+            records.DAY_BITS['Sat'] | records.DAY_BITS['Sun'] |
+            records.DAY_BITS['Mon'],
+            records.get_day_mask('Sat', 'Mon'))
+
+    def test_should_return_none_for_notes(self):
+        """Should return no record for lines only holding notes"""
+        self.assertIsNone(parser.parse_rate_record('no overnight parking'))
+
+
+class ParseResultTest(unittest.TestCase):
+
+    def test_should_keep_records_of_rate_lines(self):
+        """Should keep a record of each rate line and the text of each line"""
+        assignment = mock.Mock(rates='Max $20\r\nno overnight parking')
+        result = models.ParseResult.get_for_assignment(assignment)
+        self.assertEqual(['Daily Max: $20.00'], result.parsed_rates)
+        self.assertEqual(
+            [parser.parse_rate_record('Max $20')], result.parsed_records)
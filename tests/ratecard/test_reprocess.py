@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from parkme import models
+from parkme.ratecard import reprocess
+
+
+class StoredAssignmentTest(unittest.TestCase):
+
+    def test_should_present_transcription_as_assignment(self):
+        """Should expose the stored fields as assignment attributes"""
+        transcription = models.Transcription(
+            'a1', 'h1', 'w1', '1', 'Max $20', False, 5)
+        assignment = reprocess.StoredAssignment(transcription)
+        self.assertEqual(
+            transcription,
+            reprocess.to_transcription(assignment))
+
+
+class ReprocessTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ReprocessTest, self).setUp()
+        self.data_gateway = models.TranscriptionDataGateway(':memory:')
+        self.data_gateway.create_table()
+        self.assignments = [
+            mock.Mock(assignment_id='a1', hit_id='h1', worker_id='w1',
+                      lot_id='1', rates='Max $20\r\nThursday $4',
+                      does_not_contain_rates=False, work_seconds=5),
+            mock.Mock(assignment_id='a2', hit_id='h2', worker_id='w1',
+                      lot_id='2', rates='Max $20',
+                      does_not_contain_rates=False, work_seconds=5)]
+        reprocess.store_transcriptions(
+            self.data_gateway,
+            self.assignments,
+            {'h1': 'NO CONSENSUS', 'h2': 'CONSENSUS'},
+            grammar_version=1)
+
+    def test_should_store_failed_lines(self):
+        """Should store the transcriptions and the lines that failed"""
+        self.assertEqual(
+            ['Thursday $4'], self.data_gateway.get_failed_lines(2))
+        self.assertEqual(
+            {'h1': 'NO CONSENSUS'}, self.data_gateway.get_outcomes(['h1']))
+
+    def test_should_not_reparse_with_same_grammar(self):
+        """Should not parse failed lines again without a version bump"""
+        self.assertEqual(
+            [], reprocess.reparse_failed_lines(self.data_gateway, 1))
+
+    @mock.patch('parkme.ratecard.parser.parse_or_reject_line')
+    def test_should_find_hits_of_lines_fixed_by_new_grammar(
+            self, parse_or_reject_line):
+        """Should reparse only failed lines and return the transcriptions
+        of the HITs with lines that now parse"""
+        parse_or_reject_line.return_value = 'Thurs: $4.00'
+        fixed_lines = reprocess.reparse_failed_lines(self.data_gateway, 2)
+        self.assertEqual(['Thursday $4'], fixed_lines)
+        parse_or_reject_line.assert_called_once_with('Thursday $4')
+        self.assertEqual([], self.data_gateway.get_failed_lines(2))
+        self.assertEqual(
+            {'h1': [reprocess.to_transcription(self.assignments[0])]},
+            reprocess.get_affected_transcriptions(
+                self.data_gateway, fixed_lines))
+
+    @mock.patch('parkme.ratecard.parser.parse_or_reject_line')
+    def test_should_reparse_lines_transcribed_again_with_new_grammar(
+            self, parse_or_reject_line):
+        """Should still reparse a failed line that was transcribed again
+        after the grammar version was bumped"""
+        parse_or_reject_line.return_value = 'Thurs: $4.00'
+        assignment = mock.Mock(
+            assignment_id='a3', hit_id='h3', worker_id='w2', lot_id='3',
+            rates='Thursday $4', does_not_contain_rates=False,
+            work_seconds=5)
+        reprocess.store_transcriptions(
+            self.data_gateway, [assignment], {'h3': 'CONSENSUS'},
+            grammar_version=2)
+        fixed_lines = reprocess.reparse_failed_lines(self.data_gateway, 2)
+        self.assertEqual(['Thursday $4'], fixed_lines)
+        self.assertEqual(
+            ['h1', 'h3'],
+            sorted(reprocess.get_affected_transcriptions(
+                self.data_gateway, fixed_lines)))
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import unittest
+
+import mock
+
+from parkme import models
+from parkme.ratecard import writer
+
+
+LOT_1 = '5b7c1f0e-8a2d-4c3e-9f1a-0d6e2b4a8c11'
+LOT_2 = 'c3e9a7d2-1f4b-4e6a-8b0c-7a5d9e2f1b22'
+LOT_3 = '0f2d4b6a-9c8e-4a1f-b3d5-e7c9a1b3d533'
+
+
+@contextlib.contextmanager
+def fake_cursor(cursor):
+    """Stand in for parkme.db.cursor yielding the given cursor"""
+    yield cursor, None
+
+
+class GetRateChangesTest(unittest.TestCase):
+
+    def test_should_skip_unchanged_and_missing_lots(self):
+        """Should only change existing lots whose rates differ"""
+        self.assertEqual(
+            [models.RateChange(LOT_2, 'h2', None, 'b')],
+            writer.get_rate_changes(
+                {LOT_1: 'a', LOT_2: None},
+                {LOT_1: ('h1', 'a'), LOT_2: ('h2', 'b'),
+                 LOT_3: ('h3', 'c')}))
+
+
+class BulkRateWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        super(BulkRateWriterTest, self).setUp()
+        self.cursor = mock.Mock()
+        self.cursor.fetchall.return_value = [
+            (LOT_1, 'a'), (LOT_2, 'old')]
+        cursor_patcher = mock.patch(
+            'parkme.db.cursor', lambda *args: fake_cursor(self.cursor))
+        cursor_patcher.start()
+        self.addCleanup(cursor_patcher.stop)
+        execute_values_patcher = mock.patch(
+            'psycopg2.extras.execute_values')
+        self.execute_values = execute_values_patcher.start()
+        self.addCleanup(execute_values_patcher.stop)
+        self.audit_gateway = mock.Mock()
+        self.rate_writer = writer.BulkRateWriter(self.audit_gateway)
+
+    def test_should_update_changed_lots_in_one_statement(self):
+        """Should fetch current rates once and update only changed lots"""
+        self.rate_writer.add(LOT_1, ['a'], hit_id='h1')
+        self.rate_writer.add(LOT_2, ['x', 'y'], hit_id='h2')
+
+        rate_changes = self.rate_writer.flush()
+
+        expected = [models.RateChange(LOT_2, 'h2', 'old', 'x\r\ny')]
+        self.assertEqual(expected, rate_changes)
+        self.assertEqual(1, self.cursor.execute.call_count)
+        self.assertEqual(
+            [(LOT_2, 'x\r\ny')], self.execute_values.call_args[0][2])
+        self.audit_gateway.record_changes.assert_called_once_with(expected)
+        self.assertEqual(0, len(self.rate_writer))
+
+    def test_should_not_connect_without_rates(self):
+        """Should not touch the database if no rates were added"""
+        self.assertEqual([], self.rate_writer.flush())
+        self.assertFalse(self.cursor.execute.called)
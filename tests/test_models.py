@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from parkme import models
+
+
+class WorkerStatsDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(WorkerStatsDataGatewayTest, self).setUp()
+        self.data_gateway = models.WorkerStatsDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_return_empty_dict_if_no_results_recorded(self):
+        """Should return empty dict if no results recorded"""
+        self.assertEqual({}, self.data_gateway.get_by_worker_ids(['herp']))
+
+    def test_should_accumulate_results_for_each_worker(self):
+        """Should accumulate results for each worker"""
+        self.data_gateway.record_results([
+            models.WorkerResult('a1', 'herp', None, True, 10.0),
+            models.WorkerResult('a2', 'herp', None, False, 20.0),
+            models.WorkerResult('a3', 'derp', None, True, None)])
+        self.data_gateway.record_results([
+            models.WorkerResult('a4', 'herp', None, True, 30.0)])
+
+        results = self.data_gateway.get_by_worker_ids(['herp', 'derp'])
+
+        self.assertEqual(
+            (3, 2, 60.0),
+            (results['herp'].num_assignments,
+             results['herp'].num_agreed,
+             results['herp'].total_work_seconds))
+        self.assertEqual(
+            (1, 1, 0.0),
+            (results['derp'].num_assignments,
+             results['derp'].num_agreed,
+             results['derp'].total_work_seconds))
+
+    def test_should_ignore_previously_recorded_assignments(self):
+        """Should ignore results for previously recorded assignments"""
+        worker_result = models.WorkerResult('a1', 'herp', None, True, 10.0)
+        self.assertEqual(1, self.data_gateway.record_results([worker_result]))
+        self.assertEqual(0, self.data_gateway.record_results([worker_result]))
+        self.assertEqual(
+            1,
+            self.data_gateway.get_by_worker_ids(['herp'])['herp'].num_assignments)
+
+    def test_should_record_each_item_of_bundled_assignment(self):
+        """Should record the result on each asset of a bundled assignment"""
+        self.data_gateway.record_results([
+            models.WorkerResult('a1', 'herp', 'asset-1', True, 10.0),
+            models.WorkerResult('a1', 'herp', 'asset-2', False, 10.0),
+            models.WorkerResult('a1', 'herp', 'asset-3', False, 10.0)])
+        stats = self.data_gateway.get_by_worker_ids(['herp'])['herp']
+        self.assertEqual(
+            (3, 1), (stats.num_assignments, stats.num_agreed))
+
+    def test_should_ignore_assignments_recorded_before_keying_by_asset(self):
+        """Should ignore results of assignments recorded by assignment id
+        alone"""
+        self.data_gateway.dbconn.execute(
+            "INSERT INTO worker_stats_assignment VALUES ('a1', 'herp')")
+        self.assertEqual(0, self.data_gateway.record_results([
+            models.WorkerResult('a1', 'herp', 'asset-2', True, 10.0)]))
+
+
+class AssetDuplicateDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(AssetDuplicateDataGatewayTest, self).setUp()
+        self.data_gateway = models.AssetDuplicateDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_group_duplicates_by_original(self):
+        """Should return the duplicates of each original asset"""
+        self.data_gateway.save_all(
+            'batch', {'a2': 'a1', 'a3': 'a1', 'b2': 'b1'})
+        results = self.data_gateway.get_by_original_asset_ids(['a1', 'c1'])
+        self.assertEqual(['a1'], results.keys())
+        self.assertEqual(['a2', 'a3'], sorted(results['a1']))
+
+
+class WorkQueueDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(WorkQueueDataGatewayTest, self).setUp()
+        self.data_gateway = models.WorkQueueDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_update_priority_of_waiting_items(self):
+        """Should update the priority of re-queued waiting items"""
+        self.assertEqual(
+            2, self.data_gateway.push_all(
+                'test', [('a', 1.0, {'x': 1}), ('b', 2.0, {'x': 2})]))
+        self.assertEqual(
+            0, self.data_gateway.push_all('test', [('a', 3.0, {'x': 1})]))
+        items = self.data_gateway.get_next('test', 10)
+        self.assertEqual(['a', 'b'], [each.work_item_id for each in items])
+        self.assertEqual({'x': 1}, items[0].params)
+
+    def test_should_not_requeue_uploaded_items(self):
+        """Should ignore re-queued items that were already uploaded"""
+        self.data_gateway.push_all('test', [('a', 1.0, {})])
+        self.data_gateway.mark_uploaded('test', ['a'], 'HIT')
+        self.data_gateway.push_all('test', [('a', 1.0, {})])
+        self.assertEqual(0, self.data_gateway.count_pending('test'))
+
+
+class GoldAssetDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(GoldAssetDataGatewayTest, self).setUp()
+        self.data_gateway = models.GoldAssetDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_return_gold_assets_for_task_by_asset_id(self):
+        """Should return only the requested gold assets for the task"""
+        gold_asset = models.GoldAsset('1', {'asset_id': 1}, {'x': True})
+        self.data_gateway.save_all('test', [gold_asset])
+        self.data_gateway.save_all('other', [models.GoldAsset('2', {}, {})])
+        self.assertEqual(
+            {'1': gold_asset},
+            self.data_gateway.get_by_asset_ids('test', ['1', '2', '3']))
+
+    def test_should_query_asset_ids_in_chunks(self):
+        """Should return the gold assets of more assets than fit in one
+        query"""
+        self.data_gateway._MAX_PARAMS_PER_QUERY = 2
+        gold_assets = [models.GoldAsset(str(i), {}, {}) for i in xrange(5)]
+        self.data_gateway.save_all('test', gold_assets)
+        self.assertEqual(
+            5, len(self.data_gateway.get_by_asset_ids(
+                'test', [each.asset_id for each in gold_assets])))
+
+
+class WorkerAccuracyDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(WorkerAccuracyDataGatewayTest, self).setUp()
+        self.data_gateway = models.WorkerAccuracyDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_accumulate_each_result_once(self):
+        """Should accumulate gold results, ignoring recorded answers"""
+        gold_results = [
+            models.GoldResult('a1', 'herp', '1', True),
+            models.GoldResult('a1', 'herp', '2', False)]
+        self.assertEqual(2, self.data_gateway.record_results(gold_results))
+        self.assertEqual(0, self.data_gateway.record_results(gold_results))
+        self.data_gateway.record_results([
+            models.GoldResult('a2', 'herp', '1', True)])
+
+        worker_accuracy = self.data_gateway.get_by_worker_ids(
+            ['herp', 'derp'])
+        self.assertEqual(['herp'], worker_accuracy.keys())
+        self.assertEqual(
+            (3, 2),
+            (worker_accuracy['herp'].num_gold,
+             worker_accuracy['herp'].num_correct))
+
+
+class RateAuditDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(RateAuditDataGatewayTest, self).setUp()
+        self.data_gateway = models.RateAuditDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_return_changes_to_lot_in_order(self):
+        """Should return the changes to a lot's rates oldest first"""
+        rate_changes = [
+            models.RateChange('1', 'h1', None, 'a'),
+            models.RateChange('1', 'h2', 'a', 'b')]
+        self.data_gateway.record_changes(rate_changes)
+        self.data_gateway.record_changes([
+            models.RateChange('2', 'h3', None, 'c')])
+        self.assertEqual(rate_changes, self.data_gateway.get_by_lot_id('1'))
+
+
+class TranscriptionDataGatewayTest(unittest.TestCase):
+
+    def setUp(self):
+        super(TranscriptionDataGatewayTest, self).setUp()
+        self.data_gateway = models.TranscriptionDataGateway(':memory:')
+        self.data_gateway.create_table()
+
+    def test_should_return_transcriptions_by_hit_and_line(self):
+        """Should index the HITs of stored transcriptions by their lines"""
+        transcriptions = [
+            models.Transcription('a1', 'h1', 'w1', '1', 'x\r\n y', False, 5),
+            models.Transcription('a2', 'h1', 'w2', '1', 'x', False, None),
+            models.Transcription('a3', 'h2', 'w1', '2', None, True, 7)]
+        self.data_gateway.save_all(transcriptions)
+        self.assertEqual(
+            {'h1': transcriptions[:2]},
+            self.data_gateway.get_by_hit_ids(['h1', 'h3']))
+        self.assertEqual(
+            set(['h1']), self.data_gateway.get_hit_ids_by_lines(['y', 'z']))
+
+    def test_should_return_lines_failed_with_older_grammar(self):
+        """Should return only failed lines parsed with older versions"""
+        self.data_gateway.record_line_results(1, {'a': False, 'b': True})
+        self.data_gateway.record_line_results(2, {'c': False})
+        self.assertEqual(['a'], self.data_gateway.get_failed_lines(2))
+        self.data_gateway.record_line_results(2, {'a': True})
+        self.assertEqual(['a'], self.data_gateway.get_failed_lines(2))
+        self.data_gateway.record_line_results(
+            2, {'a': False}, overwrite=True)
+        self.assertEqual([], self.data_gateway.get_failed_lines(2))
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from parkme.turk import adaptive
+
+
+class AdaptiveSchedulerReviewTest(unittest.TestCase):
+
+    def setUp(self):
+        super(AdaptiveSchedulerReviewTest, self).setUp()
+        self.mock_hit_template = mock.Mock()
+        self.scheduler = adaptive.AdaptiveScheduler(
+            self.mock_hit_template, initial_assignments=2, max_assignments=4)
+        self.mock_hit = mock.Mock()
+        self.mock_hit.HITId = 'herp'
+        self.mock_hit.MaxAssignments = '2'
+        self.has_consensus = lambda assignments: False
+
+    def test_should_return_decided_if_consensus_reached(self):
+        """Should return DECIDED if consensus reached"""
+        self.assertEqual(
+            adaptive.DECIDED,
+            self.scheduler.review(self.mock_hit, [1, 2], lambda _: True))
+        self.assertFalse(self.mock_hit_template.extend_hit.called)
+
+    def test_should_return_waiting_if_assignments_outstanding(self):
+        """Should return WAITING if not all assignments are in"""
+        self.assertEqual(
+            adaptive.WAITING,
+            self.scheduler.review(self.mock_hit, [1], self.has_consensus))
+        self.assertFalse(self.mock_hit_template.extend_hit.called)
+
+    def test_should_extend_hit_if_no_consensus(self):
+        """Should extend HIT if all assignments are in without consensus"""
+        self.assertEqual(
+            adaptive.EXTENDED,
+            self.scheduler.review(self.mock_hit, [1, 2], self.has_consensus))
+        self.mock_hit_template.extend_hit.assert_called_once_with('herp', 1)
+
+    def test_should_return_no_consensus_once_max_assignments_reached(self):
+        """Should return NO CONSENSUS once the HIT cannot be extended"""
+        self.mock_hit.MaxAssignments = '4'
+        self.assertEqual(
+            adaptive.NO_CONSENSUS,
+            self.scheduler.review(
+                self.mock_hit, [1, 2, 3, 4], self.has_consensus))
+        self.assertFalse(self.mock_hit_template.extend_hit.called)
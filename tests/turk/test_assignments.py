@@ -5,6 +5,7 @@ import uuid
 import mock
 
 from parkme.turk import assignments
+from parkme.turk import fake
 
 
 class GetAnswerToQuestionTest(unittest.TestCase):
@@ -69,3 +70,64 @@ class BaseAssignmentTest(unittest.TestCase):
         """Should return the Worker id"""
         self.assertEqual(
             self.MOCK_WORKER_ID, self.base_assignment.worker_id)
+
+
+class ImageCategorizationAssignmentTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ImageCategorizationAssignmentTest, self).setUp()
+        self.mock_assignment = mock.Mock()
+
+    def test_should_not_split_unbundled_assignment(self):
+        """Should return the assignment itself if its HIT isn't bundled"""
+        self.mock_assignment.answers = fake.make_answers({
+            'AssetId': ['asset'], 'Answer': ['rates|hours']})
+        assignment = assignments.ImageCategorizationAssignment(
+            self.mock_assignment)
+        self.assertEqual([assignment], assignment.split_items())
+        self.assertEqual(['rates', 'hours'], assignment.categories)
+
+    def test_should_split_bundled_assignment_into_items(self):
+        """Should return an assignment reading each item's answers"""
+        self.mock_assignment.answers = fake.make_answers({
+            'AssetId_1': ['asset-1'], 'Answer_1': ['rates'],
+            'AssetId_2': ['asset-2'], 'DoesNotMatch_2': ['1']})
+        items = assignments.ImageCategorizationAssignment(
+            self.mock_assignment).split_items()
+        self.assertEqual(
+            ['asset-1', 'asset-2'], [each.asset_id for each in items])
+        self.assertEqual(['rates'], items[0].categories)
+        self.assertFalse(items[0].does_not_match)
+        self.assertIsNone(items[1].categories)
+        self.assertTrue(items[1].does_not_match)
+
+
+class UniqueByAssignmentIdTest(unittest.TestCase):
+
+    def test_should_keep_first_item_of_each_assignment(self):
+        """Should return a single item of each split bundled assignment"""
+        mock_assignment = mock.Mock()
+        mock_assignment.AssignmentId = 'a1'
+        mock_assignment.answers = fake.make_answers({
+            'AssetId_1': ['asset-1'], 'AssetId_2': ['asset-2']})
+        items = assignments.ImageCategorizationAssignment(
+            mock_assignment).split_items()
+        other = mock.Mock(assignment_id='a2')
+        self.assertEqual(
+            [items[0], other],
+            assignments.unique_by_assignment_id(items + [other]))
+
+
+class AssignmentGatewayTest(unittest.TestCase):
+
+    def test_should_accept_each_assignment_once(self):
+        """Should approve each distinct assignment only once"""
+        mock_connection = mock.Mock()
+        assignment_gateway = assignments.AssignmentGateway(mock_connection)
+        assignment_gateway.accept_all([
+            mock.Mock(assignment_id='a1'), mock.Mock(assignment_id='a1'),
+            mock.Mock(assignment_id='a2')])
+        self.assertEqual(
+            ['a1', 'a2'],
+            [call[0][0] for call in
+             mock_connection.approve_assignment.call_args_list])
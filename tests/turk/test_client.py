@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from boto.mturk import connection
+
+from parkme.turk import assignments
+from parkme.turk import client
+from parkme.turk import fake
+from parkme.turk import hits
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        super(RateLimiterTest, self).setUp()
+        self.now = 100.0
+        self.sleeps = []
+        self.rate_limiter = client.RateLimiter(
+            max_concurrent=2,
+            max_per_second=4,
+            clock=lambda: self.now,
+            sleep=self.sleeps.append)
+
+    def test_should_space_requests_by_min_interval(self):
+        """Should delay requests started faster than the rate limit"""
+        for _ in xrange(3):
+            with self.rate_limiter:
+                pass
+        self.assertEqual([0.25, 0.5], self.sleeps)
+
+    def test_should_not_delay_requests_within_rate_limit(self):
+        """Should not delay requests started slower than the rate limit"""
+        for _ in xrange(2):
+            with self.rate_limiter:
+                self.now += 1
+        self.assertEqual([], self.sleeps)
+
+
+class ConcurrentMTurkClientTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ConcurrentMTurkClientTest, self).setUp()
+        self.mturk_connection = fake.FakeMTurkConnection()
+        self.client = client.ConcurrentMTurkClient(
+            lambda: self.mturk_connection,
+            num_workers=4,
+            rate_limiter=client.RateLimiter(max_per_second=None))
+
+    def tearDown(self):
+        super(ConcurrentMTurkClientTest, self).tearDown()
+        self.client.close()
+
+    def test_should_create_hits_through_hit_template(self):
+        """Should create HITs when used as a HIT template's connection"""
+        hit_template = hits.HITTemplate(self.client, 'layout', 0.05)
+        async_results = [
+            hit_template.create_hit({'index': index}, batch_id='batch')
+            for index in xrange(20)]
+        hit_ids = set(each.get()[0].HITId for each in async_results)
+        self.assertEqual(20, len(hit_ids))
+        self.assertEqual(hit_ids, set(self.mturk_connection.hits))
+
+    def test_should_approve_submitted_assignments(self):
+        """Should approve the assignments of reviewable HITs"""
+        hit = self.mturk_connection.create_hit(
+            hit_layout='layout', max_assignments=2)[0]
+        for worker_id in ('a', 'b'):
+            self.mturk_connection.submit_assignment(
+                hit.HITId, worker_id, {'category': ['rates']})
+
+        reviewable = self.client.get_reviewable_hits().get()
+        self.assertEqual([hit.HITId], [each.HITId for each in reviewable])
+        all_assignments = self.client.get_assignments(hit.HITId).get()
+        self.assertEqual(
+            ['rates', 'rates'],
+            [assignments.BaseAssignment(each).get_answer_to_question(
+                'category') for each in all_assignments])
+        for each in all_assignments:
+            self.client.approve_assignment(each.AssignmentId).get()
+        self.assertEqual(
+            set([fake.APPROVED]),
+            set(each.AssignmentStatus
+                for each in self.mturk_connection.assignments.itervalues()))
+
+    def test_should_raise_request_error_from_get(self):
+        """Should raise the request's exception when getting its result"""
+        async_result = self.client.approve_assignment('herp')
+        self.assertRaises(connection.MTurkRequestError, async_result.get)
+
+    def test_should_return_responses_in_order_from_map(self):
+        """Should return the responses in request order from map"""
+        hit_ids = [
+            self.mturk_connection.create_hit(hit_layout='layout')[0].HITId
+            for _ in xrange(10)]
+        responses = self.client.map('get_hit', [(each,) for each in hit_ids])
+        self.assertEqual(hit_ids, [each[0].HITId for each in responses])
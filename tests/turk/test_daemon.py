@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+import mock
+
+from parkme.turk import daemon
+
+
+class ResultSet(list):
+    """Minimal stand-in for a boto result set"""
+
+    def __init__(self, items, total_num_results):
+        super(ResultSet, self).__init__(items)
+        self.TotalNumResults = str(total_num_results)
+
+
+def make_hit(hit_id, hit_type_id='type'):
+    """Return a mock HIT"""
+    hit = mock.Mock()
+    hit.HITId = hit_id
+    hit.HITTypeId = hit_type_id
+    return hit
+
+
+class GetBackoffSecondsTest(unittest.TestCase):
+
+    def test_should_double_delay_up_to_max_backoff(self):
+        """Should double the delay with each idle poll up to max backoff"""
+        rng = random.Random(1234)
+        for num_idle_polls, expected in ((1, 20), (2, 40), (10, 100)):
+            delay = daemon.get_backoff_seconds(num_idle_polls, 10, 100, rng)
+            self.assertTrue(expected / 2.0 <= delay <= expected)
+
+
+class IterReviewableHitIdsTest(unittest.TestCase):
+
+    def test_should_page_through_all_reviewable_hits(self):
+        """Should request pages until all reviewable HITs are returned"""
+        mock_connection = mock.Mock()
+        mock_connection.get_reviewable_hits.side_effect = [
+            ResultSet([make_hit('a'), make_hit('b')], 3),
+            ResultSet([make_hit('c')], 3)]
+        self.assertEqual(
+            ['a', 'b', 'c'],
+            list(daemon.iter_reviewable_hit_ids(mock_connection, 2)))
+        mock_connection.get_reviewable_hits.assert_called_with(
+            page_size=2, page_number=2)
+
+
+class ReviewDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ReviewDaemonTest, self).setUp()
+        self.mock_connection = mock.Mock()
+        self.mock_connection.get_hit.return_value = [make_hit('herp')]
+        self.mock_connection.get_assignments.return_value = ['assignment']
+        self.mock_handler = mock.Mock()
+        self.review_daemon = daemon.ReviewDaemon(
+            lambda: self.mock_connection,
+            {'type': self.mock_handler},
+            num_workers=1)
+        self.review_daemon._pool = mock.Mock()
+
+    def test_should_set_reviewing_after_handling_hit(self):
+        """Should call the HIT type's handler then set the HIT reviewing"""
+        self.review_daemon.process_hit('herp')
+        self.mock_handler.assert_called_once_with(
+            self.mock_connection, mock.ANY, ['assignment'])
+        self.mock_connection.set_reviewing.assert_called_once_with('herp')
+        self.assertEqual(1, self.review_daemon.num_processed)
+
+    def test_should_not_set_reviewing_if_handler_fails(self):
+        """Should leave the HIT reviewable if its handler raises"""
+        self.mock_handler.side_effect = ValueError
+        self.review_daemon.process_hit('herp')
+        self.assertFalse(self.mock_connection.set_reviewing.called)
+        self.assertEqual(1, self.review_daemon.num_failed)
+
+    def test_should_ignore_hits_without_handler(self):
+        """Should not dispatch HITs whose type has no handler again"""
+        self.mock_connection.get_hit.return_value = [
+            make_hit('herp', 'unknown')]
+        self.review_daemon.process_hit('herp')
+        self.mock_connection.get_reviewable_hits.return_value = ResultSet(
+            [make_hit('herp')], 1)
+        self.assertEqual(0, self.review_daemon.poll())
+
+    def test_should_limit_hits_in_flight(self):
+        """Should dispatch no more than the in-flight limit"""
+        self.mock_connection.get_reviewable_hits.return_value = ResultSet(
+            [make_hit(str(each)) for each in xrange(5)], 5)
+        self.assertEqual(2, self.review_daemon.poll())
+        self.assertEqual(0, self.review_daemon.poll())
+
+    def test_should_leave_unfinished_hits_reviewable(self):
+        """Should not set the HIT reviewing if its handler isn't finished"""
+        self.mock_handler.return_value = False
+        self.review_daemon.process_hit('herp')
+        self.assertFalse(self.mock_connection.set_reviewing.called)
+        self.assertEqual(1, self.review_daemon.num_deferred)
+        self.assertEqual(0, self.review_daemon.num_processed)
+
+    def test_should_ignore_hits_after_max_attempts(self):
+        """Should stop dispatching a HIT that keeps failing"""
+        self.mock_handler.side_effect = ValueError
+        self.mock_connection.get_reviewable_hits.return_value = ResultSet(
+            [make_hit('herp')], 1)
+        with mock.patch('traceback.print_exc'):
+            for _ in xrange(daemon.MAX_ATTEMPTS - 1):
+                self.review_daemon.process_hit('herp')
+            self.assertEqual(1, self.review_daemon.poll())
+            self.review_daemon.process_hit('herp')
+        self.assertEqual(0, self.review_daemon.poll())
+
+    def test_should_read_all_pages_before_dispatching(self):
+        """Should read every page of reviewable HITs before dispatching"""
+        calls = []
+        self.mock_connection.get_reviewable_hits.side_effect = (
+            lambda page_size, page_number: calls.append(page_number) or
+            ResultSet([make_hit(str(page_number))], page_size + 1))
+        self.review_daemon._pool.apply_async.side_effect = (
+            lambda func, args: calls.append(args))
+        self.assertEqual(2, self.review_daemon.poll())
+        self.assertEqual([1, 2, ('1',), ('2',)], calls)
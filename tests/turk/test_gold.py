@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import random
+import unittest
+
+import mock
+
+from parkme import models
+from parkme.turk import gold
+
+
+def make_assignment(assignment_id, asset_id, answer):
+    """Return a mock assignment for the given asset"""
+    assignment = mock.Mock()
+    assignment.assignment_id = assignment_id
+    assignment.worker_id = 'herp'
+    assignment.asset_id = asset_id
+    assignment.answer = answer
+    return assignment
+
+
+class MixInGoldTest(unittest.TestCase):
+
+    def test_should_mix_in_requested_fraction_of_gold(self):
+        """Should make gold about the given fraction of the result"""
+        items = range(95)
+        mixed = gold.mix_in_gold(
+            items, ['g{}'.format(i) for i in range(10)], 0.05,
+            random.Random(0))
+        self.assertEqual(100, len(mixed))
+        self.assertEqual(items, [each for each in mixed if each in items])
+
+    def test_should_use_each_gold_item_once(self):
+        """Should not repeat gold items if there are too few"""
+        mixed = gold.mix_in_gold(range(10), ['g'], 0.5, random.Random(0))
+        self.assertEqual(1, mixed.count('g'))
+
+    def test_should_not_mix_in_gold_without_items(self):
+        """Should not return gold items alone"""
+        self.assertEqual([], gold.mix_in_gold([], ['g'], 0.5))
+
+
+class ScoreAssignmentsTest(unittest.TestCase):
+
+    def test_should_score_gold_and_pass_through_others(self):
+        """Should score answers on gold assets and return the rest"""
+        assignments = [
+            make_assignment('a1', '1', 'yes'),
+            make_assignment('a1', '2', 'no'),
+            make_assignment('a2', '3', 'yes')]
+        gold_assets = {
+            '1': models.GoldAsset('1', {}, 'yes'),
+            '2': models.GoldAsset('2', {}, 'yes')}
+
+        gold_results, other_assignments = gold.score_assignments(
+            assignments, gold_assets,
+            lambda each, answer: each.answer == answer)
+
+        self.assertEqual(
+            [models.GoldResult('a1', 'herp', '1', True),
+             models.GoldResult('a1', 'herp', '2', False)],
+            gold_results)
+        self.assertEqual([assignments[2]], other_assignments)
+
+
+class GradeGoldOnlyAssignmentsTest(unittest.TestCase):
+
+    def test_should_grade_assignments_with_only_gold_answers(self):
+        """Should grade gold-only assignments by all of their answers and
+        leave bundled assignments to be reviewed with their other assets"""
+        gold_results = [
+            models.GoldResult('a1', 'herp', '1', True),
+            models.GoldResult('a1', 'herp', '2', False),
+            models.GoldResult('a2', 'herp', '1', True),
+            models.GoldResult('a3', 'herp', '1', False)]
+        self.assertEqual(
+            {'a1': False, 'a2': True},
+            gold.grade_gold_only_assignments(
+                gold_results, [make_assignment('a3', '3', 'yes')]))
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
+import datetime
 import unittest
 import uuid
 
 import mock
 
 from parkme import exceptions
+from parkme import models
 from parkme.turk import hits
 
 
@@ -83,3 +85,76 @@ class DictToLayoutParametersTest(unittest.TestCase):
         result = hits.dict_to_layout_parameters(fixture)
         found = {each.name: each.value for each in result.layoutParameters}
         self.assertEquals(fixture, found)
+
+
+class GetSecondsPerAssignmentTest(unittest.TestCase):
+
+    def test_should_return_default_without_history(self):
+        """Should return the default if no assignments were recorded"""
+        self.assertEqual(42.0, hits.get_seconds_per_assignment([], 42.0))
+
+    def test_should_return_mean_across_workers(self):
+        """Should return the mean time per assignment across all workers"""
+        worker_stats = [
+            models.WorkerStats('a', 3, 3, 90, None),
+            models.WorkerStats('b', 1, 0, 50, None)]
+        self.assertEqual(
+            35.0, hits.get_seconds_per_assignment(worker_stats))
+
+
+class BundleParamsTest(unittest.TestCase):
+
+    def test_should_index_params_of_each_item(self):
+        """Should suffix each item's params with its index"""
+        self.assertEqual(
+            {'num_items': 2,
+             'asset_id_1': 'a', 'image_url_1': 'a.jpg',
+             'asset_id_2': 'b', 'image_url_2': 'b.jpg'},
+            hits.bundle_params([
+                {'asset_id': 'a', 'image_url': 'a.jpg'},
+                {'asset_id': 'b', 'image_url': 'b.jpg'}]))
+
+
+class HITTemplatePlanTest(unittest.TestCase):
+
+    def setUp(self):
+        super(HITTemplatePlanTest, self).setUp()
+        self.hit_template = hits.HITTemplate(
+            None, 'layout', reward_per_assignment=0.10, assignments_per_hit=3)
+
+    def test_should_predict_cost_including_fees(self):
+        """Should predict the payout plus Amazon's commission"""
+        plan = self.hit_template.plan(10)
+        self.assertEqual(30, plan.num_assignments)
+        self.assertAlmostEqual(3.0, plan.reward_cost)
+        self.assertAlmostEqual(0.6, plan.fee_cost)
+        self.assertAlmostEqual(3.6, plan.total_cost)
+
+    def test_should_charge_higher_fee_on_large_hits(self):
+        """Should charge the higher commission on HITs with many assignments"""
+        self.hit_template.assignments_per_hit = 10
+        self.assertAlmostEqual(
+            0.04, self.hit_template.get_fee_per_assignment())
+
+    def test_should_predict_duration_from_workers(self):
+        """Should predict the time for the workers to complete assignments"""
+        plan = self.hit_template.plan(
+            10, seconds_per_assignment=60, num_workers=4)
+        self.assertEqual(datetime.timedelta(minutes=8), plan.duration)
+
+    def test_should_split_into_sub_batches_meeting_deadline(self):
+        """Should split HITs into sub-batches completing within deadline"""
+        sub_batches = self.hit_template.plan_sub_batches(
+            10, datetime.timedelta(minutes=3),
+            seconds_per_assignment=60, num_workers=4)
+        self.assertEqual([4, 4, 2], [each.num_hits for each in sub_batches])
+        self.assertTrue(all(
+            each.duration <= datetime.timedelta(minutes=3)
+            for each in sub_batches))
+
+    def test_should_raise_if_deadline_cannot_be_met(self):
+        """Should raise ValueError if no HIT can complete within deadline"""
+        with self.assertRaises(ValueError):
+            self.hit_template.plan_sub_batches(
+                10, datetime.timedelta(seconds=30),
+                seconds_per_assignment=60)
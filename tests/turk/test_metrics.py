@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+import mock
+
+from parkme.turk import metrics
+
+
+class InstrumentedMTurkConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        super(InstrumentedMTurkConnectionTest, self).setUp()
+        self.now = 100.0
+        self.mturk_connection = mock.Mock()
+        self.call_metrics = metrics.CallMetrics(buckets=(1.0, 5.0))
+        self.instrumented = metrics.InstrumentedMTurkConnection(
+            self.mturk_connection, self.call_metrics, clock=lambda: self.now)
+
+    def advance(self, seconds, result=None):
+        """Return a side effect advancing the clock then returning result"""
+        def side_effect(*args, **kwargs):
+            self.now += seconds
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return side_effect
+
+    def test_should_record_calls_and_errors_per_operation(self):
+        """Should record calls, errors and latency of each operation"""
+        self.mturk_connection.create_hit.side_effect = self.advance(0.5, 'r')
+        self.mturk_connection.get_hit.side_effect = self.advance(
+            2.0, ValueError())
+
+        self.assertEqual('r', self.instrumented.create_hit(question='q'))
+        self.instrumented.create_hit(question='q')
+        self.assertRaises(ValueError, self.instrumented.get_hit, 'h')
+
+        self.assertEqual(
+            [metrics.OperationMetrics('create_hit', 2, 0, 1.0, (2, 0, 0)),
+             metrics.OperationMetrics('get_hit', 1, 1, 2.0, (0, 1, 0))],
+            self.call_metrics.get_all())
+        self.mturk_connection.create_hit.assert_called_with(question='q')
+
+    def test_should_record_iterator_once_exhausted(self):
+        """Should add time spent consuming a returned iterator to the call"""
+        pages = iter([1, 2])
+        self.mturk_connection.get_all_hits.side_effect = self.advance(
+            1.0, pages)
+
+        results = self.instrumented.get_all_hits()
+        self.assertEqual([], self.call_metrics.get_all())
+        self.now += 10.0
+        self.assertEqual([1, 2], list(results))
+
+        self.assertEqual(
+            [metrics.OperationMetrics('get_all_hits', 1, 0, 1.0, (1, 0, 0))],
+            self.call_metrics.get_all())
+
+    def test_should_record_closed_iterator_once(self):
+        """Should record an iterator closed before it is exhausted once"""
+        closed = []
+
+        def pages():
+            try:
+                self.now += 2.0
+                yield 1
+                yield 2
+            finally:
+                closed.append(True)
+        self.mturk_connection.get_all_hits.side_effect = self.advance(
+            1.0, pages())
+
+        results = self.instrumented.get_all_hits()
+        self.assertEqual(1, next(results))
+        results.close()
+        results.close()
+        del results
+
+        self.assertEqual(
+            [metrics.OperationMetrics('get_all_hits', 1, 0, 3.0, (0, 1, 0))],
+            self.call_metrics.get_all())
+        self.assertEqual([True], closed)
+
+    def test_should_record_abandoned_iterator(self):
+        """Should record an iterator abandoned before it is exhausted"""
+        self.mturk_connection.get_all_hits.side_effect = self.advance(
+            1.0, iter([1, 2]))
+
+        for _ in self.instrumented.get_all_hits():
+            break
+
+        self.assertEqual(
+            [metrics.OperationMetrics('get_all_hits', 1, 0, 1.0, (1, 0, 0))],
+            self.call_metrics.get_all())
+
+
+class CallMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        super(CallMetricsTest, self).setUp()
+        self.call_metrics = metrics.CallMetrics(buckets=(1.0, 5.0))
+        self.call_metrics.record('create_hit', 0.5)
+        self.call_metrics.record('create_hit', 7.0, error=True)
+
+    def test_should_export_cumulative_buckets_as_json(self):
+        """Should export counts and cumulative buckets as JSON"""
+        self.assertEqual(
+            {'create_hit': {
+                'calls': 2,
+                'errors': 1,
+                'total_seconds': 7.5,
+                'buckets': {'1.0': 1, '5.0': 1, '+Inf': 2}}},
+            json.loads(self.call_metrics.to_json()))
+
+    def test_should_export_prometheus_histogram(self):
+        """Should export a Prometheus histogram for each operation"""
+        lines = self.call_metrics.to_prometheus().splitlines()
+        self.assertIn('mturk_calls_total{operation="create_hit"} 2', lines)
+        self.assertIn('mturk_errors_total{operation="create_hit"} 1', lines)
+        self.assertIn(
+            'mturk_call_duration_seconds_bucket'
+            '{operation="create_hit",le="5.0"} 1',
+            lines)
+        self.assertIn(
+            'mturk_call_duration_seconds_bucket'
+            '{operation="create_hit",le="+Inf"} 2',
+            lines)
+        self.assertIn(
+            'mturk_call_duration_seconds_sum{operation="create_hit"} 7.5',
+            lines)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import datetime
+import unittest
+
+import mock
+
+from parkme import models
+from parkme.turk import hits
+from parkme.turk import planning
+
+
+class PrintPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        super(PrintPlanTest, self).setUp()
+        self.hit_template = hits.HITTemplate(
+            None, 'layout', reward_per_assignment=0.10, assignments_per_hit=3)
+        self.worker_stats = [models.WorkerStats(
+            worker_id='w', num_assignments=2, num_agreed=2,
+            total_work_seconds=120, updated_at=None)]
+
+    @mock.patch('sys.stdout')
+    def test_should_return_whole_batch_without_deadline(self, _):
+        """Should return a single sub-batch of every HIT without deadline"""
+        sub_batches = planning.print_plan(
+            self.hit_template, 10, self.worker_stats, 4)
+        self.assertEqual([10], [each.num_hits for each in sub_batches])
+
+    @mock.patch('sys.stdout')
+    def test_should_return_sub_batches_meeting_deadline(self, _):
+        """Should return the sub-batches completing within the deadline"""
+        sub_batches = planning.print_plan(
+            self.hit_template, 10, self.worker_stats, 4,
+            deadline=datetime.timedelta(minutes=3))
+        self.assertEqual([4, 4, 2], [each.num_hits for each in sub_batches])
+
+    @mock.patch('sys.stdout')
+    def test_should_return_whole_batch_if_deadline_cannot_be_met(self, _):
+        """Should return a single sub-batch if no HIT meets the deadline"""
+        sub_batches = planning.print_plan(
+            self.hit_template, 10, self.worker_stats, 4,
+            deadline=datetime.timedelta(seconds=30))
+        self.assertEqual([10], [each.num_hits for each in sub_batches])
+
+
+class IterSubBatchesTest(unittest.TestCase):
+
+    @mock.patch('sys.stdout')
+    def test_should_wait_for_each_sub_batch_before_the_next(self, _):
+        """Should wait for the previous sub-batch before yielding the next"""
+        hit_template = hits.HITTemplate(
+            None, 'layout', reward_per_assignment=0.10, assignments_per_hit=1)
+        sub_batches = [hit_template.plan(2), hit_template.plan(1)]
+        events = []
+        for each in planning.iter_sub_batches(
+                sub_batches, sleep=lambda seconds: events.append(seconds)):
+            events.append(each.num_hits)
+        self.assertEqual(
+            [2, sub_batches[0].duration.total_seconds(), 1], events)
+
+
+class GetNumHitsTest(unittest.TestCase):
+
+    def test_should_round_up_to_whole_hits(self):
+        """Should need a HIT for every bundle, including a partial one"""
+        self.assertEqual(3, planning.get_num_hits(5, bundle_size=2))
+        self.assertEqual(0, planning.get_num_hits(0, bundle_size=2))
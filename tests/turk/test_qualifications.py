@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from boto.mturk import connection
+import mock
+
+from parkme import models
+from parkme.turk import fake
+from parkme.turk import qualifications
+
+
+def make_qualification_request(request_id, worker_id, answers):
+    qualification_request = connection.QualificationRequest(None)
+    qualification_request.QualificationRequestId = request_id
+    qualification_request.SubjectId = worker_id
+    qualification_request.answers = fake.make_answers(answers)
+    return qualification_request
+
+
+class QualificationAssignmentTest(unittest.TestCase):
+
+    def setUp(self):
+        super(QualificationAssignmentTest, self).setUp()
+        self.qualification_assignment = qualifications.QualificationAssignment(
+            {'title': 'Categorize Photos', 'text': 'Choose what you see'},
+            {'q1': {'text': 'Is this a sign?',
+                    'choices': [['Yes', 'yes'], ['No', 'no']],
+                    'image_url': 'http://bucket/a.jpg'},
+             'q2': {'text': 'What does it show?',
+                    'choices': [['Rates', 'rates'], ['Hours', 'hours']],
+                    'multiple': True}},
+            {'q1': 'yes', 'q2': ['rates', 'hours']})
+
+    def test_should_render_question_form(self):
+        """Should render each question with its choices"""
+        xml = self.qualification_assignment.get_question_form().get_as_xml()
+        self.assertLess(
+            xml.index('<QuestionIdentifier>q1'),
+            xml.index('<QuestionIdentifier>q2'))
+        self.assertIn('<SelectionIdentifier>hours</SelectionIdentifier>', xml)
+        self.assertIn('<SubType>jpeg</SubType>', xml)
+
+    def test_should_grade_fraction_of_correct_answers(self):
+        """Should score the fraction of questions answered exactly"""
+        self.assertEqual(
+            1.0, self.qualification_assignment.grade(
+                {'q1': ['yes'], 'q2': ['hours', 'rates']}))
+        self.assertEqual(
+            0.5, self.qualification_assignment.grade(
+                {'q1': ['yes'], 'q2': ['rates']}))
+
+
+class QualificationGraderTest(unittest.TestCase):
+
+    def setUp(self):
+        super(QualificationGraderTest, self).setUp()
+        self.mock_connection = mock.Mock()
+        self.grader = qualifications.QualificationGrader(
+            self.mock_connection,
+            'QUAL',
+            qualifications.QualificationAssignment(
+                {}, {}, {'q1': 'yes', 'q2': 'no'}),
+            passing_score=1.0)
+
+    def test_should_grant_passing_and_reject_failing_requests(self):
+        """Should grant passing requests their score and reject the rest"""
+        self.mock_connection.get_qualification_requests.return_value = (
+            fake.make_result_set([
+                make_qualification_request(
+                    'R1', 'W1', {'q1': ['yes'], 'q2': ['no']}),
+                make_qualification_request(
+                    'R2', 'W2', {'q1': ['yes'], 'q2': ['yes']})]))
+
+        grades = self.grader.grade_pending_requests()
+
+        self.assertEqual([True, False], [each.passed for each in grades])
+        self.mock_connection.grant_qualification.assert_called_once_with(
+            'R1', integer_value=100)
+        self.assertEqual(
+            'RejectQualificationRequest',
+            self.mock_connection._process_request.call_args[0][0])
+
+    def test_should_revoke_only_inaccurate_experienced_workers(self):
+        """Should revoke the qualification from inaccurate workers with
+        enough assignments"""
+        get_qualifications = (
+            self.mock_connection.get_qualifications_for_qualification_type)
+        get_qualifications.return_value = fake.make_result_set([
+            mock.Mock(SubjectId=worker_id)
+            for worker_id in ('W1', 'W2', 'W3')])
+        worker_stats_gateway = models.WorkerStatsDataGateway(':memory:')
+        worker_stats_gateway.create_table()
+        worker_stats_gateway.record_results(
+            [models.WorkerResult('W1-{}'.format(i), 'W1', None, i < 5, 10)
+             for i in xrange(20)] +
+            [models.WorkerResult('W2-{}'.format(i), 'W2', None, i < 18, 10)
+             for i in xrange(20)] +
+            [models.WorkerResult('W3-1', 'W3', None, False, 10)])
+
+        revoked = self.grader.revoke_inaccurate_workers(worker_stats_gateway)
+
+        self.assertEqual(['W1'], [each.worker_id for each in revoked])
+        self.assertEqual(
+            1, self.mock_connection.revoke_qualification.call_count)
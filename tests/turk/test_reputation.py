@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from parkme import models
+from parkme.turk import reputation
+
+
+def make_assignment(worker_id, answers):
+    """Return a mock assignment with the given answers"""
+    assignment = mock.Mock()
+    assignment.worker_id = worker_id
+    assignment.answers = answers
+    return assignment
+
+
+class GetWorkerWeightTest(unittest.TestCase):
+
+    def test_should_return_default_weight_for_unknown_worker(self):
+        """Should return default weight if worker has no statistics"""
+        self.assertEqual(
+            reputation.DEFAULT_WEIGHT, reputation.get_worker_weight(None))
+
+    def test_should_approach_agreement_rate_with_more_assignments(self):
+        """Should approach the agreement rate as assignments accumulate"""
+        worker_stats = models.WorkerStats('herp', 98, 98, 0, None)
+        self.assertAlmostEqual(
+            0.99, reputation.get_worker_weight(worker_stats))
+
+    def test_should_weight_gold_answers_more_than_agreement(self):
+        """Should lower the weight more for wrong gold answers"""
+        worker_stats = models.WorkerStats('herp', 10, 10, 0, None)
+        worker_accuracy = models.WorkerAccuracy('herp', 2, 0, None)
+        self.assertLess(
+            reputation.get_worker_weight(worker_stats, worker_accuracy),
+            reputation.get_worker_weight(
+                models.WorkerStats('herp', 12, 10, 0, None)))
+
+
+class GetWeightedConsensusTest(unittest.TestCase):
+
+    def setUp(self):
+        super(GetWeightedConsensusTest, self).setUp()
+        self.get_answers = lambda each: each.answers
+
+    def test_should_match_two_vote_rule_for_unknown_workers(self):
+        """Should require two unknown workers to agree once complete"""
+        assignments = [
+            make_assignment('a', ['rates']),
+            make_assignment('b', ['rates', 'hours']),
+            make_assignment('c', ['entrance'])]
+        votes = reputation.get_weighted_votes(
+            assignments, {}, self.get_answers)
+        self.assertEqual(
+            ['rates'], reputation.get_weighted_consensus(votes, True))
+
+    def test_should_not_decide_early_with_unknown_workers(self):
+        """Should not decide early if workers are unknown"""
+        assignments = [
+            make_assignment('a', ['rates']),
+            make_assignment('b', ['rates'])]
+        votes = reputation.get_weighted_votes(
+            assignments, {}, self.get_answers)
+        self.assertEqual([], reputation.get_weighted_consensus(votes, False))
+
+    def test_should_decide_early_with_trusted_workers(self):
+        """Should decide early if trusted workers agree"""
+        assignments = [
+            make_assignment('a', ['rates']),
+            make_assignment('b', ['rates'])]
+        votes = reputation.get_weighted_votes(
+            assignments, {'a': 0.9, 'b': 0.8}, self.get_answers)
+        self.assertEqual(
+            ['rates'], reputation.get_weighted_consensus(votes, False))
+
+    def test_should_ignore_blank_answers(self):
+        """Should not count workers who gave no answer"""
+        assignments = [make_assignment('a', None)]
+        self.assertEqual(
+            {},
+            dict(reputation.get_weighted_votes(
+                assignments, {}, self.get_answers)))
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import mock
+
+from parkme import models
+from parkme.turk import fake
+from parkme.turk import hits
+from parkme.turk import workqueue
+
+
+class GetPriorityTest(unittest.TestCase):
+
+    def test_should_prefer_busier_lots(self):
+        """Should give photos of busier lots higher priority"""
+        self.assertGreater(
+            workqueue.get_priority(traffic=1000),
+            workqueue.get_priority(traffic=10))
+
+    def test_should_prefer_recent_photos(self):
+        """Should give more recent photos higher priority"""
+        self.assertGreater(
+            workqueue.get_priority(photo_age_days=1),
+            workqueue.get_priority(photo_age_days=365))
+
+    def test_should_prefer_lots_with_stale_rates(self):
+        """Should give lots with missing or stale rates higher priority"""
+        self.assertEqual(
+            workqueue.get_priority(rates_age_days=None),
+            workqueue.get_priority(rates_age_days=1000))
+        self.assertGreater(
+            workqueue.get_priority(rates_age_days=200),
+            workqueue.get_priority(rates_age_days=20))
+
+
+class WorkQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        super(WorkQueueTest, self).setUp()
+        data_gateway = models.WorkQueueDataGateway(':memory:')
+        data_gateway.create_table()
+        self.work_queue = workqueue.WorkQueue(data_gateway, 'test')
+        self.mturk_connection = fake.FakeMTurkConnection()
+        self.hit_template = hits.HITTemplate(
+            self.mturk_connection, 'layout', reward_per_assignment=0.02)
+        self.mock_rate_limiter = mock.MagicMock()
+
+    def test_should_upload_highest_priority_first(self):
+        """Should create HITs for the highest priority items first"""
+        self.work_queue.push_all([
+            ('a', 1.0, {'asset_id': 'a'}),
+            ('b', 3.0, {'asset_id': 'b'}),
+            ('c', 2.0, {'asset_id': 'c'})])
+        with mock.patch.object(self.hit_template, 'create_hit') as mock_create:
+            mock_create.return_value = None
+            self.assertEqual(
+                (2, 2),
+                self.work_queue.drain(
+                    self.hit_template, 'batch', max_hits=2,
+                    rate_limiter=self.mock_rate_limiter))
+        self.assertEqual(
+            [mock.call({'asset_id': 'b'}, batch_id='batch'),
+             mock.call({'asset_id': 'c'}, batch_id='batch')],
+            mock_create.call_args_list)
+        self.assertEqual(1, len(self.work_queue))
+        self.assertEqual(2, self.mock_rate_limiter.__enter__.call_count)
+
+    def test_should_upload_newly_queued_urgent_work_first(self):
+        """Should upload urgent items queued after a partial drain first"""
+        self.work_queue.push_all(
+            [(str(i), 3.0 - i, {'asset_id': str(i)}) for i in xrange(3)])
+        with mock.patch.object(self.hit_template, 'create_hit') as mock_create:
+            mock_create.return_value = None
+            self.work_queue.drain(
+                self.hit_template, 'batch', max_hits=1,
+                rate_limiter=self.mock_rate_limiter)
+            self.work_queue.push_all(
+                [('urgent', 5.0, {'asset_id': 'urgent'})])
+            self.assertEqual(
+                (3, 3),
+                self.work_queue.drain(
+                    self.hit_template, 'batch',
+                    rate_limiter=self.mock_rate_limiter))
+        self.assertEqual(
+            ['0', 'urgent', '1', '2'],
+            [call[0][0]['asset_id'] for call in mock_create.call_args_list])
+
+    def test_should_bundle_items_into_hits(self):
+        """Should create bundled HITs when draining with a bundle size"""
+        self.work_queue.push_all(
+            [(str(i), 1.0, {'asset_id': str(i)}) for i in xrange(5)])
+        self.assertEqual(
+            (3, 5),
+            self.work_queue.drain(
+                self.hit_template, 'batch', bundle_size=2, chunk_size=1))
+        self.assertEqual(3, len(self.mturk_connection.get_all_hits()))
+        self.assertEqual(0, len(self.work_queue))
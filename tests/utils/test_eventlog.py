@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import json
+import StringIO
+import unittest
+
+from parkme.utils import eventlog
+
+
+class EventLogTest(unittest.TestCase):
+
+    def setUp(self):
+        super(EventLogTest, self).setUp()
+        self.stream = StringIO.StringIO()
+        self.event_log = eventlog.EventLog(
+            stream=self.stream, buffer_size=2, clock=lambda: 100.0)
+
+    def test_should_count_but_not_write_events_below_level(self):
+        """Should only count events below the log level"""
+        self.event_log.debug('asset_accepted', asset_id='1')
+        self.event_log.debug('asset_accepted', asset_id='2')
+        self.event_log.flush()
+        self.assertEqual('', self.stream.getvalue())
+        self.assertEqual(
+            {'asset_accepted': 2}, dict(self.event_log.get_counts()))
+
+    def test_should_buffer_events_as_json_lines(self):
+        """Should write buffered events once the buffer is full"""
+        self.event_log.info('lot_adjusted', lot_id=1)
+        self.assertEqual('', self.stream.getvalue())
+        self.event_log.warning('lot_skipped', lot_id=2)
+        self.assertEqual(
+            [{'time': 100.0, 'level': 'INFO', 'event': 'lot_adjusted',
+              'lot_id': 1},
+             {'time': 100.0, 'level': 'WARNING', 'event': 'lot_skipped',
+              'lot_id': 2}],
+            [json.loads(line) for line in self.stream.getvalue().split(
+                '\n') if line])
+
+    def test_should_summarize_most_frequent_events_first(self):
+        """Should summarize event counts, most frequent first"""
+        for event in ('b', 'a', 'b'):
+            self.event_log.debug(event)
+        self.assertEqual(['2 b', '1 a'], self.event_log.format_summary())
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from parkme.utils import profiling
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ProfilerTest, self).setUp()
+        self.now = 100.0
+        self.profiler = profiling.Profiler(clock=lambda: self.now)
+
+    def test_should_name_nested_spans_after_parent(self):
+        """Should name spans opened in another span after it"""
+        with self.profiler.span('outer'):
+            self.now += 1.0
+            for _ in xrange(2):
+                with self.profiler.span('inner'):
+                    self.now += 2.0
+        self.assertEqual(
+            [profiling.StageTiming('outer/inner', 2, 4.0),
+             profiling.StageTiming('outer', 1, 5.0)],
+            self.profiler.get_timings())
+
+    def test_should_time_decorated_function_even_if_it_raises(self):
+        """Should time calls that raise and close their span"""
+        @self.profiler.timed()
+        def fail():
+            self.now += 3.0
+            raise ValueError()
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(
+            [profiling.StageTiming('fail', 1, 3.0)],
+            self.profiler.get_timings())
+        with self.profiler.span('after'):
+            pass
+        self.assertEqual('after', self.profiler.get_timings()[-1].name)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from parkme.utils import report
+
+
+class BatchReportTest(unittest.TestCase):
+
+    def setUp(self):
+        super(BatchReportTest, self).setUp()
+        self.temp_dir = tempfile.mkdtemp()
+        self.report_path = os.path.join(self.temp_dir, 'report.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+        super(BatchReportTest, self).tearDown()
+
+    def read_rows(self):
+        """Return the rows written to the report so far"""
+        with open(self.report_path, 'rb') as report_file:
+            return list(csv.DictReader(report_file))
+
+    def test_should_write_rows_as_they_are_added(self):
+        """Should write rows incrementally, joining lists"""
+        batch_report = report.BatchReport(
+            self.report_path, 'b1', ['hit_id', 'decision', 'categories'],
+            flush_every=1)
+        batch_report.add_row(
+            hit_id='h1', decision='ACCEPTED', categories=['rates', 'hours'])
+        self.assertEqual(
+            [{'batch_id': 'b1', 'hit_id': 'h1', 'decision': 'ACCEPTED',
+              'categories': 'rates|hours'}],
+            self.read_rows())
+        batch_report.close()
+
+    def test_should_write_aggregate_stats_on_close(self):
+        """Should write decision counts and extra stats on close"""
+        with report.BatchReport(
+                self.report_path, 'b1', ['decision']) as batch_report:
+            for decision in ('ACCEPTED', 'ACCEPTED', 'NO CONSENSUS', 'X'):
+                batch_report.add_row(decision=decision)
+            batch_report.close(num_lots=2)
+
+        summary = report.load_summary(self.report_path)
+        self.assertEqual(
+            {'ACCEPTED': 2, 'NO CONSENSUS': 1, 'X': 1}, summary['decisions'])
+        self.assertEqual(0.5, summary['decision_fractions']['ACCEPTED'])
+        self.assertEqual((4, 2, True), (
+            summary['num_rows'], summary['num_lots'], summary['complete']))
+        self.assertEqual(4, len(self.read_rows()))
+
+    def test_should_close_opened_report_when_run_fails(self):
+        """Should write an incomplete summary when the run raises"""
+        with self.assertRaises(ValueError):
+            with report.open_report(
+                    self.report_path, 'b1', ['decision']) as batch_report:
+                batch_report.add_row(decision='ACCEPTED')
+                raise ValueError
+
+        summary = report.load_summary(self.report_path)
+        self.assertEqual(
+            (1, False), (summary['num_rows'], summary['complete']))
+
+    def test_should_open_no_report_without_path(self):
+        """Should yield None when no report path is given"""
+        with report.open_report(None, 'b1', ['decision']) as batch_report:
+            self.assertIsNone(batch_report)